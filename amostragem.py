@@ -0,0 +1,203 @@
+"""
+Amostragem estratificada dos leads enviados ao modelo na análise.
+
+A amostra uniforme (df.sample) raramente traz segmentos pequenos, como uma cidade rara,
+uma origem pouco usada ou a faixa de maior valor. Aqui a amostra é montada em três etapas
+sobre o DataFrame inteiro (operações vetorizadas, sem laço por linha):
+
+1. extremos: a linha de menor e a de maior valor de cada coluna numérica;
+2. cobertura: ao menos uma linha de cada estrato das colunas categóricas detectadas
+   (valores raros demais são agrupados em "(outros)");
+3. preenchimento proporcional ao tamanho dos estratos da coluna principal.
+
+As linhas saem em rodízio pelos estratos da coluna principal, então qualquer prefixo da
+amostra (o prompt corta linhas para caber no orçamento de tokens) continua representativo.
+O plano devolvido (colunas, estratos, semente e posições das linhas) vai para o
+resumo_estatistico e permite refazer exatamente a mesma amostra.
+"""
+import math
+import os
+
+# "estratificada" ou "aleatoria" (amostra uniforme, o comportamento anterior)
+AMOSTRAGEM_LEADS = os.getenv("AMOSTRAGEM_LEADS", "estratificada")
+MAX_COLUNAS_ESTRATO = 3
+MAX_ESTRATOS_POR_COLUNA = 30
+FRACAO_MIN_ESTRATO = 0.001  # valores abaixo disso entram em "(outros)"
+FRACAO_MAX_CARDINALIDADE = 0.5  # acima disso a coluna parece um identificador (email, nome, telefone)
+FRACAO_MAX_EXTREMOS = 0.2
+AMOSTRA_CARDINALIDADE = 5000  # linhas iniciais usadas para descartar colunas quase únicas
+ROTULO_OUTROS = "(outros)"
+ROTULO_VAZIO = "(vazio)"
+
+
+def _rotulos_estrato(serie):
+    """Série de rótulos com os valores raros agrupados, ou None se a coluna não serve de estrato."""
+    import numpy as np
+    import pandas as pd
+
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return None
+    # Descarta cedo colunas quase únicas (email, nome completo) sem percorrer a coluna toda
+    inicio = serie.iloc[:AMOSTRA_CARDINALIDADE]
+    if len(serie) > AMOSTRA_CARDINALIDADE and inicio.nunique() > FRACAO_MAX_CARDINALIDADE * len(inicio):
+        return None
+    codigos, valores = pd.factorize(serie)  # -1 = vazio
+    if len(valores) > FRACAO_MAX_CARDINALIDADE * len(serie):
+        return None
+    contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+    ordem = np.argsort(-contagens, kind="stable")
+    manter = ordem[contagens[ordem] >= max(1, FRACAO_MIN_ESTRATO * len(serie))][:MAX_ESTRATOS_POR_COLUNA]
+    # Posições dos rótulos: mantidos, depois "(outros)" e por último "(vazio)" (código -1)
+    categorias = [str(valores[i]) for i in manter] + [ROTULO_OUTROS, ROTULO_VAZIO]
+    mapa = np.full(len(valores) + 1, len(manter), dtype=np.int32)
+    mapa[manter] = np.arange(len(manter))
+    mapa[-1] = len(manter) + 1
+    rotulos = pd.Series(pd.Categorical.from_codes(mapa[codigos], categorias), index=serie.index)
+    rotulos = rotulos.cat.remove_unused_categories()
+    if len(rotulos.cat.categories) < 2:
+        return None
+    return rotulos
+
+
+def _entropia(contagens):
+    total = contagens.sum()
+    return -sum((c / total) * math.log2(c / total) for c in contagens if c)
+
+
+def detectar_estratos(df, max_colunas=MAX_COLUNAS_ESTRATO):
+    """
+    Colunas categóricas usadas como estrato, da mais informativa (maior entropia) para a menos.
+
+    Retorna [(coluna, rótulos)] com os rótulos como Series categórica alinhada ao df.
+    """
+    candidatas = []
+    for coluna in df.columns:
+        rotulos = _rotulos_estrato(df[coluna])
+        if rotulos is not None:
+            candidatas.append((_entropia(rotulos.value_counts()), coluna, rotulos))
+    candidatas.sort(key=lambda item: item[0], reverse=True)
+    return [(coluna, rotulos) for _, coluna, rotulos in candidatas[:max_colunas]]
+
+
+def _cotas_proporcionais(populacao, vagas):
+    """Divide `vagas` proporcionalmente à população de cada estrato (maiores restos)."""
+    total = populacao.sum()
+    if vagas <= 0 or total == 0:
+        return populacao * 0
+    ideal = populacao * (vagas / total)
+    cotas = ideal.astype(int)
+    restantes = vagas - cotas.sum()
+    if restantes > 0:
+        for estrato in (ideal - cotas).sort_values(ascending=False).index[:restantes]:
+            cotas[estrato] += 1
+    return cotas
+
+
+def amostra_estratificada(df, n, random_state=42):
+    """
+    Amostra de até `n` linhas com extremos, cobertura dos estratos e preenchimento proporcional.
+
+    Retorna (amostra, plano): a amostra em ordem de rodízio pelos estratos da coluna principal e
+    o plano serializável em JSON.
+    """
+    import numpy as np
+    import pandas as pd
+
+    total = len(df)
+    if total <= n:
+        return df, {"metodo": "todas", "populacao": total, "linhas": total}
+    if AMOSTRAGEM_LEADS == "aleatoria":
+        # Mesmas linhas de df.sample(n, random_state), por posição (o índice pode ter repetidos)
+        posicoes = pd.Series(range(total)).sample(n=n, random_state=random_state).tolist()
+        return df.iloc[posicoes], {"metodo": "aleatoria", "semente": random_state, "populacao": total,
+                                   "linhas": n, "posicoes": posicoes}
+
+    gerador = np.random.default_rng(random_state)
+    sorteio = gerador.permutation(total)  # ordem aleatória das posições, usada em todas as etapas
+    # Códigos inteiros dos rótulos: comparar e ordenar inteiros é bem mais rápido que strings
+    estratos = [(coluna, rotulos.cat.codes.to_numpy(), rotulos.cat.categories)
+                for coluna, rotulos in detectar_estratos(df)]
+    escolhidas = []
+    marcadas = np.zeros(total, dtype=bool)
+
+    def incluir(posicoes, limite):
+        for posicao in posicoes:
+            if len(escolhidas) >= limite:
+                return
+            if not marcadas[posicao]:
+                marcadas[posicao] = True
+                escolhidas.append(int(posicao))
+
+    # 1. Extremos das colunas numéricas
+    colunas_extremos = []
+    limite_extremos = max(2, int(n * FRACAO_MAX_EXTREMOS))
+    for coluna in df.columns:
+        serie = df[coluna]
+        if not pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie) or serie.nunique() <= 2:
+            continue
+        valores = serie.to_numpy(dtype=float, na_value=np.nan)
+        if np.isnan(valores).all():
+            continue
+        incluir([np.nanargmin(valores), np.nanargmax(valores)], limite_extremos)
+        colunas_extremos.append(coluna)
+
+    # 2. Cobertura: a primeira linha (na ordem sorteada) de cada estrato ainda não representado
+    for _, codigos, _ in estratos:
+        ja_cobertos = set(codigos[escolhidas]) if escolhidas else set()
+        valores_sorteados, primeiras = np.unique(codigos[sorteio], return_index=True)
+        incluir([sorteio[i] for valor, i in zip(valores_sorteados, primeiras) if valor not in ja_cobertos], n)
+
+    # 3. Preenchimento proporcional aos estratos da coluna principal (ou aleatório, sem estratos)
+    restantes = sorteio[~marcadas[sorteio]]
+    if estratos and len(escolhidas) < n:
+        principal = pd.Series(estratos[0][1])
+        populacao = principal.value_counts()
+        ja_na_amostra = principal.iloc[escolhidas].value_counts().reindex(populacao.index, fill_value=0)
+        alvo = _cotas_proporcionais(populacao, n)
+        cotas = (alvo - ja_na_amostra).clip(lower=0)
+        cotas = _cotas_proporcionais(cotas, min(n - len(escolhidas), int(cotas.sum()))) if cotas.sum() else cotas
+        rotulos_restantes = principal.iloc[restantes].reset_index(drop=True)
+        ordem_no_estrato = rotulos_restantes.groupby(rotulos_restantes, sort=False).cumcount().to_numpy()
+        dentro_da_cota = ordem_no_estrato < rotulos_restantes.map(cotas).fillna(0).to_numpy()
+        incluir(restantes[dentro_da_cota], n)
+        restantes = sorteio[~marcadas[sorteio]]
+    incluir(restantes[:max(0, n - len(escolhidas))], n)
+
+    # Rodízio: 1ª linha de cada estrato principal, depois a 2ª de cada um, e assim por diante
+    escolhidas = np.array(escolhidas)
+    if estratos:
+        principal = pd.Series(estratos[0][1][escolhidas])
+        rodada = principal.groupby(principal, sort=False).cumcount().to_numpy()
+        escolhidas = escolhidas[np.lexsort((np.arange(len(escolhidas)), rodada))]
+
+    plano = {
+        "metodo": "estratificada",
+        "semente": random_state,
+        "populacao": total,
+        "linhas": len(escolhidas),
+        "colunas_estrato": [coluna for coluna, _, _ in estratos],
+        "colunas_extremos": colunas_extremos,
+        "estratos": {
+            coluna: {
+                str(categorias[codigo]): {"populacao": int(qtd),
+                                          "amostra": int(np.count_nonzero(codigos[escolhidas] == codigo))}
+                for codigo, qtd in pd.Series(codigos).value_counts().items()
+            }
+            for coluna, codigos, categorias in estratos
+        },
+        "posicoes": escolhidas.tolist(),
+    }
+    return df.iloc[escolhidas], plano
+
+
+def registrar_linhas_usadas(plano, amostra_no_prompt):
+    """Marca no plano quantas linhas (prefixo da amostra) couberam no prompt e quantas de cada estrato."""
+    plano["linhas_no_prompt"] = len(amostra_no_prompt)
+    for coluna, estratos in plano.get("estratos", {}).items():
+        serie = amostra_no_prompt[coluna]
+        rotulos = serie.astype(str).where(serie.notna(), ROTULO_VAZIO)
+        rotulos = rotulos.where(rotulos.isin(list(estratos)), ROTULO_OUTROS)
+        contagens = rotulos.value_counts()
+        for rotulo, info in estratos.items():
+            info["no_prompt"] = int(contagens.get(rotulo, 0))
+    return plano
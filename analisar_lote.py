@@ -0,0 +1,224 @@
+"""
+Análise em lote de arquivos de leads (CSV, XLSX, Parquet ou JSONL) pela linha de comando,
+sem o Streamlit.
+
+Cada arquivo é analisado em um processo do pool (leitura do arquivo, estatísticas e chamada à
+OpenAI) e gera um resultado em JSON e/ou Markdown. Com --salvar, as análises bem-sucedidas
+são gravadas em analises_leads com um único insert ao final.
+
+Exemplos:
+    python analisar_lote.py exportacoes/ --plataforma "Disparo de WhatsApp" --objetivo "Gerar vendas"
+    python analisar_lote.py "exportacoes/*.csv" --objetivo "Gerar vendas" --salvar --usuario-id <uuid>
+    python analisar_lote.py exportacoes/ --objetivo "Teste" --dry-run
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+import servicos
+from deduplicacao_leads import deduplicar_leads
+from leitores import EXTENSOES, ler_leads
+from snapshots import salvar_snapshot
+from telemetria_llm import coletor_telemetria, configurar_destino
+
+load_dotenv()
+
+PLATAFORMAS_ANALISE = list(servicos.TOKENS_POR_PLATAFORMA)
+
+# Estado de cada processo do pool (clientes não são serializáveis entre processos)
+_client_worker = None
+_limitador_worker = None
+
+
+def expandir_entradas(entradas):
+    """Lista ordenada e sem repetição dos arquivos de leads indicados por diretórios, arquivos ou globs."""
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            arquivos.extend(caminho for caminho in glob.glob(os.path.join(entrada, "*"))
+                            if os.path.splitext(caminho)[1].lower() in EXTENSOES)
+        else:
+            arquivos.extend(glob.glob(entrada))
+    return sorted({os.path.abspath(a) for a in arquivos if os.path.isfile(a)})
+
+
+def _inicializar_worker(dry_run, rpm_por_worker):
+    """Cria o cliente da OpenAI (ou o falso) e um limitador próprio em cada processo."""
+    global _client_worker, _limitador_worker
+    from limitador_taxa import LimitadorTaxa
+
+    if dry_run:
+        from clientes_falsos import ClienteOpenAIFalso
+        _client_worker = ClienteOpenAIFalso(latencia=0.05)
+    else:
+        from openai import OpenAI
+        _client_worker = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # O RPM da conta é dividido entre os processos, cada um com uma chamada por vez
+    _limitador_worker = LimitadorTaxa(rpm_por_worker, 1)
+
+
+def _analisar_arquivo(caminho, plataforma, objetivo, contexto_aprendizado, modelo, usuario_id=None):
+    """Executado no processo do pool: lê um arquivo de leads e retorna a análise com os tempos."""
+    inicio = time.time()
+    resultado = {"arquivo": caminho, "sucesso": False}
+    registrados_antes = coletor_telemetria.registrados
+    try:
+        df, _ = deduplicar_leads(ler_leads(caminho)[0])
+        resultado["tempo_leitura"] = time.time() - inicio
+        analise_data, uso = servicos.executar_analise(
+            _client_worker, df, plataforma, objetivo, contexto_aprendizado, modelo, _limitador_worker, usuario_id
+        )
+        if usuario_id:
+            # Snapshot local dos leads, para reanalisar pelo histórico do app sem o arquivo original
+            try:
+                analise_data["resumo_estatistico"]["snapshot"] = salvar_snapshot(df, usuario_id)
+            except Exception as e:
+                print(f"Erro ao salvar o snapshot de {caminho}: {e}")
+        resultado.update(sucesso=True, analise_data=analise_data, uso=uso)
+    except Exception as e:
+        resultado["erro"] = str(e)
+    resultado["tempo_total"] = time.time() - inicio
+    # Telemetria das chamadas deste arquivo, gravada pelo processo principal
+    novos = coletor_telemetria.registrados - registrados_antes
+    resultado["telemetria"] = coletor_telemetria.recentes()[-novos:] if novos else []
+    return resultado
+
+
+def escrever_resultado(resultado, diretorio_saida, formatos):
+    """Grava <nome>.json e/ou <nome>.md no diretório de saída; retorna os caminhos gerados."""
+    nome = os.path.splitext(os.path.basename(resultado["arquivo"]))[0]
+    caminhos = []
+    if "json" in formatos:
+        caminho_json = os.path.join(diretorio_saida, f"{nome}.json")
+        with open(caminho_json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2, default=str)
+        caminhos.append(caminho_json)
+    if "md" in formatos and resultado["sucesso"]:
+        analise_data = resultado["analise_data"]
+        caminho_md = os.path.join(diretorio_saida, f"{nome}.md")
+        with open(caminho_md, "w", encoding="utf-8") as f:
+            f.write(f"# Análise de leads: {os.path.basename(resultado['arquivo'])}\n\n")
+            f.write(f"- **Plataforma:** {analise_data['plataforma']}\n")
+            f.write(f"- **Objetivo:** {analise_data['objetivo']}\n")
+            f.write(f"- **Total de leads:** {analise_data['total_leads']}\n")
+            f.write(f"- **Tokens:** {resultado['uso']['total_tokens']}\n\n")
+            f.write(analise_data["analise"] + "\n")
+        caminhos.append(caminho_md)
+    return caminhos
+
+
+def _argumentos(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analisa em lote um diretório ou glob de arquivos de leads.",
+        epilog=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("entradas", nargs="+", help="diretórios, arquivos de leads ou padrões glob")
+    parser.add_argument("--plataforma", choices=PLATAFORMAS_ANALISE, default=PLATAFORMAS_ANALISE[0])
+    parser.add_argument("--objetivo", required=True, help="objetivo da análise")
+    parser.add_argument("--saida", default="resultados_analise", help="diretório dos resultados")
+    parser.add_argument("--formato", choices=["json", "md", "ambos"], default="ambos")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="processos em paralelo")
+    parser.add_argument("--modelo", default=servicos.MODELO_OPENAI)
+    parser.add_argument("--salvar", action="store_true", help="grava as análises em analises_leads")
+    parser.add_argument("--usuario-id", default=os.getenv("MENCARE_USUARIO_ID"),
+                        help="dono das análises salvas e dos feedbacks usados como contexto")
+    parser.add_argument("--dry-run", action="store_true", help="usa um modelo simulado e não acessa o Supabase")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _argumentos(argv)
+    arquivos = expandir_entradas(args.entradas)
+    if not arquivos:
+        print("Nenhum arquivo de leads encontrado.")
+        return 1
+    if args.salvar and not args.usuario_id:
+        print("--salvar exige --usuario-id (ou a variável MENCARE_USUARIO_ID).")
+        return 1
+    if not args.dry_run and not os.getenv("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY não configurada. Use --dry-run para testar sem a OpenAI.")
+        return 1
+
+    supabase = None
+    contexto_aprendizado = ""
+    if not args.dry_run and (args.salvar or args.usuario_id):
+        from supabase_config import get_supabase_client
+        supabase = get_supabase_client()
+        if args.usuario_id:
+            # Contexto de feedbacks buscado uma vez e compartilhado por todos os arquivos
+            try:
+                contexto_aprendizado = servicos.montar_contexto_aprendizado(
+                    servicos.buscar_feedbacks_contexto(supabase, args.usuario_id)
+                )
+            except Exception as e:
+                print(f"Não foi possível carregar feedbacks para contexto OpenAI: {e}")
+    elif args.dry_run and args.salvar:
+        print("--dry-run: as análises não serão salvas no Supabase.")
+
+    os.makedirs(args.saida, exist_ok=True)
+    formatos = ("json", "md") if args.formato == "ambos" else (args.formato,)
+    workers = max(1, min(args.workers, len(arquivos)))
+    from limitador_taxa import OPENAI_RPM
+    rpm_por_worker = max(1, OPENAI_RPM // workers)
+
+    print(f"Analisando {len(arquivos)} arquivo(s) com {workers} processo(s)...")
+    inicio = time.time()
+    resultados = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker,
+                             initargs=(args.dry_run, rpm_por_worker)) as executor:
+        futuros = [
+            executor.submit(_analisar_arquivo, caminho, args.plataforma, args.objetivo,
+                            contexto_aprendizado, args.modelo, args.usuario_id)
+            for caminho in arquivos
+        ]
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            resultados.append(resultado)
+            escrever_resultado(resultado, args.saida, formatos)
+            nome = os.path.basename(resultado["arquivo"])
+            if resultado["sucesso"]:
+                print(f"  ✓ {nome}: {resultado['analise_data']['total_leads']} leads, "
+                      f"{resultado['uso']['total_tokens']} tokens, {resultado['tempo_total']:.2f}s "
+                      f"(leitura {resultado['tempo_leitura']:.2f}s)")
+            else:
+                print(f"  ✗ {nome}: {resultado['erro']} ({resultado['tempo_total']:.2f}s)")
+    duracao = time.time() - inicio
+
+    sucesso = [r for r in resultados if r["sucesso"]]
+    if args.salvar and supabase is not None and sucesso:
+        try:
+            ids = servicos.salvar_analises_em_lote(supabase, [r["analise_data"] for r in sucesso], args.usuario_id)
+            print(f"{len(ids)} análise(s) salva(s) em analises_leads.")
+        except Exception as e:
+            print(f"Erro ao salvar análises no Supabase: {e}")
+        for r in sucesso:
+            try:
+                servicos.registrar_consumo_tokens(supabase, args.usuario_id, "analise", r["uso"])
+            except Exception as e:
+                print(f"Erro ao salvar métricas da análise: {e}")
+
+    if supabase is not None and args.usuario_id:
+        configurar_destino(supabase)
+        for r in resultados:
+            for registro in r["telemetria"]:
+                coletor_telemetria.registrar(registro)
+        coletor_telemetria.descarregar()
+
+    soma_arquivos = sum(r["tempo_total"] for r in resultados)
+    print(
+        f"\nTotal: {len(sucesso)}/{len(resultados)} arquivo(s) analisado(s), "
+        f"{sum(r['analise_data']['total_leads'] for r in sucesso)} leads, "
+        f"{sum(r['uso']['total_tokens'] for r in sucesso)} tokens em {duracao:.2f}s "
+        f"(soma dos arquivos {soma_arquivos:.2f}s). Resultados em {os.path.abspath(args.saida)}"
+    )
+    return 0 if len(sucesso) == len(resultados) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+API HTTP (ASGI) para geração de copy e análise de leads, sem o Streamlit.
+
+Executar com:
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+Autenticação: header "Authorization: Bearer <credencial>", e o usuário dono dos dados vem da
+própria credencial: um access token do Supabase Auth (o mesmo login do app) ou uma chave por
+usuário de MENCARE_API_KEYS ("usuario_id:chave,usuario_id:chave"). Sem credencial válida a
+requisição é recusada, inclusive quando nenhuma chave está configurada.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Annotated, Dict, List
+
+from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, field_validator
+
+import servicos
+from deduplicacao_leads import deduplicar_leads
+from geracao_lote import gerar_copies_em_lote
+from jobs import fingerprint_dataframe, obter_executor_jobs
+from leitores import ler_leads
+from telemetria_llm import configurar_destino
+
+MENCARE_API_KEYS = os.getenv("MENCARE_API_KEYS", "")
+# Por quanto tempo um token do Supabase já validado dispensa nova consulta ao Auth
+VALIDADE_TOKEN_S = 60
+MAX_TOKENS_VALIDADOS = 10_000
+# Mesmo limite do app: cada 5 variantes são uma chamada à OpenAI
+MAX_VARIANTES_POR_PLATAFORMA = 5
+
+
+def _resumo(credencial):
+    return hashlib.sha256(credencial.encode("utf-8")).hexdigest()
+
+
+def interpretar_chaves(texto=MENCARE_API_KEYS):
+    """"usuario_id:chave,..." -> {sha256 da chave: usuario_id}; as chaves em si não ficam na memória."""
+    chaves = {}
+    for par in texto.split(","):
+        usuario_id, _, chave = par.strip().partition(":")
+        if usuario_id and chave:
+            chaves[_resumo(chave)] = usuario_id
+    return chaves
+
+
+class PedidoCopy(BaseModel):
+    plataforma: str
+    objetivo: str
+    publico_alvo: str
+    produto_servico: str
+    tom_de_voz: str
+    cta: str
+    informacoes_adicionais: str = ""
+    salvar: bool = False
+
+
+class PedidoCopyLote(BaseModel):
+    objetivo: str
+    publico_alvo: str
+    produto_servico: str
+    tom_de_voz: str
+    cta: str
+    informacoes_adicionais: str = ""
+    variantes_por_plataforma: Dict[str, Annotated[int, Field(ge=0, le=MAX_VARIANTES_POR_PLATAFORMA)]] = Field(
+        default_factory=lambda: {p: 1 for p in servicos.TOKENS_POR_PLATAFORMA})
+    salvar: bool = False
+
+    @field_validator("variantes_por_plataforma")
+    @classmethod
+    def _plataformas_conhecidas(cls, variantes):
+        desconhecidas = sorted(set(variantes) - set(servicos.TOKENS_POR_PLATAFORMA))
+        if desconhecidas:
+            raise ValueError(f"plataformas desconhecidas: {', '.join(desconhecidas)}")
+        return variantes
+
+
+def _clientes_padrao():
+    """Cria os clientes reais da OpenAI e do Supabase (só quando a API sobe sem injeção)."""
+    from openai import OpenAI
+    from supabase_config import get_supabase_client
+
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY")), get_supabase_client()
+
+
+def _cliente_servico():
+    from supabase_config import get_supabase_servico
+
+    return get_supabase_servico()
+
+
+def criar_app(client=None, supabase=None, executor_jobs=None, chaves_usuarios=None):
+    """
+    Fábrica da aplicação; clientes podem ser injetados (ex: falsos no teste de carga).
+
+    chaves_usuarios: {chave: usuario_id} com as chaves por usuário aceitas além dos tokens do
+    Supabase Auth (padrão: MENCARE_API_KEYS).
+    """
+    app = FastAPI(title="Mencare IA API", version="1.0.0")
+    estado = {"client": client, "supabase": supabase, "executor_jobs": executor_jobs, "telemetria": False}
+    if chaves_usuarios is None:
+        chaves = interpretar_chaves()
+    else:
+        chaves = {_resumo(chave): usuario_id for chave, usuario_id in chaves_usuarios.items()}
+    tokens_validados = {}
+    lock_tokens = threading.Lock()
+
+    def clientes():
+        if estado["client"] is None or estado["supabase"] is None:
+            client_padrao, supabase_padrao = _clientes_padrao()
+            estado["client"] = estado["client"] or client_padrao
+            estado["supabase"] = estado["supabase"] or supabase_padrao
+        if estado["executor_jobs"] is None:
+            estado["executor_jobs"] = obter_executor_jobs()
+        if not estado["telemetria"]:
+            # Telemetria das chamadas à OpenAI gravada no mesmo Supabase; com a chave de serviço os
+            # registros de todos os usuários da API passam pela política de INSERT de chamadas_llm
+            configurar_destino(estado["supabase"], _cliente_servico() if supabase is None else None)
+            estado["telemetria"] = True
+        return estado
+
+    def usuario_do_token(token):
+        """Usuário dono de um access token do Supabase Auth, ou None se o token não vale."""
+        resumo = _resumo(token)
+        agora = time.monotonic()
+        with lock_tokens:
+            validado = tokens_validados.get(resumo)
+        if validado and validado[1] > agora:
+            return validado[0]
+        supabase = clientes()["supabase"]
+        auth = getattr(supabase, "auth", None)
+        if auth is None:
+            return None
+        try:
+            resposta = auth.get_user(token)
+        except Exception:
+            # Token expirado, assinatura inválida ou um Auth sem validação de tokens (banco local)
+            return None
+        usuario = getattr(resposta, "user", None)
+        if not usuario or not getattr(usuario, "id", None):
+            return None
+        with lock_tokens:
+            if len(tokens_validados) >= MAX_TOKENS_VALIDADOS:
+                tokens_validados.clear()
+            tokens_validados[resumo] = (str(usuario.id), agora + VALIDADE_TOKEN_S)
+        return str(usuario.id)
+
+    def autenticar(authorization: str = Header(default="")):
+        esquema, _, credencial = authorization.partition(" ")
+        credencial = credencial.strip()
+        if esquema.lower() != "bearer" or not credencial:
+            raise HTTPException(status_code=401, detail="Header Authorization: Bearer <credencial> é obrigatório")
+        usuario_id = chaves.get(_resumo(credencial))
+        if usuario_id is None:
+            usuario_id = usuario_do_token(credencial)
+        if usuario_id is None:
+            raise HTTPException(status_code=401, detail="Credencial inválida")
+        return usuario_id
+
+    @app.get("/saude")
+    async def saude():
+        return {"status": "ok"}
+
+    @app.post("/copies")
+    async def gerar_copy(pedido: PedidoCopy, usuario_id: str = Depends(autenticar)):
+        ctx = clientes()
+        campos = pedido.model_dump(exclude={"salvar"})
+        try:
+            resultado = await run_in_threadpool(servicos.gerar_copy, ctx["client"], usuario_id=usuario_id, **campos)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Erro ao contatar a OpenAI: {e}")
+        resposta = {"copy": resultado["copy"], "uso": {k: v for k, v in resultado.items() if k != "copy"}}
+        if pedido.salvar:
+            salvas = await run_in_threadpool(
+                servicos.salvar_copies, ctx["supabase"], [dict(campos, copy_gerada=resultado["copy"])], usuario_id
+            )
+            resposta["id"] = salvas[0]["id"] if salvas else None
+        await run_in_threadpool(servicos.registrar_consumo_tokens, ctx["supabase"], usuario_id, "copy", resultado)
+        return resposta
+
+    @app.post("/copies/lote")
+    async def gerar_copy_lote(pedido: PedidoCopyLote, usuario_id: str = Depends(autenticar)):
+        ctx = clientes()
+        brief = pedido.model_dump(exclude={"salvar", "variantes_por_plataforma"})
+
+        def executar():
+            return list(gerar_copies_em_lote(
+                ctx["client"], brief, pedido.variantes_por_plataforma,
+                servicos.TOKENS_POR_PLATAFORMA, servicos.MODELO_OPENAI, usuario_id=usuario_id
+            ))
+
+        resultados = await run_in_threadpool(executar)
+        # Uma plataforma com erro pode ter gerado parte das variantes antes de falhar: as copies
+        # prontas são mantidas e os tokens já gastos, registrados
+        copies = [
+            dict(brief, plataforma=r["plataforma"], copy_gerada=texto)
+            for r in resultados for texto in r["copies"]
+        ]
+        if pedido.salvar and copies:
+            await run_in_threadpool(servicos.salvar_copies, ctx["supabase"], copies, usuario_id)
+        for r in resultados:
+            if r["total_tokens"]:
+                await run_in_threadpool(servicos.registrar_consumo_tokens, ctx["supabase"], usuario_id, "copy", r)
+        return {"resultados": resultados, "total_copies": len(copies)}
+
+    @app.post("/analises", status_code=202)
+    async def submeter_analise(plataforma: str = Form(...), objetivo: str = Form(...),
+                               arquivos: List[UploadFile] = File(...), usuario_id: str = Depends(autenticar)):
+        ctx = clientes()
+        conteudos = [(await arquivo.read(), arquivo.filename) for arquivo in arquivos]
+
+        def preparar():
+            df, _ = deduplicar_leads([ler_leads(conteudo, nome)[0] for conteudo, nome in conteudos])
+            return df, fingerprint_dataframe(df, plataforma, objetivo)
+
+        try:
+            df, fingerprint = await run_in_threadpool(preparar)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Erro ao ler os arquivos: {e}")
+        job_id, novo = ctx["executor_jobs"].submeter(
+            usuario_id, "analise_leads", fingerprint,
+            {"plataforma": plataforma, "objetivo": objetivo, "total_leads": len(df)},
+            servicos.analisar_leads_csv, ctx["client"], ctx["supabase"], df, plataforma, objetivo, usuario_id
+        )
+        return {"job_id": job_id, "novo": novo}
+
+    @app.get("/analises/jobs/{job_id}")
+    async def status_analise(job_id: str, usuario_id: str = Depends(autenticar)):
+        job = await run_in_threadpool(clientes()["executor_jobs"].obter, job_id)
+        if not job or job["usuario_id"] != usuario_id:
+            raise HTTPException(status_code=404, detail="Job não encontrado")
+        return job
+
+    @app.get("/analises")
+    async def historico_analises(limite: int = 20, offset: int = 0, usuario_id: str = Depends(autenticar)):
+        ctx = clientes()
+        return await run_in_threadpool(servicos.listar_analises, ctx["supabase"], usuario_id, min(limite, 100), offset)
+
+    @app.get("/copies")
+    async def historico_copies(limite: int = 20, offset: int = 0, usuario_id: str = Depends(autenticar)):
+        ctx = clientes()
+        return await run_in_threadpool(servicos.listar_copies, ctx["supabase"], usuario_id, min(limite, 100), offset)
+
+    return app
+
+
+app = criar_app()
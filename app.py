@@ -1,27 +1,44 @@
 import streamlit as st
 import os
-import requests
 import json
-from openai import OpenAI
 from dotenv import load_dotenv
-from datetime import datetime
-import pandas as pd
-import io
-import yaml
-from yaml.loader import SafeLoader
-import hashlib
+from datetime import datetime, timedelta, timezone
 import time
-from collections import defaultdict
-import plotly.express as px
-import plotly.graph_objects as go
-from supabase_config import get_supabase_client
+from collections import OrderedDict, defaultdict, deque
+# pandas, plotly, openai, supabase e yaml são importados sob demanda: a tela de login
+# não deve pagar o custo de importação deles
+from supabase_config import get_supabase_client, get_supabase_servico
+from armazenamento import ARMAZENAMENTO
+from realtime import REALTIME_HABILITADO, iniciar_realtime
+from instrumentacao import INSTRUMENTACAO_HABILITADA, finalizar_rerun, iniciar_rerun
+from perfilador import (PERFIL_HABILITADO, carregar_perfil, finalizar_perfil, iniciar_perfil, listar_perfis_guardados,
+                        nos_flame_pilhas, nos_flame_trechos, perfilado, pilhas_dobradas, trecho)
+from cache import (CONSULTA_BUSCA, CONSULTA_CONSUMO_TOKENS, CONSULTA_FEEDBACK, CONSULTA_HISTORICO_ANALISES, CONSULTA_METRICAS,
+                   CONSULTA_METRICAS_PLATAFORMA, CONSULTA_TELEMETRIA_LLM, cache_consultas)
+from geracao_lote import gerar_copies_em_lote
+from servicos import (CAMPOS_COPY, COLUNAS_ANALISES_LEADS, MODELO_OPENAI, TOKENS_POR_PLATAFORMA, analisar_leads_csv,
+                      buscar_texto, formatar_analise_historico, formatar_feedback, gerar_copy, pagina_copies,
+                      reanalisar_snapshot, salvar_copies)
+from snapshots import fingerprint_reanalise, snapshot_disponivel
+from deduplicacao_leads import deduplicar_leads, descrever_deduplicacao
+from segmentacao import exportar_segmentos_csv, segmentar_leads, tabela_segmentos
+from similaridade import indice_similaridade
+from duplicatas import buscar_copy, detector_duplicatas
+from jobs import STATUS_ATIVOS, STATUS_CONCLUIDO, STATUS_ERRO, fingerprint_dataframe, obter_executor_jobs
+from leitores import descrever_leitura, extensoes_suportadas, ler_leads, opcoes_csv
+from telemetria_llm import (PRECOS_POR_MILHAO_TOKENS, agregar_percentis, coletor_telemetria, configurar_destino,
+                            custo_por_mil_leads)
 
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
 
 # --- Configurações de Autenticação ---
+@perfilado
 def carregar_config_usuarios():
     """Carrega a configuração de usuários do arquivo config.yaml"""
+    import yaml
+    from yaml.loader import SafeLoader
+
     try:
         with open('config.yaml') as file:
             return yaml.load(file, Loader=SafeLoader)
@@ -32,9 +49,10 @@ def carregar_config_usuarios():
 def verificar_credenciais(email, password):
     """Verifica se as credenciais do usuário são válidas usando Supabase Auth"""
     try:
-        # O cliente Supabase já deve estar inicializado globalmente
-        response = supabase.auth.sign_in_with_password({"email": email, "password": password})
+        # O cliente Supabase é criado no primeiro uso (aqui, no envio do formulário)
+        response = get_supabase_client().auth.sign_in_with_password({"email": email, "password": password})
         if response.user:
+            st.session_state.usuario_id = response.user.id
             return True
     except Exception as e:
         # Tratar erros específicos do Supabase se necessário, ex: usuário não encontrado, senha inválida
@@ -80,15 +98,21 @@ def login():
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-# Configuração de tokens por plataforma
-TOKENS_POR_PLATAFORMA = {
-    "Disparo de WhatsApp": 150,
-    "Email Marketing": 600,
-    "Conteúdo para Redes Sociais (Feed)": 300,
-    "Conteúdo para Redes Sociais (Stories)": 200,
-    "Copy para SMS": 100       
-}
+# Com o armazenamento local (MENCARE_ARMAZENAMENTO=sqlite) não há URL/chave a configurar
+BANCO_CONFIGURADO = ARMAZENAMENTO != "supabase" or bool(SUPABASE_URL and SUPABASE_KEY)
+
+# Painéis de depuração na barra lateral (MENCARE_DEBUG=1)
+MODO_DEBUG = os.getenv("MENCARE_DEBUG", "").lower() in ("1", "true", "sim")
+
+# Histórico de copies: as geradas e ainda não salvas ficam na sessão (no máximo HISTORICO_SESSAO_MAX);
+# as salvas vêm da tabela copies, uma página por vez, com as últimas páginas guardadas na sessão
+HISTORICO_SESSAO_MAX = int(os.getenv("HISTORICO_SESSAO_MAX", "20"))
+HISTORICO_POR_PAGINA = int(os.getenv("HISTORICO_POR_PAGINA", "10"))
+HISTORICO_PAGINAS_EM_CACHE = 5
+BUSCA_POR_PAGINA = 10
+TIPOS_BUSCA = {"Tudo": None, "Copies": "copy", "Análises": "analise"}
+INSIGHTS_RELACIONADOS = 5
+BONUS_TAG_EM_COMUM = 0.05  # somado à similaridade de texto por tag compartilhada
 
 # Adicionar após as configurações iniciais
 METRICAS_POR_PLATAFORMA = {
@@ -164,24 +188,23 @@ TAGS_PREDEFINIDAS = {
 if not OPENAI_API_KEY:
     st.error("Chave da API da OpenAI não configurada. Verifique o arquivo .env.")
     st.stop()
-if not (SUPABASE_URL and SUPABASE_KEY):
+if not BANCO_CONFIGURADO:
     st.warning("Configurações do Supabase incompletas. A funcionalidade de salvar no banco de dados pode não funcionar.")
 
-# Inicializar cliente OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY)
+@st.cache_resource
+def obter_cliente_openai():
+    """Cliente OpenAI criado no primeiro uso e compartilhado entre sessões e reruns."""
+    from openai import OpenAI
 
-# Inicializar cliente Supabase
-supabase = get_supabase_client()
+    return OpenAI(api_key=OPENAI_API_KEY)
 
 # Inicializar autenticação
 inicializar_autenticacao()
 
 # --- Funções Auxiliares ---
 
+@perfilado
 def gerar_copy_openai(plataforma, objetivo, publico_alvo, produto_servico, tom_de_voz, cta, informacoes_adicionais=""):
-    # Obter o limite de tokens para a plataforma selecionada
-    max_tokens = TOKENS_POR_PLATAFORMA.get(plataforma, 300)
-    
     # Criar barra de progresso
     progress_bar = st.progress(0)
     status_text = st.empty()
@@ -192,99 +215,35 @@ def gerar_copy_openai(plataforma, objetivo, publico_alvo, produto_servico, tom_d
         progress_bar.progress(10)
         time.sleep(0.5)  # Pequena pausa para feedback visual
         
-        prompt = f"""
-        Você é um copywriter especialista em marketing digital com mais de 20 anos de experiência.
-        Sua tarefa é gerar uma copy persuasiva e eficaz para a plataforma especificada.
-        IMPORTANTE: Mantenha a copy dentro do limite de {max_tokens} tokens.
-
-        Plataforma: {plataforma}
-        Objetivo da Copy: {objetivo}
-        Público-Alvo: {publico_alvo}
-        Produto/Serviço a ser promovido: {produto_servico}
-        Tom de Voz desejado: {tom_de_voz}
-        Call to Action (CTA): {cta}
-        {f"Informações Adicionais: {informacoes_adicionais}" if informacoes_adicionais else ""}
-
-        Instruções específicas para a plataforma '{plataforma}':
-        """
-
         # Atualizar status - Configurando modelo
         status_text.text("⚙️ Configurando modelo de IA...")
         progress_bar.progress(30)
         time.sleep(0.5)
 
-        if plataforma == "Disparo de WhatsApp":
-            prompt += """
-            - Seja breve, direto e pessoal.
-            - Use emojis com moderação para aumentar o engajamento.
-            - Ideal para mensagens curtas e impacto rápido.
-            - Inicie de forma amigável.
-            - Deixe o CTA claro e fácil de seguir.
-            - Considere o uso de gatilhos mentais como urgência ou escassez, se aplicável.
-            """
-        elif plataforma == "Email Marketing":
-            prompt += """
-            - Assunto do email: Crie um assunto curto, chamativo e que gere curiosidade.
-            - Corpo do email:
-                - Comece com uma saudação personalizada, se possível.
-                - Desenvolva o problema ou necessidade do público-alvo.
-                - Apresente o produto/serviço como a solução.
-                - Destaque os principais benefícios.
-                - Use parágrafos curtos e boa formatação (negrito, listas).
-                - O CTA deve ser claro e visível (pode ser um link ou botão).
-            - Pode ser mais longo que outras plataformas, mas mantenha o foco.
-            """
-        elif plataforma == "Conteúdo para Redes Sociais (Feed)":
-            prompt += """
-            - Adapte a linguagem para a rede social específica (ex: Instagram mais visual, LinkedIn mais profissional).
-            - Use hashtags relevantes (sugira 3-5 hashtags).
-            - Incentive o engajamento (perguntas, enquetes, pedir comentários).
-            - Imagens/vídeos são importantes, mas a copy precisa ser atrativa por si só.
-            - Pode contar uma pequena história ou dar uma dica rápida.
-            """
-        elif plataforma == "Conteúdo para Redes Sociais (Stories)":
-            prompt += """
-            - Formato curto e dinâmico.
-            - Use texto conciso e chamativo.
-            - Ideal para enquetes, perguntas rápidas, "arrasta para cima".
-            - Pode ser mais informal.
-            - O CTA deve ser imediato.
-            """
-        elif plataforma == "Copy para SMS":
-            prompt += """
-            - Extremamente curto e objetivo (limite de caracteres, geralmente 160).
-            - CTA direto e, se possível, com link encurtado.
-            - Use abreviações com cautela para não prejudicar a clareza.
-            - Ideal para lembretes, promoções rápidas ou alertas.
-            """
-
-        prompt += "\nGere a copy abaixo:\n"
-
         # Atualizar status - Gerando copy
         status_text.text("🤖 Gerando copy com IA...")
         progress_bar.progress(50)
         time.sleep(0.5)
 
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "Você é um copywriter especialista em marketing digital."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=max_tokens
+        resultado = gerar_copy(
+            obter_cliente_openai(), plataforma, objetivo, publico_alvo, produto_servico, tom_de_voz, cta, informacoes_adicionais,
+            usuario_id=st.session_state.get('usuario_id')
         )
 
         # Rastrear consumo de tokens
-        tokens_consumidos = response.usage.total_tokens
-        salvar_consumo_tokens(tokens_consumidos, "copy", st.session_state.username) # Passar username
+        salvar_consumo_tokens(
+            resultado["total_tokens"], "copy", st.session_state.username, # Passar username
+            prompt_tokens=resultado["prompt_tokens"],
+            cached_tokens=resultado["cached_tokens"],
+            latencia_api=resultado["latencia_api"]
+        )
         
         # Atualizar status - Finalizando
         status_text.text("✨ Finalizando e formatando copy...")
         progress_bar.progress(90)
         time.sleep(0.5)
 
-        copy_gerada = response.choices[0].message.content.strip()
+        copy_gerada = resultado["copy"]
         
         # Concluído
         status_text.text("✅ Copy gerada com sucesso!")
@@ -306,8 +265,58 @@ def gerar_copy_openai(plataforma, objetivo, publico_alvo, produto_servico, tom_d
         st.error(f"Erro ao contatar a OpenAI: {e}")
         return None
 
-def salvar_no_supabase(data_to_save):
-    """Salva uma copy no Supabase"""
+def copies_duplicadas(usuario_id, brief, copy_gerada=None):
+    """
+    Copies já salvas com o briefing (ou o texto, se informado) quase igual, mais parecidas primeiro.
+
+    Retorna [(linha da copy, similaridade)]; lista vazia sem usuário, com o índice ainda
+    carregando em segundo plano ou se ele falhar.
+    """
+    if not usuario_id:
+        return []
+    try:
+        detector = detector_duplicatas(supabase, usuario_id)
+        if not detector.pronto:
+            return []
+        parecidas = dict(detector.briefs_parecidos(brief))
+        if copy_gerada:
+            for copy_id, similaridade in detector.textos_parecidos(copy_gerada):
+                parecidas[copy_id] = max(similaridade, parecidas.get(copy_id, 0))
+        mais_parecida = sorted(parecidas.items(), key=lambda item: item[1], reverse=True)[:1]
+        return [(buscar_copy(supabase, copy_id), similaridade) for copy_id, similaridade in mais_parecida]
+    except Exception as e:
+        print(f"Erro ao procurar copies duplicadas: {e}")
+        return []
+
+def gerar_copy_da_sessao(brief):
+    """Gera a copy do briefing e guarda o resultado (e o histórico) na sessão."""
+    st.session_state.duplicata_pendente = False
+    with st.spinner("Gerando sua copy com IA... Aguarde! 🧠"):
+        copy_gerada = gerar_copy_openai(
+            brief["plataforma"], brief["objetivo"], brief["publico_alvo"], brief["produto_servico"],
+            brief["tom_de_voz"], brief["cta"], brief.get("informacoes_adicionais", "")
+        )
+    if copy_gerada:
+        st.session_state.generated_copy = copy_gerada
+        st.session_state.form_data = {
+            **{campo: brief[campo] for campo in CAMPOS_COPY},
+            "copy_gerada": copy_gerada,
+            "data_geracao": datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        }
+        # Adicionar ao histórico
+        st.session_state.historico.append(st.session_state.form_data)
+    else:
+        st.session_state.generated_copy = ""
+        st.session_state.form_data = {}
+
+@perfilado
+def salvar_no_supabase(data_to_save, ignorar_duplicatas=False):
+    """
+    Salva uma copy no Supabase.
+
+    Se já houver uma copy salva quase igual, não salva: avisa e marca
+    st.session_state.duplicata_pendente para o botão "Salvar mesmo assim".
+    """
     try:
         # Adicionar usuário_id se disponível
         if 'username' in st.session_state and st.session_state.username:
@@ -323,8 +332,18 @@ def salvar_no_supabase(data_to_save):
                      st.warning("Não foi possível obter o ID do usuário autenticado para salvar a copy.")
 
 
+        if not ignorar_duplicatas:
+            duplicadas = copies_duplicadas(data_to_save.get('usuario_id'), data_to_save, data_to_save.get("copy_gerada"))
+            if duplicadas and duplicadas[0][0]:
+                existente, similaridade = duplicadas[0]
+                st.warning(f"Possível duplicata: uma copy {similaridade:.0%} parecida já foi salva em "
+                           f"{formatar_data_copy(existente['data_geracao'])}.")
+                st.session_state.duplicata_pendente = True
+                return False
+
         # Formatar dados para o Supabase
         payload = {
+            "usuario_id": data_to_save.get("usuario_id"),
             "plataforma": data_to_save.get("plataforma"),
             "objetivo": data_to_save.get("objetivo"),
             "publico_alvo": data_to_save.get("publico_alvo"),
@@ -340,8 +359,11 @@ def salvar_no_supabase(data_to_save):
 
         # Salvar no Supabase
         response = supabase.table('copies').insert(payload).execute()
+        cache_consultas.invalidar(data_to_save.get('usuario_id'), CONSULTA_METRICAS)
+        cache_consultas.invalidar(data_to_save.get('usuario_id'), CONSULTA_BUSCA)
         
         if response.data:
+            st.session_state.duplicata_pendente = False
             st.success("Copy salva com sucesso no Supabase!")
             return True
         else:
@@ -351,62 +373,149 @@ def salvar_no_supabase(data_to_save):
         st.error(f"Erro ao salvar no Supabase: {e}")
         return False
 
-def salvar_analise_leads(analise_data):
-    """Salva a análise de leads no Supabase e retorna o ID da análise salva."""
+@perfilado
+def salvar_copies_em_lote(copies_para_salvar):
+    """Salva várias copies no Supabase com um único insert."""
     try:
+        if not copies_para_salvar:
+            return 0
         auth_user = supabase.auth.get_user()
-        current_user_id = None
-        if auth_user and auth_user.user:
-            current_user_id = auth_user.user.id
-        else:
-            st.error("Usuário não autenticado. Não é possível salvar a análise de leads.")
-            return None # Retornar None em caso de falha na autenticação
+        usuario_id = auth_user.user.id if auth_user and auth_user.user else None
+        if not usuario_id:
+            st.warning("Não foi possível obter o ID do usuário autenticado para salvar as copies.")
 
-        payload = {
-            "plataforma": analise_data.get("plataforma"),
-            "objetivo": analise_data.get("objetivo"),
-            "total_leads": analise_data.get("total_leads"), 
-            "colunas": json.dumps(analise_data.get("colunas", [])),
-            "analise": analise_data.get("analise"),
-            "tempo_processamento": analise_data.get("tempo_processamento"),
-            "resumo_estatistico": json.dumps(analise_data.get("resumo_estatistico", {})),
-            "usuario_id": current_user_id,
-            "data": datetime.now().isoformat()
-        }
+        salvas = salvar_copies(supabase, copies_para_salvar, usuario_id)
 
-        print(f"DEBUG: Tentando salvar em analises_leads com usuario_id: {current_user_id}")
-        response = supabase.table('analises_leads').insert(payload).execute()
-        
-        if response.data and len(response.data) > 0:
-            saved_analise_id = response.data[0]['id'] # UUID da análise salva
-            if 'tags' in analise_data and analise_data['tags']:
-                tags_para_salvar = []
-                for tag_nome in analise_data['tags']:
-                    categoria_tag = "Personalizada"
-                    for cat, tags_list in TAGS_PREDEFINIDAS.items():
-                        if tag_nome in tags_list:
-                            categoria_tag = cat
-                            break
-                    tags_para_salvar.append({
-                        "analise_id": saved_analise_id, # Usar o UUID aqui
-                        "categoria": categoria_tag,
-                        "tag": tag_nome,
-                        "usuario_id": current_user_id 
-                    })
-                if tags_para_salvar:
-                    tags_response = supabase.table('tags').insert(tags_para_salvar).execute()
-                    if not (tags_response.data and len(tags_response.data) > 0):
-                        st.warning("Análise salva, mas houve um erro ao salvar algumas ou todas as tags.")
-            
-            st.success("Análise e tags salvas com sucesso no Supabase!")
-            return saved_analise_id # Retornar o UUID da análise salva
+        if salvas:
+            st.success(f"{len(salvas)} copies salvas com sucesso no Supabase!")
+            return len(salvas)
         else:
-            error_msg = response.error.message if response.error else "Erro desconhecido"
-            st.error(f"Erro ao salvar análise no Supabase: {error_msg}")
-            return None # Retornar None em caso de falha
+            st.error("Erro ao salvar as copies no Supabase.")
+            return 0
     except Exception as e:
-        st.error(f"Erro excepcional ao salvar análise: {e}")
-        return None # Retornar None em caso de exceção
+        st.error(f"Erro ao salvar copies em lote no Supabase: {e}")
+        return 0
+
+def remover_do_historico_sessao(itens_salvos):
+    """Tira do histórico da sessão as copies já salvas (elas passam a vir da tabela copies)."""
+    salvos = {id(item) for item in itens_salvos}
+    st.session_state.historico = deque(
+        (item for item in st.session_state.historico if id(item) not in salvos), maxlen=HISTORICO_SESSAO_MAX
+    )
+
+@perfilado
+def carregar_pagina_copies(usuario_id, cursor):
+    """
+    Página de copies salvas a partir do cursor, com as últimas páginas guardadas na sessão.
+
+    As páginas guardadas valem enquanto a versão do usuário no cache de consultas não mudar
+    (qualquer gravação dele a incrementa). Retorna (linhas, proximo_cursor).
+    """
+    versao = cache_consultas.versao(usuario_id)
+    paginas = st.session_state.get('paginas_copies')
+    if paginas is None or paginas['versao'] != versao:
+        paginas = {'versao': versao, 'paginas': OrderedDict()}
+        st.session_state.paginas_copies = paginas
+    if cursor in paginas['paginas']:
+        paginas['paginas'].move_to_end(cursor)
+        return paginas['paginas'][cursor]
+    pagina = pagina_copies(supabase, usuario_id, HISTORICO_POR_PAGINA, cursor)
+    paginas['paginas'][cursor] = pagina
+    while len(paginas['paginas']) > HISTORICO_PAGINAS_EM_CACHE:
+        paginas['paginas'].popitem(last=False)
+    return pagina
+
+def formatar_data_copy(data_iso):
+    """data_geracao (ISO, UTC) no formato exibido no app."""
+    try:
+        return datetime.fromisoformat(data_iso).astimezone().strftime("%d/%m/%Y %H:%M:%S")
+    except (TypeError, ValueError):
+        return data_iso or ""
+
+def mostrar_copy_historico(item, titulo, chave):
+    """Expander com o briefing e o texto de uma copy do histórico."""
+    with st.expander(f"{titulo} - {item['plataforma']} - {item['data_geracao']}"):
+        st.write(f"**Plataforma:** {item['plataforma']}")
+        st.write(f"**Objetivo:** {item['objetivo']}")
+        st.write(f"**Público-Alvo:** {item['publico_alvo']}")
+        st.write(f"**Produto/Serviço:** {item['produto_servico']}")
+        st.write(f"**Tom de Voz:** {item['tom_de_voz']}")
+        st.write(f"**CTA:** {item['cta']}")
+        st.write("**Copy Gerada:**")
+        st.text_area("", item['copy_gerada'], height=200, key=f"copy_{chave}")
+
+        # Botão para copiar a copy
+        if st.button("📋 Copiar Copy", key=f"copy_btn_{chave}"):
+            st.code(item['copy_gerada'])
+            st.success("Copy copiada para a área de transferência!")
+
+@perfilado
+def mostrar_historico_copies(usuario_id):
+    """Copies salvas do usuário, uma página por vez (mais recentes primeiro)."""
+    cursores = st.session_state.cursores_historico
+    try:
+        linhas, proximo_cursor = carregar_pagina_copies(usuario_id, cursores[-1])
+    except Exception as e:
+        st.error(f"Erro ao carregar o histórico de copies: {e}")
+        return
+
+    if not linhas and len(cursores) == 1:
+        st.info("Nenhuma copy salva ainda. Salve uma copy gerada para vê-la aqui.")
+        return
+
+    st.markdown(f"**Copies salvas** — página {len(cursores)}")
+    inicio = (len(cursores) - 1) * HISTORICO_POR_PAGINA
+    for idx, item in enumerate(linhas):
+        item = dict(item, data_geracao=formatar_data_copy(item.get('data_geracao')))
+        mostrar_copy_historico(item, f"Copy #{inicio + idx + 1}", item['id'])
+
+    col_anterior, col_proxima = st.columns(2)
+    with col_anterior:
+        if st.button("⬅️ Mais recentes", disabled=len(cursores) == 1, use_container_width=True,
+                     key="historico_anterior"):
+            cursores.pop()
+            st.rerun()
+    with col_proxima:
+        if st.button("Mais antigas ➡️", disabled=proximo_cursor is None, use_container_width=True,
+                     key="historico_proxima"):
+            cursores.append(proximo_cursor)
+            st.rerun()
+
+@perfilado
+def mostrar_resultados_busca(usuario_id, termo, tipo):
+    """Resultados da busca textual, mais relevantes primeiro, paginados."""
+    # Nova busca volta para a primeira página
+    if st.session_state.get('busca_atual') != (termo, tipo):
+        st.session_state.busca_atual = (termo, tipo)
+        st.session_state.pagina_busca = 0
+    pagina = st.session_state.get('pagina_busca', 0)
+    try:
+        resultados, tem_mais = buscar_texto(supabase, usuario_id, termo, tipo, BUSCA_POR_PAGINA,
+                                            pagina * BUSCA_POR_PAGINA)
+    except Exception as e:
+        st.error(f"Erro na busca: {e}")
+        return
+
+    if not resultados and pagina == 0:
+        st.info(f"Nada encontrado para \"{termo}\".")
+        return
+
+    st.caption(f"Página {pagina + 1} dos resultados para \"{termo}\", mais relevantes primeiro.")
+    for resultado in resultados:
+        icone = "📝 Copy" if resultado['tipo'] == "copy" else "📊 Análise"
+        st.markdown(f"**{icone} · {resultado.get('titulo') or '-'}** — {resultado.get('plataforma') or '-'} · "
+                    f"{formatar_data_copy(resultado.get('data'))}")
+        st.markdown(f"> {resultado.get('trecho') or ''}")
+
+    col_anterior, col_proxima = st.columns(2)
+    with col_anterior:
+        if st.button("⬅️ Anteriores", disabled=pagina == 0, use_container_width=True, key="busca_anterior"):
+            st.session_state.pagina_busca = pagina - 1
+            st.rerun()
+    with col_proxima:
+        if st.button("Próximos ➡️", disabled=not tem_mais, use_container_width=True, key="busca_proxima"):
+            st.session_state.pagina_busca = pagina + 1
+            st.rerun()
 
 def atualizar_tags_analise(analise_id, novas_tags):
     """Atualiza as tags de uma análise específica no Supabase."""
@@ -419,6 +528,8 @@ def atualizar_tags_analise(analise_id, novas_tags):
 
         # 1. Deletar tags antigas para esta analise_id e usuario_id (para segurança)
         delete_response = supabase.table('tags').delete().match({'analise_id': analise_id, 'usuario_id': user_id}).execute()
+        # As tags fazem parte do histórico cacheado: invalidar já após a remoção
+        cache_consultas.invalidar(user_id, CONSULTA_HISTORICO_ANALISES)
 
         # 2. Inserir novas tags
         if novas_tags:
@@ -451,73 +562,52 @@ def atualizar_tags_analise(analise_id, novas_tags):
         st.error(f"Erro ao atualizar tags no Supabase: {e}")
         return False
 
-def gerar_insights_com_tags(analise_atual, tags_da_analise_atual):
-    """Gera insights baseados nas tags da análise, buscando no Supabase."""
+def gerar_insights_relacionados(analise_atual, analises_por_id):
+    """
+    Insights das análises anteriores mais parecidas com a atual.
+
+    O ranking vem do índice local de similaridade (texto, objetivo e plataforma); tags em
+    comum somam um bônus. Os detalhes saem do histórico já carregado, sem consultas extras.
+    """
     try:
         auth_user = supabase.auth.get_user()
         if not (auth_user and auth_user.user):
-            st.info("Usuário não autenticado. Insights baseados em tags não podem ser gerados.")
+            st.info("Usuário não autenticado. Insights relacionados não podem ser gerados.")
             return "Nenhum insight similar encontrado (usuário não autenticado)."
-        user_id = auth_user.user.id
-        analise_id_atual = analise_atual['id']
-
-        if not tags_da_analise_atual:
-            return "Nenhuma tag fornecida para buscar insights similares."
 
-        # 1. Encontrar todas as analise_ids (diferentes da atual) que compartilham pelo menos uma tag com a análise atual
-        analises_similares_ids = set()
-        for tag_nome in tags_da_analise_atual:
-            response_tags_similares = supabase.table('tags')\
-                .select('analise_id')\
-                .eq('usuario_id', user_id)\
-                .eq('tag', tag_nome)\
-                .neq('analise_id', analise_id_atual)\
-                .execute()
-            if response_tags_similares.data:
-                for item in response_tags_similares.data:
-                    analises_similares_ids.add(item['analise_id'])
-        
-        if not analises_similares_ids:
-            return "Nenhum insight similar encontrado com as tags fornecidas."
-
-        # 2. Buscar os detalhes dessas análises similares
-        response_analises_similares = supabase.table('analises_leads')\
-            .select('id, data, plataforma, objetivo, analise')\
-            .in_('id', list(analises_similares_ids))\
-            .order('data', desc=True)\
-            .limit(5) .execute() # Limitar o número de análises similares para não sobrecarregar
-
-        insights_gerados = []
-        if response_analises_similares.data:
-            insights_gerados.append("\n### Insights de Análises Anteriores com Tags Similares:")
-            for analise_similar_db in response_analises_similares.data:
-                data_iso = analise_similar_db.get('data')
-                data_formatada = str(data_iso)
-                if data_iso:
-                    try:
-                        dt_obj = datetime.fromisoformat(data_iso.replace('Z', '+00:00').replace('+0000', '+00:00'))
-                        data_formatada = dt_obj.strftime("%d/%m/%Y %H:%M:%S")
-                    except ValueError:
-                        try:
-                            dt_obj = datetime.strptime(data_iso, "%d/%m/%Y %H:%M:%S")
-                            data_formatada = dt_obj.strftime("%d/%m/%Y %H:%M:%S")
-                        except ValueError:
-                            pass
-                
-                insights_gerados.append(f"""
-**Data:** {data_formatada}
-**Plataforma:** {analise_similar_db.get('plataforma', 'N/A')}
-**Objetivo:** {analise_similar_db.get('objetivo', 'N/A')}
-**Análise Resumida:** {analise_similar_db.get('analise', 'N/A')[:200] + '...' if analise_similar_db.get('analise') else 'N/A'}
+        indice = indice_similaridade(auth_user.user.id)
+        tags_atuais = set(analise_atual.get('tags') or [])
+        candidatas = []
+        for analise_id, similaridade, _ in indice.similares(analise_atual['id'], k=INSIGHTS_RELACIONADOS * 3):
+            analise_similar = analises_por_id.get(analise_id)
+            if analise_similar is None:  # removida do banco depois de indexada
+                continue
+            tags_em_comum = tags_atuais & set(analise_similar.get('tags') or [])
+            pontuacao = similaridade + BONUS_TAG_EM_COMUM * len(tags_em_comum)
+            candidatas.append((pontuacao, similaridade, sorted(tags_em_comum), analise_similar))
+
+        if not candidatas:
+            return "Nenhum insight similar encontrado."
+
+        insights_gerados = ["\n### Insights de Análises Anteriores Similares:"]
+        candidatas.sort(key=lambda item: item[0], reverse=True)
+        for _, similaridade, tags_em_comum, analise_similar in candidatas[:INSIGHTS_RELACIONADOS]:
+            texto = analise_similar.get('analise')
+            linha_tags = f"\n**Tags em comum:** {', '.join(tags_em_comum)}" if tags_em_comum else ""
+            insights_gerados.append(f"""
+**Data:** {analise_similar.get('data', 'N/A')}
+**Plataforma:** {analise_similar.get('plataforma', 'N/A')}
+**Objetivo:** {analise_similar.get('objetivo', 'N/A')}
+**Similaridade:** {similaridade:.0%}{linha_tags}
+**Análise Resumida:** {texto[:200] + '...' if texto else 'N/A'}
 ---""")
-            return "\n".join(insights_gerados)
-        else:
-            return "Nenhum insight similar encontrado com as tags fornecidas."
+        return "\n".join(insights_gerados)
 
     except Exception as e:
-        st.error(f"Erro ao gerar insights com tags do Supabase: {e}")
+        st.error(f"Erro ao gerar insights relacionados: {e}")
         return "Erro ao gerar insights."
 
+@perfilado
 def carregar_historico_analises():
     """Carrega o histórico de análises do usuário atual a partir do Supabase."""
     try:
@@ -527,47 +617,34 @@ def carregar_historico_analises():
             return []
 
         user_id = auth_user.user.id
+
+        def _consultar():
+            # Buscar análises do usuário
+            response_analises = supabase.table('analises_leads').select(COLUNAS_ANALISES_LEADS).eq('usuario_id', user_id).order('data', desc=True).execute()
         
-        # Buscar análises do usuário
-        response_analises = supabase.table('analises_leads').select('*').eq('usuario_id', user_id).order('data', desc=True).execute()
-        
-        if response_analises.data:
-            historico_com_tags = []
-            for analise_db in response_analises.data:
-                # Para cada análise, buscar suas tags
-                response_tags = supabase.table('tags').select('tag').eq('analise_id', analise_db['id']).execute()
+            if response_analises.data:
+                historico_com_tags = []
+                for analise_db in response_analises.data:
+                    # Para cada análise, buscar suas tags
+                    response_tags = supabase.table('tags').select('tag').eq('analise_id', analise_db['id']).execute()
                 
-                tags_da_analise = []
-                if response_tags.data:
-                    tags_da_analise = [item['tag'] for item in response_tags.data]
+                    tags_da_analise = []
+                    if response_tags.data:
+                        tags_da_analise = [item['tag'] for item in response_tags.data]
                 
-                # Montar o dicionário da análise no formato esperado
-                # Convertendo campos JSON de string para dict/list se necessário
-                colunas = json.loads(analise_db.get('colunas', '[]')) if isinstance(analise_db.get('colunas'), str) else analise_db.get('colunas', [])
-                resumo_estatistico = json.loads(analise_db.get('resumo_estatistico', '{}')) if isinstance(analise_db.get('resumo_estatistico'), str) else analise_db.get('resumo_estatistico', {})
-
-                analise_formatada = {
-                    "id": analise_db['id'],
-                    "data": analise_db.get('data_criacao') or analise_db.get('data', datetime.now().strftime("%d/%m/%Y %H:%M:%S")), # Ajustar nome da coluna de data se necessário
-                    "plataforma": analise_db['plataforma'],
-                    "objetivo": analise_db['objetivo'],
-                    "total_leads": analise_db.get('total_leads'),
-                    "colunas": colunas,
-                    "analise": analise_db['analise'],
-                    "tempo_processamento": analise_db.get('tempo_processamento'),
-                    "resumo_estatistico": resumo_estatistico,
-                    "tags": tags_da_analise,
-                    "usuario_id": analise_db.get('usuario_id')
-                }
-                historico_com_tags.append(analise_formatada)
-            return historico_com_tags
-        else:
-            return []
-            
+                    analise_formatada = formatar_analise_historico(analise_db, tags_da_analise)
+                    historico_com_tags.append(analise_formatada)
+                return historico_com_tags
+            else:
+                return []
+
+        return cache_consultas.obter_ou_carregar(user_id, CONSULTA_HISTORICO_ANALISES, _consultar)
+
     except Exception as e:
         st.error(f"Erro ao carregar histórico de análises do Supabase: {e}")
         return []
 
+@perfilado
 def salvar_feedback(analise_id, feedback_data):
     """Salva o feedback no Supabase"""
     try:
@@ -593,6 +670,8 @@ def salvar_feedback(analise_id, feedback_data):
 
         # Salvar no Supabase
         response = supabase.table('feedback').insert(payload).execute()
+        cache_consultas.invalidar(current_user_id, CONSULTA_FEEDBACK, analise_id)
+        cache_consultas.invalidar(current_user_id, CONSULTA_METRICAS)
         
         if response.data:
             return True
@@ -603,6 +682,7 @@ def salvar_feedback(analise_id, feedback_data):
         st.error(f"Erro ao salvar feedback: {e}")
         return False
 
+@perfilado
 def editar_feedback(analise_id, novo_feedback_data):
     """Edita um feedback existente no Supabase."""
     try:
@@ -670,6 +750,8 @@ def editar_feedback(analise_id, novo_feedback_data):
 
         # 4. Atualizar o feedback no Supabase usando o ID do registro de feedback
         response_update = supabase.table('feedback').update(dados_para_atualizar).eq('id', feedback_id_db).execute()
+        cache_consultas.invalidar(user_id, CONSULTA_FEEDBACK, analise_id)
+        cache_consultas.invalidar(user_id, CONSULTA_METRICAS)
 
         if response_update.data:
             return True
@@ -682,6 +764,7 @@ def editar_feedback(analise_id, novo_feedback_data):
         st.error(f"Erro excepcional ao editar feedback: {e}")
         return False
 
+@perfilado
 def salvar_metricas_plataforma(plataforma, metricas_data):
     """Salva métricas específicas da plataforma no Supabase"""
     try:
@@ -701,11 +784,9 @@ def salvar_metricas_plataforma(plataforma, metricas_data):
             "usuario_id": current_user_id 
         }
         
-        # Log para depuração
-        print(f"DEBUG: Tentando salvar em metricas_plataforma com usuario_id: {current_user_id}, tipo: {type(current_user_id)}")
-
         # Salvar no Supabase
         response = supabase.table('metricas_plataforma').insert(payload).execute()
+        cache_consultas.invalidar(current_user_id, CONSULTA_METRICAS_PLATAFORMA)
         
         if response.data:
             return True
@@ -716,175 +797,221 @@ def salvar_metricas_plataforma(plataforma, metricas_data):
         st.error(f"Erro ao salvar métricas da plataforma: {e}")
         return False
 
-def analisar_leads_csv_openai(df, plataforma, objetivo, tempo_inicio_global, resumo_estatistico_global):
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    try:
-        status_text.text("🔄 Preparando dados para análise (OpenAI)... ")
-        progress_bar.progress(10)
-        
-        colunas_relevantes = df.columns[:9]
-        df_otimizado = df[colunas_relevantes].copy()
-        max_linhas = 100
-        if len(df_otimizado) > max_linhas:
-            df_otimizado = df_otimizado.sample(n=max_linhas, random_state=42)
-        df_str = df_otimizado.to_string()
-
-        feedbacks_contexto = []
-        try:
-            auth_user = supabase.auth.get_user()
-            if auth_user and auth_user.user:
-                user_id = auth_user.user.id
-                response_feedbacks = supabase.table('feedback')\
-                    .select('pontos_positivos, pontos_melhorar')\
-                    .eq('usuario_id', user_id)\
-                    .order('created_at', desc=True)\
-                    .limit(10).execute()
-                if response_feedbacks and response_feedbacks.data:
-                    for fb_item in response_feedbacks.data:
-                        if fb_item.get('pontos_positivos') or fb_item.get('pontos_melhorar'):
-                            feedbacks_contexto.append(fb_item)
-                            if len(feedbacks_contexto) >= 3:
-                                break
-        except Exception as e_fb:
-            st.warning(f"Não foi possível carregar feedbacks para contexto OpenAI: {e_fb}")
-
-        contexto_aprendizado = ""
-        if feedbacks_contexto:
-            contexto_aprendizado = """\
-Baseado em feedbacks anteriores dos usuários, considere:"""
-            for feedback_item in feedbacks_contexto:
-                if feedback_item.get('pontos_positivos'):
-                    contexto_aprendizado += f"\
-- Pontos positivos anteriores: {feedback_item['pontos_positivos']}"
-                if feedback_item.get('pontos_melhorar'):
-                    contexto_aprendizado += f"\
-- Pontos a melhorar: {feedback_item['pontos_melhorar']}"
-
-        status_text.text("⚙️ Configurando análise com IA...")
-        progress_bar.progress(50)
-        prompt = f'''
-        Você é um especialista em análise de dados e marketing digital.
-        Analise os seguintes dados de leads e forneça insights relevantes para {plataforma} com o objetivo de {objetivo}.
-        {contexto_aprendizado}
-        Resumo dos dados:
-        - Total de leads: {resumo_estatistico_global['total_leads']}
-        - Amostra analisada: {resumo_estatistico_global['amostra_analisada']}
-        - Colunas analisadas: {', '.join(resumo_estatistico_global['colunas_analisadas'])}
-        Estatísticas básicas:
-        {json.dumps(resumo_estatistico_global['estatisticas'], indent=2)}
-        Dados da amostra:
-        {df_str}
-        Por favor, forneça:
-        1. Análise geral dos dados
-        2. Insights específicos para {plataforma}
-        3. Recomendações de estratégia para atingir o objetivo de {objetivo}
-        4. Sugestões de segmentação dos leads
-        5. Possíveis abordagens personalizadas
-        Mantenha a análise clara e objetiva, focando em insights acionáveis.
-        '''
-        status_text.text("🤖 Gerando análise com IA (OpenAI)... ")
-        progress_bar.progress(70)
-        response_openai = client.chat.completions.create(
-            model="gpt-4.1-mini", 
-            messages=[{"role": "system", "content": "Você é um especialista em análise de dados e marketing digital."}, 
-                      {"role": "user", "content": prompt}],
-            temperature=0.7, max_tokens=800)
-        
-        tokens_consumidos = response_openai.usage.total_tokens
-        username_para_tokens = st.session_state.get('username') # Usar .get() para segurança
-        salvar_consumo_tokens(tokens_consumidos, "analise", username_para_tokens)
-        
-        status_text.text("✨ Finalizando e formatando análise (OpenAI)... ")
-        progress_bar.progress(90)
-        analise_texto_ia = response_openai.choices[0].message.content.strip()
-        tempo_processamento_ia = time.time() - tempo_inicio_global
-        
-        status_text.text("✅ Análise (OpenAI) concluída!")
-        progress_bar.progress(100)
-        time.sleep(0.5)
-        progress_bar.empty()
-        status_text.empty()
-        return analise_texto_ia, tempo_processamento_ia
-
-    except Exception as e_openai:
-        status_text.text(f"❌ Erro na análise com OpenAI: {e_openai}")
-        progress_bar.progress(0)
-        time.sleep(1)
-        progress_bar.empty()
-        status_text.empty()
-        st.error(f"Erro ao analisar os leads com OpenAI: {e_openai}")
-        return None, 0
+def mostrar_painel_supabase(registro):
+    """Painel de desenvolvimento com as chamadas ao Supabase do rerun e os candidatos a N+1."""
+    resumo = registro.resumo()
+    with st.sidebar.expander(f"🛰️ Supabase neste rerun ({resumo['total_chamadas']} chamadas)"):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Chamadas", resumo["total_chamadas"])
+        col2.metric("Tempo", f"{resumo['tempo_supabase_ms']:.0f} ms")
+        col3.metric("Recebido", f"{resumo['bytes_recebidos'] / 1024:.1f} KB")
+        for candidato in resumo["candidatos_n_mais_1"]:
+            st.warning(
+                f"Possível N+1: {candidato['tabela']}.{candidato['operacao']} repetida "
+                f"{candidato['repeticoes']}x ({candidato['tempo_total_ms']:.0f} ms) · "
+                f"filtros: {', '.join(candidato['exemplo_filtros'])}"
+            )
+        if registro.chamadas:
+            st.dataframe(
+                [{"Tabela": c["tabela"], "Operação": c["operacao"], "Filtros": ", ".join(c["filtros"]),
+                  "ms": c["latencia_ms"], "Linhas": c["linhas"], "Bytes": c["bytes_recebidos"],
+                  "Erro": c["erro"] or ""} for c in registro.chamadas],
+                use_container_width=True, hide_index=True
+            )
 
-def analisar_leads_csv(df, plataforma, objetivo):
-    """
-    Prepara dados, chama a análise da OpenAI, salva os resultados e retorna a análise, ID e tempo de processamento.
-    """
-    # Definir tempo_inicio aqui, fora do try, para garantir que sempre exista se a função for chamada.
-    # No entanto, para medir o tempo do bloco 'try', ele deve estar dentro.
-    # Garantir que seja a primeira coisa no try.
-    try:
-        tempo_inicio = time.time() # Primeira linha DENTRO do try para medir a duração correta.
-        
-        colunas_relevantes = df.columns[:9]
-        df_otimizado_para_stats = df[colunas_relevantes].copy()
-        max_linhas_stats = 100 
-        if len(df_otimizado_para_stats) > max_linhas_stats:
-            df_otimizado_para_stats = df_otimizado_para_stats.sample(n=max_linhas_stats, random_state=42)
-
-        resumo_estatistico = {
-            "total_leads": len(df),
-            "colunas_analisadas": list(colunas_relevantes),
-            "amostra_analisada": len(df_otimizado_para_stats),
-            "estatisticas": {}
-        }
-        for coluna in colunas_relevantes:
-            if df_otimizado_para_stats[coluna].dtype in ['int64', 'float64']:
-                resumo_estatistico["estatisticas"][coluna] = {
-                    "media": df_otimizado_para_stats[coluna].mean(),
-                    "mediana": df_otimizado_para_stats[coluna].median(),
-                    "min": df_otimizado_para_stats[coluna].min(),
-                    "max": df_otimizado_para_stats[coluna].max()
-                }
-            else:
-                resumo_estatistico["estatisticas"][coluna] = {
-                    "valores_mais_frequentes": df_otimizado_para_stats[coluna].value_counts().head().to_dict()
-                }
+def mostrar_painel_cache():
+    """Painel de depuração com acertos e falhas do cache de consultas."""
+    estatisticas = cache_consultas.estatisticas()
+    with st.sidebar.expander("🛠️ Cache de consultas"):
+        col1, col2 = st.columns(2)
+        col1.metric("Taxa de acerto", f"{estatisticas['taxa_acerto']:.0%}")
+        col2.metric("Entradas", estatisticas["entradas"])
+        st.caption(
+            f"Memória: {estatisticas['bytes'] / 1024:.0f} KB de {estatisticas['max_bytes'] / 1024 / 1024:.0f} MB · "
+            f"Despejos: {estatisticas['despejos']}"
+        )
+        if estatisticas["por_consulta"]:
+            st.table([
+                {"Consulta": consulta, "Acertos": e["acertos"], "Falhas": e["falhas"],
+                 "Invalidações": e["invalidacoes"], "Taxa de acerto": f"{e['taxa_acerto']:.0%}"}
+                for consulta, e in estatisticas["por_consulta"].items()
+            ])
+        assinatura = iniciar_realtime()
+        if assinatura is not None:
+            st.caption(
+                f"Realtime: {'conectado' if assinatura.conectado else 'desconectado'} · "
+                f"{assinatura.alteracoes_recebidas} alterações recebidas"
+                + (f" · último erro: {assinatura.ultimo_erro}" if assinatura.ultimo_erro else "")
+            )
+        if st.button("Limpar cache", key="limpar_cache_consultas"):
+            cache_consultas.limpar()
+            st.rerun()
 
-        analise_gerada_pela_ia, tempo_processamento_openai = analisar_leads_csv_openai(
-            df, plataforma, objetivo, tempo_inicio, resumo_estatistico # tempo_inicio é passado aqui
+def mostrar_grafico(fig):
+    """st.plotly_chart cronometrado no perfil do rerun (o nome do trecho é o título do gráfico)."""
+    titulo = fig.layout.title.text or "sem título"
+    with trecho(f"gráfico: {titulo}"):
+        st.plotly_chart(fig, use_container_width=True)
+
+def _flame(ids, rotulos, pais, valores, titulo):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Icicle(
+        ids=ids, labels=rotulos, parents=pais, values=valores, branchvalues="total",
+        tiling=dict(orientation="v", flip="y"),  # raiz embaixo, como num flame graph
+        hovertemplate="%{label}<br>%{value:.1f} ms (%{percentRoot:.1%})<extra></extra>"
+    ))
+    fig.update_layout(title=titulo, margin=dict(t=40, l=0, r=0, b=0), height=420)
+    st.plotly_chart(fig, use_container_width=True)
+
+def mostrar_painel_perfil(perfil):
+    """Painel recolhível com o flame graph do rerun e dos reruns mais lentos guardados em disco."""
+    resumo = perfil.resumo()
+    with st.expander(f"🔥 Perfil do rerun ({resumo['duracao_ms']:.0f} ms)", expanded=False):
+        guardados = listar_perfis_guardados()
+        opcoes = ["Este rerun"] + [caminho for caminho, _ in guardados]
+        escolhido = st.selectbox(
+            "Perfil", opcoes, key="perfil_escolhido",
+            format_func=lambda o: o if o == "Este rerun" else
+            f"{float(os.path.basename(o).split('_', 1)[0]):.0f} ms · {os.path.basename(o)[11:26]}"
         )
+        if escolhido != "Este rerun":
+            resumo = carregar_perfil(escolhido)
+        _flame(*nos_flame_trechos(resumo), f"Trechos · {resumo['rotulo']} · {resumo['duracao_ms']:.0f} ms")
+        if resumo["trechos"]:
+            st.dataframe(
+                [{"Trecho": " > ".join(t["caminho"]), "Total (ms)": t["total_ms"], "Próprio (ms)": t["proprio_ms"],
+                  "Chamadas": t["chamadas"]} for t in sorted(resumo["trechos"], key=lambda t: -t["proprio_ms"])],
+                use_container_width=True, hide_index=True
+            )
+        if resumo.get("pilhas"):
+            _flame(*nos_flame_pilhas(resumo), f"Pilhas amostradas ({resumo['amostras']} amostras)")
+            st.download_button(
+                "📥 Baixar pilhas (formato dobrado)", pilhas_dobradas(resumo),
+                file_name="perfil_rerun.folded", mime="text/plain", key="baixar_pilhas_perfil"
+            )
+        st.caption(f"{len(guardados)} rerun(s) mais lento(s) guardado(s) em disco para comparação.")
 
-        if analise_gerada_pela_ia:
-            analise_payload_para_salvar = {
-                "plataforma": plataforma,
-                "objetivo": objetivo,
-                "total_leads": len(df), 
-                "colunas": list(df.columns), 
-                "analise": analise_gerada_pela_ia,
-                "tempo_processamento": tempo_processamento_openai, # Este é o tempo da IA
-                "resumo_estatistico": resumo_estatistico,
-                "tags": [] 
-            }
-            
-            db_analise_id_uuid = salvar_analise_leads(analise_payload_para_salvar)
-            
-            if db_analise_id_uuid:
-                # Retornar o texto da análise, o ID do banco de dados e o tempo de processamento da IA
-                return analise_gerada_pela_ia, db_analise_id_uuid, tempo_processamento_openai
+def encerrar_perfil_rerun():
+    """Fecha o perfil do rerun (MENCARE_PERFIL=1) e mostra o painel; deve ser chamado no fim do script."""
+    if not PERFIL_HABILITADO:
+        return
+    perfil = finalizar_perfil()
+    if perfil is not None:
+        mostrar_painel_perfil(perfil)
+
+def aplicar_resultado_job(job):
+    """Copia o resultado de um job de análise concluído para o session_state."""
+    resultado = job.get('resultado') or {}
+    if st.session_state.get('analise_id_atual_db') != resultado.get('analise_id'):
+        st.session_state.analise_leads_conteudo_ia = resultado.get('analise')
+        st.session_state.analise_id_atual_db = resultado.get('analise_id')
+
+@perfilado
+def mostrar_segmentacao_leads(dfs, chave):
+    """Segmenta todos os leads enviados e oferece o CSV com o segmento de cada lead."""
+    segmentacao = st.session_state.get('segmentacao_leads')
+    if segmentacao is None or segmentacao['chave'] != chave:
+        if not st.button("🧩 Segmentar Leads", key="segmentar_leads"):
+            return
+        # Mesma base da análise: arquivos combinados e sem leads repetidos
+        with trecho("deduplicação dos leads"):
+            df_combinado, _ = deduplicar_leads(dfs)
+        with trecho("segmentação dos leads"):
+            segmentos_por_lead, resumo = segmentar_leads(df_combinado)
+        if resumo is None:
+            st.info("Não há colunas que permitam segmentar estes leads (datas, valores ou categorias).")
+            return
+        segmentacao = {"chave": chave, "resumo": resumo,
+                       "csv": exportar_segmentos_csv(df_combinado, segmentos_por_lead)}
+        st.session_state.segmentacao_leads = segmentacao
+
+    resumo = segmentacao['resumo']
+    st.write(f"**Segmentos ({resumo['metodo']}):** {len(resumo['segmentos'])} segmentos de "
+             f"{resumo['total_leads']} leads, calculados em {resumo['duracao_s']:.2f}s")
+    st.dataframe(tabela_segmentos(resumo))
+    st.download_button(
+        label="📥 Baixar Leads com Segmento (CSV)",
+        data=segmentacao['csv'],
+        file_name=f"leads_segmentados_{datetime.now().strftime('%Y%m%d')}.csv",
+        mime="text/csv",
+        key="baixar_segmentos_leads"
+    )
+
+def mostrar_reanalise(analise, snapshot, idx):
+    """Reanalisa os leads guardados no snapshot com outra plataforma ou objetivo, sem novo upload."""
+    usuario_id = analise.get('usuario_id')
+    st.write(f"**🔁 Reanalisar estes leads** ({snapshot['linhas']} leads guardados, {snapshot['tamanho_mb']:.1f} MB)")
+    if not snapshot_disponivel(snapshot, usuario_id):
+        st.caption("Os leads desta análise não estão mais guardados; envie os arquivos novamente.")
+        return
+    with st.form(f"reanalise_form_{idx}"):
+        plataformas = list(TOKENS_POR_PLATAFORMA)
+        plataforma = st.selectbox(
+            "Plataforma:", plataformas,
+            index=plataformas.index(analise['plataforma']) if analise['plataforma'] in plataformas else 0,
+            key=f"reanalise_plataforma_{idx}"
+        )
+        objetivo = st.text_input("Objetivo:", value=analise['objetivo'], key=f"reanalise_objetivo_{idx}")
+        if st.form_submit_button("🔁 Reanalisar"):
+            # O job lê o snapshot (memory-map) no worker: nada de leitura de CSV nem deduplicação aqui
+            job_id, job_novo = obter_executor_jobs().submeter(
+                usuario_id, "analise_leads", fingerprint_reanalise(snapshot['fingerprint'], plataforma, objetivo),
+                {"plataforma": plataforma, "objetivo": objetivo, "total_leads": snapshot['linhas'],
+                 "reanalise_de": analise['id']},
+                reanalisar_snapshot, obter_cliente_openai(), supabase, snapshot,
+                plataforma, objetivo, usuario_id
+            )
+            st.session_state.job_analise_id = job_id
+            if job_novo:
+                st.session_state.analise_leads_conteudo_ia = None
+                st.session_state.analise_id_atual_db = None
+                st.success("Reanálise enviada! O resultado aparece na aba 📊 Análise de Leads.")
             else:
-                st.error("Falha ao salvar a análise no banco de dados (depois da IA).")
-                return None, None, None # Falha ao salvar no DB
-        else:
-            # Se analise_gerada_pela_ia for None (erro na OpenAI)
-            return None, None, None # Erro na OpenAI
+                st.info("Estes leads já foram enviados para análise com a mesma plataforma e objetivo.")
 
-    except Exception as e:
-        # Se o NameError for aqui, significa que 'tempo_inicio' não foi definido antes de ser usado
-        # na chamada de analisar_leads_csv_openai.
-        st.error(f"Erro geral ao processar CSV e analisar leads: {e}")
-        return None, None, None
+@st.fragment(run_every=5)
+def observar_alteracoes_realtime(usuario_id):
+    """Recarrega a página quando o Realtime altera dados do usuário no cache (sem novo SELECT)."""
+    if cache_consultas.versao(usuario_id) != st.session_state.get('versao_cache_vista'):
+        st.rerun()
+
+@st.fragment(run_every=2)
+def acompanhar_job_analise():
+    """Consulta o status do job de análise atual sem rerodar o script inteiro."""
+    job = obter_executor_jobs().obter(st.session_state.get('job_analise_id'))
+    if job is None:
+        return
+    if job['status'] in STATUS_ATIVOS:
+        inicio = job.get('iniciado_em') or job['criado_em']
+        decorrido = (datetime.now() - datetime.fromisoformat(inicio)).total_seconds()
+        rotulo = "Na fila" if job['status'] == "pendente" else "Analisando seus leads"
+        st.info(f"⏳ {rotulo}... ({decorrido:.0f}s). Você pode continuar usando o app.")
+    else:
+        # Terminou: rerodar o app inteiro para exibir o resultado (ou o erro)
+        st.rerun()
 
+def mostrar_jobs_recentes():
+    """Lista as análises enviadas recentemente, para recuperar resultados após recarregar a página."""
+    auth_user = supabase.auth.get_user()
+    if not (auth_user and auth_user.user):
+        return
+    jobs_recentes = obter_executor_jobs().listar(auth_user.user.id, limite=5, tipo="analise_leads")
+    if not jobs_recentes:
+        return
+    with st.expander("🕒 Análises enviadas recentemente"):
+        for job in jobs_recentes:
+            parametros = job['parametros']
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.write(f"**{parametros.get('plataforma')}** - {parametros.get('objetivo')} "
+                         f"({parametros.get('total_leads')} leads) - {job['status']} - {job['criado_em'][:19]}")
+            with col2:
+                if st.button("Ver", key=f"ver_job_{job['id']}"):
+                    st.session_state.job_analise_id = job['id']
+                    st.rerun()
+
+@perfilado
 def mostrar_historico_analises():
     """Mostra o histórico de análises com opções de feedback e métricas"""
     st.subheader("📚 Histórico de Análises")
@@ -906,6 +1033,15 @@ def mostrar_historico_analises():
     if not historico_analises:
         st.info("Nenhuma análise realizada ainda.")
     else:
+        # Índice de similaridade: inclui o que ainda não foi indexado (ex: análises de antes do índice)
+        analises_por_id = {str(analise['id']): analise for analise in historico_analises}
+        auth_user = supabase.auth.get_user()
+        if auth_user and auth_user.user:
+            try:
+                indice_similaridade(auth_user.user.id).completar(historico_analises)
+            except (OSError, ValueError) as e:
+                print(f"Erro ao atualizar o índice de similaridade: {e}")
+
         # Filtrar análises por tags selecionadas
         if tags_selecionadas:
             historico_analises = [
@@ -956,11 +1092,20 @@ def mostrar_historico_analises():
                 
                 st.write("**Análise:**")
                 st.markdown(analise['analise'])
+
+                segmentacao = (analise.get('resumo_estatistico') or {}).get('segmentacao')
+                if segmentacao:
+                    st.write(f"**🧩 Segmentos dos Leads ({segmentacao['metodo']}):**")
+                    st.dataframe(tabela_segmentos(segmentacao))
+
+                snapshot = (analise.get('resumo_estatistico') or {}).get('snapshot')
+                if snapshot:
+                    mostrar_reanalise(analise, snapshot, idx)
                 
-                # Mostrar insights baseados nas tags
-                if analise.get('tags'):
+                # Insights das análises mais parecidas (texto, objetivo, plataforma e tags)
+                if len(analises_por_id) > 1:
                     st.write("**💡 Insights Relacionados:**")
-                    insights = gerar_insights_com_tags(analise, analise['tags'])
+                    insights = gerar_insights_relacionados(analise, analises_por_id)
                     st.markdown(insights)
                 
                 # Seção de Feedback
@@ -1110,6 +1255,7 @@ def mostrar_historico_analises():
                     st.code(analise['analise'])
                     st.success("Análise copiada para a área de transferência!")
 
+@perfilado
 def carregar_feedback(analise_id, usuario_id_analise):
     """Carrega o feedback para uma análise específica do Supabase."""
     try:
@@ -1120,64 +1266,38 @@ def carregar_feedback(analise_id, usuario_id_analise):
             st.info("Usuário não autenticado. Não é possível carregar o feedback.")
             return None
 
-        response = supabase.table('feedback')\
-            .select('*')\
-            .eq('analise_id', analise_id)\
-            .eq('usuario_id', user_id_logado)\
-            .order('created_at', desc=True)\
-            .limit(1)\
-            .maybe_single()\
-            .execute()
+        def _consultar():
+            try:
+                response = supabase.table('feedback')\
+                    .select('*')\
+                    .eq('analise_id', analise_id)\
+                    .eq('usuario_id', user_id_logado)\
+                    .order('created_at', desc=True)\
+                    .limit(1)\
+                    .maybe_single()\
+                    .execute()
+            except Exception as e:
+                # O erro reportado é: "{'message': 'Missing response', 'code': '204', ...}"
+                # PGRST116 é o código PostgREST para "item não encontrado". Nos dois casos não há
+                # feedback, e a ausência também é cacheada (até salvar_feedback invalidar).
+                error_str = str(e)
+                if "'code': '204'" in error_str or "PGRST116" in error_str:
+                    return None
+                raise
 
-        # Adicionar verificação para a própria `response`
-        if response is None:
-            st.warning("A consulta ao Supabase para carregar feedback retornou None inesperadamente.")
-            return None
+            # Se .maybe_single() não encontrar nada, response (ou response.data) será None.
+            if response is None or response.data is None:
+                return None
 
-        # Se .maybe_single() não encontrar nada, response.data será None.
-        # A exceção está sendo pega no bloco `except` abaixo.
+            return formatar_feedback(response.data)
 
-        if response.data is None:
-            return None 
-
-        feedback_db = response.data
-        
-        historico_edicoes_str = feedback_db.get('historico_edicoes')
-        historico_edicoes = []
-        if isinstance(historico_edicoes_str, str) and historico_edicoes_str:
-            try:
-                historico_edicoes = json.loads(historico_edicoes_str)
-            except json.JSONDecodeError:
-                st.warning(f"Falha ao decodificar historico_edicoes para feedback da analise_id {analise_id}")
-        elif isinstance(historico_edicoes_str, list):
-             historico_edicoes = historico_edicoes_str
-
-        return {
-            "id": feedback_db.get('id'),
-            "analise_id": feedback_db.get('analise_id'),
-            "pontos_positivos": feedback_db.get('pontos_positivos'),
-            "pontos_melhorar": feedback_db.get('pontos_melhorar'),
-            "nota": feedback_db.get('nota'),
-            "editado": feedback_db.get('editado', False),
-            "ultima_edicao": feedback_db.get('ultima_edicao') or feedback_db.get('updated_at'), # Usar updated_at como fallback
-            "historico_edicoes": historico_edicoes,
-            "usuario_id": feedback_db.get('usuario_id')
-        }
+        return cache_consultas.obter_ou_carregar(user_id_logado, CONSULTA_FEEDBACK, _consultar, analise_id)
 
     except Exception as e:
-        # Converter a exceção para string para verificar se é o erro "204 No Content"
-        error_str = str(e)
-        # O erro reportado é: "{'message': 'Missing response', 'code': '204', ...}"
-        # Verificar pela presença de 'code': '204' na string da exceção.
-        if "'code': '204'" in error_str or "PGRST116" in error_str: # PGRST116 é o código PostgREST para "item não encontrado"
-            # Este é o caso em que nenhum feedback foi encontrado (HTTP 204 ou erro semântico PGRST116).
-            # Não é um erro fatal para a aplicação, apenas significa que não há dados.
-            return None
-        else:
-            # Se for qualquer outro erro, mostrar a mensagem de erro.
-            st.error(f"Erro ao carregar feedback do Supabase: {e}")
-            return None
+        st.error(f"Erro ao carregar feedback do Supabase: {e}")
+        return None
 
+@perfilado
 def carregar_metricas():
     """Carrega e calcula as métricas de performance do usuário a partir do Supabase."""
     try:
@@ -1192,97 +1312,100 @@ def carregar_metricas():
             }
         user_id = auth_user.user.id
 
-        metricas_calculadas = {
-            "total_analises": 0,
-            "total_copies": 0,
-            "tempo_medio_analise": 0.0,
-            "media_notas": 0.0,
-            "total_feedback": 0,
-            "plataformas_mais_usadas": defaultdict(int),
-            "objetivos_mais_comuns": defaultdict(int),
-            "analises": []
-        }
+        def _consultar():
+            metricas_calculadas = {
+                "total_analises": 0,
+                "total_copies": 0,
+                "tempo_medio_analise": 0.0,
+                "media_notas": 0.0,
+                "total_feedback": 0,
+                "plataformas_mais_usadas": defaultdict(int),
+                "objetivos_mais_comuns": defaultdict(int),
+                "analises": []
+            }
 
-        # 1. Total de Análises
-        response_total_analises = supabase.table('analises_leads').select('id', count='exact').eq('usuario_id', user_id).execute()
-        if response_total_analises.count is not None:
-            metricas_calculadas["total_analises"] = response_total_analises.count
+            # 1. Total de Análises
+            response_total_analises = supabase.table('analises_leads').select('id', count='exact').eq('usuario_id', user_id).execute()
+            if response_total_analises.count is not None:
+                metricas_calculadas["total_analises"] = response_total_analises.count
 
-        # 2. Total de Copies
-        response_total_copies = supabase.table('copies').select('id', count='exact').eq('usuario_id', user_id).execute()
-        if response_total_copies.count is not None:
-            metricas_calculadas["total_copies"] = response_total_copies.count
+            # 2. Total de Copies
+            response_total_copies = supabase.table('copies').select('id', count='exact').eq('usuario_id', user_id).execute()
+            if response_total_copies.count is not None:
+                metricas_calculadas["total_copies"] = response_total_copies.count
 
-        # 3. Tempo Médio de Análise
-        response_tempos_analise = supabase.table('metricas')\
-            .select('tempo_processamento')\
-            .eq('usuario_id', user_id)\
-            .eq('tipo', 'analise')\
-            .gt('tempo_processamento', 0)\
-            .execute()
-        if response_tempos_analise.data:
-            tempos = [item['tempo_processamento'] for item in response_tempos_analise.data if item.get('tempo_processamento') is not None]
-            if tempos:
-                metricas_calculadas["tempo_medio_analise"] = sum(tempos) / len(tempos)
-
-        # 4. Média de Notas e 5. Total de Feedback
-        response_feedbacks = supabase.table('feedback')\
-            .select('nota')\
-            .eq('usuario_id', user_id)\
-            .execute()
-        if response_feedbacks.data:
-            notas = [item['nota'] for item in response_feedbacks.data if item.get('nota') is not None]
-            metricas_calculadas["total_feedback"] = len(response_feedbacks.data)
-            if notas:
-                metricas_calculadas["media_notas"] = sum(notas) / len(notas)
+            # 3. Tempo Médio de Análise
+            response_tempos_analise = supabase.table('metricas')\
+                .select('tempo_processamento')\
+                .eq('usuario_id', user_id)\
+                .eq('tipo', 'analise')\
+                .gt('tempo_processamento', 0)\
+                .execute()
+            if response_tempos_analise.data:
+                tempos = [item['tempo_processamento'] for item in response_tempos_analise.data if item.get('tempo_processamento') is not None]
+                if tempos:
+                    metricas_calculadas["tempo_medio_analise"] = sum(tempos) / len(tempos)
+
+            # 4. Média de Notas e 5. Total de Feedback
+            response_feedbacks = supabase.table('feedback')\
+                .select('nota')\
+                .eq('usuario_id', user_id)\
+                .execute()
+            if response_feedbacks.data:
+                notas = [item['nota'] for item in response_feedbacks.data if item.get('nota') is not None]
+                metricas_calculadas["total_feedback"] = len(response_feedbacks.data)
+                if notas:
+                    metricas_calculadas["media_notas"] = sum(notas) / len(notas)
         
-        # 6. Plataformas Mais Usadas, 7. Objetivos Mais Comuns, 8. Últimas Análises
-        response_analises_detalhes = supabase.table('analises_leads')\
-            .select('plataforma, objetivo, data, total_leads, tempo_processamento')\
-            .eq('usuario_id', user_id)\
-            .order('data', desc=True)\
-            .limit(100) .execute() # Limitar para performance, dashboard mostra só top 5 anyway
-
-        if response_analises_detalhes.data:
-            for i, analise_item in enumerate(response_analises_detalhes.data):
-                plataforma = analise_item.get('plataforma')
-                objetivo = analise_item.get('objetivo')
-                if plataforma:
-                    metricas_calculadas["plataformas_mais_usadas"][plataforma] += 1
-                if objetivo:
-                    metricas_calculadas["objetivos_mais_comuns"][objetivo] += 1
+            # 6. Plataformas Mais Usadas, 7. Objetivos Mais Comuns, 8. Últimas Análises
+            response_analises_detalhes = supabase.table('analises_leads')\
+                .select('plataforma, objetivo, data, total_leads, tempo_processamento')\
+                .eq('usuario_id', user_id)\
+                .order('data', desc=True)\
+                .limit(100) .execute() # Limitar para performance, dashboard mostra só top 5 anyway
+
+            if response_analises_detalhes.data:
+                for i, analise_item in enumerate(response_analises_detalhes.data):
+                    plataforma = analise_item.get('plataforma')
+                    objetivo = analise_item.get('objetivo')
+                    if plataforma:
+                        metricas_calculadas["plataformas_mais_usadas"][plataforma] += 1
+                    if objetivo:
+                        metricas_calculadas["objetivos_mais_comuns"][objetivo] += 1
                 
-                if i < 5: # Para a lista das 5 últimas análises
-                    data_iso = analise_item.get('data') 
-                    data_formatada = str(data_iso) # Default para string original
-                    if data_iso:
-                        try:
-                            if isinstance(data_iso, str):
-                                dt_obj = datetime.fromisoformat(data_iso.replace('Z', '+00:00').replace('+0000', '+00:00'))
-                                data_formatada = dt_obj.strftime("%d/%m/%Y %H:%M:%S")
-                            elif isinstance(data_iso, datetime):
-                                data_formatada = data_iso.strftime("%d/%m/%Y %H:%M:%S")
-                        except ValueError: # Tentar outro formato se ISO falhar
+                    if i < 5: # Para a lista das 5 últimas análises
+                        data_iso = analise_item.get('data') 
+                        data_formatada = str(data_iso) # Default para string original
+                        if data_iso:
                             try:
                                 if isinstance(data_iso, str):
-                                    dt_obj = datetime.strptime(data_iso, "%d/%m/%Y %H:%M:%S")
+                                    dt_obj = datetime.fromisoformat(data_iso.replace('Z', '+00:00').replace('+0000', '+00:00'))
                                     data_formatada = dt_obj.strftime("%d/%m/%Y %H:%M:%S")
-                            except ValueError:
-                                pass # Mantém str(data_iso)
+                                elif isinstance(data_iso, datetime):
+                                    data_formatada = data_iso.strftime("%d/%m/%Y %H:%M:%S")
+                            except ValueError: # Tentar outro formato se ISO falhar
+                                try:
+                                    if isinstance(data_iso, str):
+                                        dt_obj = datetime.strptime(data_iso, "%d/%m/%Y %H:%M:%S")
+                                        data_formatada = dt_obj.strftime("%d/%m/%Y %H:%M:%S")
+                                except ValueError:
+                                    pass # Mantém str(data_iso)
                     
-                    metricas_calculadas["analises"].append({
-                        "data": data_formatada,
-                        "plataforma": plataforma,
-                        "objetivo": objetivo,
-                        "total_leads": analise_item.get('total_leads'),
-                        "tempo_processamento": analise_item.get('tempo_processamento')
-                    })
+                        metricas_calculadas["analises"].append({
+                            "data": data_formatada,
+                            "plataforma": plataforma,
+                            "objetivo": objetivo,
+                            "total_leads": analise_item.get('total_leads'),
+                            "tempo_processamento": analise_item.get('tempo_processamento')
+                        })
             
-        # Converter defaultdicts para dicts para o output final
-        metricas_calculadas["plataformas_mais_usadas"] = dict(metricas_calculadas["plataformas_mais_usadas"])
-        metricas_calculadas["objetivos_mais_comuns"] = dict(metricas_calculadas["objetivos_mais_comuns"])
+            # Converter defaultdicts para dicts para o output final
+            metricas_calculadas["plataformas_mais_usadas"] = dict(metricas_calculadas["plataformas_mais_usadas"])
+            metricas_calculadas["objetivos_mais_comuns"] = dict(metricas_calculadas["objetivos_mais_comuns"])
+
+            return metricas_calculadas
 
-        return metricas_calculadas
+        return cache_consultas.obter_ou_carregar(user_id, CONSULTA_METRICAS, _consultar)
 
     except Exception as e:
         st.error(f"Erro ao carregar métricas gerais do Supabase: {e}")
@@ -1293,8 +1416,12 @@ def carregar_metricas():
             "analises": []
         }
 
+@perfilado
 def gerar_dashboard():
     """Gera o dashboard com métricas e visualizações importantes"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     st.subheader("📊 Dashboard Geral")
     
     # Carregar dados
@@ -1346,7 +1473,7 @@ def gerar_dashboard():
                 names=['Copy', 'Análise', 'Outro'],
                 title='Distribuição de Tokens por Operação'
             )
-            st.plotly_chart(fig, use_container_width=True)
+            mostrar_grafico(fig)
     
     with col2:
         if consumo_tokens and consumo_tokens['historico']:
@@ -1370,8 +1497,27 @@ def gerar_dashboard():
                 showlegend=True
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            mostrar_grafico(fig)
     
+    # Cache de prompt do provedor
+    if consumo_tokens and consumo_tokens.get('cache'):
+        cache = consumo_tokens['cache']
+        st.subheader("⚡ Cache de Prompt")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Taxa de Acerto (tokens)", f"{cache['taxa_acerto_tokens'] * 100:.1f}%")
+            st.caption(f"{cache['taxa_acerto_chamadas'] * 100:.1f}% das chamadas com cache")
+        with col2:
+            st.metric("Tokens em Cache", f"{cache['cached_tokens']:,}")
+            st.caption(f"de {cache['prompt_tokens']:,} tokens de prompt")
+        with col3:
+            st.metric("Economia de Latência", f"{cache['economia_latencia']:.2f}s/chamada")
+            st.caption(f"{cache['latencia_media_com_cache']:.2f}s com cache vs {cache['latencia_media_sem_cache']:.2f}s sem")
+        with col4:
+            st.metric("Economia de Custo", f"US$ {cache['economia_custo_usd']:.4f}")
+
+    mostrar_latencia_chamadas_llm()
+
     # Gráficos e análises
     col1, col2 = st.columns(2)
     
@@ -1391,7 +1537,7 @@ def gerar_dashboard():
                 labels={'x': 'Plataforma', 'y': 'Quantidade'},
                 title='Distribuição de Análises por Plataforma'
             )
-            st.plotly_chart(fig, use_container_width=True)
+            mostrar_grafico(fig)
     
     with col2:
         st.subheader("🎯 Objetivos Mais Comuns")
@@ -1408,7 +1554,7 @@ def gerar_dashboard():
                 names=list(objetivos.keys()),
                 title='Distribuição de Objetivos'
             )
-            st.plotly_chart(fig, use_container_width=True)
+            mostrar_grafico(fig)
     
     # Métricas por Plataforma
     st.subheader("📊 Métricas por Plataforma")
@@ -1495,7 +1641,7 @@ def gerar_dashboard():
                 showlegend=True
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            mostrar_grafico(fig)
     
     # Tags Mais Utilizadas
     st.subheader("🏷️ Tags Mais Utilizadas")
@@ -1515,10 +1661,12 @@ def gerar_dashboard():
                 labels={'x': 'Frequência', 'y': 'Tag'},
                 title='Frequência de Tags'
             )
-            st.plotly_chart(fig, use_container_width=True)
+            mostrar_grafico(fig)
 
 # Adicionar após as configurações iniciais
-def salvar_consumo_tokens(tokens_consumidos, tipo_operacao, username_email=None):
+@perfilado
+def salvar_consumo_tokens(tokens_consumidos, tipo_operacao, username_email=None, prompt_tokens=0,
+                          prompt_tokens_estimados=0, cached_tokens=0, latencia_api=0.0):
     try:
         usuario_id_supabase = None
         if username_email: # username_email é o email do usuário logado
@@ -1540,6 +1688,10 @@ def salvar_consumo_tokens(tokens_consumidos, tipo_operacao, username_email=None)
         payload = {
             "tipo": tipo_operacao,
             "total_tokens": tokens_consumidos,
+            "prompt_tokens": prompt_tokens or 0,
+            "prompt_tokens_estimados": prompt_tokens_estimados or 0,
+            "cached_tokens": cached_tokens or 0,
+            "latencia_api": latencia_api or 0.0,
             "plataforma": "copy" if tipo_operacao == "copy" else "analise",
             "tempo_processamento": 0, 
             "usuario_id": usuario_id_supabase, # Pode ser None se não encontrado
@@ -1548,6 +1700,7 @@ def salvar_consumo_tokens(tokens_consumidos, tipo_operacao, username_email=None)
 
         # Salvar no Supabase
         response = supabase.table('metricas').insert(payload).execute()
+        cache_consultas.invalidar(usuario_id_supabase, CONSULTA_CONSUMO_TOKENS)
         
         if response.data:
             return True
@@ -1559,6 +1712,7 @@ def salvar_consumo_tokens(tokens_consumidos, tipo_operacao, username_email=None)
         return False
 
 # Adicionar após as configurações iniciais
+@perfilado
 def salvar_metricas(metricas_data):
     """Salva as métricas de performance no Supabase"""
     try:
@@ -1604,6 +1758,7 @@ def salvar_metricas(metricas_data):
 
         # Salvar no Supabase
         response = supabase.table('metricas').insert(payload).execute()
+        cache_consultas.invalidar(usuario_id_supabase, CONSULTA_METRICAS)
         
         if response.data:
             return True
@@ -1614,6 +1769,7 @@ def salvar_metricas(metricas_data):
         st.error(f"Erro ao salvar métricas: {e}")
         return False
 
+@perfilado
 def carregar_metricas_plataforma():
     """Carrega as métricas específicas da plataforma mais recentes do Supabase."""
     try:
@@ -1623,37 +1779,58 @@ def carregar_metricas_plataforma():
             return {} 
         user_id = auth_user.user.id
 
-        # Buscar todas as métricas de plataforma para o usuário
-        response = supabase.table('metricas_plataforma') \
-            .select('plataforma, metricas, data') \
-            .eq('usuario_id', user_id) \
-            .order('data', desc=True) \
-            .execute()
+        def _consultar():
+            # Buscar todas as métricas de plataforma para o usuário
+            response = supabase.table('metricas_plataforma') \
+                .select('plataforma, metricas, data') \
+                .eq('usuario_id', user_id) \
+                .order('data', desc=True) \
+                .execute()
 
-        metricas_recentes_por_plataforma = {}
-        if response.data:
-            for item in response.data:
-                plataforma = item['plataforma']
-                # Se ainda não temos a métrica mais recente para esta plataforma, adicionamos
-                if plataforma not in metricas_recentes_por_plataforma:
-                    metricas_db = item.get('metricas')
-                    if isinstance(metricas_db, str):
-                        try:
-                            metricas_recentes_por_plataforma[plataforma] = json.loads(metricas_db)
-                        except json.JSONDecodeError:
-                            st.warning(f"Falha ao decodificar JSON de métricas para a plataforma {plataforma}")
-                            metricas_recentes_por_plataforma[plataforma] = METRICAS_POR_PLATAFORMA.get(plataforma, {}) # Fallback para estrutura padrão
-                    elif isinstance(metricas_db, dict):
-                        metricas_recentes_por_plataforma[plataforma] = metricas_db
-                    else:
-                        metricas_recentes_por_plataforma[plataforma] = METRICAS_POR_PLATAFORMA.get(plataforma, {}) # Fallback
-            return metricas_recentes_por_plataforma
-        return {} # Retornar dict vazio se não houver dados, para consistência
+            metricas_recentes_por_plataforma = {}
+            if response.data:
+                for item in response.data:
+                    plataforma = item['plataforma']
+                    # Se ainda não temos a métrica mais recente para esta plataforma, adicionamos
+                    if plataforma not in metricas_recentes_por_plataforma:
+                        metricas_db = item.get('metricas')
+                        if isinstance(metricas_db, str):
+                            try:
+                                metricas_recentes_por_plataforma[plataforma] = json.loads(metricas_db)
+                            except json.JSONDecodeError:
+                                st.warning(f"Falha ao decodificar JSON de métricas para a plataforma {plataforma}")
+                                metricas_recentes_por_plataforma[plataforma] = METRICAS_POR_PLATAFORMA.get(plataforma, {}) # Fallback para estrutura padrão
+                        elif isinstance(metricas_db, dict):
+                            metricas_recentes_por_plataforma[plataforma] = metricas_db
+                        else:
+                            metricas_recentes_por_plataforma[plataforma] = METRICAS_POR_PLATAFORMA.get(plataforma, {}) # Fallback
+                return metricas_recentes_por_plataforma
+            return {} # Retornar dict vazio se não houver dados, para consistência
+
+        return cache_consultas.obter_ou_carregar(user_id, CONSULTA_METRICAS_PLATAFORMA, _consultar)
 
     except Exception as e:
         st.error(f"Erro ao carregar métricas da plataforma do Supabase: {e}")
         return {} # Retornar dict vazio em caso de erro
 
+def calcular_economia_cache(prompt_tokens, cached_tokens, chamadas_com_cache, total_chamadas,
+                            latencias_com_cache, latencias_sem_cache, modelo=MODELO_OPENAI):
+    """Calcula a taxa de acerto do cache de prompt e a economia estimada de custo e latência."""
+    precos = PRECOS_POR_MILHAO_TOKENS.get(modelo, {"entrada": 0.0, "entrada_cache": 0.0})
+    latencia_com = sum(latencias_com_cache) / len(latencias_com_cache) if latencias_com_cache else 0.0
+    latencia_sem = sum(latencias_sem_cache) / len(latencias_sem_cache) if latencias_sem_cache else 0.0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "taxa_acerto_tokens": (cached_tokens / prompt_tokens) if prompt_tokens else 0.0,
+        "taxa_acerto_chamadas": (chamadas_com_cache / total_chamadas) if total_chamadas else 0.0,
+        "latencia_media_com_cache": latencia_com,
+        "latencia_media_sem_cache": latencia_sem,
+        "economia_latencia": (latencia_sem - latencia_com) if (latencias_com_cache and latencias_sem_cache) else 0.0,
+        "economia_custo_usd": cached_tokens * (precos["entrada"] - precos["entrada_cache"]) / 1_000_000
+    }
+
+@perfilado
 def carregar_consumo_tokens():
     """Carrega o consumo de tokens do usuário a partir do Supabase."""
     try:
@@ -1662,85 +1839,216 @@ def carregar_consumo_tokens():
             return {
                 "total_tokens": 0,
                 "historico": [],
-                "por_operacao": {"copy": 0, "analise": 0, "outro": 0}
+                "por_operacao": {"copy": 0, "analise": 0, "outro": 0},
+                "cache": None
             }
         user_id = auth_user.user.id
 
-        response = supabase.table('metricas')\
-            .select('total_tokens, tipo, plataforma, data')\
-            .eq('usuario_id', user_id)\
-            .gt('total_tokens', 0) \
-            .order('data', desc=True)\
-            .execute()
-
-        consumo = {
-            "total_tokens": 0,
-            "historico": [],
-            "por_operacao": defaultdict(int) 
-        }
+        def _consultar():
+            response = supabase.table('metricas')\
+                .select('total_tokens, prompt_tokens, cached_tokens, latencia_api, tipo, plataforma, data')\
+                .eq('usuario_id', user_id)\
+                .gt('total_tokens', 0) \
+                .order('data', desc=True)\
+                .execute()
 
-        if response.data:
-            for item in response.data:
-                tokens = item.get('total_tokens', 0)
-                consumo["total_tokens"] += tokens
+            consumo = {
+                "total_tokens": 0,
+                "historico": [],
+                "por_operacao": defaultdict(int) 
+            }
+            # Acumuladores do cache de prompt: latências separadas por chamadas com e sem acerto
+            prompt_tokens_total = 0
+            cached_tokens_total = 0
+            chamadas_com_cache = 0
+            latencias_com_cache = []
+            latencias_sem_cache = []
+
+            if response.data:
+                for item in response.data:
+                    tokens = item.get('total_tokens', 0)
+                    consumo["total_tokens"] += tokens
+
+                    prompt_tokens_item = item.get('prompt_tokens') or 0
+                    cached_tokens_item = item.get('cached_tokens') or 0
+                    latencia_item = item.get('latencia_api') or 0
+                    prompt_tokens_total += prompt_tokens_item
+                    cached_tokens_total += cached_tokens_item
+                    if cached_tokens_item > 0:
+                        chamadas_com_cache += 1
+                    if latencia_item > 0:
+                        (latencias_com_cache if cached_tokens_item > 0 else latencias_sem_cache).append(latencia_item)
                 
-                data_iso = item.get('data')
-                data_formatada = "Data Desconhecida"
-                if data_iso:
-                    try:
-                        data_formatada = datetime.fromisoformat(data_iso.replace('Z', '+00:00')).strftime("%d/%m/%Y %H:%M:%S")
-                    except ValueError:
+                    data_iso = item.get('data')
+                    data_formatada = "Data Desconhecida"
+                    if data_iso:
                         try:
-                            data_formatada = datetime.strptime(data_iso, "%d/%m/%Y %H:%M:%S").strftime("%d/%m/%Y %H:%M:%S")
+                            data_formatada = datetime.fromisoformat(data_iso.replace('Z', '+00:00')).strftime("%d/%m/%Y %H:%M:%S")
                         except ValueError:
-                            data_formatada = str(data_iso)
+                            try:
+                                data_formatada = datetime.strptime(data_iso, "%d/%m/%Y %H:%M:%S").strftime("%d/%m/%Y %H:%M:%S")
+                            except ValueError:
+                                data_formatada = str(data_iso)
                 
-                consumo["historico"].append({
-                    "tokens": tokens,
-                    "tipo": item.get('tipo', 'desconhecido'),
-                    "plataforma": item.get('plataforma'),
-                    "data": data_formatada
-                })
+                    consumo["historico"].append({
+                        "tokens": tokens,
+                        "tipo": item.get('tipo', 'desconhecido'),
+                        "plataforma": item.get('plataforma'),
+                        "data": data_formatada
+                    })
                 
-                tipo_op = item.get('tipo', 'outro').lower()
-                if tipo_op in ["copy", "analise"]:
-                    consumo["por_operacao"][tipo_op] += tokens
-                else:
-                    consumo["por_operacao"]['outro'] += tokens
+                    tipo_op = item.get('tipo', 'outro').lower()
+                    if tipo_op in ["copy", "analise"]:
+                        consumo["por_operacao"][tipo_op] += tokens
+                    else:
+                        consumo["por_operacao"]['outro'] += tokens
             
-            consumo["historico"].reverse() 
+                consumo["historico"].reverse() 
+
+            consumo["por_operacao"] = {
+                "copy": consumo["por_operacao"]['copy'],
+                "analise": consumo["por_operacao"]['analise'],
+                "outro": consumo["por_operacao"]['outro']
+            }
+            consumo["cache"] = calcular_economia_cache(
+                prompt_tokens_total, cached_tokens_total, chamadas_com_cache,
+                len(response.data or []), latencias_com_cache, latencias_sem_cache
+            )
+            return consumo
+
+        return cache_consultas.obter_ou_carregar(user_id, CONSULTA_CONSUMO_TOKENS, _consultar)
 
-        consumo["por_operacao"] = {
-            "copy": consumo["por_operacao"]['copy'],
-            "analise": consumo["por_operacao"]['analise'],
-            "outro": consumo["por_operacao"]['outro']
-        }
-        return consumo
-        
     except Exception as e:
         st.error(f"Erro ao carregar consumo de tokens do Supabase: {e}")
         return {
             "total_tokens": 0,
             "historico": [],
-            "por_operacao": {"copy": 0, "analise": 0, "outro": 0}
+            "por_operacao": {"copy": 0, "analise": 0, "outro": 0},
+            "cache": None
         }
 
+@perfilado
+def carregar_telemetria_llm(dias=30):
+    """Percentis de latência e custo das chamadas à IA nos últimos `dias` (função percentis_chamadas_llm)."""
+    try:
+        user_id = st.session_state.get('usuario_id')
+        if not user_id:
+            return []
+        desde = (datetime.now(timezone.utc) - timedelta(days=dias)).isoformat()
+
+        def _consultar():
+            try:
+                response = supabase.rpc(
+                    'percentis_chamadas_llm', {'p_usuario_id': user_id, 'p_desde': desde}
+                ).execute()
+                return response.data or []
+            except Exception as e_rpc:
+                # Banco sem a função: agrega no app as linhas do período
+                print(f"percentis_chamadas_llm indisponível ({e_rpc}); agregando no app.")
+                response = supabase.table('chamadas_llm')\
+                    .select('criado_em, operacao, plataforma, prompt_tokens, completion_tokens, cached_tokens, '
+                            'ttft_ms, latencia_ms, tentativas, resultado, leads, custo_usd')\
+                    .eq('usuario_id', user_id)\
+                    .gte('criado_em', desde)\
+                    .limit(10000)\
+                    .execute()
+                return agregar_percentis(response.data or [])
+
+        return cache_consultas.obter_ou_carregar(user_id, CONSULTA_TELEMETRIA_LLM, _consultar, dias)
+
+    except Exception as e:
+        st.error(f"Erro ao carregar telemetria das chamadas à IA: {e}")
+        return []
+
+@perfilado
+def mostrar_latencia_chamadas_llm():
+    """Painel do dashboard com p50/p95/p99 por operação e plataforma e a evolução diária."""
+    import plotly.express as px
+
+    st.subheader("⏱️ Latência e Custo das Chamadas à IA")
+    dias = st.selectbox("Período", [7, 30, 90], index=1, format_func=lambda d: f"Últimos {d} dias",
+                        key="periodo_telemetria_llm")
+    linhas = carregar_telemetria_llm(dias)
+    if coletor_telemetria.ultimo_erro:
+        descartados = (f" ({coletor_telemetria.descartados} registros descartados)"
+                       if coletor_telemetria.descartados else "")
+        st.caption(f"⚠️ Falha ao gravar a telemetria mais recente: {coletor_telemetria.ultimo_erro}{descartados}")
+    if not linhas:
+        st.info("Nenhuma chamada à IA registrada no período.")
+        return
+
+    periodo = [l for l in linhas if l['dia'] is None]
+    total_chamadas = sum(l['chamadas'] for l in periodo)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Chamadas", f"{total_chamadas:,}")
+        st.caption(f"{sum(l['erros'] for l in periodo)} com erro, {sum(l['retentativas'] for l in periodo)} retentativas")
+    with col2:
+        st.metric("Custo no Período", f"US$ {sum(l['custo_usd'] or 0 for l in periodo):.4f}")
+    with col3:
+        custo_mil_leads = custo_por_mil_leads(linhas)
+        st.metric("Análise: Custo por 1k Leads", f"US$ {custo_mil_leads:.4f}" if custo_mil_leads is not None else "-")
+    with col4:
+        custo_copy = [l for l in periodo if l['operacao'] in ('copy', 'copy_lote')]
+        chamadas_copy = sum(l['chamadas'] for l in custo_copy)
+        st.metric("Copy: Custo por Chamada",
+                  f"US$ {sum(l['custo_usd'] or 0 for l in custo_copy) / chamadas_copy:.5f}" if chamadas_copy else "-")
+
+    tabela = pd.DataFrame(periodo)
+    tabela = tabela[['operacao', 'plataforma', 'chamadas', 'erros', 'p50_ms', 'p95_ms', 'p99_ms',
+                     'ttft_p50_ms', 'ttft_p95_ms', 'custo_usd']]
+    st.dataframe(
+        tabela.rename(columns={
+            'operacao': 'Operação', 'plataforma': 'Plataforma', 'chamadas': 'Chamadas', 'erros': 'Erros',
+            'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)', 'p99_ms': 'p99 (ms)',
+            'ttft_p50_ms': 'TTFT p50 (ms)', 'ttft_p95_ms': 'TTFT p95 (ms)', 'custo_usd': 'Custo (US$)'
+        }).round(1),
+        use_container_width=True, hide_index=True
+    )
+
+    diario = pd.DataFrame([l for l in linhas if l['dia'] is not None])
+    if not diario.empty:
+        percentil_grafico = st.radio("Percentil", ['p50_ms', 'p95_ms', 'p99_ms'], index=1, horizontal=True,
+                                     format_func=lambda c: c.replace('_ms', ''), key="percentil_telemetria_llm")
+        diario['serie'] = diario['operacao'] + " · " + diario['plataforma'].fillna("-")
+        fig = px.line(
+            diario.sort_values('dia'), x='dia', y=percentil_grafico, color='serie', markers=True,
+            labels={'dia': 'Dia', percentil_grafico: 'Latência (ms)', 'serie': 'Operação · Plataforma'},
+            title=f"Latência {percentil_grafico.replace('_ms', '')} por dia"
+        )
+        mostrar_grafico(fig)
+
 # --- Interface Streamlit ---
 st.set_page_config(page_title="Gerador de Copy Mencare", layout="wide")
 
+if INSTRUMENTACAO_HABILITADA:
+    iniciar_rerun(st.session_state.get('username') or "login")
+iniciar_perfil(st.session_state.get('username') or "login")
+
 # Verificar autenticação
 if not st.session_state.autenticado:
-    login()
+    with trecho("login"):
+        login()
+    encerrar_perfil_rerun()
 else:
+    # Dependências pesadas carregadas só depois do login
+    import pandas as pd
+    supabase = get_supabase_client()
+    configurar_destino(supabase, get_supabase_servico())
+
     # Inicializar st.session_state se não existir
     if 'generated_copy' not in st.session_state:
         st.session_state.generated_copy = ""
     if 'form_data' not in st.session_state:
         st.session_state.form_data = {}
-    if 'historico' not in st.session_state:
-        st.session_state.historico = []
+    if not isinstance(st.session_state.get('historico'), deque):
+        st.session_state.historico = deque(st.session_state.get('historico') or [], maxlen=HISTORICO_SESSAO_MAX)
+    if 'cursores_historico' not in st.session_state:
+        st.session_state.cursores_historico = [None]
     if 'analise_leads' not in st.session_state:
         st.session_state.analise_leads = None
+    if 'copies_lote' not in st.session_state:
+        st.session_state.copies_lote = []
 
     # Barra superior com informações do usuário e botão de logout
     col1, col2 = st.columns([6, 1])
@@ -1758,21 +2066,29 @@ else:
             # Limpar estado da sessão do Streamlit
             st.session_state.autenticado = False
             st.session_state.username = None
+            st.session_state.usuario_id = None
             st.session_state.login_success = False
             # Limpar outros dados de sessão que dependem do usuário, se houver
             st.session_state.generated_copy = ""
             st.session_state.form_data = {}
-            st.session_state.historico = []
+            st.session_state.historico = deque(maxlen=HISTORICO_SESSAO_MAX)
+            st.session_state.cursores_historico = [None]
+            st.session_state.pop('paginas_copies', None)
             st.session_state.analise_leads = None
+            st.session_state.copies_lote = []
+            st.session_state.copy_existente = None
+            st.session_state.duplicata_pendente = False
+            st.session_state.job_analise_id = None
+            st.session_state.pop('segmentacao_leads', None)
             if 'analise_id' in st.session_state:
                 del st.session_state['analise_id']
 
             st.rerun()
 
     # Criar as abas
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📝 Gerar Copy", "📚 Histórico", "📊 Análise de Leads", "📈 Métricas", "🎯 Dashboard"])
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📝 Gerar Copy", "📚 Histórico", "📊 Análise de Leads", "📈 Métricas", "🎯 Dashboard", "✉️ Personalização em Massa"])
 
-    with tab1:
+    with tab1, trecho("aba: Gerar Copy"):
         st.markdown("Preencha os campos abaixo para gerar sua copy e, opcionalmente, salvá-la no Baserow.")
 
         with st.sidebar:
@@ -1806,68 +2122,163 @@ else:
                 if not all([plataforma, objetivo, publico_alvo, produto_servico, tom_de_voz, cta]):
                     st.warning("Por favor, preencha todos os campos obrigatórios antes de gerar a copy.")
                 else:
-                    with st.spinner("Gerando sua copy com IA... Aguarde! 🧠"):
-                        copy_gerada = gerar_copy_openai(
-                            plataforma, objetivo, publico_alvo, produto_servico, tom_de_voz, cta, informacoes_adicionais
-                        )
-                        if copy_gerada:
-                            st.session_state.generated_copy = copy_gerada
-                            st.session_state.form_data = {
-                                "plataforma": plataforma,
-                                "objetivo": objetivo,
-                                "publico_alvo": publico_alvo,
-                                "produto_servico": produto_servico,
-                                "tom_de_voz": tom_de_voz,
-                                "cta": cta,
-                                "copy_gerada": copy_gerada,
-                                "data_geracao": datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-                            }
-                            # Adicionar ao histórico
-                            st.session_state.historico.append(st.session_state.form_data)
-                        else:
-                            st.session_state.generated_copy = ""
-                            st.session_state.form_data = {}
+                    brief = {
+                        "plataforma": plataforma,
+                        "objetivo": objetivo,
+                        "publico_alvo": publico_alvo,
+                        "produto_servico": produto_servico,
+                        "tom_de_voz": tom_de_voz,
+                        "cta": cta,
+                        "informacoes_adicionais": informacoes_adicionais
+                    }
+                    # Briefing quase igual a um já salvo: oferece a copy existente antes de chamar o modelo
+                    duplicadas = copies_duplicadas(st.session_state.get('usuario_id'), brief) if BANCO_CONFIGURADO else []
+                    if duplicadas and duplicadas[0][0]:
+                        st.session_state.copy_existente = {"brief": brief, "copy": duplicadas[0][0],
+                                                           "similaridade": duplicadas[0][1]}
+                    else:
+                        st.session_state.copy_existente = None
+                        gerar_copy_da_sessao(brief)
+
+            if st.session_state.get('copy_existente'):
+                oferta = st.session_state.copy_existente
+                existente = oferta["copy"]
+                st.info(f"Você já salvou uma copy com briefing {oferta['similaridade']:.0%} parecido em "
+                        f"{formatar_data_copy(existente['data_geracao'])}.")
+                st.text_area("Copy existente:", existente['copy_gerada'], height=150, disabled=True)
+                col_usar, col_nova = st.columns(2)
+                if col_usar.button("♻️ Usar a copy existente", use_container_width=True):
+                    st.session_state.copy_existente = None
+                    st.session_state.generated_copy = existente['copy_gerada']
+                    st.session_state.form_data = {**{campo: existente.get(campo) for campo in CAMPOS_COPY},
+                                                  "copy_gerada": existente['copy_gerada'],
+                                                  "data_geracao": formatar_data_copy(existente['data_geracao']),
+                                                  "copy_id": existente['id']}
+                    st.rerun()
+                if col_nova.button("✨ Gerar nova mesmo assim", use_container_width=True):
+                    st.session_state.copy_existente = None
+                    gerar_copy_da_sessao(oferta["brief"])
+                    st.rerun()
 
         with col2:
             st.subheader("📄 Copy Gerada")
             if st.session_state.generated_copy:
                 st.text_area("Resultado:", st.session_state.generated_copy, height=300)
-                if SUPABASE_URL and SUPABASE_KEY:
+                if BANCO_CONFIGURADO and st.session_state.form_data.get('copy_id'):
+                    st.caption("Esta copy já está salva no histórico.")
+                elif BANCO_CONFIGURADO:
                     if st.button("💾 Salvar Copy no Supabase", use_container_width=True):
                         with st.spinner("Salvando no Supabase..."):
                             if st.session_state.form_data:
-                                salvar_no_supabase(st.session_state.form_data)
+                                if salvar_no_supabase(st.session_state.form_data):
+                                    remover_do_historico_sessao([st.session_state.form_data])
                             else:
                                 st.error("Nenhuma copy gerada para salvar.")
+                    if st.session_state.get('duplicata_pendente'):
+                        if st.button("💾 Salvar mesmo assim", use_container_width=True):
+                            if salvar_no_supabase(st.session_state.form_data, ignorar_duplicatas=True):
+                                remover_do_historico_sessao([st.session_state.form_data])
                 elif st.session_state.generated_copy:
                     st.info("Configure as variáveis de ambiente do Supabase para habilitar o salvamento.")
             else:
                 st.info("A copy gerada aparecerá aqui.")
 
-    with tab2:
+        # Geração em lote: mesmo briefing para várias plataformas e variantes A/B
+        with st.expander("📦 Geração em Lote (várias plataformas e variantes)"):
+            st.caption("Usa o briefing preenchido na barra lateral.")
+            plataformas_lote = st.multiselect(
+                "Plataformas:", plataforma_opcoes, default=plataforma_opcoes, key="plataformas_lote"
+            )
+            variantes_lote = st.number_input(
+                "Variantes por plataforma (A/B):", min_value=1, max_value=5, value=3, key="variantes_lote"
+            )
+            if st.button("🚀 Gerar Lote", use_container_width=True):
+                if not all([objetivo, publico_alvo, produto_servico, tom_de_voz, cta]) or not plataformas_lote:
+                    st.warning("Preencha o briefing e selecione ao menos uma plataforma.")
+                else:
+                    brief = {
+                        "objetivo": objetivo,
+                        "publico_alvo": publico_alvo,
+                        "produto_servico": produto_servico,
+                        "tom_de_voz": tom_de_voz,
+                        "cta": cta,
+                        "informacoes_adicionais": informacoes_adicionais
+                    }
+                    # Grade com um espaço reservado por plataforma, preenchido conforme cada uma termina
+                    colunas_grade = st.columns(len(plataformas_lote))
+                    espacos = {}
+                    for coluna_grade, plataforma_lote in zip(colunas_grade, plataformas_lote):
+                        with coluna_grade:
+                            st.markdown(f"**{plataforma_lote}**")
+                            espacos[plataforma_lote] = st.empty()
+                            espacos[plataforma_lote].info("⏳ Gerando...")
+
+                    data_geracao_lote = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+                    st.session_state.copies_lote = []
+                    for resultado in gerar_copies_em_lote(
+                        obter_cliente_openai(), brief, {p: int(variantes_lote) for p in plataformas_lote},
+                        TOKENS_POR_PLATAFORMA, MODELO_OPENAI, usuario_id=st.session_state.get('usuario_id')
+                    ):
+                        plataforma_lote = resultado["plataforma"]
+                        if resultado["erro"]:
+                            espacos[plataforma_lote].error(f"Erro: {resultado['erro']}")
+                            continue
+                        with espacos[plataforma_lote].container():
+                            for n_variante, texto in enumerate(resultado["copies"], start=1):
+                                st.text_area(
+                                    f"Variante {n_variante}", texto, height=200,
+                                    key=f"lote_{plataforma_lote}_{n_variante}"
+                                )
+                        salvar_consumo_tokens(
+                            resultado["total_tokens"], "copy", st.session_state.username,
+                            prompt_tokens=resultado["prompt_tokens"],
+                            cached_tokens=resultado["cached_tokens"],
+                            latencia_api=resultado["latencia_api"]
+                        )
+                        for texto in resultado["copies"]:
+                            item_lote = dict(brief, plataforma=plataforma_lote, copy_gerada=texto,
+                                             data_geracao=data_geracao_lote)
+                            item_lote.pop("informacoes_adicionais", None)
+                            st.session_state.copies_lote.append(item_lote)
+                            st.session_state.historico.append(item_lote)
+
+            if st.session_state.copies_lote and BANCO_CONFIGURADO:
+                st.write(f"{len(st.session_state.copies_lote)} copies geradas neste lote.")
+                if st.button("💾 Salvar Lote no Supabase", use_container_width=True):
+                    with st.spinner("Salvando no Supabase..."):
+                        if salvar_copies_em_lote(st.session_state.copies_lote):
+                            remover_do_historico_sessao(st.session_state.copies_lote)
+                            st.session_state.copies_lote = []
+
+    with tab2, trecho("aba: Histórico"):
         st.subheader("📚 Histórico de Copies")
-        
-        if not st.session_state.historico:
-            st.info("Nenhuma copy gerada ainda. O histórico aparecerá aqui após gerar algumas copies.")
-        else:
-            # Mostrar histórico em ordem reversa (mais recente primeiro)
-            for idx, item in enumerate(reversed(st.session_state.historico)):
-                with st.expander(f"Copy #{len(st.session_state.historico) - idx} - {item['plataforma']} - {item['data_geracao']}"):
-                    st.write(f"**Plataforma:** {item['plataforma']}")
-                    st.write(f"**Objetivo:** {item['objetivo']}")
-                    st.write(f"**Público-Alvo:** {item['publico_alvo']}")
-                    st.write(f"**Produto/Serviço:** {item['produto_servico']}")
-                    st.write(f"**Tom de Voz:** {item['tom_de_voz']}")
-                    st.write(f"**CTA:** {item['cta']}")
-                    st.write("**Copy Gerada:**")
-                    st.text_area("", item['copy_gerada'], height=200, key=f"copy_{idx}")
-                    
-                    # Botão para copiar a copy
-                    if st.button("📋 Copiar Copy", key=f"copy_btn_{idx}"):
-                        st.code(item['copy_gerada'])
-                        st.success("Copy copiada para a área de transferência!")
 
-    with tab3:
+        pode_consultar = bool(st.session_state.get('usuario_id') and BANCO_CONFIGURADO)
+        termo_busca = ""
+        if pode_consultar:
+            col_busca, col_tipo = st.columns([3, 2])
+            with col_busca:
+                termo_busca = st.text_input("🔎 Buscar em copies e análises", key="termo_busca",
+                                            placeholder="Ex.: black friday, clientes inativos").strip()
+            with col_tipo:
+                tipo_busca = st.radio("Buscar em:", list(TIPOS_BUSCA), horizontal=True, key="tipo_busca")
+
+        if termo_busca:
+            mostrar_resultados_busca(st.session_state.usuario_id, termo_busca, TIPOS_BUSCA[tipo_busca])
+        else:
+            if st.session_state.historico:
+                with st.expander(f"🕒 Geradas nesta sessão e ainda não salvas ({len(st.session_state.historico)})"):
+                    st.caption(f"Apenas as {HISTORICO_SESSAO_MAX} mais recentes ficam aqui; salve as que quiser manter.")
+                    # Mostrar histórico em ordem reversa (mais recente primeiro)
+                    for idx, item in enumerate(reversed(st.session_state.historico)):
+                        mostrar_copy_historico(item, f"Copy #{len(st.session_state.historico) - idx}", f"sessao_{idx}")
+
+            if pode_consultar:
+                mostrar_historico_copies(st.session_state.usuario_id)
+            elif not st.session_state.historico:
+                st.info("Nenhuma copy gerada ainda. O histórico aparecerá aqui após gerar algumas copies.")
+
+    with tab3, trecho("aba: Análise de Leads"):
         st.subheader("📊 Análise de Leads via CSV")
         
         # Configurações da análise
@@ -1888,10 +2299,10 @@ else:
                 key="objetivo_analise"
             )
         
-        # Upload de múltiplos arquivos CSV
+        # Upload de múltiplos arquivos (CSV, XLSX, Parquet ou JSONL)
         uploaded_files = st.file_uploader(
-            "Escolha um ou mais arquivos CSV com seus leads", 
-            type=['csv'],
+            "Escolha um ou mais arquivos com seus leads (CSV, XLSX, Parquet ou JSONL)",
+            type=extensoes_suportadas(),
             accept_multiple_files=True
         )
         
@@ -1899,12 +2310,15 @@ else:
             try:
                 # Lista para armazenar todos os DataFrames
                 dfs = []
+                leituras = []
                 total_leads = 0
                 
                 # Processar cada arquivo
                 for uploaded_file in uploaded_files:
-                    df = pd.read_csv(uploaded_file)
+                    with trecho("leitura do arquivo"):
+                        df, leitura = ler_leads(uploaded_file)
                     dfs.append(df)
+                    leituras.append(leitura)
                     total_leads += len(df)
                 
                 # Mostrar preview dos dados
@@ -1917,6 +2331,7 @@ else:
                     with tab:
                         st.write(f"**Arquivo {i+1}:** {uploaded_files[i].name}")
                         st.write(f"Total de leads neste arquivo: {len(dfs[i])}")
+                        st.caption(descrever_leitura(leituras[i]))
                         st.dataframe(dfs[i].head())
                         st.write("Colunas disponíveis:")
                         for col in dfs[i].columns:
@@ -1925,92 +2340,95 @@ else:
                 # Mostrar informações básicas do dataset combinado
                 st.subheader("ℹ️ Informações do Dataset Combinado")
                 st.write(f"Total de leads em todos os arquivos: {total_leads}")
+                mostrar_segmentacao_leads(dfs, tuple((arquivo.name, arquivo.size) for arquivo in uploaded_files))
                 
-                # Botão para iniciar análise
+                # Botão para iniciar análise: a análise roda em segundo plano, fora do script
                 if st.button("🔍 Iniciar Análise", type="primary"):
                     if not objetivo_analise:
                         st.warning("Por favor, defina um objetivo para a análise.")
                     else:
-                        with st.spinner("Analisando seus leads... Isso pode levar alguns minutos."):
-                            df_combinado = pd.concat(dfs, ignore_index=True)
-                            df_combinado = df_combinado.drop_duplicates()
-                            
-                            # Ajustar a chamada para receber três valores
-                            analise_texto_resultado, analise_db_id_retornado, tempo_proc_openai_retornado = analisar_leads_csv(
-                                df_combinado, plataforma_analise, objetivo_analise
+                        auth_user = supabase.auth.get_user()
+                        if not (auth_user and auth_user.user):
+                            st.error("Usuário não autenticado. Não é possível salvar a análise de leads.")
+                        else:
+                            usuario_id_analise = auth_user.user.id
+                            with trecho("deduplicação dos leads"):
+                                df_combinado, estatisticas_dedup = deduplicar_leads(dfs)
+                            st.info(descrever_deduplicacao(estatisticas_dedup))
+
+                            job_id, job_novo = obter_executor_jobs().submeter(
+                                usuario_id_analise, "analise_leads",
+                                fingerprint_dataframe(df_combinado, plataforma_analise, objetivo_analise),
+                                {"plataforma": plataforma_analise, "objetivo": objetivo_analise,
+                                 "total_leads": len(df_combinado),
+                                 "duplicatas_removidas": estatisticas_dedup["duplicatas_removidas"]},
+                                analisar_leads_csv, obter_cliente_openai(), supabase, df_combinado,
+                                plataforma_analise, objetivo_analise, usuario_id_analise
                             )
-                            
-                            if analise_texto_resultado and analise_db_id_retornado:
-                                st.session_state.analise_leads_conteudo_ia = analise_texto_resultado
-                                st.session_state.analise_id_atual_db = analise_db_id_retornado
-                                st.success("Análise concluída e salva no histórico!")
-                                
-                                # Salvar métricas usando o tempo de processamento retornado
-                                # A função salvar_metricas atualmente define "total_tokens": 0 e "tempo_processamento" 
-                                # para "analise" baseado no que é passado.
-                                metricas_payload_analise = {
-                                    "data": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
-                                    "plataforma": plataforma_analise,
-                                    "objetivo": objetivo_analise,
-                                    "total_leads": len(df_combinado),
-                                    "tempo_processamento": tempo_proc_openai_retornado # Passar o tempo correto
-                                }
-                                salvar_metricas({"analise": metricas_payload_analise})
-
-                            elif analise_texto_resultado is None and analise_db_id_retornado is None:
-                                # Erro já foi mostrado por analisar_leads_csv ou sua helper
-                                st.session_state.analise_leads_conteudo_ia = None
-                                st.session_state.analise_id_atual_db = None
-                            else: # Caso inesperado
-                                st.error("Ocorreu um erro inesperado durante a análise.")
+                            st.session_state.job_analise_id = job_id
+                            if job_novo:
                                 st.session_state.analise_leads_conteudo_ia = None
                                 st.session_state.analise_id_atual_db = None
-                
-                # Mostrar resultados da análise (usando a nova chave de session_state)
-                if st.session_state.get('analise_leads_conteudo_ia'):
-                    st.subheader("📊 Resultados da Análise")
-                    st.markdown(st.session_state.analise_leads_conteudo_ia)
-                    
-                    # Seção de feedback - só mostrar se a análise foi salva e temos um ID de DB
-                    if st.session_state.get('analise_id_atual_db'):
-                        st.subheader("💭 Feedback da Análise")
-                        # Usar uma chave de formulário única para evitar conflitos
-                        with st.form(f"feedback_form_nova_analise_{st.session_state.analise_id_atual_db}"):
-                            pontos_positivos = st.text_area("Pontos Positivos:", 
-                                placeholder="O que você achou mais útil nesta análise?", key=f"fp_pos_{st.session_state.analise_id_atual_db}")
-                            pontos_melhorar = st.text_area("Pontos a Melhorar:", 
-                                placeholder="O que poderia ser melhorado nesta análise?", key=f"fp_neg_{st.session_state.analise_id_atual_db}")
-                            nota = st.slider("Nota da Análise:", 1, 5, 3, key=f"fp_nota_{st.session_state.analise_id_atual_db}")
-                            feedback_submit = st.form_submit_button("Enviar Feedback")
-                            
-                            if feedback_submit:
-                                feedback_data_payload = {
-                                    "pontos_positivos": pontos_positivos,
-                                    "pontos_melhorar": pontos_melhorar,
-                                    "nota": nota
-                                }
-                                # Usar o ID UUID do banco de dados armazenado na session_state
-                                if salvar_feedback(st.session_state.analise_id_atual_db, feedback_data_payload):
-                                    st.success("Feedback enviado com sucesso! Obrigado por ajudar a melhorar nossas análises.")
-                                else:
-                                    st.error("Falha ao enviar o feedback.")
-                    else:
-                        if st.session_state.get('analise_leads_conteudo_ia'): # Só mostrar esta msg se houve tentativa de análise
-                            st.info("A análise precisa ser salva com sucesso no banco de dados antes de adicionar feedback.")
-                    
-                    if st.button("📋 Copiar Análise (Resultados)", key=f"copiar_analise_nova_{st.session_state.get('analise_id_atual_db', '')}"):
-                        st.code(st.session_state.analise_leads_conteudo_ia)
-                        st.success("Análise copiada para a área de transferência!")
+                                st.info("Análise enviada! Você pode continuar usando o app enquanto ela é processada.")
+                            else:
+                                st.info("Estes dados já foram enviados para análise com a mesma plataforma e objetivo. "
+                                        "Acompanhando a análise existente.")
             
             except Exception as e:
-                st.error(f"Erro ao processar os arquivos CSV: {e}")
-                st.info("Certifique-se de que os arquivos estão no formato CSV válido e contêm dados estruturados.")
+                st.error(f"Erro ao processar os arquivos: {e}")
+                st.info("Certifique-se de que os arquivos são CSV, XLSX, Parquet ou JSONL válidos e contêm dados estruturados.")
         else:
-            st.info("Faça upload de um ou mais arquivos CSV para começar a análise.")
+            st.info("Faça upload de um ou mais arquivos de leads para começar a análise.")
+
+        # Status e resultado da análise ficam fora do bloco de upload: sobrevivem a reruns e ao recarregar
+        job_atual = obter_executor_jobs().obter(st.session_state.job_analise_id) if st.session_state.get('job_analise_id') else None
+        if job_atual and job_atual['status'] in STATUS_ATIVOS:
+            acompanhar_job_analise()
+        elif job_atual and job_atual['status'] == STATUS_CONCLUIDO:
+            aplicar_resultado_job(job_atual)
+        elif job_atual and job_atual['status'] == STATUS_ERRO:
+            st.error(f"Erro ao analisar os leads: {job_atual['erro']}")
+
+        # Mostrar resultados da análise (usando a nova chave de session_state)
+        if st.session_state.get('analise_leads_conteudo_ia'):
+            st.subheader("📊 Resultados da Análise")
+            st.markdown(st.session_state.analise_leads_conteudo_ia)
+            
+            # Seção de feedback - só mostrar se a análise foi salva e temos um ID de DB
+            if st.session_state.get('analise_id_atual_db'):
+                st.subheader("💭 Feedback da Análise")
+                # Usar uma chave de formulário única para evitar conflitos
+                with st.form(f"feedback_form_nova_analise_{st.session_state.analise_id_atual_db}"):
+                    pontos_positivos = st.text_area("Pontos Positivos:", 
+                        placeholder="O que você achou mais útil nesta análise?", key=f"fp_pos_{st.session_state.analise_id_atual_db}")
+                    pontos_melhorar = st.text_area("Pontos a Melhorar:", 
+                        placeholder="O que poderia ser melhorado nesta análise?", key=f"fp_neg_{st.session_state.analise_id_atual_db}")
+                    nota = st.slider("Nota da Análise:", 1, 5, 3, key=f"fp_nota_{st.session_state.analise_id_atual_db}")
+                    feedback_submit = st.form_submit_button("Enviar Feedback")
+                    
+                    if feedback_submit:
+                        feedback_data_payload = {
+                            "pontos_positivos": pontos_positivos,
+                            "pontos_melhorar": pontos_melhorar,
+                            "nota": nota
+                        }
+                        # Usar o ID UUID do banco de dados armazenado na session_state
+                        if salvar_feedback(st.session_state.analise_id_atual_db, feedback_data_payload):
+                            st.success("Feedback enviado com sucesso! Obrigado por ajudar a melhorar nossas análises.")
+                        else:
+                            st.error("Falha ao enviar o feedback.")
+            else:
+                if st.session_state.get('analise_leads_conteudo_ia'): # Só mostrar esta msg se houve tentativa de análise
+                    st.info("A análise precisa ser salva com sucesso no banco de dados antes de adicionar feedback.")
+            
+            if st.button("📋 Copiar Análise (Resultados)", key=f"copiar_analise_nova_{st.session_state.get('analise_id_atual_db', '')}"):
+                st.code(st.session_state.analise_leads_conteudo_ia)
+                st.success("Análise copiada para a área de transferência!")
 
+        mostrar_jobs_recentes()
         mostrar_historico_analises()
 
-    with tab4:
+    with tab4, trecho("aba: Métricas"):
         st.subheader("📈 Métricas de Performance")
         
         metricas = carregar_metricas()
@@ -2067,7 +2485,118 @@ else:
                     mime="application/json"
                 )
 
-    with tab5:
-        gerar_dashboard()
+    with tab5, trecho("aba: Dashboard"):
+        # As abas são todas executadas a cada rerun: o dashboard (e o plotly) só carrega quando aberto
+        if st.session_state.get('dashboard_aberto') or st.button("📊 Abrir Dashboard", key="abrir_dashboard"):
+            st.session_state.dashboard_aberto = True
+            gerar_dashboard()
+
+    with tab6, trecho("aba: Personalização em Massa"):
+        st.subheader("✉️ Mensagens Personalizadas por Lead")
+        st.markdown("Gera uma mensagem de WhatsApp ou SMS para cada lead do CSV. Leads com o mesmo perfil "
+                    "compartilham uma única chamada à IA; os marcadores (ex: nome) são preenchidos lead a lead.")
+
+        arquivo_personalizacao = st.file_uploader("Arquivo CSV com os leads", type=['csv'], key="csv_personalizacao")
+        if arquivo_personalizacao:
+            from personalizacao_lote import personalizar_leads, salvar_upload_em_disco
+
+            # Salvar em disco uma única vez por upload: o pipeline lê o arquivo em blocos
+            if st.session_state.get('personalizacao_upload_id') != arquivo_personalizacao.file_id:
+                caminho_csv, hash_arquivo = salvar_upload_em_disco(arquivo_personalizacao)
+                st.session_state.personalizacao_upload_id = arquivo_personalizacao.file_id
+                st.session_state.personalizacao_arquivo = (caminho_csv, hash_arquivo)
+            caminho_csv, hash_arquivo = st.session_state.personalizacao_arquivo
+
+            colunas_csv = list(pd.read_csv(caminho_csv, nrows=0, **opcoes_csv(caminho_csv)).columns)
+            col1, col2 = st.columns(2)
+            with col1:
+                plataforma_personalizacao = st.selectbox(
+                    "Plataforma:", ["Disparo de WhatsApp", "Copy para SMS"], key="plataforma_personalizacao"
+                )
+                campos_grupo = st.multiselect(
+                    "Campos que definem o perfil (uma chamada por combinação):", colunas_csv,
+                    key="campos_grupo_personalizacao"
+                )
+                campos_marcadores = st.multiselect(
+                    "Campos preenchidos lead a lead (marcadores):", colunas_csv,
+                    default=[c for c in colunas_csv if c.lower() in ("nome", "name", "primeiro_nome")],
+                    key="campos_marcadores_personalizacao"
+                )
+            with col2:
+                objetivo_personalizacao = st.text_input("🎯 Objetivo:", key="objetivo_personalizacao")
+                produto_personalizacao = st.text_input("🛍️ Produto/Serviço:", key="produto_personalizacao")
+                tom_personalizacao = st.selectbox(
+                    "🗣️ Tom de Voz:", ["Formal", "Informal", "Amigável", "Persuasivo", "Divertido", "Urgente"],
+                    key="tom_personalizacao"
+                )
+                cta_personalizacao = st.text_input("📢 Call to Action (CTA):", key="cta_personalizacao")
+
+            if st.button("🚀 Gerar Mensagens Personalizadas", type="primary"):
+                if not all([objetivo_personalizacao, produto_personalizacao, cta_personalizacao]):
+                    st.warning("Preencha objetivo, produto/serviço e CTA.")
+                else:
+                    brief_personalizacao = {
+                        "objetivo": objetivo_personalizacao,
+                        "produto_servico": produto_personalizacao,
+                        "tom_de_voz": tom_personalizacao,
+                        "cta": cta_personalizacao
+                    }
+                    painel_progresso = st.empty()
+
+                    def mostrar_progresso(estatisticas):
+                        with painel_progresso.container():
+                            c1, c2, c3, c4 = st.columns(4)
+                            c1.metric("Grupos", f"{estatisticas['grupos_concluidos']}/{estatisticas['total_grupos']}")
+                            c2.metric("Leads Escritos", f"{estatisticas['leads_escritos']:,}/{estatisticas['total_leads']:,}")
+                            c3.metric("Leads/s", f"{estatisticas['leads_por_segundo']:,.0f}")
+                            c4.metric("Tokens/Lead", f"{estatisticas['tokens_por_lead']:.2f}")
 
-    st.markdown("---")
\ No newline at end of file
+                    try:
+                        resultado_personalizacao = personalizar_leads(
+                            obter_cliente_openai(), caminho_csv, hash_arquivo, campos_grupo, campos_marcadores,
+                            plataforma_personalizacao, brief_personalizacao, MODELO_OPENAI,
+                            ao_progredir=mostrar_progresso, usuario_id=st.session_state.get('usuario_id')
+                        )
+                        st.session_state.resultado_personalizacao = resultado_personalizacao
+                        tokens_novos = resultado_personalizacao["tokens_novos"]
+                        if tokens_novos:
+                            salvar_consumo_tokens(tokens_novos, "personalizacao", st.session_state.username)
+                    except Exception as e:
+                        st.error(f"Erro na personalização em massa: {e}")
+                        st.info("O progresso foi salvo; clique novamente para retomar de onde parou.")
+
+            resultado_personalizacao = st.session_state.get('resultado_personalizacao')
+            if resultado_personalizacao:
+                if resultado_personalizacao["grupos_retomados"]:
+                    st.info(f"{resultado_personalizacao['grupos_retomados']} grupos retomados do checkpoint.")
+                if resultado_personalizacao["grupos_com_erro"]:
+                    st.warning(f"{resultado_personalizacao['grupos_com_erro']} grupos falharam "
+                               f"({resultado_personalizacao['leads_sem_mensagem']} leads sem mensagem). "
+                               "Gere novamente para tentar só os que faltam.")
+                if resultado_personalizacao.get("caminho_saida"):
+                    with open(resultado_personalizacao["caminho_saida"], "rb") as arquivo_saida:
+                        st.download_button(
+                            "📥 Baixar CSV com Mensagens",
+                            data=arquivo_saida,
+                            file_name=f"mensagens_personalizadas_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+                            mime="text/csv"
+                        )
+        else:
+            st.info("Faça upload de um CSV para começar.")
+
+    st.markdown("---")
+
+    # Por último, para incluir as consultas deste rerun
+    if MODO_DEBUG:
+        mostrar_painel_cache()
+    if INSTRUMENTACAO_HABILITADA:
+        registro_rerun = finalizar_rerun()
+        if MODO_DEBUG and registro_rerun is not None:
+            mostrar_painel_supabase(registro_rerun)
+    encerrar_perfil_rerun()
+
+    # Realtime: a versão vista é registrada depois das escritas deste rerun, então só
+    # alterações vindas de fora (outros usuários da conta, jobs, API) disparam um novo rerun
+    if REALTIME_HABILITADO and st.session_state.get('usuario_id') and iniciar_realtime() is not None:
+        st.session_state.versao_cache_vista = cache_consultas.versao(st.session_state.usuario_id)
+        observar_alteracoes_realtime(st.session_state.usuario_id)
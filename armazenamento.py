@@ -0,0 +1,578 @@
+"""
+Backends de armazenamento do app, escolhidos por MENCARE_ARMAZENAMENTO.
+
+A interface é o subconjunto do cliente do Supabase (postgrest-py) que o app já usa:
+
+    cliente.table("copies").select("*").eq("usuario_id", uid).order("data", desc=True).limit(20).execute()
+    cliente.table("tags").insert([...]).execute()
+    cliente.rpc("percentis_chamadas_llm", {...}).execute()
+    cliente.auth.sign_in_with_password(...) / get_user() / sign_out()
+
+- supabase: o cliente oficial, apontado para SUPABASE_URL (padrão).
+- sqlite: banco embutido em CAMINHO_BANCO_LOCAL (modo WAL, mesmas tabelas e índices do
+  supabase_schema.sql). Para desenvolvimento, benchmarks e instalações locais de um só
+  cliente: as leituras não saem do processo.
+
+Os helpers de supabase_config.py e as consultas do app.py funcionam sem mudança nos dois.
+Usuários do backend sqlite são criados com:
+
+    python armazenamento.py criar-usuario email@exemplo.com
+"""
+import argparse
+import getpass
+import hashlib
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import unicodedata
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+ARMAZENAMENTO = os.getenv("MENCARE_ARMAZENAMENTO", "supabase").lower()
+CAMINHO_BANCO_LOCAL = os.getenv("CAMINHO_BANCO_LOCAL", os.path.join(".mencare", "mencare.db"))
+ITERACOES_SENHA = 200_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    senha_hash TEXT NOT NULL,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS copies (
+    id TEXT PRIMARY KEY,
+    plataforma TEXT NOT NULL,
+    objetivo TEXT NOT NULL,
+    publico_alvo TEXT NOT NULL,
+    produto_servico TEXT NOT NULL,
+    tom_de_voz TEXT NOT NULL,
+    cta TEXT NOT NULL,
+    copy_gerada TEXT NOT NULL,
+    data_geracao TEXT,
+    usuario_id TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS analises_leads (
+    id TEXT PRIMARY KEY,
+    data TEXT,
+    plataforma TEXT NOT NULL,
+    objetivo TEXT NOT NULL,
+    total_leads INTEGER NOT NULL,
+    colunas TEXT NOT NULL,
+    analise TEXT NOT NULL,
+    tempo_processamento REAL NOT NULL,
+    resumo_estatistico TEXT NOT NULL,
+    usuario_id TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    id TEXT PRIMARY KEY,
+    analise_id TEXT REFERENCES analises_leads(id),
+    data TEXT,
+    pontos_positivos TEXT,
+    pontos_melhorar TEXT,
+    nota INTEGER CHECK (nota >= 1 AND nota <= 5),
+    editado INTEGER DEFAULT 0,
+    ultima_edicao TEXT,
+    historico_edicoes TEXT DEFAULT '[]',
+    usuario_id TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS metricas (
+    id TEXT PRIMARY KEY,
+    data TEXT,
+    tipo TEXT NOT NULL,
+    total_tokens INTEGER DEFAULT 0,
+    prompt_tokens INTEGER DEFAULT 0,
+    prompt_tokens_estimados INTEGER DEFAULT 0,
+    cached_tokens INTEGER DEFAULT 0,
+    latencia_api REAL DEFAULT 0,
+    plataforma TEXT NOT NULL,
+    tempo_processamento REAL DEFAULT 0,
+    usuario_id TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS metricas_plataforma (
+    id TEXT PRIMARY KEY,
+    data TEXT,
+    plataforma TEXT NOT NULL,
+    metricas TEXT NOT NULL,
+    usuario_id TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS tags (
+    id TEXT PRIMARY KEY,
+    analise_id TEXT REFERENCES analises_leads(id),
+    categoria TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    usuario_id TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS chamadas_llm (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    criado_em TEXT NOT NULL,
+    usuario_id TEXT,
+    operacao TEXT NOT NULL,
+    modelo TEXT,
+    plataforma TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    ttft_ms INTEGER,
+    latencia_ms INTEGER NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 1,
+    resultado TEXT NOT NULL,
+    leads INTEGER NOT NULL DEFAULT 0,
+    custo_usd REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_copies_usuario_id ON copies(usuario_id);
+CREATE INDEX IF NOT EXISTS idx_copies_usuario_data_geracao ON copies(usuario_id, data_geracao DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analises_leads_usuario_id ON analises_leads(usuario_id);
+CREATE INDEX IF NOT EXISTS idx_feedback_usuario_id ON feedback(usuario_id);
+CREATE INDEX IF NOT EXISTS idx_metricas_usuario_id ON metricas(usuario_id);
+CREATE INDEX IF NOT EXISTS idx_metricas_plataforma_usuario_id ON metricas_plataforma(usuario_id);
+CREATE INDEX IF NOT EXISTS idx_tags_usuario_id ON tags(usuario_id);
+CREATE INDEX IF NOT EXISTS idx_chamadas_llm_usuario_criado_em ON chamadas_llm(usuario_id, criado_em);
+-- BRIN no Postgres; no SQLite, B-tree comum
+CREATE INDEX IF NOT EXISTS idx_chamadas_llm_criado_em ON chamadas_llm(criado_em);
+-- Busca textual: FTS5 no lugar das colunas tsvector + GIN, sincronizado por triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS copies_busca USING fts5(
+    produto_servico, copy_gerada, content='copies', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS copies_busca_insert AFTER INSERT ON copies BEGIN
+    INSERT INTO copies_busca(rowid, produto_servico, copy_gerada)
+    VALUES (new.rowid, new.produto_servico, new.copy_gerada);
+END;
+CREATE TRIGGER IF NOT EXISTS copies_busca_delete AFTER DELETE ON copies BEGIN
+    INSERT INTO copies_busca(copies_busca, rowid, produto_servico, copy_gerada)
+    VALUES ('delete', old.rowid, old.produto_servico, old.copy_gerada);
+END;
+CREATE TRIGGER IF NOT EXISTS copies_busca_update AFTER UPDATE ON copies BEGIN
+    INSERT INTO copies_busca(copies_busca, rowid, produto_servico, copy_gerada)
+    VALUES ('delete', old.rowid, old.produto_servico, old.copy_gerada);
+    INSERT INTO copies_busca(rowid, produto_servico, copy_gerada)
+    VALUES (new.rowid, new.produto_servico, new.copy_gerada);
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS analises_leads_busca USING fts5(
+    objetivo, analise, content='analises_leads', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS analises_leads_busca_insert AFTER INSERT ON analises_leads BEGIN
+    INSERT INTO analises_leads_busca(rowid, objetivo, analise) VALUES (new.rowid, new.objetivo, new.analise);
+END;
+CREATE TRIGGER IF NOT EXISTS analises_leads_busca_delete AFTER DELETE ON analises_leads BEGIN
+    INSERT INTO analises_leads_busca(analises_leads_busca, rowid, objetivo, analise)
+    VALUES ('delete', old.rowid, old.objetivo, old.analise);
+END;
+CREATE TRIGGER IF NOT EXISTS analises_leads_busca_update AFTER UPDATE ON analises_leads BEGIN
+    INSERT INTO analises_leads_busca(analises_leads_busca, rowid, objetivo, analise)
+    VALUES ('delete', old.rowid, old.objetivo, old.analise);
+    INSERT INTO analises_leads_busca(rowid, objetivo, analise) VALUES (new.rowid, new.objetivo, new.analise);
+END;
+"""
+
+# Tipos que o SQLite não tem: gravados como texto/inteiro e convertidos na leitura
+_COLUNAS_JSON = {
+    "analises_leads": {"colunas", "resumo_estatistico"},
+    "feedback": {"historico_edicoes"},
+    "metricas_plataforma": {"metricas"},
+}
+_COLUNAS_BOOL = {"feedback": {"editado"}}
+# TIMESTAMPTZ: normalizadas para ISO em UTC, para que comparar texto equivalha a comparar datas
+_COLUNAS_DATA = {"data", "data_geracao", "created_at", "updated_at", "ultima_edicao", "criado_em"}
+_IDENTIFICADOR = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_TABELAS_BUSCA = ("copies_busca", "analises_leads_busca")
+
+
+def _agora():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _normalizar_data(valor):
+    """ISO em UTC; sem fuso, o valor é tratado como UTC (como na sessão do Supabase)."""
+    if not isinstance(valor, str):
+        return valor
+    try:
+        momento = datetime.fromisoformat(valor.replace("Z", "+00:00"))
+    except ValueError:
+        return valor
+    if momento.tzinfo is None:
+        return momento.replace(tzinfo=timezone.utc).isoformat()
+    return momento.astimezone(timezone.utc).isoformat()
+
+
+def _identificador(nome):
+    nome = nome.strip()
+    if not _IDENTIFICADOR.match(nome):
+        raise ValueError(f"Identificador inválido: {nome!r}")
+    return f'"{nome}"'
+
+
+def termos_busca(consulta):
+    """Palavras da consulta em minúsculas, sem acentos (busca dos backends sem Postgres)."""
+    sem_acentos = unicodedata.normalize("NFKD", consulta or "").encode("ascii", "ignore").decode("ascii")
+    return re.findall(r"\w+", sem_acentos.lower())
+
+
+def _hash_senha(senha, sal=None):
+    sal = sal or secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), bytes.fromhex(sal), ITERACOES_SENHA)
+    return f"pbkdf2_sha256${ITERACOES_SENHA}${sal}${digest.hex()}"
+
+
+def _senha_confere(senha, senha_hash):
+    try:
+        _, iteracoes, sal, esperado = senha_hash.split("$")
+    except ValueError:
+        return False
+    digest = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), bytes.fromhex(sal), int(iteracoes))
+    return secrets.compare_digest(digest.hex(), esperado)
+
+
+class _ConsultaSQLite:
+    """Query builder compatível com o subconjunto do postgrest-py usado no app, traduzido para SQL."""
+
+    def __init__(self, cliente, tabela):
+        self._cliente = cliente
+        self._tabela = tabela
+        self._operacao = "select"
+        self._colunas = "*"
+        self._contar = None
+        self._dados = None
+        self._conflito = None
+        self._filtros = []
+        self._parametros = []
+        self._ordem = []
+        self._limite = None
+        self._offset = 0
+        self._unico = False
+
+    # Operações
+    def select(self, colunas="*", count=None):
+        self._operacao, self._colunas, self._contar = "select", colunas, count
+        return self
+
+    def insert(self, dados):
+        self._operacao, self._dados = "insert", dados
+        return self
+
+    def upsert(self, dados, on_conflict=None):
+        self._operacao, self._dados, self._conflito = "upsert", dados, on_conflict or "id"
+        return self
+
+    def update(self, dados):
+        self._operacao, self._dados = "update", dados
+        return self
+
+    def delete(self):
+        self._operacao = "delete"
+        return self
+
+    # Filtros
+    def _filtro(self, coluna, operador, valor):
+        self._filtros.append(f"{_identificador(coluna)} {operador} ?")
+        self._parametros.append(self._cliente.codificar(self._tabela, coluna, valor))
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(coluna, "=", valor)
+
+    def neq(self, coluna, valor):
+        return self._filtro(coluna, "!=", valor)
+
+    def gt(self, coluna, valor):
+        return self._filtro(coluna, ">", valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro(coluna, ">=", valor)
+
+    def lt(self, coluna, valor):
+        return self._filtro(coluna, "<", valor)
+
+    def lte(self, coluna, valor):
+        return self._filtro(coluna, "<=", valor)
+
+    def in_(self, coluna, valores):
+        valores = list(valores)
+        if not valores:
+            self._filtros.append("0")
+            return self
+        self._filtros.append(f"{_identificador(coluna)} IN ({','.join('?' * len(valores))})")
+        self._parametros.extend(self._cliente.codificar(self._tabela, coluna, v) for v in valores)
+        return self
+
+    def match(self, criterios):
+        for coluna, valor in criterios.items():
+            self.eq(coluna, valor)
+        return self
+
+    def order(self, coluna, desc=False):
+        # Padrão do Postgres: nulos por último em ASC e primeiro em DESC
+        self._ordem.append(f"{_identificador(coluna)} {'DESC NULLS FIRST' if desc else 'ASC NULLS LAST'}")
+        return self
+
+    def limit(self, quantidade):
+        self._limite = quantidade
+        return self
+
+    def range(self, inicio, fim):
+        self._offset, self._limite = inicio, fim - inicio + 1
+        return self
+
+    def maybe_single(self):
+        self._unico = True
+        return self
+
+    # Execução
+    def _where(self):
+        return f" WHERE {' AND '.join(self._filtros)}" if self._filtros else ""
+
+    def _inserir(self, conn):
+        registros = self._dados if isinstance(self._dados, list) else [self._dados]
+        if not registros:
+            return []
+        colunas_tabela = self._cliente.colunas(self._tabela)
+        tabela = _identificador(self._tabela)
+        inseridos = []
+        for registro in registros:
+            linha = dict(registro)
+            agora = _agora()
+            if "id" not in linha and self._tabela != "chamadas_llm":
+                linha["id"] = str(uuid.uuid4())
+            for coluna in ("created_at", "updated_at", "data", "data_geracao", "criado_em"):
+                if coluna in colunas_tabela and linha.get(coluna) is None:
+                    linha[coluna] = agora
+            colunas = list(linha)
+            valores = [self._cliente.codificar(self._tabela, c, linha[c]) for c in colunas]
+            sql = (f"INSERT INTO {tabela} ({', '.join(_identificador(c) for c in colunas)}) "
+                   f"VALUES ({', '.join('?' * len(colunas))})")
+            if self._operacao == "upsert":
+                alvo = [c.strip() for c in self._conflito.split(",")]
+                atualizar = [c for c in colunas if c not in alvo]
+                sql += f" ON CONFLICT ({', '.join(_identificador(c) for c in alvo)}) "
+                sql += (f"DO UPDATE SET {', '.join(f'{_identificador(c)} = excluded.{_identificador(c)}' for c in atualizar)}"
+                        if atualizar else "DO NOTHING")
+            inseridos.extend(conn.execute(sql + " RETURNING *", valores).fetchall())
+        return inseridos
+
+    def execute(self):
+        tabela = _identificador(self._tabela)
+        conn = self._cliente.conexao()
+        contagem = None
+        with conn:
+            if self._operacao in ("insert", "upsert"):
+                linhas = self._inserir(conn)
+            elif self._operacao == "update":
+                dados = dict(self._dados)
+                if "updated_at" in self._cliente.colunas(self._tabela):
+                    dados.setdefault("updated_at", _agora())  # trigger update_updated_at_column
+                atribuicoes = ", ".join(f"{_identificador(c)} = ?" for c in dados)
+                valores = [self._cliente.codificar(self._tabela, c, v) for c, v in dados.items()]
+                linhas = conn.execute(f"UPDATE {tabela} SET {atribuicoes}{self._where()} RETURNING *",
+                                      valores + self._parametros).fetchall()
+            elif self._operacao == "delete":
+                linhas = conn.execute(f"DELETE FROM {tabela}{self._where()} RETURNING *", self._parametros).fetchall()
+            else:
+                colunas = "*" if self._colunas.strip() == "*" else ", ".join(
+                    _identificador(c) for c in self._colunas.split(",")
+                )
+                sql = f"SELECT {colunas} FROM {tabela}{self._where()}"
+                if self._ordem:
+                    sql += f" ORDER BY {', '.join(self._ordem)}"
+                if self._limite is not None or self._offset:
+                    sql += f" LIMIT {int(self._limite if self._limite is not None else -1)} OFFSET {int(self._offset)}"
+                linhas = conn.execute(sql, self._parametros).fetchall()
+                if self._contar:
+                    contagem = conn.execute(f"SELECT COUNT(*) FROM {tabela}{self._where()}",
+                                            self._parametros).fetchone()[0]
+        dados = [self._cliente.decodificar(self._tabela, linha) for linha in linhas]
+        if self._unico:
+            dados = dados[0] if dados else None
+        return SimpleNamespace(data=dados, count=contagem, error=None)
+
+
+class _AuthLocal:
+    """Login contra a tabela users do banco local (substitui o Supabase Auth)."""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self._usuario = None
+
+    def sign_in_with_password(self, credenciais):
+        resposta = self._cliente.table("users").select("id, email, senha_hash") \
+            .eq("email", credenciais.get("email")).maybe_single().execute()
+        if not resposta.data or not _senha_confere(credenciais.get("password") or "", resposta.data["senha_hash"]):
+            raise ValueError("E-mail ou senha inválidos")
+        self._usuario = SimpleNamespace(id=resposta.data["id"], email=resposta.data["email"])
+        return SimpleNamespace(user=self._usuario)
+
+    def get_user(self):
+        return SimpleNamespace(user=self._usuario)
+
+    def sign_out(self):
+        self._usuario = None
+
+
+_SQL_BUSCA = """
+SELECT 'copy' AS tipo, c.id, c.plataforma, c.produto_servico AS titulo, c.data_geracao AS data,
+       -bm25(copies_busca, 2.0, 1.0) AS relevancia, snippet(copies_busca, 1, '**', '**', ' … ', 24) AS trecho
+FROM copies_busca JOIN copies c ON c.rowid = copies_busca.rowid
+WHERE copies_busca MATCH :consulta AND c.usuario_id = :usuario_id AND :tipo IN ('', 'copy')
+UNION ALL
+SELECT 'analise', a.id, a.plataforma, a.objetivo, a.data,
+       -bm25(analises_leads_busca, 2.0, 1.0), snippet(analises_leads_busca, 1, '**', '**', ' … ', 24)
+FROM analises_leads_busca JOIN analises_leads a ON a.rowid = analises_leads_busca.rowid
+WHERE analises_leads_busca MATCH :consulta AND a.usuario_id = :usuario_id AND :tipo IN ('', 'analise')
+ORDER BY relevancia DESC, data DESC
+LIMIT :limite OFFSET :offset
+"""
+
+
+def _buscar_texto(cliente, p_usuario_id, p_consulta, p_tipo=None, p_limite=10, p_offset=0):
+    # Sem stemming do Postgres: cada palavra vale como prefixo ("promo" encontra "promoção")
+    termos = termos_busca(p_consulta)
+    if not termos:
+        return []
+    consulta = " ".join(f'"{termo}"*' for termo in termos)
+    linhas = cliente.conexao().execute(_SQL_BUSCA, {
+        "consulta": consulta, "usuario_id": p_usuario_id, "tipo": p_tipo or "", "limite": p_limite,
+        "offset": p_offset,
+    }).fetchall()
+    return [dict(linha) for linha in linhas]
+
+
+def _percentis_chamadas_llm(cliente, p_usuario_id, p_desde):
+    from telemetria_llm import agregar_percentis
+
+    linhas = cliente.table("chamadas_llm").select("*").eq("usuario_id", p_usuario_id) \
+        .gte("criado_em", p_desde).execute().data
+    return agregar_percentis(linhas)
+
+
+FUNCOES_RPC = {
+    "percentis_chamadas_llm": _percentis_chamadas_llm,
+    "buscar_texto": _buscar_texto,
+}
+
+
+class ClienteSQLite:
+    """Cliente com a mesma interface do Supabase sobre um arquivo SQLite em modo WAL."""
+
+    def __init__(self, caminho=CAMINHO_BANCO_LOCAL):
+        self.caminho = caminho
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        # Uma conexão por thread (cada sessão do Streamlit roda na sua); o WAL deixa leitores
+        # e o escritor trabalharem ao mesmo tempo
+        self._local = threading.local()
+        self._colunas = {}
+        with self.conexao() as conn:
+            existentes = {linha[0] for linha in conn.execute("SELECT name FROM sqlite_master")}
+            conn.executescript(_SCHEMA)
+            # Índice de busca criado agora num banco que já tinha linhas: indexar o que existe
+            for tabela in _TABELAS_BUSCA:
+                if tabela not in existentes:
+                    conn.execute(f"INSERT INTO {tabela}({tabela}) VALUES ('rebuild')")
+        self.auth = _AuthLocal(self)
+
+    def conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def colunas(self, tabela):
+        if tabela not in self._colunas:
+            linhas = self.conexao().execute(f"PRAGMA table_info({_identificador(tabela)})").fetchall()
+            self._colunas[tabela] = {linha["name"] for linha in linhas}
+        return self._colunas[tabela]
+
+    def codificar(self, tabela, coluna, valor):
+        if isinstance(valor, (dict, list)) or coluna in _COLUNAS_JSON.get(tabela, ()):
+            return None if valor is None else json.dumps(valor, ensure_ascii=False, default=str)
+        if coluna in _COLUNAS_DATA:
+            return _normalizar_data(valor)
+        if isinstance(valor, bool):
+            return int(valor)
+        return valor
+
+    def decodificar(self, tabela, linha):
+        registro = dict(linha)
+        for coluna in _COLUNAS_JSON.get(tabela, ()):
+            if isinstance(registro.get(coluna), str):
+                registro[coluna] = json.loads(registro[coluna])
+        for coluna in _COLUNAS_BOOL.get(tabela, ()):
+            if registro.get(coluna) is not None:
+                registro[coluna] = bool(registro[coluna])
+        return registro
+
+    def table(self, nome):
+        return _ConsultaSQLite(self, nome)
+
+    def rpc(self, funcao, params=None):
+        implementacao = FUNCOES_RPC.get(funcao)
+        if implementacao is None:
+            raise RuntimeError(f"Função {funcao} não existe no armazenamento local")
+        return SimpleNamespace(execute=lambda: SimpleNamespace(
+            data=implementacao(self, **(params or {})), count=None, error=None
+        ))
+
+    def criar_usuario(self, email, senha):
+        """Cria (ou redefine a senha de) um usuário do login local e retorna o id."""
+        existente = self.table("users").select("id").eq("email", email).maybe_single().execute().data
+        if existente:
+            self.table("users").update({"senha_hash": _hash_senha(senha)}).eq("id", existente["id"]).execute()
+            return existente["id"]
+        return self.table("users").insert({"email": email, "senha_hash": _hash_senha(senha)}).execute().data[0]["id"]
+
+
+def _cliente_supabase():
+    from supabase import create_client
+
+    return create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+
+BACKENDS = {
+    "supabase": _cliente_supabase,
+    "sqlite": lambda: ClienteSQLite(CAMINHO_BANCO_LOCAL),
+}
+
+
+def criar_cliente(backend=None):
+    """Cliente do backend configurado (MENCARE_ARMAZENAMENTO) ou do indicado."""
+    backend = (backend or ARMAZENAMENTO).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"MENCARE_ARMAZENAMENTO inválido: {backend} (use {' ou '.join(BACKENDS)})")
+    return BACKENDS[backend]()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Administração do armazenamento local (SQLite).")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    criar = subcomandos.add_parser("criar-usuario", help="cria um usuário para o login local")
+    criar.add_argument("email")
+    parser.add_argument("--banco", default=CAMINHO_BANCO_LOCAL)
+    args = parser.parse_args()
+    if args.comando == "criar-usuario":
+        senha = getpass.getpass("Senha: ")
+        usuario_id = ClienteSQLite(args.banco).criar_usuario(args.email, senha)
+        print(f"Usuário {args.email} criado com id {usuario_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Teste de carga da API (api.py) contra OpenAI e Supabase falsos, em processo.
+
+Uso:
+    python benchmarks/carga_api.py --requisicoes 500 --concorrencia 50 --latencia-openai 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requisicoes", type=int, default=500)
+    parser.add_argument("--concorrencia", type=int, default=50)
+    parser.add_argument("--latencia-openai", type=float, default=0.2, help="segundos por chamada à OpenAI falsa")
+    parser.add_argument("--latencia-supabase", type=float, default=0.0, help="segundos por consulta ao Supabase falso")
+    parser.add_argument("--endpoint", choices=["copies", "historico"], default="copies")
+    parser.add_argument("--salvar", action="store_true", help="também persiste cada copy gerada")
+    return parser.parse_args()
+
+
+async def _executar(args):
+    import httpx
+
+    from api import criar_app
+    from clientes_falsos import ClienteOpenAIFalso, SupabaseEmMemoria
+
+    supabase = SupabaseEmMemoria(latencia=args.latencia_supabase)
+    app = criar_app(ClienteOpenAIFalso(latencia=args.latencia_openai), supabase, executor_jobs=object(),
+                     chaves_usuarios={"chave-carga": "usuario-carga"})
+    cabecalhos = {"Authorization": "Bearer chave-carga"}
+    pedido = {
+        "plataforma": "Disparo de WhatsApp", "objetivo": "Vender", "publico_alvo": "Adultos",
+        "produto_servico": "Curso", "tom_de_voz": "Amigável", "cta": "Compre agora", "salvar": args.salvar
+    }
+    latencias = []
+    erros = 0
+    semaforo = asyncio.Semaphore(args.concorrencia)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://carga") as cliente:
+        async def uma_requisicao():
+            nonlocal erros
+            async with semaforo:
+                inicio = time.perf_counter()
+                if args.endpoint == "copies":
+                    resposta = await cliente.post("/copies", json=pedido, headers=cabecalhos)
+                else:
+                    resposta = await cliente.get("/copies?limite=20", headers=cabecalhos)
+                latencias.append(time.perf_counter() - inicio)
+                if resposta.status_code >= 400:
+                    erros += 1
+
+        inicio_total = time.perf_counter()
+        await asyncio.gather(*(uma_requisicao() for _ in range(args.requisicoes)))
+        duracao = time.perf_counter() - inicio_total
+
+    latencias.sort()
+    return {
+        "endpoint": args.endpoint,
+        "requisicoes": args.requisicoes,
+        "concorrencia": args.concorrencia,
+        "erros": erros,
+        "duracao_s": round(duracao, 3),
+        "requisicoes_por_segundo": round(args.requisicoes / duracao, 1),
+        "latencia_p50_ms": round(statistics.median(latencias) * 1000, 1),
+        "latencia_p95_ms": round(latencias[int(len(latencias) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def main():
+    args = _argumentos()
+    # O limitador de taxa é lido na importação: liberar a concorrência pedida no teste
+    os.environ.setdefault("OPENAI_MAX_CONCORRENCIA", str(args.concorrencia))
+    os.environ.setdefault("OPENAI_RPM", "1000000")
+    print(json.dumps(asyncio.run(_executar(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Dados sintéticos para os benchmarks: CSVs de leads de qualquer tamanho e um Supabase em
+memória (clientes_falsos.SupabaseEmMemoria) populado com volumes realistas de uma conta.
+
+Os CSVs são gerados em blocos e ficam em cache em disco (mesmo tamanho e semente = mesmo
+arquivo), então o CSV de 1M de linhas só é escrito na primeira execução.
+"""
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+DIRETORIO_DADOS = os.getenv("DIRETORIO_DADOS_BENCHMARK", os.path.join(".mencare", "benchmarks"))
+TAMANHO_BLOCO_CSV = 100_000
+
+CIDADES = [("São Paulo", "SP"), ("Rio de Janeiro", "RJ"), ("Belo Horizonte", "MG"), ("Curitiba", "PR"),
+           ("Porto Alegre", "RS"), ("Salvador", "BA"), ("Recife", "PE"), ("Fortaleza", "CE"),
+           ("Brasília", "DF"), ("Goiânia", "GO"), ("Campinas", "SP"), ("Florianópolis", "SC")]
+ORIGENS = ["Instagram", "Google Ads", "Indicação", "Facebook", "Site", "WhatsApp", "Evento"]
+INTERESSES = ["Curso online", "Consultoria", "Assinatura", "Produto físico", "Mentoria", "E-book"]
+STATUS = ["novo", "contatado", "qualificado", "cliente", "perdido"]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Henrique", "Isabela", "João",
+         "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael", "Sofia", "Thiago", "Vanessa", "Yuri"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Carvalho", "Ferreira", "Rodrigues",
+              "Almeida", "Costa", "Gomes", "Martins", "Araújo", "Barbosa"]
+PLATAFORMAS = ["Disparo de WhatsApp", "Email Marketing", "Conteúdo para Redes Sociais (Feed)",
+               "Conteúdo para Redes Sociais (Stories)", "Copy para SMS"]
+TAGS = {"Tipo de Negócio": ["E-commerce", "Serviços", "Digital", "B2B", "B2C"],
+        "Setor": ["Saúde", "Educação", "Tecnologia", "Moda", "Finanças"],
+        "Objetivo": ["Vendas", "Leads", "Engajamento", "Fidelização"],
+        "Público": ["Jovens", "Adultos", "Profissionais", "Empresários"]}
+
+
+def _bloco_leads(inicio, quantidade, gerador):
+    """Um bloco de leads com tipos variados (texto, número, data, nulos e duplicatas)."""
+    import numpy as np
+    import pandas as pd
+
+    indices = np.arange(inicio, inicio + quantidade)
+    cidades = gerador.integers(0, len(CIDADES), quantidade)
+    nomes = np.array(NOMES)[gerador.integers(0, len(NOMES), quantidade)]
+    sobrenomes = np.array(SOBRENOMES)[gerador.integers(0, len(SOBRENOMES), quantidade)]
+    cadastro = np.datetime64("2023-01-01") + gerador.integers(0, 900, quantidade).astype("timedelta64[D]")
+    num_compras = gerador.poisson(1.5, quantidade)
+    bloco = pd.DataFrame({
+        "nome": np.char.add(np.char.add(nomes, " "), sobrenomes),
+        "email": [f"lead{i}@exemplo.com.br" for i in indices],
+        "telefone": [f"+55119{i % 100_000_000:08d}" for i in indices],
+        "cidade": np.array([c for c, _ in CIDADES])[cidades],
+        "estado": np.array([uf for _, uf in CIDADES])[cidades],
+        "idade": gerador.integers(18, 75, quantidade),
+        "renda_mensal": np.round(gerador.lognormal(8.3, 0.6, quantidade), 2),
+        "origem": np.array(ORIGENS)[gerador.integers(0, len(ORIGENS), quantidade)],
+        "interesse": np.array(INTERESSES)[gerador.integers(0, len(INTERESSES), quantidade)],
+        "data_cadastro": cadastro.astype(str),
+        "num_compras": num_compras,
+        "valor_total_compras": np.round(num_compras * gerador.gamma(2.0, 120.0, quantidade), 2),
+        "status": np.array(STATUS)[gerador.integers(0, len(STATUS), quantidade)],
+    })
+    # ~2% de campos vazios e ~1% de linhas repetidas, como em exportações reais
+    bloco.loc[gerador.random(quantidade) < 0.02, "telefone"] = None
+    bloco.loc[gerador.random(quantidade) < 0.02, "renda_mensal"] = None
+    origem = np.where(gerador.random(quantidade) < 0.01, gerador.integers(0, quantidade, quantidade), np.arange(quantidade))
+    return bloco.iloc[origem].reset_index(drop=True)
+
+
+def gerar_csv_leads(linhas, semente=42, diretorio=DIRETORIO_DADOS):
+    """Caminho de um CSV com `linhas` leads, gerado em blocos na primeira chamada."""
+    import numpy as np
+
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"leads_{linhas}_{semente}.csv")
+    if os.path.exists(caminho):
+        return caminho
+    gerador = np.random.default_rng(semente)
+    temporario = caminho + ".parcial"
+    for inicio in range(0, linhas, TAMANHO_BLOCO_CSV):
+        quantidade = min(TAMANHO_BLOCO_CSV, linhas - inicio)
+        _bloco_leads(inicio, quantidade, gerador).to_csv(
+            temporario, mode="w" if inicio == 0 else "a", header=inicio == 0, index=False
+        )
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def gerar_csv_excel_br(linhas, semente=42, diretorio=DIRETORIO_DADOS):
+    """Os mesmos leads de gerar_csv_leads() como o Excel brasileiro salva: ";", vírgula decimal e cp1252."""
+    import pandas as pd
+
+    caminho = os.path.join(diretorio, f"leads_{linhas}_{semente}_excel_br.csv")
+    if os.path.exists(caminho):
+        return caminho
+    temporario = caminho + ".parcial"
+    blocos = pd.read_csv(gerar_csv_leads(linhas, semente, diretorio), chunksize=TAMANHO_BLOCO_CSV)
+    for i, bloco in enumerate(blocos):
+        bloco.to_csv(temporario, mode="w" if i == 0 else "a", header=i == 0, index=False, sep=";", decimal=",",
+                     encoding="cp1252")
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def popular_supabase(banco, usuario_id, analises=300, copies=2000, metricas=5000, chamadas_llm=20000,
+                     dias=180, semente=42):
+    """
+    Insere diretamente nas tabelas do SupabaseEmMemoria os dados de uma conta ativa.
+
+    Cada análise tem de 1 a 4 tags e 60% delas têm feedback; as datas se espalham pelos
+    últimos `dias` dias.
+    """
+    aleatorio = random.Random(semente)
+    agora = datetime.now(timezone.utc)
+
+    def data_aleatoria():
+        return (agora - timedelta(seconds=aleatorio.uniform(0, dias * 86400))).isoformat()
+
+    tabelas = banco.tabelas
+    for nome in ("analises_leads", "tags", "feedback", "metricas", "metricas_plataforma", "copies", "chamadas_llm"):
+        tabelas.setdefault(nome, [])
+
+    for _ in range(analises):
+        analise_id = str(uuid.uuid4())
+        data = data_aleatoria()
+        colunas = ["nome", "email", "telefone", "cidade", "estado", "idade", "renda_mensal", "origem", "status"]
+        tabelas["analises_leads"].append({
+            "id": analise_id, "data": data, "created_at": data, "updated_at": data, "usuario_id": usuario_id,
+            "plataforma": aleatorio.choice(PLATAFORMAS), "objetivo": aleatorio.choice(["Vendas", "Reativação", "Leads"]),
+            "total_leads": aleatorio.randint(200, 200_000), "colunas": colunas,
+            "analise": "## Análise simulada\n" + "Segmento com alta propensão de compra. " * aleatorio.randint(20, 80),
+            "tempo_processamento": round(aleatorio.uniform(2, 25), 2),
+            "resumo_estatistico": {"total_leads": 1000, "colunas": colunas, "estatisticas": {
+                c: {"valores_mais_frequentes": {f"valor {i}": 100 - i for i in range(5)}} for c in colunas
+            }},
+        })
+        for categoria, tag in aleatorio.sample([(c, t) for c, ts in TAGS.items() for t in ts], aleatorio.randint(1, 4)):
+            tabelas["tags"].append({"id": str(uuid.uuid4()), "analise_id": analise_id, "categoria": categoria,
+                                    "tag": tag, "usuario_id": usuario_id, "created_at": data})
+        if aleatorio.random() < 0.6:
+            tabelas["feedback"].append({
+                "id": str(uuid.uuid4()), "analise_id": analise_id, "data": data, "nota": aleatorio.randint(1, 5),
+                "pontos_positivos": "Segmentação clara", "pontos_melhorar": "Mais exemplos de mensagem",
+                "editado": False, "historico_edicoes": [], "usuario_id": usuario_id, "created_at": data,
+                "updated_at": data,
+            })
+
+    for _ in range(copies):
+        data = data_aleatoria()
+        tabelas["copies"].append({
+            "id": str(uuid.uuid4()), "plataforma": aleatorio.choice(PLATAFORMAS), "objetivo": "Vendas",
+            "publico_alvo": "Adultos", "produto_servico": "Curso online", "tom_de_voz": "Amigável",
+            "cta": "Garanta sua vaga", "copy_gerada": "Olá {{nome}}! " + "Oferta especial. " * aleatorio.randint(5, 40),
+            "data_geracao": data, "usuario_id": usuario_id, "created_at": data,
+        })
+
+    for _ in range(metricas):
+        tipo = aleatorio.choice(["copy", "analise", "personalizacao"])
+        prompt_tokens = aleatorio.randint(300, 4000)
+        cached = int(prompt_tokens * aleatorio.choice([0, 0, 0.5, 0.8]))
+        tabelas["metricas"].append({
+            "id": str(uuid.uuid4()), "data": data_aleatoria(), "tipo": tipo, "usuario_id": usuario_id,
+            "plataforma": "copy" if tipo == "copy" else "analise",
+            "total_tokens": prompt_tokens + aleatorio.randint(50, 800), "prompt_tokens": prompt_tokens,
+            "prompt_tokens_estimados": prompt_tokens, "cached_tokens": cached,
+            "latencia_api": round(aleatorio.uniform(0.5, 9), 3),
+            "tempo_processamento": round(aleatorio.uniform(2, 25), 2) if tipo == "analise" else 0,
+        })
+    for plataforma in PLATAFORMAS:
+        tabelas["metricas_plataforma"].append({
+            "id": str(uuid.uuid4()), "data": data_aleatoria(), "plataforma": plataforma, "usuario_id": usuario_id,
+            "metricas": {"taxa_conversao": round(aleatorio.uniform(0, 12), 2), "total_envios": aleatorio.randint(100, 9000)},
+        })
+
+    for _ in range(chamadas_llm):
+        operacao = aleatorio.choice(["copy", "copy_lote", "analise", "personalizacao"])
+        latencia = int(aleatorio.lognormvariate(7.3, 0.5))
+        tabelas["chamadas_llm"].append({
+            "id": len(tabelas["chamadas_llm"]) + 1, "criado_em": data_aleatoria(), "usuario_id": usuario_id,
+            "operacao": operacao, "modelo": "gpt-4.1-mini", "plataforma": aleatorio.choice(PLATAFORMAS),
+            "prompt_tokens": aleatorio.randint(300, 4000), "completion_tokens": aleatorio.randint(50, 800),
+            "cached_tokens": 0, "ttft_ms": int(latencia * 0.3), "latencia_ms": latencia,
+            "tentativas": 1 if aleatorio.random() > 0.02 else 2, "resultado": "ok",
+            "leads": aleatorio.randint(500, 50_000) if operacao == "analise" else 0,
+            "custo_usd": round(aleatorio.uniform(0.0002, 0.004), 6),
+        })
+    return {nome: len(linhas) for nome, linhas in tabelas.items()}
+
+
+PRODUTOS = ["Curso", "Mentoria", "Consultoria", "Assinatura", "E-book", "Workshop", "Plano", "Kit", "Clube", "Programa"]
+TEMAS = ["de Python", "de marketing digital", "de finanças pessoais", "de inglês", "de vendas B2B", "de fotografia",
+         "de nutrição", "de yoga", "de investimentos", "de design", "de liderança", "de confeitaria", "de excel",
+         "de oratória", "de tráfego pago", "de copywriting", "de gestão de projetos", "de maquiagem"]
+PUBLICOS = ["Jovens", "Adultos", "Profissionais", "Empresários", "Estudantes", "Mães", "Aposentados", "Gestores"]
+DETALHES_PUBLICO = ["de 18 a 25 anos", "de 25 a 40 anos", "acima de 40 anos", "em início de carreira",
+                    "do interior", "das capitais", "que trabalham em casa", "que já compraram antes"]
+OBJETIVOS = ["Gerar vendas", "Gerar leads", "Aumentar engajamento", "Reativar clientes", "Divulgar lançamento",
+             "Recuperar carrinhos"]
+TONS = ["Formal", "Informal", "Amigável", "Persuasivo", "Divertido", "Urgente"]
+CTAS = ["Compre agora", "Saiba mais", "Inscreva-se já", "Garanta sua vaga", "Fale com a gente", "Aproveite hoje"]
+FRASES_COPY = ["Olá {nome}, {beneficio} com o {produto}.", "Chegou a hora de {beneficio}.",
+               "Só {n} vagas para a turma de {mes}.", "Condição especial de {n}% até {dia}.",
+               "Mais de {n} alunos já conseguiram {beneficio}.", "{nome}, você merece {beneficio}.",
+               "Comece em {dia}, no seu ritmo.", "Acesso por {n} meses e certificado.", "Parcelamos em até {n}x.",
+               "Suporte com especialistas em {tema}.", "Bônus de {tema} para quem responder até {dia}.",
+               "Resultados em {n} semanas.", "Conteúdo prático de {tema} desde o primeiro dia.",
+               "Aulas ao vivo toda {dia}.", "Garantia de {n} dias."]
+BENEFICIOS = ["economizar tempo", "vender mais", "organizar suas finanças", "aprender do zero", "ganhar confiança",
+              "crescer na carreira", "conquistar clientes", "cuidar da saúde", "sair do lugar", "ter mais resultados"]
+MESES = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto", "setembro", "outubro"]
+DIAS = ["segunda", "terça", "quarta", "quinta", "sexta", "sábado", "domingo", "amanhã", "hoje", "o fim do mês"]
+
+
+def gerar_copies(quantidade, usuario_id, semente=42):
+    """
+    Copies sintéticas em ordem crescente de data_geracao, com briefings variados (produto x tema,
+    público x detalhe) e textos de 4 a 9 frases-modelo preenchidas com nomes, benefícios e números.
+    """
+    aleatorio = random.Random(semente)
+    inicio = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(quantidade):
+        data = (inicio + timedelta(seconds=i * 60)).isoformat()
+        tema = aleatorio.choice(TEMAS)
+        produto = f"{aleatorio.choice(PRODUTOS)} {tema} {aleatorio.randint(1, 200)}"
+        frases = [frase.format(nome=aleatorio.choice(NOMES), beneficio=aleatorio.choice(BENEFICIOS), produto=produto,
+                               n=aleatorio.randint(2, 500), mes=aleatorio.choice(MESES), dia=aleatorio.choice(DIAS),
+                               tema=tema[3:])
+                  for frase in aleatorio.sample(FRASES_COPY, aleatorio.randint(4, 9))]
+        yield {
+            "id": str(uuid.UUID(int=aleatorio.getrandbits(128))), "plataforma": aleatorio.choice(PLATAFORMAS),
+            "objetivo": aleatorio.choice(OBJETIVOS),
+            "publico_alvo": f"{aleatorio.choice(PUBLICOS)} {aleatorio.choice(DETALHES_PUBLICO)}",
+            "produto_servico": produto, "tom_de_voz": aleatorio.choice(TONS), "cta": aleatorio.choice(CTAS),
+            "copy_gerada": " ".join(frases), "data_geracao": data, "usuario_id": usuario_id,
+        }
@@ -0,0 +1,145 @@
+"""
+Servidor HTTP local que imita POST /v1/chat/completions da OpenAI (com e sem streaming).
+
+O app e o SDK oficial falam com ele normalmente apontando OPENAI_BASE_URL para
+http://<host>:<porta>/v1, então o benchmark mede também o custo do SDK e do HTTP.
+
+Uso:
+    python benchmarks/openai_falso.py --porta 8787 --latencia 0.3 --ttft 0.1 --tokens-resposta 150
+    OPENAI_BASE_URL=http://localhost:8787/v1 OPENAI_API_KEY=sk-falsa streamlit run app.py
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Tratador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder_json(self, status, corpo):
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._responder_json(200, {"object": "list", "data": [{"id": "gpt-4.1-mini", "object": "model"}]})
+        else:
+            self._responder_json(404, {"error": {"message": "não encontrado"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._responder_json(404, {"error": {"message": "não encontrado"}})
+            return
+        pedido = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        config = self.server.config
+        with self.server.lock:
+            self.server.chamadas += 1
+            falhar = config["taxa_erro"] and (self.server.chamadas % round(1 / config["taxa_erro"]) == 0)
+        if falhar:
+            self._responder_json(429, {"error": {"message": "rate limit simulado", "type": "rate_limit_error"}})
+            return
+
+        n = pedido.get("n") or 1
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in pedido.get("messages", [])) // 4
+        completion_tokens = min(config["tokens_resposta"], pedido.get("max_tokens") or config["tokens_resposta"])
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens * n,
+            "total_tokens": prompt_tokens + completion_tokens * n,
+            "prompt_tokens_details": {"cached_tokens": int(prompt_tokens * config["fracao_cache"])},
+        }
+        palavras = ["Resposta"] + ["simulada"] * max(completion_tokens - 2, 0) + ["{{nome}}"]
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": pedido.get("model")}
+
+        if not pedido.get("stream"):
+            time.sleep(config["latencia"])
+            self._responder_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": i, "finish_reason": "stop", "message": {"role": "assistant", "content": " ".join(palavras)}}
+                for i in range(n)
+            ]))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def evento(corpo):
+            self.wfile.write(f"data: {json.dumps(corpo)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        time.sleep(config["ttft"])
+        restante = max(config["latencia"] - config["ttft"], 0)
+        pausa = restante / max(len(palavras) * n, 1)
+        for i in range(n):
+            for j, palavra in enumerate(palavras):
+                evento(dict(base, object="chat.completion.chunk", choices=[
+                    {"index": i, "delta": {"content": palavra if j == 0 else " " + palavra}, "finish_reason": None}
+                ]))
+                if pausa:
+                    time.sleep(pausa)
+            evento(dict(base, object="chat.completion.chunk", choices=[
+                {"index": i, "delta": {}, "finish_reason": "stop"}
+            ]))
+        if (pedido.get("stream_options") or {}).get("include_usage"):
+            evento(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class ServidorOpenAIFalso(ThreadingHTTPServer):
+    """Servidor com latência, TTFT, tokens, fração de cache e taxa de erro 429 configuráveis."""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", porta=0, latencia=0.2, ttft=0.05, tokens_resposta=120, fracao_cache=0.0,
+                 taxa_erro=0.0):
+        super().__init__((host, porta), _Tratador)
+        self.config = {"latencia": latencia, "ttft": min(ttft, latencia), "tokens_resposta": tokens_resposta,
+                       "fracao_cache": fracao_cache, "taxa_erro": taxa_erro}
+        self.chamadas = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url_base(self):
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}/v1"
+
+    def iniciar_em_thread(self):
+        threading.Thread(target=self.serve_forever, name="openai-falso", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8787)
+    parser.add_argument("--latencia", type=float, default=0.2, help="segundos até o fim da resposta")
+    parser.add_argument("--ttft", type=float, default=0.05, help="segundos até o primeiro token (streaming)")
+    parser.add_argument("--tokens-resposta", type=int, default=120)
+    parser.add_argument("--fracao-cache", type=float, default=0.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração das chamadas respondidas com 429")
+    args = parser.parse_args()
+    servidor = ServidorOpenAIFalso(args.host, args.porta, args.latencia, args.ttft, args.tokens_resposta,
+                                   args.fracao_cache, args.taxa_erro)
+    print(f"OpenAI falsa em {servidor.url_base}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
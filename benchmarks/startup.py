@@ -0,0 +1,95 @@
+"""
+Benchmark de partida a frio do app.py: tempo até a tela de login e módulos pesados importados.
+
+Cada repetição roda em um processo novo (imports frios) com `python -X importtime`, executa o
+app.py uma vez via streamlit.testing (sem sessão autenticada) e mede:
+  - tempo de `import streamlit` (linha de base, fora do nosso controle);
+  - tempo até a tela de login estar renderizada;
+  - tempo de importação acumulado dos módulos pesados que foram carregados nessa primeira tela.
+
+Uso:
+    python benchmarks/startup.py --repeticoes 5
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS_PESADOS = ("pandas", "numpy", "plotly", "openai", "supabase", "yaml", "requests", "tiktoken", "httpx")
+
+_CODIGO_FILHO = """
+import json, sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+depois_streamlit = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+fim = time.perf_counter()
+print(json.dumps({
+    "import_streamlit_s": depois_streamlit - inicio,
+    "ate_login_s": fim - depois_streamlit,
+    "login_renderizado": any("Login" in t.value for t in at.title),
+    "excecoes": [str(e.value) for e in at.exception],
+}))
+"""
+
+_LINHA_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def tempos_de_importacao(stderr):
+    """Tempo acumulado (ms) de cada módulo pesado carregado, a partir da saída do -X importtime."""
+    tempos = {}
+    for linha in stderr.splitlines():
+        casamento = _LINHA_IMPORTTIME.match(linha)
+        if not casamento:
+            continue
+        modulo = casamento.group(4)
+        if modulo in MODULOS_PESADOS and modulo not in tempos:
+            tempos[modulo] = int(casamento.group(2)) / 1000
+    return tempos
+
+
+def executar_uma_vez(caminho_app):
+    ambiente = dict(os.environ)
+    # Valores fictícios: o app só precisa que existam para renderizar a tela de login
+    ambiente.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    ambiente.setdefault("SUPABASE_URL", "http://localhost:54321")
+    ambiente.setdefault("SUPABASE_KEY", "chave-benchmark")
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CODIGO_FILHO, caminho_app],
+        cwd=RAIZ, env=ambiente, capture_output=True, text=True, check=True
+    )
+    resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+    resultado["modulos_pesados_ms"] = tempos_de_importacao(processo.stderr)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--app", default=os.path.join(RAIZ, "app.py"))
+    args = parser.parse_args()
+
+    execucoes = [executar_uma_vez(args.app) for _ in range(args.repeticoes)]
+    modulos = sorted({m for e in execucoes for m in e["modulos_pesados_ms"]})
+    relatorio = {
+        "repeticoes": args.repeticoes,
+        "import_streamlit_s_mediana": round(statistics.median(e["import_streamlit_s"] for e in execucoes), 3),
+        "ate_login_s_mediana": round(statistics.median(e["ate_login_s"] for e in execucoes), 3),
+        "login_renderizado": all(e["login_renderizado"] for e in execucoes),
+        "excecoes": execucoes[-1]["excecoes"],
+        # Módulos importados antes da tela de login (o ideal é só o que o streamlit já traz)
+        "modulos_pesados_ms_mediana": {
+            m: round(statistics.median(e["modulos_pesados_ms"].get(m, 0) for e in execucoes), 1) for m in modulos
+        },
+    }
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+"""
+Suíte de benchmarks offline: OpenAI falsa (servidor HTTP local) e Supabase em memória populado.
+
+Cenários:
+  copy      gerar_copy() em sequência e em paralelo (latência, TTFT e chamadas/s)
+  analise   leitura, snapshot, estatísticas, prompt e análise completa de CSVs de 1k, 100k e 1M linhas
+  leitura   parser padrão do pandas x Arrow (leitores.py) por tamanho de CSV, em UTF-8 e no formato do Excel
+  historico aba de histórico renderizada via streamlit.testing.AppTest (cache frio e quente)
+  dashboard dashboard aberto via AppTest (cache frio e quente), com tempo por carregador
+  sessoes   várias sessões do AppTest em paralelo, uma por processo (reruns/s e latência por rerun)
+  duplicatas índice de copies quase duplicadas com 500k copies (carga, memória, latência e revocação)
+
+Com --armazenamento sqlite, os mesmos dados vão para o backend SQLite local (armazenamento.py).
+Os tempos por trecho vêm do perfilador (MENCARE_PERFIL=1, ligado pela suíte). O resultado é
+um JSON; com --comparar, cada métrica é comparada à execução anterior e regressões acima da
+--tolerancia fazem o processo sair com código 1.
+
+Uso:
+    python benchmarks/suite.py --saida resultados/bench.json
+    python benchmarks/suite.py --cenarios copy analise --tamanhos 1000 100000
+    python benchmarks/suite.py --comparar resultados/bench.json --tolerancia 0.15
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CENARIOS = ("copy", "analise", "leitura", "historico", "dashboard", "sessoes", "duplicatas")
+USUARIO_BENCHMARK = "usuario-benchmark"
+
+
+def _percentis(valores):
+    if not valores:
+        return {}
+    from telemetria_llm import percentil
+
+    ordenados = sorted(valores)
+    return {"p50": round(percentil(ordenados, 0.5), 2), "p95": round(percentil(ordenados, 0.95), 2),
+            "max": round(ordenados[-1], 2)}
+
+
+def _pico_memoria_mb():
+    # ru_maxrss é em KB no Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _cliente_openai(servidor):
+    """SDK oficial apontado para o servidor falso; sem o pacote openai, o cliente em processo."""
+    try:
+        from openai import OpenAI
+    except ImportError:
+        from clientes_falsos import ClienteOpenAIFalso
+
+        return ClienteOpenAIFalso(latencia=servidor.config["latencia"]), "em_processo"
+    return OpenAI(api_key="sk-benchmark", base_url=servidor.url_base), "sdk_http"
+
+
+# --- Cenários sem Streamlit ---
+
+def cenario_copy(args, servidor):
+    import servicos
+    from limitador_taxa import LimitadorTaxa
+    from telemetria_llm import coletor_telemetria
+
+    client, modo = _cliente_openai(servidor)
+    limitador = LimitadorTaxa(1_000_000, args.concorrencia)
+
+    def uma_copy(_):
+        inicio = time.perf_counter()
+        servicos.gerar_copy(client, "Email Marketing", "Vender", "Adultos", "Curso online", "Amigável",
+                            "Compre agora", modelo=servicos.MODELO_OPENAI, limitador=limitador,
+                            usuario_id=USUARIO_BENCHMARK)
+        return (time.perf_counter() - inicio) * 1000
+
+    registrados_antes = coletor_telemetria.registrados
+    sequencial = [uma_copy(i) for i in range(args.chamadas_copy)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        paralelo = list(executor.map(uma_copy, range(args.chamadas_copy * 4)))
+    duracao_paralelo = time.perf_counter() - inicio
+    novos = coletor_telemetria.registrados - registrados_antes
+    ttfts = [r["ttft_ms"] for r in coletor_telemetria.recentes()[-novos:] if r.get("ttft_ms") is not None]
+    return {
+        "cliente": modo,
+        "sequencial_ms": _percentis(sequencial),
+        "paralelo_ms": _percentis(paralelo),
+        "ttft_ms": _percentis(ttfts),
+        "concorrencia": args.concorrencia,
+        "chamadas_por_segundo": round(len(paralelo) / duracao_paralelo, 1),
+    }
+
+
+def cenario_analise(args, servidor):
+    import servicos
+    from dados_sinteticos import DIRETORIO_DADOS, gerar_csv_leads
+    from deduplicacao_leads import deduplicar_leads
+    from leitores import ler_leads
+    from limitador_taxa import LimitadorTaxa
+    from prompt_builder import construir_prompt_analise
+    from segmentacao import segmentar_leads
+    from snapshots import carregar_snapshot, salvar_snapshot
+
+    client, modo = _cliente_openai(servidor)
+    limitador = LimitadorTaxa(1_000_000, 1)
+    resultados = {"cliente": modo}
+    for linhas in args.tamanhos:
+        inicio = time.perf_counter()
+        caminho = gerar_csv_leads(linhas)
+        geracao = time.perf_counter() - inicio
+        tempos = {}
+
+        inicio = time.perf_counter()
+        df, leitura = ler_leads(caminho)
+        tempos["leitura_s"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        df, deduplicacao = deduplicar_leads(df)
+        tempos["deduplicacao_s"] = time.perf_counter() - inicio
+
+        # Reanálise: o snapshot substitui leitura + deduplicação
+        diretorio_snapshots = os.path.join(DIRETORIO_DADOS, "snapshots")
+        inicio = time.perf_counter()
+        snapshot = salvar_snapshot(df, USUARIO_BENCHMARK, diretorio=diretorio_snapshots)
+        tempos["snapshot_s"] = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        carregar_snapshot(snapshot["fingerprint"], USUARIO_BENCHMARK, diretorio=diretorio_snapshots)
+        tempos["leitura_snapshot_s"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        resumo = servicos.calcular_resumo_estatistico(df)
+        tempos["estatisticas_s"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        _, resumo["segmentacao"] = segmentar_leads(df)
+        tempos["segmentacao_s"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        prompt = construir_prompt_analise(df, "Disparo de WhatsApp", "Vender", resumo)
+        tempos["prompt_s"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        servicos.executar_analise(client, df, "Disparo de WhatsApp", "Vender", modelo=servicos.MODELO_OPENAI,
+                                  limitador=limitador, usuario_id=USUARIO_BENCHMARK)
+        tempos["analise_completa_s"] = time.perf_counter() - inicio
+
+        resultados[str(linhas)] = dict(
+            {nome: round(valor, 4) for nome, valor in tempos.items()},
+            linhas_apos_deduplicacao=len(df),
+            duplicatas_removidas=deduplicacao["duplicatas_removidas"],
+            tamanho_csv_mb=round(os.path.getsize(caminho) / 1024 / 1024, 1),
+            motor_leitura=leitura["motor"],
+            tamanho_snapshot_mb=snapshot["tamanho_mb"],
+            tokens_prompt_estimados=prompt["tokens_estimados"],
+            segmentos=len(resumo["segmentacao"]["segmentos"]) if resumo["segmentacao"] else 0,
+            pico_memoria_processo_mb=_pico_memoria_mb(),
+            geracao_csv_s=round(geracao, 2),
+        )
+        del df
+    return resultados
+
+
+def cenario_leitura(args, servidor):
+    import pandas as pd
+
+    from dados_sinteticos import gerar_csv_excel_br, gerar_csv_leads
+    from leitores import ler_leads
+
+    resultados = {}
+    for linhas in args.tamanhos:
+        for variante, gerar in (("padrao", gerar_csv_leads), ("excel_br", gerar_csv_excel_br)):
+            caminho = gerar(linhas)
+            tamanho_mb = os.path.getsize(caminho) / 1024 / 1024
+            tempos = {}
+            if variante == "padrao":
+                # O que o app fazia antes: pd.read_csv sem opções
+                inicio = time.perf_counter()
+                pd.read_csv(caminho)
+                tempos["pandas_sem_deteccao"] = time.perf_counter() - inicio
+            for motor in ("c", "pyarrow"):
+                inicio = time.perf_counter()
+                _, leitura = ler_leads(caminho, motor=motor)
+                tempos[leitura["motor"]] = time.perf_counter() - inicio
+            item = {f"{nome}_s": round(valor, 4) for nome, valor in tempos.items()}
+            item.update({f"{nome}_mb_s": round(tamanho_mb / valor, 1) for nome, valor in tempos.items()})
+            if "pyarrow" in tempos:
+                item["aceleracao_pyarrow"] = round(tempos["c"] / tempos["pyarrow"], 2)
+            item.update(tamanho_csv_mb=round(tamanho_mb, 1), separador=leitura["sep"],
+                        encoding=leitura["encoding"], decimal=leitura["decimal"])
+            resultados[f"{linhas}_{variante}"] = item
+    resultados["threads_cpu"] = os.cpu_count()
+    return resultados
+
+
+def cenario_duplicatas(args, servidor):
+    from dados_sinteticos import gerar_copies
+    from duplicatas import TAMANHO_LOTE_CARGA, DetectorDuplicatas
+
+    detector = DetectorDuplicatas(USUARIO_BENCHMARK)
+    amostra = []
+    intervalo_amostra = max(1, args.copies_duplicatas // 1000)
+    memoria_antes = _pico_memoria_mb()
+    inicio = time.perf_counter()
+    lote = []
+    # Mesmos lotes da sincronização com o banco
+    for i, copy in enumerate(gerar_copies(args.copies_duplicatas, USUARIO_BENCHMARK)):
+        lote.append(copy)
+        if i % intervalo_amostra == 0:
+            amostra.append(copy)
+        if len(lote) == TAMANHO_LOTE_CARGA:
+            detector.adicionar_varias(lote)
+            lote = []
+    detector.adicionar_varias(lote)
+    carga = time.perf_counter() - inicio
+
+    tempos = {"brief_parecido": [], "brief_novo": [], "texto_parecido": [], "texto_novo": []}
+    encontradas = {"brief": 0, "texto": 0}
+    novas = list(gerar_copies(len(amostra), USUARIO_BENCHMARK, semente=7))
+    for existente, nova in zip(amostra, novas):
+        # Mesmo briefing com um detalhe a mais, e o mesmo texto com uma frase a mais
+        consultas = [
+            ("brief_parecido", detector.briefs_parecidos,
+             dict(existente, produto_servico=existente["produto_servico"] + " online"), "brief"),
+            ("brief_novo", detector.briefs_parecidos, nova, None),
+            ("texto_parecido", detector.textos_parecidos, existente["copy_gerada"] + " Responda já.", "texto"),
+            ("texto_novo", detector.textos_parecidos, nova["copy_gerada"], None),
+        ]
+        for nome, buscar, consulta, acerto in consultas:
+            inicio = time.perf_counter()
+            resultado = buscar(consulta)
+            tempos[nome].append((time.perf_counter() - inicio) * 1000)
+            if acerto and any(copy_id == existente["id"] for copy_id, _ in resultado):
+                encontradas[acerto] += 1
+    resultados = {f"{nome}_ms": _percentis(valores) for nome, valores in tempos.items()}
+    resultados.update(
+        copies_indexadas=len(detector),
+        carga_s=round(carga, 2),
+        copies_indexadas_por_segundo=round(len(detector) / carga),
+        memoria_indice_mb=round(_pico_memoria_mb() - memoria_antes, 1),
+        revocacao_brief=round(encontradas["brief"] / len(amostra), 3),
+        revocacao_texto=round(encontradas["texto"] / len(amostra), 3),
+    )
+    return resultados
+
+
+# --- Cenários com Streamlit (AppTest) ---
+
+def _novo_apptest(args, dashboard=False):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=args.timeout_apptest)
+    at.session_state["autenticado"] = True
+    at.session_state["username"] = f"{USUARIO_BENCHMARK}@exemplo.com"
+    at.session_state["usuario_id"] = USUARIO_BENCHMARK
+    if dashboard:
+        at.session_state["dashboard_aberto"] = True
+    return at
+
+
+def _rodar(at):
+    """Executa um rerun e devolve (ms, trechos do perfil por nome, exceções)."""
+    from perfilador import ultimo_perfil
+
+    inicio = time.perf_counter()
+    at.run()
+    duracao = (time.perf_counter() - inicio) * 1000
+    trechos = {}
+    for trecho in (ultimo_perfil() or {}).get("trechos", []):
+        nome = trecho["caminho"][-1]
+        trechos[nome] = round(trechos.get(nome, 0) + trecho["total_ms"], 2)
+    return duracao, trechos, [str(e.value) for e in at.exception]
+
+
+def _frio_e_quente(args, dashboard, trechos_interesse):
+    from cache import cache_consultas
+
+    resultado = {}
+    for estado in ("frio", "quente"):
+        if estado == "frio":
+            cache_consultas.limpar()
+        at = _novo_apptest(args, dashboard)
+        duracoes, por_trecho, excecoes = [], {}, []
+        for _ in range(args.reruns):
+            if estado == "frio":
+                cache_consultas.limpar()
+            duracao, trechos, excecoes = _rodar(at)
+            duracoes.append(duracao)
+            for nome, ms in trechos.items():
+                if any(nome.startswith(prefixo) for prefixo in trechos_interesse):
+                    por_trecho.setdefault(nome, []).append(ms)
+        resultado[estado] = {
+            "rerun_ms": _percentis(duracoes),
+            "trechos_p50_ms": {nome: round(statistics.median(v), 2) for nome, v in sorted(por_trecho.items())},
+            "excecoes": excecoes,
+        }
+    return resultado
+
+
+def cenario_historico(args, servidor):
+    return _frio_e_quente(args, False, ("aba: Histórico", "mostrar_historico_analises", "carregar_historico",
+                                        "carregar_feedback"))
+
+
+def cenario_dashboard(args, servidor):
+    return _frio_e_quente(args, True, ("aba: Dashboard", "gerar_dashboard", "carregar_", "gráfico:",
+                                       "mostrar_latencia_chamadas_llm"))
+
+
+def _sessao_em_processo(args, fila):
+    """Uma sessão do AppTest no próprio processo; põe (ms por rerun, erros) na fila."""
+    duracoes, erros = [], []
+    try:
+        at = _novo_apptest(args)
+        for _ in range(args.reruns):
+            inicio = time.perf_counter()
+            at.run()
+            duracoes.append((time.perf_counter() - inicio) * 1000)
+            erros.extend(str(e.value) for e in at.exception)
+    except Exception as e:
+        erros.append(f"{type(e).__name__}: {e}")
+    fila.put((duracoes, erros))
+
+
+def cenario_sessoes(args, servidor):
+    # O AppTest cria e apaga o Runtime global do Streamlit a cada run, então sessões
+    # simultâneas no mesmo processo se atropelam: cada sessão roda em um processo próprio.
+    # O fork herda o Supabase já populado e o ambiente apontando para a OpenAI falsa, e não
+    # precisa serializar a função (o AppTest troca o __main__ depois do primeiro run).
+    contexto = multiprocessing.get_context("fork")
+    fila = contexto.Queue()
+    processos = [contexto.Process(target=_sessao_em_processo, args=(args, fila), daemon=True)
+                 for _ in range(args.sessoes)]
+    duracoes, erros = [], []
+    inicio = time.perf_counter()
+    for processo in processos:
+        processo.start()
+    limite = time.monotonic() + args.timeout_apptest * (args.reruns + 1)
+    for _ in processos:
+        try:
+            duracoes_sessao, erros_sessao = fila.get(timeout=max(0, limite - time.monotonic()))
+        except queue.Empty:
+            # Sessão travada ou processo morto: conta como erro, a suíte continua
+            erros.append("sessão sem resposta dentro do timeout")
+            continue
+        duracoes.extend(duracoes_sessao)
+        erros.extend(erros_sessao)
+    duracao = time.perf_counter() - inicio
+    for processo in processos:
+        processo.join(timeout=1)
+        if processo.is_alive():
+            processo.terminate()
+    return {
+        "sessoes": args.sessoes,
+        "reruns_por_sessao": args.reruns,
+        "reruns_por_segundo": round(len(duracoes) / duracao, 2),
+        "rerun_ms": _percentis(duracoes),
+        "erros": erros[:10],
+    }
+
+
+# --- Comparação entre execuções ---
+
+def _metricas_planas(valor, prefixo=""):
+    if isinstance(valor, dict):
+        for chave, filho in valor.items():
+            yield from _metricas_planas(filho, f"{prefixo}.{chave}" if prefixo else chave)
+    elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        yield prefixo, valor
+
+
+def comparar(atual, anterior, tolerancia):
+    """Métricas que pioraram mais que a tolerância (tempo maior ou vazão menor)."""
+    base = dict(_metricas_planas(anterior.get("resultados", {})))
+    regressoes = []
+    for nome, valor in _metricas_planas(atual.get("resultados", {})):
+        antes = base.get(nome)
+        if not antes:
+            continue
+        if nome.endswith("_segundo"):
+            variacao = (antes - valor) / antes
+        elif nome.endswith(("_ms", "_s", "_mb", ".p50", ".p95", ".max")):
+            variacao = (valor - antes) / antes
+        else:
+            continue
+        if variacao > tolerancia:
+            regressoes.append({"metrica": nome, "anterior": antes, "atual": valor, "piora": f"{variacao:.0%}"})
+    return regressoes
+
+
+def _copiar_para_sqlite(banco):
+    """ClienteSQLite novo com as mesmas linhas do Supabase em memória populado."""
+    from armazenamento import ClienteSQLite
+    from dados_sinteticos import DIRETORIO_DADOS
+
+    caminho = os.path.join(DIRETORIO_DADOS, "benchmark.db")
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+    cliente = ClienteSQLite(caminho)
+    for nome, linhas in banco.tabelas.items():
+        for inicio in range(0, len(linhas), 500):
+            cliente.table(nome).insert(linhas[inicio:inicio + 500]).execute()
+    return cliente
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument("--tamanhos", nargs="+", type=int, default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--latencia-openai", type=float, default=0.3, help="segundos por resposta da OpenAI falsa")
+    parser.add_argument("--ttft-openai", type=float, default=0.1, help="segundos até o primeiro token")
+    parser.add_argument("--tokens-resposta", type=int, default=150)
+    parser.add_argument("--armazenamento", choices=("memoria", "sqlite"), default="memoria",
+                        help="Supabase em memória (com --latencia-supabase) ou o backend SQLite local")
+    parser.add_argument("--latencia-supabase", type=float, default=0.01, help="segundos por consulta ao Supabase")
+    parser.add_argument("--analises", type=int, default=300, help="análises no Supabase em memória")
+    parser.add_argument("--chamadas-copy", type=int, default=10)
+    parser.add_argument("--copies-duplicatas", type=int, default=500_000, help="copies no índice de duplicatas")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--reruns", type=int, default=3)
+    parser.add_argument("--sessoes", type=int, default=8)
+    parser.add_argument("--timeout-apptest", type=float, default=120)
+    parser.add_argument("--saida", help="arquivo JSON do resultado (padrão: só imprime)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="piora aceita antes de acusar regressão")
+    return parser.parse_args()
+
+
+def main():
+    args = _argumentos()
+    # Ambiente do app antes de importar qualquer módulo do projeto
+    os.environ.setdefault("MENCARE_PERFIL", "1")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_KEY", "chave-benchmark")
+    os.environ.setdefault("OPENAI_RPM", "1000000")
+    os.environ.setdefault("OPENAI_MAX_CONCORRENCIA", str(max(args.concorrencia, args.sessoes)))
+    os.environ.setdefault("DIRETORIO_PERFIS", os.path.join(".mencare", "benchmarks", "perfis"))
+
+    from clientes_falsos import SupabaseEmMemoria
+    from dados_sinteticos import popular_supabase
+    from openai_falso import ServidorOpenAIFalso
+    from supabase_config import definir_supabase_client
+
+    servidor = ServidorOpenAIFalso(latencia=args.latencia_openai, ttft=args.ttft_openai,
+                                   tokens_resposta=args.tokens_resposta).iniciar_em_thread()
+    # obter_cliente_openai() do app usa o SDK, que lê OPENAI_BASE_URL
+    os.environ["OPENAI_BASE_URL"] = servidor.url_base
+    banco = SupabaseEmMemoria(USUARIO_BENCHMARK, latencia=args.latencia_supabase)
+    volumes = popular_supabase(banco, USUARIO_BENCHMARK, analises=args.analises)
+    if args.armazenamento == "sqlite":
+        banco = _copiar_para_sqlite(banco)
+    definir_supabase_client(banco)
+
+    funcoes = {"copy": cenario_copy, "analise": cenario_analise, "leitura": cenario_leitura,
+               "historico": cenario_historico, "dashboard": cenario_dashboard, "sessoes": cenario_sessoes,
+               "duplicatas": cenario_duplicatas}
+    resultados = {}
+    for nome in args.cenarios:
+        print(f"Executando cenário {nome}...", file=sys.stderr)
+        inicio = time.perf_counter()
+        try:
+            resultados[nome] = funcoes[nome](args, servidor)
+        except ImportError as e:
+            resultados[nome] = {"ignorado": f"dependência ausente: {e}"}
+        resultados[nome]["duracao_cenario_s"] = round(time.perf_counter() - inicio, 2)
+    servidor.shutdown()
+
+    relatorio = {
+        "versao": 1,
+        "momento": datetime.now().isoformat(),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("saida", "comparar")},
+        "volumes_supabase": volumes,
+        "resultados": resultados,
+    }
+    codigo_saida = 0
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            relatorio["regressoes"] = comparar(relatorio, json.load(f), args.tolerancia)
+        codigo_saida = 1 if relatorio["regressoes"] else 0
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    print(texto)
+    return codigo_saida
+
+
+if __name__ == "__main__":
+    sys.exit(main())
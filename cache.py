@@ -0,0 +1,204 @@
+"""
+Cache de consultas ao Supabase compartilhado entre sessões do processo.
+
+As entradas são indexadas por (usuario_id, consulta, parâmetros), têm TTL próprio e o total
+ocupado é limitado (LRU). As funções de escrita invalidam explicitamente as consultas que
+alteram, então o TTL é só a rede de segurança para escritas feitas fora deste processo.
+"""
+import copy
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", "64"))
+CACHE_TTL_PADRAO = int(os.getenv("CACHE_TTL_PADRAO", "120"))
+
+# Consultas cacheadas e seus TTLs (segundos)
+CONSULTA_HISTORICO_ANALISES = "historico_analises"
+CONSULTA_METRICAS = "metricas"
+CONSULTA_METRICAS_PLATAFORMA = "metricas_plataforma"
+CONSULTA_CONSUMO_TOKENS = "consumo_tokens"
+CONSULTA_FEEDBACK = "feedback"
+CONSULTA_TELEMETRIA_LLM = "telemetria_llm"
+CONSULTA_BUSCA = "busca_texto"
+
+TTL_CONSULTAS = {
+    CONSULTA_HISTORICO_ANALISES: 300,
+    CONSULTA_METRICAS: 120,
+    CONSULTA_METRICAS_PLATAFORMA: 600,
+    CONSULTA_CONSUMO_TOKENS: 120,
+    CONSULTA_FEEDBACK: 600,
+    CONSULTA_TELEMETRIA_LLM: 120,
+    CONSULTA_BUSCA: 60,
+}
+
+
+def _tamanho_estimado(valor):
+    """Bytes aproximados do valor (tamanho serializado; sys.getsizeof como fallback)."""
+    try:
+        return len(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(valor)
+
+
+class CacheConsultas:
+    """Cache LRU com TTL por entrada e limite de memória, seguro entre threads."""
+
+    def __init__(self, max_bytes=int(CACHE_MAX_MB * 1024 * 1024), ttl_padrao=CACHE_TTL_PADRAO, ttls=None):
+        self.max_bytes = max_bytes
+        self.ttl_padrao = ttl_padrao
+        self.ttls = dict(ttls or {})
+        self._entradas = OrderedDict()  # chave -> (valor, expira_em, tamanho)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._acertos = defaultdict(int)
+        self._falhas = defaultdict(int)
+        self._invalidacoes = defaultdict(int)
+        self._despejos = 0
+        self._versoes = defaultdict(int)  # usuario_id -> contador de alterações
+        self._geracoes = defaultdict(int)  # consulta -> invalidações de todos os usuários
+
+    @staticmethod
+    def _chave(usuario_id, consulta, parametros):
+        return (usuario_id, consulta, tuple(parametros))
+
+    def _remover(self, chave):
+        _, _, tamanho = self._entradas.pop(chave)
+        self._bytes -= tamanho
+
+    def _guardar(self, chave, valor, ttl):
+        """Grava a entrada (já com o lock) e aplica o limite de memória."""
+        if chave in self._entradas:
+            self._remover(chave)
+        tamanho = _tamanho_estimado(valor)
+        if tamanho > self.max_bytes:
+            return
+        if ttl is None:
+            ttl = self.ttls.get(chave[1], self.ttl_padrao)
+        self._entradas[chave] = (copy.deepcopy(valor), time.monotonic() + ttl, tamanho)
+        self._bytes += tamanho
+        while self._bytes > self.max_bytes:
+            self._remover(next(iter(self._entradas)))
+            self._despejos += 1
+
+    def obter_ou_carregar(self, usuario_id, consulta, carregar, *parametros, ttl=None):
+        """
+        Retorna o valor em cache ou executa carregar() e guarda o resultado.
+
+        O TTL vem do argumento, de ttls[consulta] ou do padrão. Exceções de carregar() não
+        são cacheadas. O valor devolvido é sempre uma cópia, então quem chama pode
+        alterá-lo sem afetar outras sessões. carregar() roda fora do lock: se uma invalidação
+        ou um delta (Realtime) chegar enquanto ele roda, o valor é devolvido mas não guardado,
+        porque pode ter sido lido antes da alteração.
+        """
+        chave = self._chave(usuario_id, consulta, parametros)
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[1] > agora:
+                self._entradas.move_to_end(chave)
+                self._acertos[consulta] += 1
+                return copy.deepcopy(entrada[0])
+            if entrada is not None:
+                self._remover(chave)
+            self._falhas[consulta] += 1
+            versao = (self._versoes[usuario_id], self._geracoes[consulta])
+
+        valor = carregar()
+        with self._lock:
+            if (self._versoes[usuario_id], self._geracoes[consulta]) == versao:
+                self._guardar(chave, valor, ttl)
+        return valor
+
+    def atualizar(self, usuario_id, consulta, aplicar, *parametros):
+        """
+        Aplica um delta ao valor em cache: aplicar(valor) altera o valor no lugar.
+
+        Só age sobre entradas válidas (não carrega nada) e renova o TTL. Retorna True se
+        havia entrada para atualizar.
+        """
+        chave = self._chave(usuario_id, consulta, parametros)
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada[1] <= time.monotonic():
+                return False
+            valor = copy.deepcopy(entrada[0])
+            aplicar(valor)
+            self._guardar(chave, valor, None)
+            self._versoes[usuario_id] += 1
+            return True
+
+    def definir(self, usuario_id, consulta, valor, *parametros):
+        """Grava diretamente o valor de uma consulta (ex: linha recebida por realtime)."""
+        with self._lock:
+            self._guardar(self._chave(usuario_id, consulta, parametros), valor, None)
+            self._versoes[usuario_id] += 1
+
+    def versao(self, usuario_id):
+        """Contador que muda a cada invalidação ou delta aplicado aos dados do usuário."""
+        with self._lock:
+            return self._versoes[usuario_id]
+
+    def invalidar(self, usuario_id, consulta, *parametros):
+        """
+        Remove as entradas da consulta para o usuário.
+
+        Com parâmetros, remove só a entrada exata; sem eles, todas as variações da consulta.
+        """
+        with self._lock:
+            if parametros:
+                chaves = [self._chave(usuario_id, consulta, parametros)]
+            else:
+                chaves = [c for c in self._entradas if c[0] == usuario_id and c[1] == consulta]
+            for chave in chaves:
+                if chave in self._entradas:
+                    self._remover(chave)
+                    self._invalidacoes[consulta] += 1
+            self._versoes[usuario_id] += 1
+
+    def invalidar_consulta(self, consulta):
+        """Remove a consulta de todos os usuários (quando a alteração não diz de quem é)."""
+        with self._lock:
+            self._geracoes[consulta] += 1
+            for chave in [c for c in self._entradas if c[1] == consulta]:
+                self._remover(chave)
+                self._invalidacoes[consulta] += 1
+                self._versoes[chave[0]] += 1
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        """Acertos, falhas e taxa de acerto por consulta, além do uso de memória."""
+        with self._lock:
+            consultas = sorted(set(self._acertos) | set(self._falhas) | set(self._invalidacoes))
+            por_consulta = {}
+            for consulta in consultas:
+                acertos, falhas = self._acertos[consulta], self._falhas[consulta]
+                por_consulta[consulta] = {
+                    "acertos": acertos,
+                    "falhas": falhas,
+                    "invalidacoes": self._invalidacoes[consulta],
+                    "taxa_acerto": acertos / (acertos + falhas) if (acertos + falhas) else 0.0
+                }
+            total_acertos = sum(self._acertos.values())
+            total_falhas = sum(self._falhas.values())
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "despejos": self._despejos,
+                "acertos": total_acertos,
+                "falhas": total_falhas,
+                "taxa_acerto": total_acertos / (total_acertos + total_falhas) if (total_acertos + total_falhas) else 0.0,
+                "por_consulta": por_consulta
+            }
+
+
+# Instância única do processo: os módulos importados sobrevivem aos reruns do Streamlit
+cache_consultas = CacheConsultas(ttls=TTL_CONSULTAS)
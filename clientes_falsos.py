@@ -0,0 +1,276 @@
+"""
+Clientes falsos da OpenAI e do Supabase para testes de carga, benchmarks e --dry-run.
+
+Implementam apenas a parte das APIs usada pelo app: chat.completions.create e o query
+builder do supabase-py (table().select/insert/update/delete com filtros, order, limit,
+range, maybe_single e execute), além de rpc() para as funções listadas em FUNCOES_RPC.
+"""
+import copy
+import threading
+import time
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+
+class ClienteOpenAIFalso:
+    """Imita client.chat.completions.create com latência e contagem de tokens configuráveis."""
+
+    def __init__(self, latencia=0.0, tokens_resposta=120, fracao_cache=0.0, texto=None):
+        self.latencia = latencia
+        self.tokens_resposta = tokens_resposta
+        self.fracao_cache = fracao_cache
+        self.texto = texto
+        self.chamadas = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._criar))
+
+    def _criar(self, model=None, messages=None, n=1, max_tokens=None, temperature=None, stream=False,
+               stream_options=None, **kwargs):
+        with self._lock:
+            self.chamadas += 1
+        if stream:
+            return self._stream(model, messages, n, max_tokens, stream_options or {})
+        if self.latencia:
+            time.sleep(self.latencia)
+        return self._resposta(model, messages, n, max_tokens)
+
+    def _resposta(self, model, messages, n, max_tokens):
+        prompt_tokens = sum(len(m.get("content", "")) for m in (messages or [])) // 4
+        completion_tokens = min(self.tokens_resposta, max_tokens or self.tokens_resposta)
+        texto = self.texto or f"Resposta simulada ({model}, {completion_tokens} tokens). Olá {{{{nome}}}}!"
+        choices = [
+            SimpleNamespace(index=i, message=SimpleNamespace(role="assistant", content=texto), finish_reason="stop")
+            for i in range(n or 1)
+        ]
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens * len(choices),
+            total_tokens=prompt_tokens + completion_tokens * len(choices),
+            prompt_tokens_details=SimpleNamespace(cached_tokens=int(prompt_tokens * self.fracao_cache))
+        )
+        return SimpleNamespace(id=f"falso-{uuid.uuid4()}", model=model, choices=choices, usage=usage)
+
+    def _stream(self, model, messages, n, max_tokens, stream_options):
+        """Chunks no formato do streaming: primeiro token após 30% da latência, uso no fim."""
+        resposta = self._resposta(model, messages, n, max_tokens)
+        if self.latencia:
+            time.sleep(self.latencia * 0.3)
+        for choice in resposta.choices:
+            palavras = choice.message.content.split(" ")
+            for i, palavra in enumerate(palavras):
+                delta = SimpleNamespace(content=palavra if i == 0 else " " + palavra)
+                yield SimpleNamespace(choices=[SimpleNamespace(index=choice.index, delta=delta, finish_reason=None)],
+                                      usage=None)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=choice.index, delta=SimpleNamespace(content=None),
+                                                           finish_reason=choice.finish_reason)], usage=None)
+        if self.latencia:
+            time.sleep(self.latencia * 0.7)
+        if stream_options.get("include_usage"):
+            yield SimpleNamespace(choices=[], usage=resposta.usage)
+
+
+class _Consulta:
+    """Query builder em memória compatível com o subconjunto do postgrest-py usado no app."""
+
+    def __init__(self, banco, tabela):
+        self._banco = banco
+        self._tabela = tabela
+        self._operacao = "select"
+        self._colunas = "*"
+        self._contar = None
+        self._dados = None
+        self._filtros = []
+        self._ordem = []
+        self._limite = None
+        self._offset = 0
+        self._unico = False
+
+    # Operações
+    def select(self, colunas="*", count=None):
+        self._operacao, self._colunas, self._contar = "select", colunas, count
+        return self
+
+    def insert(self, dados):
+        self._operacao, self._dados = "insert", dados
+        return self
+
+    def upsert(self, dados, on_conflict=None):
+        self._operacao, self._dados = "insert", dados
+        return self
+
+    def update(self, dados):
+        self._operacao, self._dados = "update", dados
+        return self
+
+    def delete(self):
+        self._operacao = "delete"
+        return self
+
+    # Filtros
+    def eq(self, coluna, valor):
+        self._filtros.append(lambda r: r.get(coluna) == valor)
+        return self
+
+    def neq(self, coluna, valor):
+        self._filtros.append(lambda r: r.get(coluna) != valor)
+        return self
+
+    def gt(self, coluna, valor):
+        self._filtros.append(lambda r: r.get(coluna) is not None and r.get(coluna) > valor)
+        return self
+
+    def gte(self, coluna, valor):
+        self._filtros.append(lambda r: r.get(coluna) is not None and r.get(coluna) >= valor)
+        return self
+
+    def lt(self, coluna, valor):
+        self._filtros.append(lambda r: r.get(coluna) is not None and r.get(coluna) < valor)
+        return self
+
+    def lte(self, coluna, valor):
+        self._filtros.append(lambda r: r.get(coluna) is not None and r.get(coluna) <= valor)
+        return self
+
+    def in_(self, coluna, valores):
+        conjunto = set(valores)
+        self._filtros.append(lambda r: r.get(coluna) in conjunto)
+        return self
+
+    def match(self, criterios):
+        for coluna, valor in criterios.items():
+            self.eq(coluna, valor)
+        return self
+
+    def order(self, coluna, desc=False):
+        self._ordem.append((coluna, desc))
+        return self
+
+    def limit(self, quantidade):
+        self._limite = quantidade
+        return self
+
+    def range(self, inicio, fim):
+        self._offset, self._limite = inicio, fim - inicio + 1
+        return self
+
+    def maybe_single(self):
+        self._unico = True
+        return self
+
+    def _filtrar(self, linhas):
+        return [r for r in linhas if all(f(r) for f in self._filtros)]
+
+    def _projetar(self, linha):
+        if self._colunas.strip() == "*":
+            return dict(linha)
+        return {c.strip(): linha.get(c.strip()) for c in self._colunas.split(",")}
+
+    def execute(self):
+        with self._banco.lock:
+            linhas = self._banco.tabelas.setdefault(self._tabela, [])
+            if self._operacao == "insert":
+                registros = self._dados if isinstance(self._dados, list) else [self._dados]
+                agora = datetime.now().isoformat()
+                inseridos = []
+                for registro in registros:
+                    novo = {"id": str(uuid.uuid4()), "created_at": agora, "updated_at": agora}
+                    novo.update(copy.deepcopy(registro))
+                    linhas.append(novo)
+                    inseridos.append(dict(novo))
+                return SimpleNamespace(data=inseridos, count=None, error=None)
+            selecionadas = self._filtrar(linhas)
+            if self._operacao == "update":
+                for linha in selecionadas:
+                    linha.update(copy.deepcopy(self._dados))
+                return SimpleNamespace(data=[dict(r) for r in selecionadas], count=None, error=None)
+            if self._operacao == "delete":
+                removidas = {id(r) for r in selecionadas}
+                self._banco.tabelas[self._tabela] = [r for r in linhas if id(r) not in removidas]
+                return SimpleNamespace(data=[dict(r) for r in selecionadas], count=None, error=None)
+
+            total = len(selecionadas)
+            for coluna, desc in reversed(self._ordem):
+                selecionadas.sort(key=lambda r: (r.get(coluna) is None, r.get(coluna) or ""), reverse=desc)
+            if self._offset or self._limite is not None:
+                fim = None if self._limite is None else self._offset + self._limite
+                selecionadas = selecionadas[self._offset:fim]
+            dados = [self._projetar(r) for r in selecionadas]
+            if self._unico:
+                dados = dados[0] if dados else None
+            return SimpleNamespace(data=dados, count=total if self._contar else None, error=None)
+
+
+class SupabaseEmMemoria:
+    """Substituto em memória do cliente do Supabase (tabelas como listas de dicts)."""
+
+    def __init__(self, usuario_id="usuario-teste", latencia=0.0):
+        self.tabelas = {}
+        self.lock = threading.Lock()
+        self.latencia = latencia
+        usuario = SimpleNamespace(id=usuario_id, email=f"{usuario_id}@exemplo.com")
+        self.auth = SimpleNamespace(
+            get_user=lambda: SimpleNamespace(user=usuario),
+            sign_in_with_password=lambda credenciais: SimpleNamespace(user=usuario),
+            sign_out=lambda: None
+        )
+
+    def table(self, nome):
+        if self.latencia:
+            time.sleep(self.latencia)
+        return _Consulta(self, nome)
+
+    def rpc(self, funcao, params=None):
+        """Funções do banco reimplementadas em Python (FUNCOES_RPC); as demais falham como no PostgREST."""
+        if self.latencia:
+            time.sleep(self.latencia)
+        implementacao = FUNCOES_RPC.get(funcao)
+        if implementacao is None:
+            raise RuntimeError(f"Função {funcao} não encontrada no Supabase em memória")
+        return SimpleNamespace(execute=lambda: SimpleNamespace(
+            data=implementacao(self, **(params or {})), count=None, error=None
+        ))
+
+
+def _percentis_chamadas_llm(banco, p_usuario_id, p_desde):
+    from telemetria_llm import agregar_percentis
+
+    with banco.lock:
+        linhas = [r for r in banco.tabelas.get("chamadas_llm", [])
+                  if r.get("usuario_id") == p_usuario_id and str(r.get("criado_em", "")) >= p_desde]
+    return agregar_percentis(linhas)
+
+
+def _buscar_texto(banco, p_usuario_id, p_consulta, p_tipo=None, p_limite=10, p_offset=0):
+    """Busca por prefixo de palavra, relevância = ocorrências dos termos (sem stemming nem índice)."""
+    from armazenamento import termos_busca
+
+    termos = termos_busca(p_consulta)
+    fontes = [("copy", "copies", "produto_servico", "copy_gerada", "data_geracao"),
+              ("analise", "analises_leads", "objetivo", "analise", "data")]
+    resultados = []
+    with banco.lock:
+        for tipo, tabela, coluna_titulo, coluna_texto, coluna_data in fontes:
+            if not termos or p_tipo not in (None, tipo):
+                continue
+            for linha in banco.tabelas.get(tabela, []):
+                if linha.get("usuario_id") != p_usuario_id:
+                    continue
+                palavras = termos_busca(f"{linha.get(coluna_titulo) or ''} {linha.get(coluna_texto) or ''}")
+                ocorrencias = [sum(p.startswith(t) for p in palavras) for t in termos]
+                if not all(ocorrencias):
+                    continue
+                texto = linha.get(coluna_texto) or ""
+                resultados.append({
+                    "tipo": tipo, "id": linha["id"], "plataforma": linha.get("plataforma"),
+                    "titulo": linha.get(coluna_titulo), "data": linha.get(coluna_data),
+                    "relevancia": float(sum(ocorrencias)), "trecho": texto[:200],
+                })
+    resultados.sort(key=lambda r: (r["relevancia"], str(r["data"] or "")), reverse=True)
+    return resultados[p_offset:p_offset + p_limite]
+
+
+FUNCOES_RPC = {
+    "percentis_chamadas_llm": _percentis_chamadas_llm,
+    "buscar_texto": _buscar_texto,
+}
@@ -0,0 +1,297 @@
+"""
+Deduplicação de leads por identidade, entre vários arquivos enviados juntos.
+
+drop_duplicates() só remove linhas idênticas em todas as colunas: o mesmo lead exportado por
+duas ferramentas (colunas em outra ordem, "E-mail" em vez de "email", telefone formatado de
+outro jeito, email em maiúsculas) sobrevivia e inflava o total de leads. Aqui:
+
+1. as colunas são alinhadas pelo nome normalizado (sem acentos, caixa ou pontuação, com
+   sinônimos como phone/celular/whatsapp -> telefone), mantendo o primeiro nome visto, e os
+   campos da chave são procurados pelo nome canônico ("E-mail" atende a "email");
+2. cada alternativa da chave de identidade é montada com operações vetorizadas de string
+   (email em minúsculas, telefone só com dígitos e sem o 55) e reduzida a um hash de 64 bits,
+   em blocos, então a memória extra é de 8 bytes por linha e alternativa mais um bloco de strings;
+3. linhas que coincidem em qualquer alternativa, mesmo de forma indireta, formam um lead só;
+   fica a primeira, que recebe os campos vazios preenchidos pelas cópias descartadas.
+
+A chave vem de CHAVE_IDENTIDADE_LEADS: alternativas separadas por vírgula, na ordem de
+preferência, e campos compostos com "+" (ex: "email,telefone" ou "nome+cidade"). Linhas sem
+nenhuma alternativa preenchida só são removidas se forem idênticas em todas as colunas.
+"""
+import os
+import re
+import time
+import unicodedata
+
+CHAVE_IDENTIDADE_LEADS = os.getenv("CHAVE_IDENTIDADE_LEADS", "email,telefone")
+TAMANHO_BLOCO = 200_000
+SEPARADOR_CHAVE = "\x1f"
+MIN_DIGITOS_TELEFONE = 8
+ROTULO_LINHA_IDENTICA = "linha_identica"
+
+# Nome normalizado -> nome canônico usado no alinhamento
+SINONIMOS_COLUNAS = {
+    **dict.fromkeys(("email", "e_mail", "mail", "email_address", "endereco_de_email", "endereco_email"), "email"),
+    **dict.fromkeys(("telefone", "phone", "phone_number", "celular", "whatsapp", "fone", "tel", "mobile",
+                     "telefone_celular", "numero_de_telefone"), "telefone"),
+    **dict.fromkeys(("nome", "name", "nome_completo", "full_name"), "nome"),
+}
+
+
+def nome_canonico(coluna):
+    """Nome usado para alinhar colunas: sem acentos, minúsculo, com "_" e sinônimos resolvidos."""
+    texto = unicodedata.normalize("NFKD", str(coluna)).encode("ascii", "ignore").decode("ascii")
+    normalizado = re.sub(r"[^a-z0-9]+", "_", texto.lower()).strip("_")
+    return SINONIMOS_COLUNAS.get(normalizado, normalizado)
+
+
+def alinhar_colunas(dfs):
+    """
+    Renomeia as colunas de cada DataFrame para o primeiro nome visto com o mesmo nome canônico.
+
+    Retorna (dfs renomeados, {índice do arquivo: {nome original: nome usado}}) só com as
+    colunas que mudaram de nome.
+    """
+    nomes_por_canonico = {}
+    alinhados, renomeadas = [], {}
+    for indice, df in enumerate(dfs):
+        mapa = {}
+        usados = set()
+        for coluna in df.columns:
+            canonico = nome_canonico(coluna)
+            destino = nomes_por_canonico.setdefault(canonico, coluna)
+            # Duas colunas do mesmo arquivo com o mesmo nome canônico: a segunda fica como está
+            if destino in usados:
+                destino = coluna
+            usados.add(destino)
+            if destino != coluna:
+                mapa[coluna] = destino
+        alinhados.append(df.rename(columns=mapa) if mapa else df)
+        if mapa:
+            renomeadas[indice] = {str(k): str(v) for k, v in mapa.items()}
+    return alinhados, renomeadas
+
+
+def interpretar_chave(chave=CHAVE_IDENTIDADE_LEADS):
+    """"email,telefone" -> [("email",), ("telefone",)]; "nome+cidade" -> [("nome", "cidade")]."""
+    return [tuple(nome_canonico(campo) for campo in alternativa.split("+") if campo.strip())
+            for alternativa in chave.split(",") if alternativa.strip()]
+
+
+def normalizar_email(serie):
+    """Email em minúsculas e sem espaços; valores sem "@" viram vazio."""
+    emails = serie.astype("string").str.strip().str.lower()
+    return emails.where(emails.str.contains("@", regex=False, na=False))
+
+
+def normalizar_telefone(serie):
+    """Só os dígitos, sem zeros à esquerda nem o código do país (55); menos de 8 dígitos vira vazio."""
+    import numpy as np
+    import pandas as pd
+
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        # Telefones lidos como número (5511999990000.0): tudo em aritmética inteira, sem regex
+        numeros = pd.to_numeric(serie, errors="coerce").round().astype("Int64")
+        tamanho = np.floor(np.log10(numeros.clip(lower=1).astype("float64"))) + 1
+        divisor = (10 ** (tamanho - 2).clip(lower=0)).astype("Int64")
+        com_pais = (tamanho >= 12) & (numeros // divisor == 55)
+        numeros = numeros.mask(com_pais, numeros % divisor)
+        return numeros.where(numeros >= 10 ** (MIN_DIGITOS_TELEFONE - 1)).astype("string")
+    # Colunas mistas (número de um arquivo, texto de outro) trazem "5511999990000.0" como texto
+    textos = serie.astype("string").str.replace(r"\.0+$", "", regex=True)
+    digitos = textos.str.replace(r"\D+", "", regex=True).str.lstrip("0")
+    com_pais = digitos.str.startswith("55") & (digitos.str.len() >= 12)
+    digitos = digitos.mask(com_pais, digitos.str[2:])
+    return digitos.where(digitos.str.len() >= MIN_DIGITOS_TELEFONE)
+
+
+def normalizar_texto(serie):
+    """Texto em minúsculas, sem espaços nas bordas e com espaços simples; vazio vira NA."""
+    textos = serie.astype("string").str.strip().str.lower().str.replace(r"\s+", " ", regex=True)
+    return textos.where(textos.str.len() > 0)
+
+
+NORMALIZADORES = {"email": normalizar_email, "telefone": normalizar_telefone}
+
+
+def colunas_da_chave(colunas, campos):
+    """
+    Colunas do DataFrame que atendem aos campos (canônicos) de uma alternativa da chave.
+
+    "E-mail", "EMAIL" e "Celular" atendem a "email" e "telefone"; com mais de uma coluna para o
+    mesmo campo vale a primeira. Retorna None se algum campo não tiver coluna.
+    """
+    por_canonico = {}
+    for coluna in colunas:
+        por_canonico.setdefault(nome_canonico(coluna), coluna)
+    encontradas = tuple(por_canonico.get(campo) for campo in campos)
+    return None if None in encontradas else encontradas
+
+
+def _valores_chave(bloco, campos, colunas):
+    """Chave composta normalizada de cada linha do bloco (vazio se algum campo estiver vazio)."""
+    chave = None
+    for campo, coluna in zip(campos, colunas):
+        valores = NORMALIZADORES.get(campo, normalizar_texto)(bloco[coluna])
+        chave = valores if chave is None else chave + SEPARADOR_CHAVE + valores
+    return chave
+
+
+def hashes_identidade(df, alternativas, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Hash de 64 bits de cada alternativa da chave, por linha, e onde ele é válido.
+
+    Retorna (hashes, validos), ambos com uma coluna por alternativa e uma última coluna com o
+    hash da linha inteira, usada só nas linhas sem nenhuma alternativa preenchida.
+    """
+    import numpy as np
+    import pandas as pd
+
+    colunas = [colunas_da_chave(df.columns, campos) for campos in alternativas]
+    hashes = np.zeros((len(df), len(alternativas) + 1), dtype=np.uint64)
+    validos = np.zeros((len(df), len(alternativas) + 1), dtype=bool)
+    for inicio in range(0, len(df), tamanho_bloco):
+        bloco = df.iloc[inicio:inicio + tamanho_bloco]
+        fim = inicio + len(bloco)
+        for indice, campos in enumerate(alternativas):
+            if colunas[indice] is None:
+                continue
+            valores = _valores_chave(bloco, campos, colunas[indice])
+            preenchidos = valores.notna().to_numpy()
+            if preenchidos.any():
+                validos[inicio:fim, indice] = preenchidos
+                hashes[inicio:fim, indice][preenchidos] = pd.util.hash_array(
+                    valores[preenchidos].to_numpy(dtype=object))
+        sem_chave = ~validos[inicio:fim, :-1].any(axis=1)
+        if sem_chave.any():
+            validos[inicio:fim, -1] = sem_chave
+            hashes[inicio:fim, -1][sem_chave] = pd.util.hash_pandas_object(bloco[sem_chave], index=False).to_numpy()
+    return hashes, validos
+
+
+def agrupar_identidades(hashes, validos):
+    """
+    Posição da primeira linha do mesmo lead, para cada linha.
+
+    Duas linhas são o mesmo lead se coincidirem em qualquer alternativa, inclusive de forma
+    indireta (A e B pelo email, B e C pelo telefone). Os grupos saem por propagação do menor
+    rótulo: cada passada é um groupby vetorizado por alternativa e poucas passadas bastam.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rotulos = np.arange(len(hashes))
+    mudou = True
+    while mudou:
+        mudou = False
+        for indice in range(hashes.shape[1]):
+            linhas = np.flatnonzero(validos[:, indice])
+            if len(linhas) < 2:
+                continue
+            atuais = rotulos[linhas]
+            menores = pd.Series(atuais).groupby(hashes[linhas, indice], sort=False).transform("min").to_numpy()
+            if (menores < atuais).any():
+                rotulos[linhas] = np.minimum(atuais, menores)
+                mudou = True
+        # Salto de ponteiros: cada linha passa a apontar para o rótulo do seu rótulo
+        while True:
+            saltos = rotulos[rotulos]
+            if (saltos == rotulos).all():
+                break
+            rotulos = saltos
+    return rotulos
+
+
+def _preencher_com_duplicatas(df, rotulos, repetidas):
+    """Completa os campos vazios de quem fica com os valores das cópias descartadas."""
+    import pandas as pd
+
+    em_grupo = pd.Series(rotulos).duplicated(keep=False).to_numpy()
+    if not em_grupo.any():
+        return 0
+    ficam = em_grupo & ~repetidas
+    # Só as colunas com algum vazio em quem fica precisam da mesclagem
+    colunas = df.columns[df[ficam].isna().any().to_numpy()]
+    if not len(colunas):
+        return 0
+    mesclados = df.loc[em_grupo, colunas].groupby(rotulos[em_grupo], sort=False).first()
+    atuais = df.loc[ficam, colunas]
+    novos = mesclados.loc[rotulos[ficam]].set_axis(atuais.index)[atuais.columns]
+    preenchidos = atuais.isna() & novos.notna()
+    total = int(preenchidos.to_numpy().sum())
+    if total:
+        for coluna in preenchidos.columns[preenchidos.any().to_numpy()]:
+            linhas = preenchidos.index[preenchidos[coluna].to_numpy()]
+            df.loc[linhas, coluna] = novos.loc[linhas, coluna]
+    return total
+
+
+def _alternativa_da_remocao(hashes, validos, repetidas):
+    """Para cada linha removida, a primeira alternativa em que ela coincide com outra linha."""
+    import numpy as np
+    import pandas as pd
+
+    origem = np.full(int(repetidas.sum()), hashes.shape[1] - 1, dtype=np.int8)
+    pendentes = np.ones(len(origem), dtype=bool)
+    removidas = np.flatnonzero(repetidas)
+    for indice in range(hashes.shape[1] - 1):
+        linhas = np.flatnonzero(validos[:, indice])
+        coincide = np.zeros(len(hashes), dtype=bool)
+        coincide[linhas] = pd.Series(hashes[linhas, indice]).duplicated(keep=False).to_numpy()
+        marcar = pendentes & coincide[removidas]
+        origem[marcar] = indice
+        pendentes &= ~marcar
+    return origem
+
+
+def deduplicar_leads(dfs, chave=CHAVE_IDENTIDADE_LEADS, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Combina um ou mais DataFrames de leads e remove as repetições pela chave de identidade.
+
+    Retorna (df, estatisticas): o DataFrame sem repetições (índice reiniciado) e um dict
+    serializável com as linhas de entrada e saída, as removidas por tipo de chave, os campos
+    preenchidos na mesclagem e as colunas renomeadas no alinhamento.
+    """
+    import numpy as np
+    import pandas as pd
+
+    inicio = time.perf_counter()
+    if isinstance(dfs, pd.DataFrame):
+        dfs = [dfs]
+    alinhados, renomeadas = alinhar_colunas(list(dfs))
+    if len(alinhados) > 1:
+        df = pd.concat(alinhados, ignore_index=True, sort=False)
+    else:
+        df = alinhados[0].reset_index(drop=True)
+    alternativas = interpretar_chave(chave)
+
+    hashes, validos = hashes_identidade(df, alternativas, tamanho_bloco)
+    rotulos = agrupar_identidades(hashes, validos)
+    repetidas = rotulos != np.arange(len(df))
+    campos_preenchidos = _preencher_com_duplicatas(df, rotulos, repetidas)
+
+    nomes = ["+".join(campos) for campos in alternativas] + [ROTULO_LINHA_IDENTICA]
+    removidas_por_chave = np.bincount(_alternativa_da_remocao(hashes, validos, repetidas), minlength=len(nomes))
+    estatisticas = {
+        "chave": chave,
+        "linhas_entrada": len(df),
+        "linhas_saida": int(len(df) - repetidas.sum()),
+        "duplicatas_removidas": int(repetidas.sum()),
+        "removidas_por_chave": {nome: int(n) for nome, n in zip(nomes, removidas_por_chave) if n},
+        "campos_preenchidos": campos_preenchidos,
+        "colunas_renomeadas": renomeadas,
+        "arquivos": len(alinhados),
+        "duracao_s": round(time.perf_counter() - inicio, 3),
+    }
+    return df[~repetidas].reset_index(drop=True), estatisticas
+
+
+def descrever_deduplicacao(estatisticas):
+    """Resumo curto para a interface, ex: "120 leads repetidos removidos (email: 100, telefone: 20)"."""
+    if not estatisticas["duplicatas_removidas"]:
+        return "Nenhum lead repetido encontrado."
+    por_chave = ", ".join(f"{chave}: {n}" for chave, n in estatisticas["removidas_por_chave"].items())
+    texto = f"{estatisticas['duplicatas_removidas']} leads repetidos removidos ({por_chave})"
+    if estatisticas["campos_preenchidos"]:
+        texto += f"; {estatisticas['campos_preenchidos']} campos vazios completados com as cópias"
+    return texto + "."
@@ -0,0 +1,333 @@
+"""
+Detecção de copies quase duplicadas (MinHash + LSH), por usuário e em memória.
+
+Cada copy salva gera duas assinaturas MinHash (de uma permutação, para carregar rápido): uma
+do briefing normalizado (4-gramas de caracteres de objetivo, público, produto, tom e CTA) e
+outra do texto gerado (5-gramas de caracteres). As assinaturas são divididas em BANDAS; duas
+copies viram candidatas quando alguma banda coincide, e só as candidatas têm a similaridade
+de Jaccard estimada. A plataforma não entra na assinatura do briefing: ela separa os baldes
+das bandas (o mesmo briefing para outro canal não é duplicata).
+
+Para caber centenas de milhares de copies, as assinaturas ficam num array contíguo e cada
+banda é um par de arrays ordenados (chave, linha) consultado por busca binária; inserções
+novas vão para um dicionário que é incorporado aos arrays quando passa de 1/4 do tamanho
+deles (ou de MAX_RECENTES).
+
+O índice é carregado do banco numa thread em segundo plano, disparada pela primeira consulta
+(que não espera: até a carga terminar o detector não aponta duplicatas), em páginas pela chave
+(data_geracao, id). Depois, só busca as copies a partir da última vista: quando os dados do
+usuário mudam (cache_consultas.versao) ou a cada INTERVALO_SINCRONIZACAO segundos. Detectores
+sem uso há DETECTOR_OCIOSO_S segundos, ou além dos MAX_DETECTORES mais recentes, são descartados
+e recarregados no próximo uso.
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from operator import eq
+
+from cache import cache_consultas
+from servicos import CAMPOS_COPY, COLUNAS_HISTORICO_COPIES
+
+LIMIAR_DUPLICATA = float(os.getenv("LIMIAR_DUPLICATA", "0.8"))
+TAMANHO_ASSINATURA = 96
+BANDAS = 12  # 12 bandas de 8 valores: Jaccard 0,8 vira candidata com ~89% de chance, 0,9 com ~100%, 0,3 com <0,1%
+LINHAS_POR_BANDA = TAMANHO_ASSINATURA // BANDAS
+MAX_RECENTES = 20_000
+TAMANHO_LOTE_CARGA = 1000
+INTERVALO_SINCRONIZACAO = 30
+DETECTOR_OCIOSO_S = int(os.getenv("DETECTOR_OCIOSO_S", "1800"))
+MAX_DETECTORES = int(os.getenv("MAX_DETECTORES", "50"))
+CAMPOS_BRIEF = tuple(campo for campo in CAMPOS_COPY if campo != "plataforma")
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos nem pontuação, espaços simples."""
+    sem_acentos = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.findall(r"[a-z0-9]+", sem_acentos.lower()))
+
+
+def shingles_brief(brief):
+    """4-gramas de caracteres de cada campo do briefing, prefixados pelo campo."""
+    shingles = set()
+    for indice, campo in enumerate(CAMPOS_BRIEF):
+        texto = normalizar(brief.get(campo))
+        if len(texto) <= 4:
+            shingles.add(f"{indice}|{texto}")
+        else:
+            shingles.update(f"{indice}|{texto[i:i + 4]}" for i in range(len(texto) - 3))
+    return shingles
+
+
+def shingles_texto(texto):
+    """5-gramas de caracteres do texto normalizado (conjuntos grandes o bastante para preencher as faixas)."""
+    texto = normalizar(texto)
+    if len(texto) <= 5:
+        return {texto}
+    return {texto[i:i + 5] for i in range(len(texto) - 4)}
+
+
+def assinatura(shingles):
+    """
+    Assinatura MinHash de uma permutação: um hash por shingle, mínimo por faixa do hash.
+
+    Faixas vazias (conjuntos pequenos) copiam a próxima faixa preenchida, misturada com a
+    distância, como na densificação de Shrivastava e Li. Usa hash() do Python, que muda entre
+    processos: as assinaturas só valem dentro do processo que as calculou.
+    """
+    vazia = 1 << 64  # maior que qualquer hash()
+    minimos = [vazia] * TAMANHO_ASSINATURA
+    for h in map(hash, shingles):
+        faixa = h % TAMANHO_ASSINATURA
+        if h < minimos[faixa]:
+            minimos[faixa] = h
+    if vazia not in minimos:
+        return minimos
+    if not shingles:
+        return [0] * TAMANHO_ASSINATURA
+    densificada = list(minimos)
+    proxima = None
+    # Duas voltas de trás para frente: a próxima faixa preenchida pode estar no começo
+    for i in range(2 * TAMANHO_ASSINATURA - 1, -1, -1):
+        faixa = i % TAMANHO_ASSINATURA
+        if minimos[faixa] != vazia:
+            proxima = i
+        elif i < TAMANHO_ASSINATURA:
+            densificada[faixa] = minimos[proxima % TAMANHO_ASSINATURA] ^ ((proxima - i) * 0x9E3779B97F4A7C15)
+    return densificada
+
+
+def _chaves_bandas(valores, grupo=None):
+    """Uma chave por banda; `grupo` (ex: a plataforma) separa os baldes de grupos diferentes."""
+    return [hash((grupo, *valores[i:i + LINHAS_POR_BANDA])) for i in range(0, TAMANHO_ASSINATURA, LINHAS_POR_BANDA)]
+
+
+class _IndiceMinHash:
+    """
+    Assinaturas em array contíguo e, por banda, arrays ordenados (chave, linha) + recentes.
+
+    As bandas usam os valores completos; o array guarda só os 16 bits baixos de cada valor, o
+    bastante para estimar a similaridade (coincidência espúria em 1 de 65536 faixas).
+    """
+
+    def __init__(self):
+        self.assinaturas = array("H")
+        self._chaves = [array("q") for _ in range(BANDAS)]
+        self._linhas = [array("I") for _ in range(BANDAS)]
+        self._recentes = [{} for _ in range(BANDAS)]
+        self._total_recentes = 0
+
+    def adicionar(self, linha, valores, grupo=None):
+        self.assinaturas.extend(v & 0xFFFF for v in valores)
+        for banda, chave in enumerate(_chaves_bandas(valores, grupo)):
+            # Um int por chave; lista só quando a chave se repete (economiza memória)
+            recentes = self._recentes[banda]
+            atual = recentes.get(chave)
+            if atual is None:
+                recentes[chave] = linha
+            elif isinstance(atual, list):
+                atual.append(linha)
+            else:
+                recentes[chave] = [atual, linha]
+        self._total_recentes += 1
+        # Limite proporcional ao tamanho: a carga inicial compacta O(log n) vezes, não O(n)
+        if self._total_recentes >= max(MAX_RECENTES, len(self._chaves[0]) // 4):
+            self.compactar()
+
+    def compactar(self):
+        """Incorpora as inserções recentes aos arrays ordenados, uma banda por vez."""
+        for banda in range(BANDAS):
+            chaves, linhas = self._chaves[banda], self._linhas[banda]
+            for chave, linhas_chave in self._recentes[banda].items():
+                if isinstance(linhas_chave, list):
+                    chaves.extend([chave] * len(linhas_chave))
+                    linhas.extend(linhas_chave)
+                else:
+                    chaves.append(chave)
+                    linhas.append(linhas_chave)
+            ordem = sorted(range(len(chaves)), key=chaves.__getitem__)
+            self._chaves[banda] = array("q", [chaves[i] for i in ordem])
+            self._linhas[banda] = array("I", [linhas[i] for i in ordem])
+            self._recentes[banda] = {}
+        self._total_recentes = 0
+
+    def candidatas(self, valores, grupo=None):
+        encontradas = set()
+        for banda, chave in enumerate(_chaves_bandas(valores, grupo)):
+            chaves, linhas = self._chaves[banda], self._linhas[banda]
+            inicio = posicao = bisect_left(chaves, chave)
+            while posicao < len(chaves) and chaves[posicao] == chave:
+                posicao += 1
+            encontradas.update(linhas[inicio:posicao])
+            recentes = self._recentes[banda].get(chave)
+            if isinstance(recentes, list):
+                encontradas.update(recentes)
+            elif recentes is not None:
+                encontradas.add(recentes)
+        return encontradas
+
+    def similaridade(self, linha, valores_16_bits):
+        """Jaccard estimada: fração das faixas com o mesmo mínimo."""
+        inicio = linha * TAMANHO_ASSINATURA
+        guardada = self.assinaturas[inicio:inicio + TAMANHO_ASSINATURA]
+        return sum(map(eq, guardada, valores_16_bits)) / TAMANHO_ASSINATURA
+
+
+class DetectorDuplicatas:
+    """Índices de briefing e de texto das copies de um usuário."""
+
+    def __init__(self, usuario_id):
+        self.usuario_id = usuario_id
+        self.ids = []
+        self._plataformas = array("B")
+        self._nomes_plataformas = []
+        self._brief = _IndiceMinHash()
+        self._texto = _IndiceMinHash()
+        self._ultima_data = None
+        self._ids_na_ultima_data = set()
+        self._versao = None
+        self._sincronizado_em = 0.0
+        self._lock = threading.Lock()
+        self._carga = None  # thread da carga inicial em segundo plano
+        self.pronto = False  # carga inicial concluída
+        self.usado_em = time.monotonic()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _codigo_plataforma(self, plataforma):
+        if plataforma not in self._nomes_plataformas:
+            self._nomes_plataformas.append(plataforma)
+        return self._nomes_plataformas.index(plataforma)
+
+    def adicionar_varias(self, copies):
+        """Inclui copies (linhas da tabela copies, em ordem crescente de data_geracao)."""
+        for copy in copies:
+            linha = len(self.ids)
+            self.ids.append(copy["id"])
+            self._plataformas.append(self._codigo_plataforma(copy.get("plataforma")))
+            self._brief.adicionar(linha, assinatura(shingles_brief(copy)), copy.get("plataforma"))
+            self._texto.adicionar(linha, assinatura(shingles_texto(copy.get("copy_gerada"))))
+            data = copy.get("data_geracao")
+            if data is None:
+                continue
+            if self._ultima_data is None or data > self._ultima_data:
+                self._ultima_data, self._ids_na_ultima_data = data, {copy["id"]}
+            elif data == self._ultima_data:
+                self._ids_na_ultima_data.add(copy["id"])
+
+    def sincronizar(self, supabase):
+        """
+        Busca as copies salvas desde a última sincronização (todas, na primeira).
+
+        Paginação pela chave (data_geracao, id), como em servicos.pagina_copies: copies salvas
+        em lote compartilham o mesmo data_geracao, então a consulta usa gte e pede, além do
+        lote, as linhas desse instante que já estão no índice, que são descartadas.
+        """
+        versao = cache_consultas.versao(self.usuario_id)
+        with self._lock:
+            if versao == self._versao and time.monotonic() - self._sincronizado_em < INTERVALO_SINCRONIZACAO:
+                return
+            while True:
+                consulta = supabase.table('copies').select(COLUNAS_HISTORICO_COPIES).eq('usuario_id', self.usuario_id)
+                if self._ultima_data is not None:
+                    consulta = consulta.gte('data_geracao', self._ultima_data)
+                limite = TAMANHO_LOTE_CARGA + len(self._ids_na_ultima_data)
+                linhas = consulta.order('data_geracao').order('id').limit(limite).execute().data or []
+                self.adicionar_varias([l for l in linhas if l['id'] not in self._ids_na_ultima_data])
+                if len(linhas) < limite:
+                    break
+            self._versao = versao
+            self._sincronizado_em = time.monotonic()
+            self.pronto = True
+
+    def iniciar_carga(self, supabase):
+        """Dispara a carga inicial numa thread (uma vez); retorna sem esperar."""
+        with _lock_detectores:
+            if self._carga is not None:
+                return
+            self._carga = threading.Thread(target=self._carregar, args=(supabase,),
+                                           name=f"carga-duplicatas-{self.usuario_id}", daemon=True)
+        self._carga.start()
+
+    def _carregar(self, supabase):
+        inicio = time.perf_counter()
+        try:
+            self.sincronizar(supabase)
+            print(f"Índice de duplicatas carregado: {len(self)} copies em {time.perf_counter() - inicio:.1f}s")
+        except Exception as e:
+            print(f"Erro ao carregar o índice de duplicatas: {e}")
+            with _lock_detectores:
+                self._carga = None  # nova tentativa no próximo uso
+
+    def _proximas(self, indice, valores, plataforma, limiar, k):
+        codigo = self._nomes_plataformas.index(plataforma) if plataforma in self._nomes_plataformas else None
+        if plataforma is not None and codigo is None:
+            return []
+        resultados = []
+        valores_16_bits = array("H", (v & 0xFFFF for v in valores))
+        for linha in indice.candidatas(valores, plataforma):
+            # O grupo do balde já separa as plataformas; a conferência cobre colisões de hash
+            if codigo is not None and self._plataformas[linha] != codigo:
+                continue
+            similaridade = indice.similaridade(linha, valores_16_bits)
+            if similaridade >= limiar:
+                resultados.append((self.ids[linha], similaridade))
+                # O mesmo briefing salvo muitas vezes gera baldes enormes: k idênticas bastam
+                if similaridade == 1.0 and sum(1 for _, s in resultados if s == 1.0) >= k:
+                    break
+        resultados.sort(key=lambda item: item[1], reverse=True)
+        return resultados[:k]
+
+    def briefs_parecidos(self, brief, limiar=LIMIAR_DUPLICATA, k=3):
+        """[(copy_id, similaridade)] das copies da mesma plataforma com briefing quase igual."""
+        return self._proximas(self._brief, assinatura(shingles_brief(brief)), brief.get("plataforma"), limiar, k)
+
+    def textos_parecidos(self, texto, limiar=LIMIAR_DUPLICATA, k=3):
+        """[(copy_id, similaridade)] das copies (de qualquer plataforma) com texto quase igual."""
+        return self._proximas(self._texto, assinatura(shingles_texto(texto)), None, limiar, k)
+
+
+_detectores = OrderedDict()  # usuario_id -> detector, do menos para o mais usado
+_lock_detectores = threading.Lock()
+
+
+def _descartar_ociosos(agora):
+    """Remove (já com o lock) os detectores ociosos e os que passam de MAX_DETECTORES."""
+    while _detectores:
+        usuario_id, detector = next(iter(_detectores.items()))
+        if len(_detectores) <= MAX_DETECTORES and agora - detector.usado_em < DETECTOR_OCIOSO_S:
+            break
+        del _detectores[usuario_id]
+
+
+def detector_duplicatas(supabase, usuario_id):
+    """
+    Detector do usuário (um por processo).
+
+    Na primeira vez a carga vai para segundo plano e o detector volta com pronto=False (não
+    consulte até ficar pronto); depois disso, cada uso só sincroniza as copies novas.
+    """
+    agora = time.monotonic()
+    with _lock_detectores:
+        detector = _detectores.get(usuario_id)
+        if detector is None:
+            detector = _detectores[usuario_id] = DetectorDuplicatas(usuario_id)
+        _detectores.move_to_end(usuario_id)
+        detector.usado_em = agora
+        _descartar_ociosos(agora)
+    if detector.pronto:
+        detector.sincronizar(supabase)
+    else:
+        detector.iniciar_carga(supabase)
+    return detector
+
+
+def buscar_copy(supabase, copy_id):
+    """Linha completa de uma copy (para oferecer a existente no lugar de gerar outra)."""
+    response = supabase.table('copies').select(COLUNAS_HISTORICO_COPIES).eq('id', copy_id).limit(1).execute()
+    return response.data[0] if response.data else None
@@ -0,0 +1,76 @@
+"""Geração de copies em lote: várias plataformas e variantes a partir de um único briefing."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from limitador_taxa import limitador_openai
+from prompts import mensagens_copy, tokens_em_cache
+from telemetria_llm import chamar_chat
+
+# Máximo de variantes pedidas com n= em uma única chamada
+MAX_VARIANTES_POR_CHAMADA = 5
+
+
+def gerar_variantes_plataforma(client, plataforma, brief, n_variantes, max_tokens, modelo,
+                               limitador=limitador_openai, usuario_id=None):
+    """
+    Gera n_variantes copies de uma plataforma usando n= na chamada.
+
+    Não usa Streamlit: pode rodar em threads. Retorna um dict com as copies, o uso de
+    tokens e a latência, ou com a chave "erro" preenchida em caso de falha.
+    """
+    mensagens = mensagens_copy(
+        plataforma, brief["objetivo"], brief["publico_alvo"], brief["produto_servico"],
+        brief["tom_de_voz"], brief["cta"], brief.get("informacoes_adicionais", ""), max_tokens
+    )
+    resultado = {
+        "plataforma": plataforma,
+        "copies": [],
+        "total_tokens": 0,
+        "prompt_tokens": 0,
+        "cached_tokens": 0,
+        "latencia_api": 0.0,
+        "erro": None
+    }
+    try:
+        restantes = n_variantes
+        while restantes > 0:
+            n = min(restantes, MAX_VARIANTES_POR_CHAMADA)
+            response, telemetria = chamar_chat(
+                client, "copy_lote", plataforma=plataforma, usuario_id=usuario_id, limitador=limitador,
+                model=modelo,
+                messages=mensagens,
+                temperature=0.9 if n > 1 else 0.7,  # Mais diversidade entre variantes A/B
+                max_tokens=max_tokens,
+                n=n
+            )
+            resultado["latencia_api"] += telemetria["latencia_ms"] / 1000
+            resultado["copies"].extend(choice.message.content.strip() for choice in response.choices)
+            resultado["total_tokens"] += response.usage.total_tokens
+            resultado["prompt_tokens"] += response.usage.prompt_tokens
+            resultado["cached_tokens"] += tokens_em_cache(response.usage)
+            restantes -= n
+    except Exception as e:
+        resultado["erro"] = str(e)
+    return resultado
+
+
+def gerar_copies_em_lote(client, brief, variantes_por_plataforma, tokens_por_plataforma, modelo,
+                         limitador=limitador_openai, max_workers=None, usuario_id=None):
+    """
+    Dispara a geração de todas as plataformas em paralelo (sob o limitador de taxa).
+
+    variantes_por_plataforma: {plataforma: número de variantes}.
+    É um gerador: cada resultado é devolvido assim que fica pronto.
+    """
+    plataformas = [p for p, n in variantes_por_plataforma.items() if n > 0]
+    if not plataformas:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers or len(plataformas)) as executor:
+        futuros = [
+            executor.submit(
+                gerar_variantes_plataforma, client, plataforma, brief, variantes_por_plataforma[plataforma],
+                tokens_por_plataforma.get(plataforma, 300), modelo, limitador, usuario_id
+            )
+            for plataforma in plataformas
+        ]
+        for futuro in as_completed(futuros):
+            yield futuro.result()
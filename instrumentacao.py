@@ -0,0 +1,254 @@
+"""
+Instrumentação das chamadas ao Supabase (PostgREST e Auth) com detector de N+1.
+
+ClienteInstrumentado envolve o cliente do supabase-py e registra, para cada execute(), a
+tabela, a operação, os filtros, a latência, os bytes enviados/recebidos e o número de linhas.
+As chamadas são agrupadas por rerun do Streamlit (iniciar_rerun/finalizar_rerun, por thread);
+consultas com a mesma forma (tabela, operação, colunas e filtros, sem os valores) repetidas
+LIMIAR_N_MAIS_1 vezes ou mais no mesmo rerun são marcadas como candidatas a N+1.
+
+Ativa com MENCARE_DEBUG=1 ou SUPABASE_TRACE_ARQUIVO=<caminho.jsonl>; no segundo caso cada rerun
+(e cada chamada feita fora de um rerun, ex: jobs em segundo plano) vira uma linha do arquivo.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+SUPABASE_TRACE_ARQUIVO = os.getenv("SUPABASE_TRACE_ARQUIVO")
+INSTRUMENTACAO_HABILITADA = bool(SUPABASE_TRACE_ARQUIVO) or os.getenv("MENCARE_DEBUG", "").lower() in ("1", "true", "sim")
+LIMIAR_N_MAIS_1 = int(os.getenv("LIMIAR_N_MAIS_1", "3"))
+
+METODOS_OPERACAO = ("select", "insert", "update", "upsert", "delete")
+_MAX_CARACTERES_VALOR = 60
+
+_local = threading.local()
+_lock_trace = threading.Lock()
+
+
+def _bytes_json(valor):
+    if valor is None:
+        return 0
+    try:
+        return len(json.dumps(valor, default=str, ensure_ascii=False).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _resumir_valor(valor):
+    texto = repr(valor)
+    return texto if len(texto) <= _MAX_CARACTERES_VALOR else texto[:_MAX_CARACTERES_VALOR - 1] + "…"
+
+
+def _escrever_trace(registro):
+    if not SUPABASE_TRACE_ARQUIVO:
+        return
+    diretorio = os.path.dirname(SUPABASE_TRACE_ARQUIVO)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    linha = json.dumps(registro, default=str, ensure_ascii=False)
+    with _lock_trace, open(SUPABASE_TRACE_ARQUIVO, "a", encoding="utf-8") as f:
+        f.write(linha + "\n")
+
+
+class RegistroRerun:
+    """Chamadas ao Supabase feitas durante um rerun."""
+
+    def __init__(self, rotulo=""):
+        self.rotulo = rotulo
+        self.inicio = time.time()
+        self.duracao = None
+        self.chamadas = []
+        self._lock = threading.Lock()
+
+    def adicionar(self, chamada):
+        with self._lock:
+            self.chamadas.append(chamada)
+
+    def candidatos_n_mais_1(self, limiar=LIMIAR_N_MAIS_1):
+        """Formas de consulta repetidas no rerun, da que mais custou tempo para a que menos custou."""
+        por_forma = defaultdict(list)
+        for chamada in self.chamadas:
+            por_forma[chamada["forma"]].append(chamada)
+        candidatos = [
+            {
+                "forma": forma,
+                "tabela": chamadas[0]["tabela"],
+                "operacao": chamadas[0]["operacao"],
+                "repeticoes": len(chamadas),
+                "tempo_total_ms": round(sum(c["latencia_ms"] for c in chamadas), 1),
+                "exemplo_filtros": chamadas[0]["filtros"],
+            }
+            for forma, chamadas in por_forma.items() if len(chamadas) >= limiar
+        ]
+        return sorted(candidatos, key=lambda c: c["tempo_total_ms"], reverse=True)
+
+    def resumo(self):
+        por_tabela = defaultdict(int)
+        for chamada in self.chamadas:
+            por_tabela[chamada["tabela"]] += 1
+        return {
+            "rotulo": self.rotulo,
+            "inicio": datetime.fromtimestamp(self.inicio).isoformat(),
+            "duracao_ms": round(self.duracao * 1000, 1) if self.duracao is not None else None,
+            "total_chamadas": len(self.chamadas),
+            "tempo_supabase_ms": round(sum(c["latencia_ms"] for c in self.chamadas), 1),
+            "bytes_recebidos": sum(c["bytes_recebidos"] for c in self.chamadas),
+            "bytes_enviados": sum(c["bytes_enviados"] for c in self.chamadas),
+            "por_tabela": dict(por_tabela),
+            "candidatos_n_mais_1": self.candidatos_n_mais_1(),
+        }
+
+
+def iniciar_rerun(rotulo=""):
+    """Abre o registro do rerun da thread atual (fechando o anterior, se ficou aberto)."""
+    if getattr(_local, "rerun", None) is not None:
+        finalizar_rerun()
+    _local.rerun = RegistroRerun(rotulo)
+    return _local.rerun
+
+
+def finalizar_rerun():
+    """Fecha o registro da thread atual, grava no trace e o retorna (ou None)."""
+    registro = getattr(_local, "rerun", None)
+    _local.rerun = None
+    if registro is None:
+        return None
+    registro.duracao = time.time() - registro.inicio
+    if SUPABASE_TRACE_ARQUIVO:
+        _escrever_trace(dict(registro.resumo(), chamadas=registro.chamadas))
+    return registro
+
+
+def _registrar(chamada):
+    registro = getattr(_local, "rerun", None)
+    if registro is not None:
+        registro.adicionar(chamada)
+    elif SUPABASE_TRACE_ARQUIVO:
+        # Fora de um rerun (jobs, API, CLI): uma linha por chamada
+        _escrever_trace({"rotulo": threading.current_thread().name, "chamadas": [chamada]})
+
+
+class _ConsultaInstrumentada:
+    """Envolve o query builder do postgrest-py e registra o execute()."""
+
+    def __init__(self, builder, tabela):
+        self._builder = builder
+        self._tabela = tabela
+        self._operacao = "select"
+        self._colunas = "*"
+        self._filtros = []
+        self._bytes_enviados = 0
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._builder, nome)
+        if not callable(atributo):
+            # Propriedades como .not_ devolvem outro builder
+            if hasattr(atributo, "execute"):
+                self._builder = atributo
+                self._filtros.append((nome, None, None))
+                return self
+            return atributo
+
+        def chamar(*args, **kwargs):
+            resultado = atributo(*args, **kwargs)
+            if nome in METODOS_OPERACAO:
+                self._operacao = nome
+                if nome == "select":
+                    self._colunas = args[0] if args else kwargs.get("columns", "*")
+                elif args:
+                    self._bytes_enviados += _bytes_json(args[0])
+            else:
+                coluna = args[0] if args and isinstance(args[0], str) else None
+                resto = args[1:] if coluna is not None else args
+                if resto:
+                    valor = _resumir_valor(resto[0] if len(resto) == 1 else resto)
+                else:
+                    valor = _resumir_valor(kwargs) if kwargs else None
+                self._filtros.append((nome, coluna, valor))
+            if hasattr(resultado, "execute"):
+                self._builder = resultado
+                return self
+            return resultado
+
+        return chamar
+
+    def execute(self):
+        inicio = time.perf_counter()
+        erro = None
+        resposta = None
+        try:
+            resposta = self._builder.execute()
+            return resposta
+        except Exception as e:
+            erro = str(e)
+            raise
+        finally:
+            dados = getattr(resposta, "data", None)
+            _registrar({
+                "tabela": self._tabela,
+                "operacao": self._operacao,
+                "colunas": self._colunas,
+                "filtros": [f"{metodo}({'='.join(p for p in (coluna, valor) if p)})"
+                            for metodo, coluna, valor in self._filtros],
+                "forma": "|".join([self._tabela, self._operacao, str(self._colunas)]
+                                  + [f"{metodo}:{coluna}" for metodo, coluna, _ in self._filtros]),
+                "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2),
+                "bytes_enviados": self._bytes_enviados,
+                "bytes_recebidos": _bytes_json(dados),
+                "linhas": len(dados) if isinstance(dados, list) else (1 if dados else 0),
+                "erro": erro,
+                "momento": datetime.now().isoformat(),
+            })
+
+
+class _AuthInstrumentado:
+    """Registra as chamadas de supabase.auth (get_user faz uma requisição a cada chamada)."""
+
+    def __init__(self, auth):
+        self._auth = auth
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._auth, nome)
+        if not callable(atributo):
+            return atributo
+
+        def chamar(*args, **kwargs):
+            inicio = time.perf_counter()
+            erro = None
+            try:
+                return atributo(*args, **kwargs)
+            except Exception as e:
+                erro = str(e)
+                raise
+            finally:
+                _registrar({
+                    "tabela": "auth", "operacao": nome, "colunas": "", "filtros": [], "forma": f"auth|{nome}",
+                    "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2),
+                    "bytes_enviados": 0, "bytes_recebidos": 0, "linhas": 0, "erro": erro,
+                    "momento": datetime.now().isoformat(),
+                })
+
+        return chamar
+
+
+class ClienteInstrumentado:
+    """Cliente do Supabase com table(), rpc() e auth instrumentados; o resto é repassado."""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self.auth = _AuthInstrumentado(cliente.auth)
+
+    def table(self, nome):
+        return _ConsultaInstrumentada(self._cliente.table(nome), nome)
+
+    def rpc(self, funcao, params=None, *args, **kwargs):
+        consulta = _ConsultaInstrumentada(self._cliente.rpc(funcao, params or {}, *args, **kwargs), f"rpc:{funcao}")
+        consulta._operacao = "rpc"
+        consulta._bytes_enviados = _bytes_json(params)
+        return consulta
+
+    def __getattr__(self, nome):
+        return getattr(self._cliente, nome)
@@ -0,0 +1,160 @@
+"""
+Execução de análises longas em segundo plano.
+
+Os jobs rodam em um pool de threads do processo (a chamada à OpenAI é I/O) e o estado
+fica em uma tabela SQLite local, então sobrevive a reruns do Streamlit e a recarregar a
+página. Envios repetidos do mesmo CSV (mesmo fingerprint) reaproveitam o job existente.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+CAMINHO_BANCO_JOBS = os.getenv("CAMINHO_BANCO_JOBS", os.path.join(".mencare", "jobs.db"))
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+
+STATUS_PENDENTE = "pendente"
+STATUS_EXECUTANDO = "executando"
+STATUS_CONCLUIDO = "concluido"
+STATUS_ERRO = "erro"
+STATUS_ATIVOS = (STATUS_PENDENTE, STATUS_EXECUTANDO)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    usuario_id TEXT,
+    tipo TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL,
+    parametros TEXT,
+    resultado TEXT,
+    erro TEXT,
+    criado_em TEXT NOT NULL,
+    iniciado_em TEXT,
+    concluido_em TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_usuario_fingerprint ON jobs(usuario_id, fingerprint);
+CREATE INDEX IF NOT EXISTS idx_jobs_usuario_criado ON jobs(usuario_id, criado_em);
+"""
+
+
+def fingerprint_dataframe(df, *parametros):
+    """Hash do conteúdo do DataFrame (colunas + valores) e dos parâmetros da análise."""
+    import pandas as pd
+
+    sha = hashlib.sha256()
+    sha.update(json.dumps([str(c) for c in df.columns], ensure_ascii=False).encode("utf-8"))
+    sha.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    sha.update(json.dumps(parametros, ensure_ascii=False, default=str).encode("utf-8"))
+    return sha.hexdigest()
+
+
+class ExecutorJobs:
+    """Pool de workers com tabela de jobs persistida em SQLite."""
+
+    def __init__(self, caminho_banco=CAMINHO_BANCO_JOBS, max_workers=JOBS_MAX_WORKERS):
+        self.caminho_banco = caminho_banco
+        diretorio = os.path.dirname(caminho_banco)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-analise")
+        with self._conectar() as conn:
+            conn.executescript(_SCHEMA)
+            # Jobs ativos de um processo anterior não têm mais worker: marcar como interrompidos
+            conn.execute(
+                f"UPDATE jobs SET status = ?, erro = ?, concluido_em = ? WHERE status IN ({','.join('?' * len(STATUS_ATIVOS))})",
+                (STATUS_ERRO, "Interrompido (o servidor foi reiniciado). Envie a análise novamente.",
+                 datetime.now().isoformat(), *STATUS_ATIVOS)
+            )
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.caminho_banco, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _linha_para_job(linha):
+        if linha is None:
+            return None
+        job = dict(linha)
+        job["parametros"] = json.loads(job["parametros"]) if job.get("parametros") else {}
+        job["resultado"] = json.loads(job["resultado"]) if job.get("resultado") else None
+        return job
+
+    def submeter(self, usuario_id, tipo, fingerprint, parametros, funcao, *args, **kwargs):
+        """
+        Enfileira funcao(*args, **kwargs) como um job.
+
+        Retorna (job_id, novo). Se já existe um job ativo ou concluído com o mesmo
+        fingerprint para o usuário, devolve esse job sem enfileirar outro.
+        """
+        with self._lock, self._conectar() as conn:
+            existente = conn.execute(
+                "SELECT id FROM jobs WHERE usuario_id IS ? AND tipo = ? AND fingerprint = ? AND status != ? "
+                "ORDER BY criado_em DESC LIMIT 1",
+                (usuario_id, tipo, fingerprint, STATUS_ERRO)
+            ).fetchone()
+            if existente:
+                return existente["id"], False
+            job_id = str(uuid.uuid4())
+            conn.execute(
+                "INSERT INTO jobs (id, usuario_id, tipo, fingerprint, status, parametros, criado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, usuario_id, tipo, fingerprint, STATUS_PENDENTE,
+                 json.dumps(parametros, ensure_ascii=False, default=str), datetime.now().isoformat())
+            )
+        self._executor.submit(self._executar, job_id, funcao, args, kwargs)
+        return job_id, True
+
+    def _atualizar(self, job_id, **campos):
+        colunas = ", ".join(f"{nome} = ?" for nome in campos)
+        with self._conectar() as conn:
+            conn.execute(f"UPDATE jobs SET {colunas} WHERE id = ?", (*campos.values(), job_id))
+
+    def _executar(self, job_id, funcao, args, kwargs):
+        self._atualizar(job_id, status=STATUS_EXECUTANDO, iniciado_em=datetime.now().isoformat())
+        try:
+            resultado = funcao(*args, **kwargs)
+            self._atualizar(
+                job_id, status=STATUS_CONCLUIDO, concluido_em=datetime.now().isoformat(),
+                resultado=json.dumps(resultado, ensure_ascii=False, default=str)
+            )
+        except Exception as e:
+            self._atualizar(job_id, status=STATUS_ERRO, concluido_em=datetime.now().isoformat(), erro=str(e))
+
+    def obter(self, job_id):
+        """Retorna o job como dict (parametros e resultado já decodificados) ou None."""
+        with self._conectar() as conn:
+            linha = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._linha_para_job(linha)
+
+    def listar(self, usuario_id, limite=10, tipo=None):
+        """Jobs mais recentes do usuário."""
+        consulta = "SELECT * FROM jobs WHERE usuario_id IS ?"
+        parametros = [usuario_id]
+        if tipo:
+            consulta += " AND tipo = ?"
+            parametros.append(tipo)
+        consulta += " ORDER BY criado_em DESC LIMIT ?"
+        parametros.append(limite)
+        with self._conectar() as conn:
+            linhas = conn.execute(consulta, parametros).fetchall()
+        return [self._linha_para_job(linha) for linha in linhas]
+
+
+_executor_jobs = None
+_lock_executor = threading.Lock()
+
+
+def obter_executor_jobs():
+    """Executor único do processo: sobrevive aos reruns do script do Streamlit."""
+    global _executor_jobs
+    with _lock_executor:
+        if _executor_jobs is None:
+            _executor_jobs = ExecutorJobs()
+        return _executor_jobs
@@ -0,0 +1,265 @@
+"""
+Leitura dos arquivos de leads enviados: CSV, XLSX, Parquet e JSONL.
+
+O formato vem da extensão (ou, sem extensão conhecida, dos primeiros bytes) e cada formato
+tem o seu leitor em LEITORES; registrar_leitor() acrescenta outros. Nos CSVs:
+
+- separador, encoding e vírgula decimal são detectados nos primeiros TAMANHO_PREFIXO bytes,
+  então o ";" em Latin-1 que o Excel brasileiro salva é lido sem configuração;
+- com MOTOR_CSV_LEADS=auto (padrão) o parser é o do Arrow (pyarrow.csv, multithread) e o
+  do pandas fica como reserva: sem pyarrow instalado ou quando o Arrow recusa o arquivo
+  (tipos que mudam no meio da coluna, por exemplo). O resultado tem os mesmos dtypes do
+  pandas: datas continuam como texto.
+"""
+import codecs
+import csv
+import io
+import os
+import re
+import time
+
+# "auto" (Arrow quando disponível), "pyarrow" ou "c" (parser padrão do pandas)
+MOTOR_CSV_LEADS = os.getenv("MOTOR_CSV_LEADS", "auto")
+TAMANHO_PREFIXO = 64 * 1024
+LINHAS_DETECCAO = 50
+SEPARADORES = (",", ";", "\t", "|")
+# Ordem de tentativa: cp1252 é o que o Excel no Windows usa; latin-1 aceita qualquer byte
+ENCODINGS = ("utf-8", "cp1252", "latin-1")
+
+_PADRAO_DECIMAL_VIRGULA = re.compile(r"^-?\d+,\d+$")
+_PADRAO_DECIMAL_PONTO = re.compile(r"^-?\d+\.\d+$")
+_PADRAO_DICA_SEPARADOR = re.compile(r"^sep=(.)\s*$")
+
+# Formato -> função que recebe os bytes e devolve (DataFrame, detalhes da leitura)
+LEITORES = {}
+EXTENSOES = {}
+
+
+def registrar_leitor(formato, extensoes):
+    """Decorador que registra o leitor de um formato e as extensões que ele atende."""
+    def registrar(funcao):
+        LEITORES[formato] = funcao
+        for extensao in extensoes:
+            EXTENSOES[extensao] = formato
+        return funcao
+    return registrar
+
+
+def _pyarrow_disponivel():
+    try:
+        import pyarrow.csv  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def detectar_encoding(prefixo):
+    """Encoding do texto pelos primeiros bytes: BOM, depois UTF-8 estrito e por fim cp1252/latin-1."""
+    if prefixo.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if prefixo.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    for encoding in ENCODINGS:
+        try:
+            prefixo.decode(encoding)
+            return encoding
+        except UnicodeDecodeError as e:
+            # Um caractere multibyte cortado no fim do prefixo não conta como erro
+            if encoding == "utf-8" and e.start >= len(prefixo) - 3 and e.reason == "unexpected end of data":
+                return encoding
+    return "latin-1"
+
+
+def detectar_formato_csv(prefixo):
+    """
+    Separador, encoding, vírgula decimal e linhas a pular, detectados no início do arquivo.
+
+    Retorna um dict com as chaves sep, encoding, decimal e skiprows (argumentos de pd.read_csv).
+    """
+    encoding = detectar_encoding(prefixo)
+    texto = prefixo.decode(encoding, errors="ignore")
+    linhas = texto.splitlines()
+    if len(prefixo) >= TAMANHO_PREFIXO and len(linhas) > 1:
+        linhas = linhas[:-1]  # a última linha do prefixo pode estar cortada
+    linhas = linhas[:LINHAS_DETECCAO]
+
+    # Excel às vezes grava "sep=;" na primeira linha
+    dica = _PADRAO_DICA_SEPARADOR.match(linhas[0]) if linhas else None
+    skiprows = 1 if dica else 0
+    linhas = linhas[skiprows:]
+    if dica:
+        separador = dica.group(1)
+    else:
+        # Separador que divide o cabeçalho em mais colunas com o mesmo número de campos nas demais linhas
+        melhor = (0.0, 1)
+        separador = ","
+        for candidato in SEPARADORES:
+            contagens = [len(campos) for campos in csv.reader(linhas, delimiter=candidato)]
+            if not contagens or contagens[0] < 2:
+                continue
+            consistencia = sum(1 for n in contagens if n == contagens[0]) / len(contagens)
+            if (consistencia, contagens[0]) > melhor:
+                melhor = (consistencia, contagens[0])
+                separador = candidato
+
+    decimal = "."
+    if separador != ",":
+        celulas = [c.strip() for campos in csv.reader(linhas[1:], delimiter=separador) for c in campos]
+        com_virgula = sum(1 for c in celulas if _PADRAO_DECIMAL_VIRGULA.match(c))
+        if com_virgula > sum(1 for c in celulas if _PADRAO_DECIMAL_PONTO.match(c)):
+            decimal = ","
+    return {"sep": separador, "encoding": encoding, "decimal": decimal, "skiprows": skiprows}
+
+
+def opcoes_csv(caminho):
+    """Argumentos de pd.read_csv para um CSV em disco (para leituras em blocos, com chunksize)."""
+    with open(caminho, "rb") as arquivo:
+        return detectar_formato_csv(arquivo.read(TAMANHO_PREFIXO))
+
+
+def _ler_csv_pyarrow(conteudo, opcoes):
+    """Parser multithread do Arrow com as opções detectadas; datas ficam como texto, como no pandas."""
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    # Arrow lê UTF-8 direto (e ignora o BOM); outros encodings são convertidos antes do parse
+    encoding = "utf8" if opcoes["encoding"] in ("utf-8", "utf-8-sig") else opcoes["encoding"]
+    leitura = pa_csv.ReadOptions(encoding=encoding, skip_rows=opcoes["skiprows"], use_threads=True)
+    parse = pa_csv.ParseOptions(delimiter=opcoes["sep"])
+
+    def conversao(tipos_colunas=None):
+        return pa_csv.ConvertOptions(strings_can_be_null=True, decimal_point=opcoes["decimal"],
+                                     column_types=tipos_colunas)
+
+    # O Arrow converte datas ISO em date/timestamp; o pandas as mantém como texto
+    prefixo = conteudo[:TAMANHO_PREFIXO]
+    if len(conteudo) > TAMANHO_PREFIXO:
+        prefixo = prefixo[:prefixo.rfind(b"\n") + 1] or prefixo
+    esquema = pa_csv.read_csv(pa.BufferReader(prefixo), read_options=leitura, parse_options=parse,
+                              convert_options=conversao()).schema
+    texto = {campo.name: pa.string() for campo in esquema if pa.types.is_temporal(campo.type)}
+    tabela = pa_csv.read_csv(pa.BufferReader(conteudo), read_options=leitura, parse_options=parse,
+                             convert_options=conversao(texto))
+    if encoding == "utf8" and any(pa.types.is_binary(campo.type) for campo in tabela.schema):
+        # Bytes inválidos em UTF-8 depois do prefixo viram colunas binárias: é Latin-1 mais adiante
+        opcoes["encoding"] = "cp1252"
+        return _ler_csv_pyarrow(conteudo, opcoes)
+    return tabela.to_pandas()
+
+
+def _ler_csv_pandas(conteudo, opcoes):
+    import pandas as pd
+
+    return pd.read_csv(io.BytesIO(conteudo), sep=opcoes["sep"], encoding=opcoes["encoding"],
+                       decimal=opcoes["decimal"], skiprows=opcoes["skiprows"])
+
+
+@registrar_leitor("csv", (".csv", ".tsv", ".txt"))
+def ler_csv(conteudo, motor=None):
+    """CSV com separador e encoding detectados, pelo Arrow ou pelo parser do pandas."""
+    motor = motor or MOTOR_CSV_LEADS
+    opcoes = detectar_formato_csv(conteudo[:TAMANHO_PREFIXO])
+    if motor != "c" and _pyarrow_disponivel():
+        import pyarrow as pa
+
+        try:
+            return _ler_csv_pyarrow(conteudo, opcoes), dict(opcoes, motor="pyarrow")
+        except pa.ArrowInvalid as e:
+            if motor == "pyarrow":
+                raise
+            # Tipos que mudam depois do primeiro bloco, aspas malformadas...: o pandas é mais tolerante
+            print(f"Arrow não leu o CSV ({e}); usando o parser do pandas")
+    try:
+        return _ler_csv_pandas(conteudo, opcoes), dict(opcoes, motor="c")
+    except UnicodeDecodeError:
+        if opcoes["encoding"] not in ("utf-8", "utf-8-sig"):
+            raise
+        # Prefixo em UTF-8 e um caractere Latin-1 mais adiante
+        opcoes["encoding"] = "cp1252"
+        return _ler_csv_pandas(conteudo, opcoes), dict(opcoes, motor="c")
+
+
+@registrar_leitor("xlsx", (".xlsx", ".xlsm"))
+def ler_xlsx(conteudo, motor=None):
+    """Primeira planilha de um arquivo do Excel (requer openpyxl)."""
+    import pandas as pd
+
+    try:
+        return pd.read_excel(io.BytesIO(conteudo), engine="openpyxl"), {"motor": "openpyxl"}
+    except ImportError as e:
+        raise ImportError("Instale o openpyxl para ler arquivos XLSX (pip install openpyxl).") from e
+
+
+@registrar_leitor("parquet", (".parquet", ".pq"))
+def ler_parquet(conteudo, motor=None):
+    """Arquivo Parquet (requer pyarrow, que já vem com o Streamlit)."""
+    import pandas as pd
+
+    return pd.read_parquet(io.BytesIO(conteudo)), {"motor": "pyarrow"}
+
+
+@registrar_leitor("jsonl", (".jsonl", ".ndjson"))
+def ler_jsonl(conteudo, motor=None):
+    """Um objeto JSON por linha (JSON Lines), sem conversão automática de datas."""
+    import pandas as pd
+
+    df = pd.read_json(io.BytesIO(conteudo), lines=True, dtype=False, convert_dates=False,
+                      precise_float=True)
+    return df, {"motor": "pandas"}
+
+
+def detectar_formato(conteudo, nome=""):
+    """Formato pela extensão do nome; sem extensão conhecida, pelos primeiros bytes do conteúdo."""
+    extensao = os.path.splitext(str(nome).lower())[1]
+    if extensao in EXTENSOES:
+        return EXTENSOES[extensao]
+    if conteudo.startswith(b"PAR1"):
+        return "parquet"
+    if conteudo.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    if conteudo.lstrip(codecs.BOM_UTF8 + b" \t\r\n").startswith(b"{"):
+        return "jsonl"
+    return "csv"
+
+
+def _conteudo_e_nome(origem, nome):
+    """Bytes e nome de um caminho, de bytes ou de um arquivo aberto (ex: UploadedFile do Streamlit)."""
+    if isinstance(origem, (str, os.PathLike)):
+        with open(origem, "rb") as arquivo:
+            return arquivo.read(), nome or os.fspath(origem)
+    if isinstance(origem, (bytes, bytearray, memoryview)):
+        return bytes(origem), nome or ""
+    conteudo = origem.getvalue() if hasattr(origem, "getvalue") else origem.read()
+    return conteudo, nome or getattr(origem, "name", "")
+
+
+def ler_leads(origem, nome=None, motor=None):
+    """
+    Lê um arquivo de leads em qualquer formato registrado.
+
+    Retorna (df, leitura): o DataFrame e um dict com o formato, o motor, as opções detectadas
+    (separador, encoding e decimal nos CSVs), o tamanho e a duração da leitura.
+    """
+    inicio = time.perf_counter()
+    conteudo, nome = _conteudo_e_nome(origem, nome)
+    formato = detectar_formato(conteudo, nome)
+    df, detalhes = LEITORES[formato](conteudo, motor=motor)
+    leitura = dict(detalhes, arquivo=os.path.basename(str(nome)), formato=formato, linhas=len(df),
+                   colunas=len(df.columns), tamanho_mb=round(len(conteudo) / 1024 / 1024, 2),
+                   duracao_s=round(time.perf_counter() - inicio, 3))
+    return df, leitura
+
+
+def extensoes_suportadas():
+    """Extensões aceitas, sem o ponto (para o file_uploader do Streamlit)."""
+    return sorted(extensao.lstrip(".") for extensao in EXTENSOES)
+
+
+def descrever_leitura(leitura):
+    """Resumo curto para a interface, ex: "CSV (separador ';', cp1252, decimal ',') lido com pyarrow em 0.42s"."""
+    texto = leitura["formato"].upper()
+    if leitura["formato"] == "csv":
+        separador = "tab" if leitura["sep"] == "\t" else f"'{leitura['sep']}'"
+        texto += f" (separador {separador}, {leitura['encoding']}"
+        texto += f", decimal '{leitura['decimal']}')" if leitura["decimal"] != "." else ")"
+    return f"{texto} lido com {leitura['motor']} em {leitura['duracao_s']:.2f}s"
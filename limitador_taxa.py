@@ -0,0 +1,48 @@
+"""Limitador de taxa compartilhado para as chamadas à OpenAI."""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Requisições por minuto e chamadas simultâneas permitidas para a OpenAI
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_MAX_CONCORRENCIA = int(os.getenv("OPENAI_MAX_CONCORRENCIA", "4"))
+
+
+class LimitadorTaxa:
+    """Token bucket (requisições por minuto) combinado com um limite de concorrência."""
+
+    def __init__(self, requisicoes_por_minuto=OPENAI_RPM, max_concorrencia=OPENAI_MAX_CONCORRENCIA):
+        self.capacidade = max(1, requisicoes_por_minuto)
+        self.taxa_por_segundo = self.capacidade / 60.0
+        self._fichas = float(self.capacidade)
+        self._ultima_recarga = time.monotonic()
+        self._lock = threading.Lock()
+        self._semaforo = threading.BoundedSemaphore(max(1, max_concorrencia))
+
+    def _aguardar_ficha(self):
+        """Bloqueia até haver uma ficha disponível no bucket."""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultima_recarga) * self.taxa_por_segundo)
+                self._ultima_recarga = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.taxa_por_segundo
+            time.sleep(espera)
+
+    @contextmanager
+    def reservar(self):
+        """Context manager que respeita o limite de RPM e de chamadas simultâneas."""
+        self._semaforo.acquire()
+        try:
+            self._aguardar_ficha()
+            yield
+        finally:
+            self._semaforo.release()
+
+
+# Instância única do processo: todas as sessões do Streamlit compartilham o mesmo limite
+limitador_openai = LimitadorTaxa()
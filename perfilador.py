@@ -0,0 +1,304 @@
+"""
+Perfilador opcional dos reruns do Streamlit: tempo por trecho nomeado e, se pedido, amostragem
+da pilha do rerun inteiro.
+
+    with trecho("aba: Histórico"):
+        ...
+
+    @perfilado
+    def carregar_metricas():
+        ...
+
+Os trechos aninhados formam uma árvore (caminho = nomes dos trechos abertos), exibida como
+flame graph no painel do app. Com MENCARE_PERFIL_AMOSTRAGEM=1, uma thread amostra a pilha da
+thread do rerun a cada PERFIL_INTERVALO_MS e conta as pilhas no formato "dobrado"
+(a;b;c contagem), o mesmo do flamegraph.pl e do speedscope.
+
+Os MAX_PERFIS_GUARDADOS reruns mais lentos ficam em DIRETORIO_PERFIS, um JSON por rerun, para
+comparação posterior. Ativa com MENCARE_PERFIL=1; desligado, trecho() não faz nada.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ContextDecorator
+from datetime import datetime
+
+PERFIL_HABILITADO = os.getenv("MENCARE_PERFIL", "").lower() in ("1", "true", "sim")
+PERFIL_AMOSTRAGEM = os.getenv("MENCARE_PERFIL_AMOSTRAGEM", "").lower() in ("1", "true", "sim")
+PERFIL_INTERVALO_MS = float(os.getenv("PERFIL_INTERVALO_MS", "5"))
+DIRETORIO_PERFIS = os.getenv("DIRETORIO_PERFIS", os.path.join(".mencare", "perfis"))
+MAX_PERFIS_GUARDADOS = int(os.getenv("MAX_PERFIS_GUARDADOS", "20"))
+
+RAIZ_PROJETO = os.path.dirname(os.path.abspath(__file__))
+
+_local = threading.local()
+_lock_disco = threading.Lock()
+_ultimo_resumo = None
+
+
+class AmostradorPilha(threading.Thread):
+    """Amostra periodicamente a pilha de uma thread (sys._current_frames) e conta as pilhas."""
+
+    def __init__(self, id_thread, intervalo_ms=PERFIL_INTERVALO_MS):
+        super().__init__(name="perfilador-amostragem", daemon=True)
+        self.id_thread = id_thread
+        self.intervalo = intervalo_ms / 1000
+        self.pilhas = Counter()
+        self.amostras = 0
+        self._parar = threading.Event()
+
+    @staticmethod
+    def _descrever(frame):
+        codigo = frame.f_code
+        return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+    def _pilha(self, frame):
+        quadros = []
+        while frame is not None:
+            quadros.append(frame)
+            frame = frame.f_back
+        quadros.reverse()
+        # Descarta o runtime do Streamlit: a pilha começa no primeiro quadro do projeto
+        for i, quadro in enumerate(quadros):
+            if quadro.f_code.co_filename.startswith(RAIZ_PROJETO):
+                quadros = quadros[i:]
+                break
+        return ";".join(self._descrever(q) for q in quadros)
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.id_thread)
+            if frame is None:
+                return  # a thread do rerun terminou
+            self.pilhas[self._pilha(frame)] += 1
+            self.amostras += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join(timeout=1)
+
+
+class PerfilRerun:
+    """Trechos cronometrados (e pilhas amostradas) de um rerun."""
+
+    def __init__(self, rotulo="", amostrar=PERFIL_AMOSTRAGEM):
+        self.rotulo = rotulo
+        self.momento = datetime.now()
+        self.inicio = time.perf_counter()
+        self.ultimo_evento = self.inicio
+        self.duracao = None
+        self.interrompido = False
+        self.trechos = []
+        self._abertos = []
+        self.amostrador = None
+        if amostrar:
+            self.amostrador = AmostradorPilha(threading.get_ident())
+            self.amostrador.start()
+
+    def abrir(self, nome):
+        caminho = tuple(t["nome"] for t in self._abertos) + (nome,)
+        self.ultimo_evento = time.perf_counter()
+        registro = {"nome": nome, "caminho": caminho, "inicio": self.ultimo_evento, "duracao_ms": None}
+        self._abertos.append(registro)
+        return registro
+
+    def fechar(self, registro, fim=None):
+        self.ultimo_evento = fim or time.perf_counter()
+        registro["duracao_ms"] = (self.ultimo_evento - registro["inicio"]) * 1000
+        # Fecha também os filhos que ficaram abertos (ex: st.stop() dentro do trecho)
+        while self._abertos:
+            if self._abertos.pop() is registro:
+                break
+        self.trechos.append(registro)
+
+    def encerrar(self, interrompido=False):
+        # Interrompido, o fim conhecido é o último trecho aberto ou fechado, não o momento atual
+        fim = self.ultimo_evento if interrompido else time.perf_counter()
+        self.duracao = fim - self.inicio
+        self.interrompido = interrompido
+        for registro in reversed(list(self._abertos)):
+            self.fechar(registro, fim)
+        if self.amostrador is not None:
+            self.amostrador.parar()
+
+    def arvore(self):
+        """Tempo total, próprio e chamadas por caminho de trechos, do mais lento ao mais rápido."""
+        total = defaultdict(float)
+        chamadas = defaultdict(int)
+        filhos = defaultdict(float)
+        for registro in self.trechos:
+            caminho = registro["caminho"]
+            total[caminho] += registro["duracao_ms"]
+            chamadas[caminho] += 1
+            if len(caminho) > 1:
+                filhos[caminho[:-1]] += registro["duracao_ms"]
+        return sorted(
+            ({"caminho": list(caminho), "total_ms": round(ms, 2), "proprio_ms": round(max(ms - filhos[caminho], 0), 2),
+              "chamadas": chamadas[caminho]} for caminho, ms in total.items()),
+            key=lambda t: t["total_ms"], reverse=True
+        )
+
+    def resumo(self):
+        duracao_ms = self.duracao * 1000 if self.duracao is not None else None
+        return {
+            "rotulo": self.rotulo,
+            "momento": self.momento.isoformat(),
+            "duracao_ms": round(duracao_ms, 1) if duracao_ms is not None else None,
+            "interrompido": self.interrompido,
+            "trechos": self.arvore(),
+            "intervalo_amostragem_ms": self.amostrador.intervalo * 1000 if self.amostrador else None,
+            "amostras": self.amostrador.amostras if self.amostrador else 0,
+            "pilhas": dict(self.amostrador.pilhas) if self.amostrador else {},
+        }
+
+
+class _Trecho(ContextDecorator):
+    """Context manager/decorador de trecho; sem perfil ativo na thread, não faz nada."""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self._perfil = None
+        self._registro = None
+
+    def _recreate_cm(self):
+        # Uma instância por chamada: a função decorada pode ser reentrante
+        return _Trecho(self.nome)
+
+    def __enter__(self):
+        self._perfil = getattr(_local, "perfil", None)
+        if self._perfil is not None:
+            self._registro = self._perfil.abrir(self.nome)
+        return self
+
+    def __exit__(self, *exc):
+        if self._perfil is not None:
+            self._perfil.fechar(self._registro)
+        return False
+
+
+def trecho(nome):
+    """Cronometra um trecho do rerun atual: use com `with` ou como decorador."""
+    return _Trecho(nome)
+
+
+def perfilado(funcao):
+    """Decorador que cronometra a função com o nome dela."""
+    return trecho(funcao.__name__)(funcao)
+
+
+# --- Ciclo de vida por rerun ---
+
+def iniciar_perfil(rotulo=""):
+    """Abre o perfil do rerun da thread atual (se habilitado), encerrando o anterior interrompido."""
+    if not PERFIL_HABILITADO:
+        return None
+    anterior = getattr(_local, "perfil", None)
+    if anterior is not None:
+        # st.rerun()/st.stop() interrompem o script antes do finalizar_perfil()
+        _local.perfil = None
+        anterior.encerrar(interrompido=True)
+        guardar_se_lento(anterior)
+    _local.perfil = PerfilRerun(rotulo)
+    return _local.perfil
+
+
+def finalizar_perfil():
+    """Encerra o perfil da thread atual, guarda em disco se estiver entre os mais lentos e o retorna."""
+    perfil = getattr(_local, "perfil", None)
+    _local.perfil = None
+    if perfil is None:
+        return None
+    global _ultimo_resumo
+    perfil.encerrar()
+    guardar_se_lento(perfil)
+    _ultimo_resumo = perfil.resumo()
+    return perfil
+
+
+def ultimo_perfil():
+    """Resumo do último rerun finalizado em qualquer thread (usado pelos benchmarks)."""
+    return _ultimo_resumo
+
+
+# --- Reruns mais lentos em disco ---
+
+def listar_perfis_guardados(diretorio=DIRETORIO_PERFIS):
+    """[(caminho, duracao_ms)] dos perfis guardados, do mais lento ao mais rápido."""
+    if not os.path.isdir(diretorio):
+        return []
+    perfis = []
+    for nome in os.listdir(diretorio):
+        if not nome.endswith(".json"):
+            continue
+        try:
+            perfis.append((os.path.join(diretorio, nome), float(nome.split("_", 1)[0])))
+        except ValueError:
+            continue
+    return sorted(perfis, key=lambda p: p[1], reverse=True)
+
+
+def guardar_se_lento(perfil, diretorio=DIRETORIO_PERFIS, maximo=MAX_PERFIS_GUARDADOS):
+    """Grava o perfil se ele estiver entre os `maximo` reruns mais lentos; retorna o caminho ou None."""
+    resumo = perfil.resumo()
+    duracao_ms = resumo["duracao_ms"] or 0
+    with _lock_disco:
+        guardados = listar_perfis_guardados(diretorio)
+        if len(guardados) >= maximo and duracao_ms <= guardados[-1][1]:
+            return None
+        os.makedirs(diretorio, exist_ok=True)
+        # A duração no nome permite ordenar sem abrir os arquivos
+        caminho = os.path.join(diretorio, f"{duracao_ms:010.1f}_{perfil.momento.strftime('%Y%m%d_%H%M%S_%f')}.json")
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(resumo, f, ensure_ascii=False)
+        for antigo, _ in listar_perfis_guardados(diretorio)[maximo:]:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+        return caminho
+
+
+def carregar_perfil(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- Dados para o flame graph ---
+
+def nos_flame_trechos(resumo):
+    """ids, rótulos, pais e valores (ms) dos trechos para um gráfico icicle do plotly."""
+    raiz = f"rerun ({resumo['rotulo'] or '-'})"
+    ids, rotulos, pais, valores = [raiz], [raiz], [""], [resumo["duracao_ms"] or 0]
+    for t in sorted(resumo["trechos"], key=lambda t: len(t["caminho"])):
+        caminho = t["caminho"]
+        ids.append(" > ".join(caminho))
+        rotulos.append(caminho[-1])
+        pais.append(" > ".join(caminho[:-1]) if len(caminho) > 1 else raiz)
+        valores.append(t["total_ms"])
+    return ids, rotulos, pais, valores
+
+
+def nos_flame_pilhas(resumo):
+    """Mesmo formato de nos_flame_trechos, a partir das pilhas amostradas (valores em ms)."""
+    intervalo = resumo.get("intervalo_amostragem_ms") or PERFIL_INTERVALO_MS
+    valores = defaultdict(float)
+    for pilha, contagem in resumo.get("pilhas", {}).items():
+        quadros = pilha.split(";")
+        for i in range(1, len(quadros) + 1):
+            valores[tuple(quadros[:i])] += contagem * intervalo
+    raiz = "amostras"
+    ids, rotulos, pais, lista_valores = [raiz], [raiz], [""], [resumo.get("amostras", 0) * intervalo]
+    for caminho in sorted(valores, key=len):
+        ids.append(";".join(caminho))
+        rotulos.append(caminho[-1])
+        pais.append(";".join(caminho[:-1]) if len(caminho) > 1 else raiz)
+        lista_valores.append(valores[caminho])
+    return ids, rotulos, pais, lista_valores
+
+
+def pilhas_dobradas(resumo):
+    """Texto no formato dobrado (uma pilha por linha + contagem), para flamegraph.pl/speedscope."""
+    return "\n".join(f"{pilha} {contagem}" for pilha, contagem in sorted(resumo.get("pilhas", {}).items()))
@@ -0,0 +1,237 @@
+"""
+Personalização em massa de mensagens (WhatsApp/SMS) a partir de um CSV de leads.
+
+Os leads são agrupados pelos campos relevantes para o modelo de mensagem: cada combinação
+distinta vira uma única chamada à OpenAI, que devolve um modelo com marcadores {{coluna}}.
+Os marcadores são preenchidos lead a lead. O CSV é lido e escrito em blocos, então a memória
+não cresce com o tamanho do arquivo, e os modelos prontos ficam em um checkpoint JSONL que
+permite retomar um processamento interrompido.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from leitores import opcoes_csv
+from limitador_taxa import limitador_openai
+from prompts import montar_mensagens
+from telemetria_llm import chamar_chat
+
+DIRETORIO_PERSONALIZACAO = os.getenv("DIRETORIO_PERSONALIZACAO", os.path.join(".mencare", "personalizacao"))
+TAMANHO_BLOCO = 20_000
+SEPARADOR_CHAVE = "\x1f"
+MAX_TOKENS_PERSONALIZACAO = {"Disparo de WhatsApp": 150, "Copy para SMS": 100}
+
+
+def salvar_upload_em_disco(arquivo, diretorio=DIRETORIO_PERSONALIZACAO):
+    """Copia um upload para disco em blocos e devolve (caminho, sha256 do conteúdo)."""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho_temp = os.path.join(diretorio, f"upload_{os.getpid()}_{time.time_ns()}.csv")
+    sha = hashlib.sha256()
+    with open(caminho_temp, "wb") as destino:
+        while True:
+            bloco = arquivo.read(1024 * 1024)
+            if not bloco:
+                break
+            sha.update(bloco)
+            destino.write(bloco)
+    digest = sha.hexdigest()
+    caminho = os.path.join(diretorio, f"entrada_{digest[:16]}.csv")
+    shutil.move(caminho_temp, caminho)
+    return caminho, digest
+
+
+def calcular_fingerprint(hash_arquivo, campos_grupo, campos_marcadores, plataforma, brief):
+    """Identifica um job de personalização (mesmo arquivo + mesmos parâmetros = mesmo checkpoint)."""
+    conteudo = json.dumps(
+        [hash_arquivo, list(campos_grupo), list(campos_marcadores), plataforma, brief],
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:24]
+
+
+def _chaves_grupo(bloco, campos_grupo):
+    """Chave normalizada (sem caixa/espaços) de cada linha, concatenada de forma vetorizada."""
+    if not campos_grupo:
+        return pd.Series("", index=bloco.index)
+    chave = None
+    for campo in campos_grupo:
+        normalizado = bloco[campo].fillna("").astype(str).str.strip().str.lower()
+        chave = normalizado if chave is None else chave + SEPARADOR_CHAVE + normalizado
+    return chave
+
+
+def _ler_blocos(caminho_csv, colunas=None, tamanho_bloco=TAMANHO_BLOCO):
+    """Leitura do CSV em blocos, sempre como texto para não alterar telefones/CEPs."""
+    return pd.read_csv(caminho_csv, usecols=colunas, dtype=str, chunksize=tamanho_bloco, keep_default_na=False,
+                       **opcoes_csv(caminho_csv))
+
+
+def coletar_grupos(caminho_csv, campos_grupo, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Primeira passada: encontra as combinações distintas dos campos do modelo.
+
+    Retorna ({chave: {"perfil": valores originais, "leads": quantidade}}, total de leads).
+    """
+    grupos = {}
+    total_leads = 0
+    for bloco in _ler_blocos(caminho_csv, list(campos_grupo) or None, tamanho_bloco):
+        total_leads += len(bloco)
+        chaves = _chaves_grupo(bloco, campos_grupo)
+        contagem = chaves.value_counts()
+        primeiros = bloco.assign(_chave=chaves).drop_duplicates("_chave")
+        perfis = primeiros[list(campos_grupo)].to_dict("records")
+        for chave, perfil in zip(primeiros["_chave"], perfis):
+            if chave not in grupos:
+                grupos[chave] = {"perfil": perfil, "leads": 0}
+        for chave, quantidade in contagem.items():
+            grupos[chave]["leads"] += int(quantidade)
+    return grupos, total_leads
+
+
+def carregar_checkpoint(caminho_checkpoint):
+    """Lê os modelos já gerados de um checkpoint JSONL (linhas incompletas são ignoradas)."""
+    modelos = {}
+    tokens = 0
+    if not os.path.exists(caminho_checkpoint):
+        return modelos, tokens
+    with open(caminho_checkpoint, encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            try:
+                item = json.loads(linha)
+            except json.JSONDecodeError:
+                continue
+            modelos[item["chave"]] = item["modelo"]
+            tokens += item.get("tokens", 0)
+    return modelos, tokens
+
+
+def gerar_modelo_grupo(client, perfil, campos_marcadores, plataforma, brief, modelo,
+                       limitador=limitador_openai, usuario_id=None, leads=0):
+    """Gera o modelo de mensagem de um grupo. Roda em threads (sem Streamlit)."""
+    perfil_texto = "; ".join(f"{campo}={valor}" for campo, valor in perfil.items()) or "todos os leads"
+    marcadores = ", ".join("{{" + campo + "}}" for campo in campos_marcadores) or "nenhum"
+    max_tokens = MAX_TOKENS_PERSONALIZACAO.get(plataforma, 150)
+    mensagens = montar_mensagens(
+        "personalizacao",
+        plataforma=plataforma,
+        objetivo=brief["objetivo"],
+        produto_servico=brief["produto_servico"],
+        tom_de_voz=brief["tom_de_voz"],
+        cta=brief["cta"],
+        perfil=perfil_texto,
+        marcadores=marcadores,
+        max_tokens=max_tokens,
+    )
+    response, _ = chamar_chat(
+        client, "personalizacao", plataforma=plataforma, usuario_id=usuario_id, leads=leads,
+        limitador=limitador, model=modelo, messages=mensagens, temperature=0.7, max_tokens=max_tokens
+    )
+    return response.choices[0].message.content.strip(), response.usage.total_tokens
+
+
+def preencher_marcadores(modelos, bloco, campos_marcadores):
+    """Substitui {{coluna}} pelos valores de cada lead."""
+    mensagens = modelos.tolist()
+    for campo in campos_marcadores:
+        marcador = "{{" + campo + "}}"
+        valores = bloco[campo].fillna("").astype(str).str.strip().tolist()
+        mensagens = [m.replace(marcador, v) if marcador in m else m for m, v in zip(mensagens, valores)]
+    return mensagens
+
+
+def personalizar_leads(client, caminho_csv, hash_arquivo, campos_grupo, campos_marcadores, plataforma, brief,
+                       modelo, ao_progredir=None, diretorio=DIRETORIO_PERSONALIZACAO, max_workers=None,
+                       limitador=limitador_openai, tamanho_bloco=TAMANHO_BLOCO, usuario_id=None):
+    """
+    Executa o pipeline completo e devolve um dict com o caminho do CSV de saída e as estatísticas.
+
+    ao_progredir(estatisticas) é chamado na thread de quem chamou a função, então pode
+    atualizar elementos do Streamlit.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    fingerprint = calcular_fingerprint(hash_arquivo, campos_grupo, campos_marcadores, plataforma, brief)
+    caminho_checkpoint = os.path.join(diretorio, f"{fingerprint}.jsonl")
+    caminho_saida = os.path.join(diretorio, f"{fingerprint}_mensagens.csv")
+    inicio = time.time()
+
+    grupos, total_leads = coletar_grupos(caminho_csv, campos_grupo, tamanho_bloco)
+    modelos, tokens_total = carregar_checkpoint(caminho_checkpoint)
+    pendentes = [chave for chave in grupos if chave not in modelos]
+    estatisticas = {
+        "fingerprint": fingerprint,
+        "total_leads": total_leads,
+        "total_grupos": len(grupos),
+        "grupos_retomados": len(grupos) - len(pendentes),
+        "grupos_concluidos": len(grupos) - len(pendentes),
+        "grupos_com_erro": 0,
+        "leads_escritos": 0,
+        "leads_sem_mensagem": 0,
+        "tokens_total": tokens_total,
+        "tokens_novos": 0,
+        "leads_por_segundo": 0.0,
+        "tokens_por_lead": 0.0,
+        "erros": []
+    }
+    # Leads cujos grupos já têm modelo; mantido incrementalmente para não somar todos os grupos a cada conclusão
+    leads_cobertos = sum(grupos[c]["leads"] for c in modelos if c in grupos)
+
+    def atualizar():
+        decorrido = max(time.time() - inicio, 1e-6)
+        estatisticas["tempo_decorrido"] = decorrido
+        estatisticas["leads_por_segundo"] = estatisticas["leads_escritos"] / decorrido
+        estatisticas["tokens_por_lead"] = estatisticas["tokens_total"] / leads_cobertos if leads_cobertos else 0.0
+        if ao_progredir:
+            ao_progredir(estatisticas)
+
+    atualizar()
+
+    # Uma chamada por grupo, em paralelo; cada modelo pronto vai imediatamente para o checkpoint
+    if pendentes:
+        with open(caminho_checkpoint, "a", encoding="utf-8") as checkpoint, \
+                ThreadPoolExecutor(max_workers=max_workers or 8) as executor:
+            futuros = {
+                executor.submit(gerar_modelo_grupo, client, grupos[chave]["perfil"], campos_marcadores,
+                                plataforma, brief, modelo, limitador, usuario_id, grupos[chave]["leads"]): chave
+                for chave in pendentes
+            }
+            for futuro in as_completed(futuros):
+                chave = futuros[futuro]
+                try:
+                    texto_modelo, tokens = futuro.result()
+                except Exception as e:
+                    estatisticas["grupos_com_erro"] += 1
+                    estatisticas["erros"].append(f"{grupos[chave]['perfil']}: {e}")
+                    continue
+                modelos[chave] = texto_modelo
+                leads_cobertos += grupos[chave]["leads"]
+                estatisticas["tokens_total"] += tokens
+                estatisticas["tokens_novos"] += tokens
+                estatisticas["grupos_concluidos"] += 1
+                checkpoint.write(json.dumps({"chave": chave, "modelo": texto_modelo, "tokens": tokens},
+                                            ensure_ascii=False) + "\n")
+                checkpoint.flush()
+                atualizar()
+
+    # Segunda passada: preenche e grava a saída em blocos
+    primeiro_bloco = True
+    for bloco in _ler_blocos(caminho_csv, None, tamanho_bloco):
+        chaves = _chaves_grupo(bloco, campos_grupo)
+        modelos_bloco = chaves.map(modelos)
+        com_modelo = modelos_bloco.notna()
+        estatisticas["leads_sem_mensagem"] += int((~com_modelo).sum())
+        bloco = bloco[com_modelo]
+        mensagens = preencher_marcadores(modelos_bloco[com_modelo], bloco, campos_marcadores)
+        bloco.assign(mensagem_personalizada=mensagens).to_csv(
+            caminho_saida, mode="w" if primeiro_bloco else "a", header=primeiro_bloco, index=False
+        )
+        primeiro_bloco = False
+        estatisticas["leads_escritos"] += len(bloco)
+        atualizar()
+
+    estatisticas["caminho_saida"] = caminho_saida if not primeiro_bloco else None
+    return estatisticas
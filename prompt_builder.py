@@ -0,0 +1,214 @@
+"""Montagem do prompt de análise de leads dentro de um orçamento de tokens."""
+import json
+import math
+import os
+import re
+
+from amostragem import amostra_estratificada, registrar_linhas_usadas
+from prompts import montar_mensagens
+from segmentacao import tabela_segmentos
+
+# Orçamento total de tokens do prompt de análise (amostra + estatísticas + feedbacks)
+ORCAMENTO_TOKENS_ANALISE = int(os.getenv("ORCAMENTO_TOKENS_ANALISE", "6000"))
+# Formato da amostra enviada ao modelo: "csv" ou "pipe"
+FORMATO_AMOSTRA = os.getenv("FORMATO_AMOSTRA_LEADS", "csv")
+MAX_CARACTERES_CELULA = 40
+MAX_CARACTERES_PERFIL = 300
+CASAS_DECIMAIS = 2
+MIN_LINHAS_AMOSTRA = 5
+MAX_LINHAS_AMOSTRA = 100
+# Com a tabela de segmentos o modelo já vê a base inteira resumida: poucas linhas bastam de exemplo
+MAX_LINHAS_AMOSTRA_COM_SEGMENTOS = 30
+
+_PADRAO_TOKENS = re.compile(r"\w+|[^\w\s]")
+_PADRAO_ESPACOS = re.compile(r"\s+")
+
+# Codificador do tiktoken, carregado na primeira estimativa (False = indisponível)
+_ENCODER = None
+
+
+def _obter_codificador():
+    """Carrega o tiktoken sob demanda; ele é opcional e caro de importar."""
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken
+            _ENCODER = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # tiktoken é opcional, usamos a estimativa local
+            _ENCODER = False
+    return _ENCODER
+
+
+def estimar_tokens(texto):
+    """Estima o número de tokens de um texto sem chamar a API."""
+    if not texto:
+        return 0
+    codificador = _obter_codificador()
+    if codificador:
+        return len(codificador.encode(texto))
+    # Aproximação do BPE: palavras longas viram vários tokens, pontuação conta 1
+    total = 0
+    for pedaco in _PADRAO_TOKENS.findall(texto):
+        total += max(1, math.ceil(len(pedaco) / 4))
+    # Quebras de linha costumam virar tokens próprios
+    return total + texto.count("\n")
+
+
+def arredondar_valores(obj, casas_decimais=CASAS_DECIMAIS):
+    """Arredonda recursivamente floats de dicts/listas para compactar o JSON."""
+    if isinstance(obj, dict):
+        return {str(k): arredondar_valores(v, casas_decimais) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [arredondar_valores(v, casas_decimais) for v in obj]
+    if isinstance(obj, float):
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+        valor = round(obj, casas_decimais)
+        return int(valor) if valor.is_integer() else valor
+    if hasattr(obj, "item"):  # Escalares numpy
+        return arredondar_valores(obj.item(), casas_decimais)
+    return obj
+
+
+def compactar_estatisticas(estatisticas, casas_decimais=CASAS_DECIMAIS):
+    """Serializa as estatísticas em JSON sem indentação e com números arredondados."""
+    return json.dumps(
+        arredondar_valores(estatisticas, casas_decimais),
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+
+
+def _formatar_celula(valor, separador, max_caracteres, casas_decimais):
+    """Converte uma célula para texto curto, sem espaços supérfluos."""
+    import pandas as pd
+
+    if valor is None or (not isinstance(valor, (list, dict)) and pd.isna(valor)):
+        return ""
+    if hasattr(valor, "item") and not isinstance(valor, str):
+        valor = valor.item()
+    if isinstance(valor, float):
+        valor = round(valor, casas_decimais)
+        texto = str(int(valor)) if valor.is_integer() else f"{valor:.{casas_decimais}f}".rstrip("0")
+    else:
+        texto = _PADRAO_ESPACOS.sub(" ", str(valor)).strip()
+    if len(texto) > max_caracteres:
+        texto = texto[:max_caracteres - 1] + "…"
+    if separador == "|":
+        return texto.replace("|", "/")
+    if separador in texto or '"' in texto:
+        return '"' + texto.replace('"', '""') + '"'
+    return texto
+
+
+def formatar_amostra_compacta(df, formato=FORMATO_AMOSTRA, max_caracteres=MAX_CARACTERES_CELULA,
+                              casas_decimais=CASAS_DECIMAIS):
+    """Gera uma representação CSV ou pipe da amostra, muito menor que df.to_string()."""
+    separador = "|" if formato == "pipe" else ","
+    linhas = [separador.join(_formatar_celula(c, separador, max_caracteres, casas_decimais) for c in df.columns)]
+    for registro in df.itertuples(index=False, name=None):
+        linhas.append(separador.join(
+            _formatar_celula(v, separador, max_caracteres, casas_decimais) for v in registro
+        ))
+    return "\n".join(linhas)
+
+
+def formatar_segmentos(resumo_estatistico, formato=FORMATO_AMOSTRA):
+    """Bloco do prompt com a tabela de segmentos (vazio se a análise não tem segmentação)."""
+    segmentacao = resumo_estatistico.get("segmentacao")
+    if not segmentacao:
+        return ""
+    tabela = formatar_amostra_compacta(tabela_segmentos(segmentacao), formato, max_caracteres=MAX_CARACTERES_PERFIL)
+    return (f"Segmentos calculados sobre todos os leads (método: {segmentacao['metodo']}; perfil com medianas "
+            f"numéricas e o valor mais comum de cada categoria):\n{tabela}\n")
+
+
+def _montar_mensagens_analise(plataforma, objetivo, resumo_estatistico, estatisticas_str,
+                              contexto_aprendizado, amostra_str, linhas_amostra, formato):
+    """Monta as mensagens de análise: prefixo estático do registro e campos variáveis no fim."""
+    return montar_mensagens(
+        "analise",
+        plataforma=plataforma,
+        objetivo=objetivo,
+        contexto_aprendizado=f"{contexto_aprendizado}\n" if contexto_aprendizado else "",
+        total_leads=resumo_estatistico["total_leads"],
+        linhas_amostra=linhas_amostra,
+        colunas=", ".join(map(str, resumo_estatistico["colunas_analisadas"])),
+        estatisticas=estatisticas_str,
+        segmentos=formatar_segmentos(resumo_estatistico, formato),
+        descricao_formato="separados por |" if formato == "pipe" else "CSV",
+        amostra=amostra_str,
+    )
+
+
+def _estimar_tokens_mensagens(mensagens):
+    """Soma a estimativa de tokens de todas as mensagens (com ~4 tokens de overhead cada)."""
+    return sum(estimar_tokens(m["content"]) + 4 for m in mensagens)
+
+
+def construir_prompt_analise(df, plataforma, objetivo, resumo_estatistico, contexto_aprendizado="",
+                             orcamento_tokens=ORCAMENTO_TOKENS_ANALISE, formato=FORMATO_AMOSTRA,
+                             max_linhas=MAX_LINHAS_AMOSTRA, random_state=42):
+    """
+    Monta o prompt de análise ajustando o número de linhas da amostra ao orçamento de tokens.
+
+    Com resumo_estatistico["segmentacao"], a tabela de segmentos entra no prompt e a amostra
+    fica limitada a MAX_LINHAS_AMOSTRA_COM_SEGMENTOS linhas.
+
+    Retorna um dict com as mensagens de chat, o prompt variável, as linhas usadas, a
+    estimativa de tokens (incluindo o prefixo estático) e o plano da amostra estratificada.
+    """
+    if resumo_estatistico.get("segmentacao"):
+        max_linhas = min(max_linhas, MAX_LINHAS_AMOSTRA_COM_SEGMENTOS)
+    colunas = list(resumo_estatistico["colunas_analisadas"])
+    base = df[colunas]
+    estatisticas_str = compactar_estatisticas(resumo_estatistico.get("estatisticas", {}))
+
+    def montar(amostra_df, contexto):
+        amostra_str = formatar_amostra_compacta(amostra_df, formato) if amostra_df is not None else ""
+        linhas = len(amostra_df) if amostra_df is not None else 0
+        return _montar_mensagens_analise(plataforma, objetivo, resumo_estatistico, estatisticas_str,
+                                         contexto, amostra_str, linhas, formato)
+
+    # O contexto de feedback é descartado se sozinho estourar o orçamento
+    contexto = contexto_aprendizado
+    tokens_fixos = _estimar_tokens_mensagens(montar(None, contexto))
+    if contexto and tokens_fixos > orcamento_tokens:
+        contexto = ""
+        tokens_fixos = _estimar_tokens_mensagens(montar(None, contexto))
+
+    # Amostra montada uma única vez, em rodízio pelos estratos: reduzir linhas mantém a mesma
+    # ordem (reprodutível) e o prefixo continua cobrindo os estratos
+    limite = min(max_linhas, len(base))
+    amostra_total, plano_amostragem = amostra_estratificada(base, limite, random_state)
+
+    # Estimativa inicial a partir do custo médio por linha
+    disponivel = max(0, orcamento_tokens - tokens_fixos)
+    piloto = amostra_total.head(min(20, len(amostra_total)))
+    tokens_piloto = estimar_tokens(formatar_amostra_compacta(piloto, formato))
+    tokens_por_linha = tokens_piloto / max(1, len(piloto))
+    if tokens_por_linha > 0:
+        n_linhas = min(limite, int(disponivel / tokens_por_linha))
+    else:
+        n_linhas = limite
+    n_linhas = max(min(MIN_LINHAS_AMOSTRA, limite), n_linhas)
+
+    # Ajuste fino: reduz a amostra até caber no orçamento
+    mensagens = montar(amostra_total.head(n_linhas), contexto)
+    tokens_estimados = _estimar_tokens_mensagens(mensagens)
+    while tokens_estimados > orcamento_tokens and n_linhas > MIN_LINHAS_AMOSTRA:
+        n_linhas = max(MIN_LINHAS_AMOSTRA, int(n_linhas * 0.85))
+        mensagens = montar(amostra_total.head(n_linhas), contexto)
+        tokens_estimados = _estimar_tokens_mensagens(mensagens)
+
+    return {
+        "mensagens": mensagens,
+        "prompt": mensagens[-1]["content"],
+        "linhas_amostra": n_linhas,
+        "plano_amostragem": registrar_linhas_usadas(plano_amostragem, amostra_total.head(n_linhas)),
+        "tokens_estimados": tokens_estimados,
+        "orcamento_tokens": orcamento_tokens,
+        "formato": formato,
+        "contexto_incluido": bool(contexto),
+    }
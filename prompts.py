@@ -0,0 +1,271 @@
+"""
+Registro de templates de prompt.
+
+Cada template tem um prefixo estático (mensagem de sistema), idêntico entre requisições,
+e uma parte variável (mensagem do usuário) com os campos de cada pedido. Manter o prefixo
+estável permite que o cache de prefixo do provedor seja aproveitado; a OpenAI só armazena
+em cache prefixos a partir de MIN_TOKENS_CACHE_PREFIXO tokens, por isso os prefixos de copy e
+de análise trazem o guia completo (técnicas, tom de voz, regras e as instruções de todas as
+plataformas) em vez de variarem por pedido. O da personalização fica abaixo do mínimo: é
+curto e cada lote já reaproveita um modelo por segmento.
+"""
+
+# Mínimo de tokens do prefixo para a OpenAI guardá-lo em cache
+MIN_TOKENS_CACHE_PREFIXO = 1024
+
+INSTRUCOES_GERAIS_COPY = """Você é um copywriter especialista em marketing digital com mais de 20 anos de experiência.
+Sua tarefa é gerar uma copy persuasiva e eficaz para a plataforma indicada no pedido do usuário.
+
+Princípios que valem para qualquer plataforma:
+- Escreva em português do Brasil, com linguagem natural e sem erros.
+- Foque no benefício para o público-alvo, não apenas nas características do produto/serviço.
+- Use uma estrutura clara: gancho inicial, desenvolvimento do problema/desejo, solução e CTA.
+- Respeite o tom de voz pedido do início ao fim da copy.
+- Use o CTA informado de forma explícita e fácil de seguir.
+- Não invente preços, prazos, descontos ou garantias que não estejam nas informações do pedido.
+- Evite promessas enganosas e termos que possam ser classificados como spam.
+- Respeite o limite de tokens indicado no pedido.
+- Responda somente com a copy pronta para uso, sem comentários ou explicações adicionais."""
+
+GUIA_COPY = """Estruturas de copy (escolha a que melhor serve ao objetivo e à plataforma):
+- AIDA: Atenção (gancho que interrompe a rolagem), Interesse (por que isso importa para o leitor),
+  Desejo (o resultado que ele terá) e Ação (o CTA). Boa para vendas e lançamentos.
+- PAS: Problema (a dor do público, com as palavras dele), Agitação (o custo de não resolver) e
+  Solução (o produto/serviço). Boa para públicos que já sentem o problema.
+- Antes e depois: a situação atual, a situação desejada e a ponte entre as duas. Boa para
+  transformação, cursos e serviços.
+- Prova: um dado, um resultado ou um depoimento presente nas informações do pedido, seguido do
+  convite. Use só provas fornecidas; nunca crie números, clientes ou depoimentos.
+- Nos formatos curtos (SMS, Stories, WhatsApp) condense a estrutura em gancho + benefício + CTA.
+
+Tom de voz (siga o tom pedido; estas são as leituras padrão):
+- Amigável: frases curtas, tratamento por "você", proximidade sem intimidade forçada.
+- Profissional: vocabulário preciso, sem gírias, foco em resultados e credibilidade.
+- Urgente: verbos no imperativo e prazos reais do pedido; sem urgência falsa.
+- Divertido: leveza e bom humor, sem piadas que desviem do benefício ou ofendam.
+- Inspirador: fala de conquistas e possibilidades, com o benefício concreto no centro.
+- Técnico: termos do setor, especificações e dados, para públicos que já conhecem o assunto.
+- Se o tom pedido não estiver na lista, interprete-o de forma natural e mantenha a coerência.
+
+Adaptação ao público-alvo:
+- Use o vocabulário, as dores e os desejos do público descrito; evite termos que ele não usaria.
+- Em B2B, destaque ganho de tempo, redução de custo, segurança e retorno; em B2C, emoção,
+  praticidade e identidade.
+- Considere o nível de consciência: quem ainda não conhece o problema precisa de contexto;
+  quem já compara soluções precisa de diferenciais e de um motivo para agir agora.
+- Não faça suposições sobre idade, gênero, renda ou saúde que não estejam no pedido.
+
+Gatilhos mentais (use no máximo dois por copy e só quando forem verdadeiros):
+- Escassez e urgência apenas com vagas, estoque ou prazos informados no pedido.
+- Prova social apenas com números ou depoimentos fornecidos.
+- Autoridade, reciprocidade e novidade de forma sutil, sem exageros.
+
+Conformidade:
+- Respeite o Código de Defesa do Consumidor: nada de preço, condição ou garantia enganosa.
+- Não peça dados sensíveis (senhas, documentos, dados bancários) na mensagem.
+- Em SMS e WhatsApp, a mensagem deve fazer sentido para quem aceitou receber comunicações da marca;
+  se as informações do pedido trouxerem instrução de descadastro, inclua-a.
+- Evite caixa alta contínua, excesso de exclamações e palavras típicas de spam ("grátis!!!",
+  "clique aqui", "100% garantido").
+
+Antes de responder, confira: o gancho prende nos primeiros segundos? O benefício principal está
+claro? O tom é o pedido? O CTA informado aparece de forma explícita? A copy respeita o formato e o
+limite da plataforma? Nada foi inventado além das informações do pedido?"""
+
+# Instruções estáticas por plataforma (antes embutidas em gerar_copy_openai)
+INSTRUCOES_PLATAFORMA = {
+    "Disparo de WhatsApp": """- Seja breve, direto e pessoal.
+- Use emojis com moderação para aumentar o engajamento.
+- Ideal para mensagens curtas e impacto rápido.
+- Inicie de forma amigável.
+- Deixe o CTA claro e fácil de seguir.
+- Considere o uso de gatilhos mentais como urgência ou escassez, se aplicável.""",
+    "Email Marketing": """- Assunto do email: Crie um assunto curto, chamativo e que gere curiosidade.
+- Corpo do email:
+    - Comece com uma saudação personalizada, se possível.
+    - Desenvolva o problema ou necessidade do público-alvo.
+    - Apresente o produto/serviço como a solução.
+    - Destaque os principais benefícios.
+    - Use parágrafos curtos e boa formatação (negrito, listas).
+    - O CTA deve ser claro e visível (pode ser um link ou botão).
+- Pode ser mais longo que outras plataformas, mas mantenha o foco.""",
+    "Conteúdo para Redes Sociais (Feed)": """- Adapte a linguagem para a rede social específica (ex: Instagram mais visual, LinkedIn mais profissional).
+- Use hashtags relevantes (sugira 3-5 hashtags).
+- Incentive o engajamento (perguntas, enquetes, pedir comentários).
+- Imagens/vídeos são importantes, mas a copy precisa ser atrativa por si só.
+- Pode contar uma pequena história ou dar uma dica rápida.""",
+    "Conteúdo para Redes Sociais (Stories)": """- Formato curto e dinâmico.
+- Use texto conciso e chamativo.
+- Ideal para enquetes, perguntas rápidas, "arrasta para cima".
+- Pode ser mais informal.
+- O CTA deve ser imediato.""",
+    "Copy para SMS": """- Extremamente curto e objetivo (limite de caracteres, geralmente 160).
+- CTA direto e, se possível, com link encurtado.
+- Use abreviações com cautela para não prejudicar a clareza.
+- Ideal para lembretes, promoções rápidas ou alertas.""",
+}
+
+
+def _montar_prefixo_copy():
+    """Prefixo estático da copy: instruções gerais seguidas das de todas as plataformas."""
+    return "\n".join([INSTRUCOES_GERAIS_COPY, "", GUIA_COPY, "", _instrucoes_plataformas()])
+
+
+def _instrucoes_plataformas():
+    """Instruções de todas as plataformas, em ordem fixa (parte do prefixo estático)."""
+    blocos = ["Instruções específicas por plataforma:"]
+    for plataforma, instrucoes in INSTRUCOES_PLATAFORMA.items():
+        blocos.append(f"\n### {plataforma}\n{instrucoes}")
+    return "\n".join(blocos)
+
+
+PREFIXO_COPY = _montar_prefixo_copy()
+
+TEMPLATE_COPY = """Siga as instruções da plataforma '{plataforma}'.
+Plataforma: {plataforma}
+Objetivo da Copy: {objetivo}
+Público-Alvo: {publico_alvo}
+Produto/Serviço a ser promovido: {produto_servico}
+Tom de Voz desejado: {tom_de_voz}
+Call to Action (CTA): {cta}{linha_informacoes}
+IMPORTANTE: Mantenha a copy dentro do limite de {max_tokens} tokens.
+Gere a copy abaixo:"""
+
+INSTRUCOES_GERAIS_ANALISE = """Você é um especialista em análise de dados e marketing digital.
+Você receberá um resumo de uma base de leads (estatísticas em JSON, os segmentos calculados sobre todos os
+leads, quando houver, e uma amostra em CSV ou separada por |), a plataforma de comunicação e o objetivo da
+campanha. Podem vir também feedbacks anteriores dos usuários, que devem ser considerados para melhorar a análise.
+
+Por favor, forneça:
+1. Análise geral dos dados
+2. Insights específicos para a plataforma informada
+3. Recomendações de estratégia para atingir o objetivo informado
+4. Sugestões de segmentação dos leads (partindo dos segmentos calculados, com o tamanho de cada um)
+5. Possíveis abordagens personalizadas
+Mantenha a análise clara e objetiva, focando em insights acionáveis."""
+
+GUIA_ANALISE = """Como ler os dados recebidos:
+- "Total de leads" é o tamanho da base inteira, já sem leads repetidos; a amostra é só uma parte dela.
+- As colunas analisadas foram escolhidas pelas que mais informam sobre os leads; colunas de
+  identificação (IDs, emails, telefones) ficam de fora de propósito.
+- Nas estatísticas em JSON, colunas numéricas trazem media, mediana, min e max; colunas de texto
+  trazem valores_mais_frequentes com a contagem de cada valor. Média muito acima da mediana indica
+  poucos leads com valores altos; diga isso em vez de tratar a média como típica.
+- Os segmentos, quando vierem, foram calculados sobre todos os leads, não sobre a amostra. O método
+  pode ser "rfm" (recência, frequência e valor de compra), "faixas" (faixas de uma medida numérica)
+  ou "categorias" (valores de uma coluna de texto). O perfil de cada segmento traz medianas numéricas
+  e o valor mais comum de cada categoria. Prefira os tamanhos dos segmentos às contagens da amostra.
+- A amostra serve para entender o formato e exemplos reais dos dados; não tire porcentagens dela
+  quando as estatísticas ou os segmentos já responderem à pergunta.
+- Feedbacks anteriores, quando vierem, dizem o que foi útil ou não em análises passadas: siga o que
+  foi bem avaliado e corrija o que foi criticado.
+
+Regras da análise:
+- Baseie cada afirmação nos dados recebidos e cite os números (tamanhos, medianas, valores mais
+  comuns) que a sustentam. Quando algo for hipótese, diga que é hipótese.
+- Não repita dados pessoais da amostra (nomes, emails, telefones, documentos ou endereços completos).
+- Aponte problemas de qualidade que afetem a campanha: colunas muito vazias, valores inconsistentes,
+  categorias com grafias diferentes ou poucos leads para a plataforma escolhida.
+- Priorize: comece pelos segmentos maiores ou de maior valor e diga por onde a campanha deve começar.
+- Adapte as recomendações à plataforma informada, usando as características abaixo: formato,
+  tamanho da mensagem, frequência de envio e tipo de CTA.
+- Proponha de 3 a 6 segmentos acionáveis; para cada um, diga o tamanho, o perfil, a mensagem
+  principal e o momento de contato sugerido.
+- Nas abordagens personalizadas, dê exemplos curtos de mensagem para os segmentos mais importantes,
+  usando marcadores como {nome} no lugar de dados de leads específicos.
+- Responda em português do Brasil, em Markdown, com um título "##" para cada uma das cinco partes,
+  listas curtas e negrito só nos pontos principais. Não inclua código nem a amostra de volta."""
+
+
+def _montar_prefixo_analise():
+    """Prefixo estático da análise: instruções, guia de leitura dos dados e todas as plataformas."""
+    return "\n".join([
+        INSTRUCOES_GERAIS_ANALISE, "", GUIA_ANALISE, "",
+        "Características das plataformas (para os insights e as abordagens):", "", _instrucoes_plataformas(),
+    ])
+
+
+PREFIXO_ANALISE = _montar_prefixo_analise()
+
+TEMPLATE_ANALISE = """Plataforma: {plataforma}
+Objetivo: {objetivo}
+{contexto_aprendizado}Resumo dos dados:
+- Total de leads: {total_leads}
+- Amostra analisada: {linhas_amostra}
+- Colunas analisadas: {colunas}
+Estatísticas básicas (JSON):
+{estatisticas}
+{segmentos}Dados da amostra ({descricao_formato}):
+{amostra}"""
+
+PREFIXO_PERSONALIZACAO = """Você é um copywriter especialista em mensagens de disparo em massa (WhatsApp e SMS).
+Você receberá o briefing de uma campanha e o perfil de um segmento de leads. Escreva UM modelo de
+mensagem que será enviado a todos os leads desse segmento.
+
+Regras do modelo:
+- Use apenas os marcadores listados no pedido, exatamente no formato {{coluna}}; eles serão
+  substituídos pelos dados de cada lead (ex: {{nome}}).
+- Não invente outros marcadores nem dados que não estejam no briefing ou no perfil do segmento.
+- Adapte a mensagem ao perfil do segmento (ex: cidade, interesse, origem), sem citar que é um segmento.
+- Responda somente com o texto da mensagem, sem comentários.
+
+Instruções por plataforma:
+
+### Disparo de WhatsApp
+""" + INSTRUCOES_PLATAFORMA["Disparo de WhatsApp"] + """
+
+### Copy para SMS
+""" + INSTRUCOES_PLATAFORMA["Copy para SMS"]
+
+TEMPLATE_PERSONALIZACAO = """Plataforma: {plataforma}
+Objetivo: {objetivo}
+Produto/Serviço: {produto_servico}
+Tom de Voz: {tom_de_voz}
+Call to Action (CTA): {cta}
+Perfil do segmento: {perfil}
+Marcadores disponíveis: {marcadores}
+IMPORTANTE: Mantenha a mensagem dentro do limite de {max_tokens} tokens.
+Gere o modelo de mensagem abaixo:"""
+
+# Registro de templates: o prefixo nunca recebe campos variáveis
+TEMPLATES_PROMPT = {
+    "copy": {"versao": 3, "prefixo": PREFIXO_COPY, "variavel": TEMPLATE_COPY},
+    "analise": {"versao": 4, "prefixo": PREFIXO_ANALISE, "variavel": TEMPLATE_ANALISE},
+    "personalizacao": {"versao": 1, "prefixo": PREFIXO_PERSONALIZACAO, "variavel": TEMPLATE_PERSONALIZACAO},
+}
+
+
+def montar_mensagens(nome_template, **campos):
+    """Monta as mensagens de chat de um template: prefixo estático primeiro, campos depois."""
+    template = TEMPLATES_PROMPT[nome_template]
+    return [
+        {"role": "system", "content": template["prefixo"]},
+        {"role": "user", "content": template["variavel"].format(**campos)},
+    ]
+
+
+def mensagens_copy(plataforma, objetivo, publico_alvo, produto_servico, tom_de_voz, cta,
+                   informacoes_adicionais="", max_tokens=300):
+    """Mensagens para geração de copy."""
+    linha_informacoes = f"\nInformações Adicionais: {informacoes_adicionais}" if informacoes_adicionais else ""
+    return montar_mensagens(
+        "copy",
+        plataforma=plataforma,
+        objetivo=objetivo,
+        publico_alvo=publico_alvo,
+        produto_servico=produto_servico,
+        tom_de_voz=tom_de_voz,
+        cta=cta,
+        linha_informacoes=linha_informacoes,
+        max_tokens=max_tokens,
+    )
+
+
+def tokens_em_cache(usage):
+    """Extrai usage.prompt_tokens_details.cached_tokens (0 se o SDK/modelo não informar)."""
+    detalhes = getattr(usage, "prompt_tokens_details", None)
+    if detalhes is None:
+        return 0
+    if isinstance(detalhes, dict):
+        return detalhes.get("cached_tokens") or 0
+    return getattr(detalhes, "cached_tokens", 0) or 0
@@ -0,0 +1,239 @@
+"""
+Assinatura opcional do Supabase Realtime (postgres_changes) que mantém o cache de consultas
+atualizado sem novo SELECT.
+
+Alterações em analises_leads, tags e feedback viram deltas aplicados às entradas do cache do
+usuário dono da linha; alterações em metricas invalidam os agregados (métricas e consumo de
+tokens), que são recalculados na próxima leitura. Uma única conexão por processo atende a
+todas as sessões do Streamlit.
+
+Ativar com SUPABASE_REALTIME=1. A chave usada (SUPABASE_REALTIME_KEY, ou SUPABASE_KEY) precisa
+enxergar as linhas de todos os usuários pelo RLS, ou seja, a service role. Para testar sem o
+Supabase, rode servidor_realtime_local.py e aponte SUPABASE_REALTIME_URL para ele.
+"""
+import json
+import os
+import threading
+import time
+
+from cache import (CONSULTA_CONSUMO_TOKENS, CONSULTA_FEEDBACK, CONSULTA_HISTORICO_ANALISES, CONSULTA_METRICAS,
+                   cache_consultas)
+from servicos import formatar_analise_historico, formatar_feedback
+
+REALTIME_HABILITADO = os.getenv("SUPABASE_REALTIME", "").lower() in ("1", "true", "sim")
+TABELAS_REALTIME = ("analises_leads", "tags", "feedback", "metricas")
+INTERVALO_HEARTBEAT = 25
+TOPICO = "realtime:mencare"
+
+
+def url_realtime():
+    """URL do websocket: SUPABASE_REALTIME_URL ou derivada de SUPABASE_URL."""
+    url = os.getenv("SUPABASE_REALTIME_URL")
+    if url:
+        return url
+    base = (os.getenv("SUPABASE_URL") or "").rstrip("/")
+    if not base:
+        return None
+    base = base.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+    return f"{base}/realtime/v1/websocket"
+
+
+# --- Deltas no cache ---
+
+def _usuario(alteracao):
+    registro = alteracao.get("record") or {}
+    antigo = alteracao.get("old_record") or {}
+    return registro.get("usuario_id") or antigo.get("usuario_id")
+
+
+def _aplicar_analise(cache, tipo, registro, antigo, usuario_id):
+    if tipo == "DELETE":
+        def remover(historico):
+            historico[:] = [a for a in historico if a["id"] != antigo.get("id")]
+
+        if usuario_id:
+            cache.atualizar(usuario_id, CONSULTA_HISTORICO_ANALISES, remover)
+            cache.invalidar(usuario_id, CONSULTA_METRICAS)
+        else:
+            # Sem REPLICA IDENTITY FULL o DELETE não traz o dono da linha
+            cache.invalidar_consulta(CONSULTA_HISTORICO_ANALISES)
+            cache.invalidar_consulta(CONSULTA_METRICAS)
+        return
+
+    def aplicar(historico):
+        for i, analise in enumerate(historico):
+            if analise["id"] == registro["id"]:
+                historico[i] = formatar_analise_historico(registro, analise.get("tags", []))
+                return
+        # Nova análise: o histórico é ordenado por data decrescente
+        historico.insert(0, formatar_analise_historico(registro, []))
+
+    cache.atualizar(usuario_id, CONSULTA_HISTORICO_ANALISES, aplicar)
+    cache.invalidar(usuario_id, CONSULTA_METRICAS)
+
+
+def _aplicar_tag(cache, tipo, registro, antigo, usuario_id):
+    linha = antigo if tipo == "DELETE" else registro
+    analise_id, tag = linha.get("analise_id"), linha.get("tag")
+    if not (usuario_id and analise_id and tag) or tipo == "UPDATE":
+        if usuario_id:
+            cache.invalidar(usuario_id, CONSULTA_HISTORICO_ANALISES)
+        else:
+            cache.invalidar_consulta(CONSULTA_HISTORICO_ANALISES)
+        return
+
+    def aplicar(historico):
+        for analise in historico:
+            if analise["id"] == analise_id:
+                if tipo == "INSERT" and tag not in analise["tags"]:
+                    analise["tags"].append(tag)
+                elif tipo == "DELETE" and tag in analise["tags"]:
+                    analise["tags"].remove(tag)
+
+    cache.atualizar(usuario_id, CONSULTA_HISTORICO_ANALISES, aplicar)
+
+
+def _aplicar_feedback(cache, tipo, registro, antigo, usuario_id):
+    if tipo == "DELETE" or not usuario_id:
+        if usuario_id:
+            cache.invalidar(usuario_id, CONSULTA_FEEDBACK)
+        else:
+            cache.invalidar_consulta(CONSULTA_FEEDBACK)
+    else:
+        # O histórico mostra o feedback mais recente da análise, que é o recém-gravado
+        cache.definir(usuario_id, CONSULTA_FEEDBACK, formatar_feedback(registro), registro.get("analise_id"))
+    if usuario_id:
+        cache.invalidar(usuario_id, CONSULTA_METRICAS)
+    else:
+        cache.invalidar_consulta(CONSULTA_METRICAS)
+
+
+def _aplicar_metrica(cache, tipo, registro, antigo, usuario_id):
+    if usuario_id:
+        cache.invalidar(usuario_id, CONSULTA_CONSUMO_TOKENS)
+        cache.invalidar(usuario_id, CONSULTA_METRICAS)
+    else:
+        cache.invalidar_consulta(CONSULTA_CONSUMO_TOKENS)
+        cache.invalidar_consulta(CONSULTA_METRICAS)
+
+
+_APLICADORES = {
+    "analises_leads": _aplicar_analise,
+    "tags": _aplicar_tag,
+    "feedback": _aplicar_feedback,
+    "metricas": _aplicar_metrica,
+}
+
+
+def aplicar_alteracao(alteracao, cache=cache_consultas):
+    """Aplica ao cache um evento postgres_changes (payload["data"] do Realtime)."""
+    aplicador = _APLICADORES.get(alteracao.get("table"))
+    if aplicador is None:
+        return False
+    aplicador(cache, alteracao.get("type"), alteracao.get("record") or {}, alteracao.get("old_record") or {},
+              _usuario(alteracao))
+    return True
+
+
+# --- Conexão (protocolo Phoenix do Realtime) ---
+
+class AssinaturaRealtime(threading.Thread):
+    """Thread que mantém o websocket aberto, reconecta com backoff e aplica os eventos ao cache."""
+
+    def __init__(self, url, chave, tabelas=TABELAS_REALTIME, cache=cache_consultas):
+        super().__init__(name="supabase-realtime", daemon=True)
+        self.url = url
+        self.chave = chave
+        self.tabelas = tabelas
+        self.cache = cache
+        self.conectado = False
+        self.alteracoes_recebidas = 0
+        self.ultimo_erro = None
+        self._ja_conectou = False
+        self._ref = 0
+        self._parar = threading.Event()
+
+    def _mensagem(self, topico, evento, payload):
+        self._ref += 1
+        return json.dumps({"topic": topico, "event": evento, "payload": payload,
+                           "ref": str(self._ref), "join_ref": "1"})
+
+    def _sessao(self):
+        from websockets.sync.client import connect
+
+        separador = "&" if "?" in self.url else "?"
+        with connect(f"{self.url}{separador}apikey={self.chave}&vsn=1.0.0", open_timeout=10) as ws:
+            ws.send(self._mensagem(TOPICO, "phx_join", {
+                "config": {
+                    "broadcast": {"self": False},
+                    "presence": {"key": ""},
+                    "postgres_changes": [{"event": "*", "schema": "public", "table": t} for t in self.tabelas]
+                },
+                "access_token": self.chave
+            }))
+            proximo_heartbeat = time.monotonic() + INTERVALO_HEARTBEAT
+            while not self._parar.is_set():
+                try:
+                    bruto = ws.recv(timeout=max(0.1, proximo_heartbeat - time.monotonic()))
+                except TimeoutError:
+                    ws.send(self._mensagem("phoenix", "heartbeat", {}))
+                    proximo_heartbeat = time.monotonic() + INTERVALO_HEARTBEAT
+                    continue
+                mensagem = json.loads(bruto)
+                evento = mensagem.get("event")
+                if evento == "phx_reply" and mensagem.get("topic") == TOPICO:
+                    status = (mensagem.get("payload") or {}).get("status")
+                    if status != "ok":
+                        raise RuntimeError(f"Assinatura recusada pelo Realtime: {mensagem.get('payload')}")
+                    if self._ja_conectou:
+                        # Reconexão: eventos do intervalo desconectado foram perdidos
+                        self.cache.limpar()
+                    self._ja_conectou = self.conectado = True
+                    self.ultimo_erro = None
+                elif evento == "postgres_changes":
+                    if aplicar_alteracao((mensagem.get("payload") or {}).get("data") or {}, self.cache):
+                        self.alteracoes_recebidas += 1
+                elif evento in ("phx_error", "phx_close") and mensagem.get("topic") == TOPICO:
+                    raise RuntimeError(f"Canal do Realtime encerrado: {evento}")
+
+    def run(self):
+        espera = 1
+        while not self._parar.is_set():
+            try:
+                self._sessao()
+                espera = 1
+            except Exception as e:
+                self.ultimo_erro = str(e)
+                print(f"Realtime desconectado: {e}. Nova tentativa em {espera}s.")
+            self.conectado = False
+            self._parar.wait(espera)
+            espera = min(espera * 2, 30)
+
+    def parar(self):
+        self._parar.set()
+
+
+_assinatura = None
+_lock_assinatura = threading.Lock()
+
+
+def iniciar_realtime():
+    """Inicia (uma vez por processo) a assinatura, se habilitada. Retorna a thread ou None."""
+    global _assinatura
+    if not REALTIME_HABILITADO:
+        return None
+    with _lock_assinatura:
+        if _assinatura is None:
+            url = url_realtime()
+            chave = os.getenv("SUPABASE_REALTIME_KEY") or os.getenv("SUPABASE_KEY")
+            if not url:
+                print("Realtime habilitado, mas SUPABASE_URL/SUPABASE_REALTIME_URL não está configurada.")
+                return None
+            try:
+                import websockets  # noqa: F401
+            except ImportError:
+                print("Realtime habilitado, mas o pacote websockets não está instalado.")
+                return None
+            _assinatura = AssinaturaRealtime(url, chave)
+            _assinatura.start()
+        return _assinatura
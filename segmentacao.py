@@ -0,0 +1,318 @@
+"""
+Segmentação local dos leads, calculada sobre o DataFrame inteiro antes da chamada à OpenAI.
+
+O modelo só vê uma amostra de linhas; aqui os segmentos são montados com operações
+vetorizadas do pandas/numpy (sem laço por linha) e chegam ao prompt como uma tabela
+compacta com o tamanho e o perfil de cada segmento. A base do segmento é escolhida
+conforme as colunas disponíveis:
+
+1. RFM: com uma coluna de data e uma de valor ou de frequência, cada lead recebe notas
+   de 1 a 5 (quintis) de recência, frequência e valor, agrupadas em segmentos nomeados;
+2. faixas: sem RFM, as colunas numéricas mais informativas são cortadas em tercis
+   (baixo, médio, alto);
+3. categorias: sem colunas numéricas úteis, a coluna categórica principal.
+
+Quando couber em MAX_SEGMENTOS, a base é cruzada com a coluna categórica principal
+(ex: "Campeões | Instagram"); segmentos além do limite são agrupados em "Outros".
+"""
+import os
+import re
+import time
+import unicodedata
+
+from amostragem import ROTULO_OUTROS, detectar_estratos
+
+MAX_SEGMENTOS = int(os.getenv("MAX_SEGMENTOS_LEADS", "12"))
+MAX_COLUNAS_FAIXAS = 2
+MAX_COLUNAS_PERFIL = 4
+FAIXAS_TERCIS = ("baixo", "médio", "alto")
+ROTULO_OUTROS_SEGMENTOS = "Outros"
+COLUNA_SEGMENTO = "segmento"
+FRACAO_MAX_OUTROS = 0.5  # colunas com mais valores raros que isso (ex: nome) não agrupam leads
+FRACAO_MIN_DATAS = 0.9  # fração da amostra que precisa virar data para a coluna contar como data
+AMOSTRA_DETECCAO = 500
+
+# Nomes de colunas (sem acentos, minúsculos) que indicam o papel de cada uma no RFM
+_PADRAO_DATA = re.compile(r"data|date|dt_|ultim|cadastro|criad|created|atualiz")
+_PADRAO_DATA_COMPRA = re.compile(r"ultim|compra|pedido|venda|order|purchase|last")
+_PADRAO_VALOR = re.compile(r"valor|receita|ticket|gasto|faturamento|montante|amount|revenue|spent|ltv")
+_PADRAO_FREQUENCIA = re.compile(r"num_|qtd|quantidade|frequencia|pedidos|compras|visitas|count|orders")
+# Colunas numéricas que são identificadores, não medidas
+_PADRAO_IDENTIFICADOR = re.compile(r"(^|_)id($|_)|telefone|celular|whatsapp|phone|cep|cpf|cnpj|zip|codigo")
+
+# Segmentos RFM na ordem de prioridade (a primeira condição verdadeira vence)
+SEGMENTOS_RFM = (
+    ("Campeões", lambda r, fv: (r >= 4) & (fv >= 4)),
+    ("Leais", lambda r, fv: (r >= 3) & (fv >= 3)),
+    ("Não pode perder", lambda r, fv: (r <= 2) & (fv >= 4)),
+    ("Em risco", lambda r, fv: (r <= 2) & (fv >= 3)),
+    ("Recentes", lambda r, fv: r >= 4),
+    ("Precisam de atenção", lambda r, fv: r == 3),
+    ("Hibernando", lambda r, fv: r <= 2),
+)
+
+
+def _nome_normalizado(coluna):
+    texto = unicodedata.normalize("NFKD", str(coluna)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"\W+", "_", texto.lower())
+
+
+def _eh_numerica(serie):
+    import pandas as pd
+
+    return pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)
+
+
+def _eh_inteira(serie):
+    import pandas as pd
+
+    return pd.api.types.is_integer_dtype(serie)
+
+
+def _colunas_medidas(df):
+    """Colunas numéricas que medem algo (exclui identificadores, telefones e constantes)."""
+    medidas = []
+    for coluna in df.columns:
+        serie = df[coluna]
+        if not _eh_numerica(serie) or _PADRAO_IDENTIFICADOR.search(_nome_normalizado(coluna)):
+            continue
+        distintos = serie.nunique()
+        if distintos < 3:
+            continue
+        # Inteiros quase todos distintos costumam ser códigos (pedido, matrícula)
+        if _eh_inteira(serie) and distintos > 0.95 * serie.notna().sum():
+            continue
+        medidas.append(coluna)
+    return medidas
+
+
+def _converter_datas(serie):
+    """Série como datas, ou None se a coluna não parece ser de datas."""
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    if serie.dtype != object:
+        return None
+    amostra = serie.dropna().head(AMOSTRA_DETECCAO).astype(str)
+    if amostra.empty:
+        return None
+    # Datas no formato brasileiro (dd/mm/aaaa) precisam de dayfirst
+    dia_primeiro = bool(amostra.str.contains("/", regex=False).mean() > 0.5)
+    convertida = pd.to_datetime(amostra, errors="coerce", dayfirst=dia_primeiro)
+    if convertida.notna().mean() < FRACAO_MIN_DATAS:
+        return None
+    # cache=True converte cada valor distinto uma vez só (datas se repetem muito)
+    return pd.to_datetime(serie, errors="coerce", dayfirst=dia_primeiro, cache=True)
+
+
+def detectar_colunas_rfm(df, medidas=None):
+    """
+    Colunas de data, frequência e valor para o RFM, pelo nome e pelo tipo.
+
+    Retorna (coluna_data, datas, coluna_frequencia, coluna_valor); a data é obrigatória e ao
+    menos uma das outras duas precisa existir, senão retorna None.
+    """
+    medidas = _colunas_medidas(df) if medidas is None else medidas
+    candidatas_data = [c for c in df.columns if _PADRAO_DATA.search(_nome_normalizado(c))]
+    # Datas de compra/pedido dizem mais sobre recência que a data de cadastro
+    candidatas_data.sort(key=lambda c: not _PADRAO_DATA_COMPRA.search(_nome_normalizado(c)))
+    coluna_data, datas = None, None
+    for coluna in candidatas_data:
+        datas = _converter_datas(df[coluna])
+        if datas is not None:
+            coluna_data = coluna
+            break
+    if coluna_data is None:
+        return None
+    coluna_valor = next((c for c in medidas if _PADRAO_VALOR.search(_nome_normalizado(c))), None)
+    coluna_frequencia = next((c for c in medidas if c != coluna_valor and _eh_inteira(df[c])
+                              and _PADRAO_FREQUENCIA.search(_nome_normalizado(c))), None)
+    if coluna_valor is None and coluna_frequencia is None:
+        return None
+    return coluna_data, datas, coluna_frequencia, coluna_valor
+
+
+def _notas_quintis(valores, maior_melhor=True):
+    """Nota de 1 a 5 por quintil (valores vazios ficam com a pior nota)."""
+    import numpy as np
+
+    percentis = valores.rank(pct=True, method="average", ascending=maior_melhor).to_numpy()
+    return np.where(np.isnan(percentis), 1, np.ceil(percentis * 5)).clip(1, 5).astype(np.int8)
+
+
+def _segmentos_rfm(df, colunas_rfm):
+    import numpy as np
+
+    coluna_data, datas, coluna_frequencia, coluna_valor = colunas_rfm
+    referencia = datas.max()
+    recencia_dias = (referencia - datas).dt.days
+    r = _notas_quintis(recencia_dias, maior_melhor=False)
+    notas = [_notas_quintis(df[c]) for c in (coluna_frequencia, coluna_valor) if c is not None]
+    fv = np.rint(np.mean(notas, axis=0)).astype(np.int8)
+    nomes = [nome for nome, _ in SEGMENTOS_RFM]
+    codigos = np.select([condicao(r, fv) for _, condicao in SEGMENTOS_RFM], range(len(nomes)), len(nomes) - 1)
+    info = {
+        "metodo": "rfm",
+        "colunas": {"data": coluna_data, "frequencia": coluna_frequencia, "valor": coluna_valor},
+        "referencia": str(referencia.date()) if hasattr(referencia, "date") else str(referencia),
+    }
+    medidas_perfil = {"recencia_dias": recencia_dias.to_numpy()}
+    return codigos, nomes, info, medidas_perfil
+
+
+def _segmentos_faixas(df, medidas):
+    """Tercis das colunas numéricas mais informativas (maior número de valores distintos)."""
+    import numpy as np
+
+    escolhidas = sorted(medidas, key=lambda c: df[c].nunique(), reverse=True)[:MAX_COLUNAS_FAIXAS]
+    codigos = np.zeros(len(df), dtype=np.int16)
+    nomes = [""]
+    for coluna in escolhidas:
+        percentis = df[coluna].rank(pct=True, method="average").to_numpy()
+        faixa = np.where(np.isnan(percentis), 0, np.ceil(percentis * 3)).clip(0, 3).astype(np.int16)
+        rotulos_faixa = ["vazio", *FAIXAS_TERCIS]
+        codigos = codigos * len(rotulos_faixa) + faixa
+        nomes = [f"{base}, {coluna} {rotulo}".lstrip(", ") for base in nomes for rotulo in rotulos_faixa]
+    usados, codigos = np.unique(codigos, return_inverse=True)
+    limites = {c: [round(float(v), 2) for v in df[c].quantile([1 / 3, 2 / 3])] for c in escolhidas}
+    info = {"metodo": "faixas", "colunas": escolhidas, "limites_tercis": limites}
+    return codigos, [nomes[i] for i in usados], info, {}
+
+
+def _cruzar(codigos, nomes, rotulos_categoria):
+    """Combina a base com a coluna categórica (códigos de ambos viram um só)."""
+    import numpy as np
+
+    categorias = rotulos_categoria.cat.categories
+    combinados = codigos.astype(np.int64) * len(categorias) + rotulos_categoria.cat.codes.to_numpy()
+    usados, codigos = np.unique(combinados, return_inverse=True)
+    novos_nomes = [f"{nomes[i // len(categorias)]} | {categorias[i % len(categorias)]}".strip(" |")
+                   for i in usados]
+    return codigos, novos_nomes
+
+
+def _limitar_segmentos(codigos, nomes, max_segmentos):
+    """Mantém os maiores segmentos e agrupa o resto em "Outros"; ordena do maior para o menor."""
+    import numpy as np
+
+    tamanhos = np.bincount(codigos, minlength=len(nomes))
+    ordem = np.argsort(-tamanhos, kind="stable")
+    ordem = ordem[tamanhos[ordem] > 0]
+    if len(ordem) > max_segmentos:
+        mantidos, agrupados = ordem[:max_segmentos - 1], ordem[max_segmentos - 1:]
+    else:
+        mantidos, agrupados = ordem, ordem[:0]
+    novo_codigo = np.full(len(nomes), len(mantidos), dtype=np.int64)
+    novo_codigo[mantidos] = np.arange(len(mantidos))
+    novos_nomes = [nomes[i] for i in mantidos] + ([ROTULO_OUTROS_SEGMENTOS] if len(agrupados) else [])
+    return novo_codigo[codigos], novos_nomes
+
+
+def _perfis(df, codigos, nomes, colunas_numericas, colunas_categoricas, medidas_extras):
+    """Tamanho, medianas numéricas e valor categórico dominante de cada segmento."""
+    import numpy as np
+    import pandas as pd
+
+    total = len(df)
+    tamanhos = np.bincount(codigos, minlength=len(nomes))
+    numericas = df[colunas_numericas].copy()
+    for posicao, (nome_medida, valores) in enumerate(medidas_extras.items()):
+        numericas.insert(posicao, nome_medida, valores)
+    medianas = numericas.groupby(codigos).median() if len(numericas.columns) else None
+    dominantes = {}
+    for coluna, rotulos in colunas_categoricas:
+        # Tabela segmento x categoria com um único bincount
+        categorias = rotulos.cat.categories
+        combinados = codigos.astype(np.int64) * len(categorias) + rotulos.cat.codes.to_numpy()
+        contagem = np.bincount(combinados, minlength=len(nomes) * len(categorias)).reshape(len(nomes), -1)
+        mais_comum = contagem.argmax(axis=1)
+        dominantes[coluna] = (categorias[mais_comum], contagem[np.arange(len(nomes)), mais_comum])
+
+    segmentos = []
+    for codigo, nome in enumerate(nomes):
+        perfil = {}
+        if medianas is not None and codigo in medianas.index:
+            for coluna, valor in medianas.loc[codigo].items():
+                if not pd.isna(valor):
+                    valor = round(float(valor), 2)
+                    perfil[coluna] = int(valor) if valor.is_integer() else valor
+        for coluna, (valores, quantidades) in dominantes.items():
+            if tamanhos[codigo]:
+                perfil[coluna] = f"{valores[codigo]} ({quantidades[codigo] / tamanhos[codigo]:.0%})"
+        segmentos.append({
+            "segmento": nome,
+            "leads": int(tamanhos[codigo]),
+            "percentual": round(100 * tamanhos[codigo] / max(1, total), 1),
+            "perfil": perfil,
+        })
+    return segmentos
+
+
+def segmentar_leads(df, max_segmentos=MAX_SEGMENTOS):
+    """
+    Segmenta todos os leads do DataFrame.
+
+    Retorna (segmentos_por_lead, resumo): a Series categórica com o segmento de cada lead
+    (alinhada ao df) e o resumo serializável em JSON (método, colunas e perfil de cada
+    segmento). Retorna (None, None) se não houver coluna que permita segmentar.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if df.empty:
+        return None, None
+    inicio = time.perf_counter()
+    medidas = _colunas_medidas(df)
+    estratos = [(coluna, rotulos) for coluna, rotulos in detectar_estratos(df)
+                if (rotulos == ROTULO_OUTROS).mean() < FRACAO_MAX_OUTROS]
+    colunas_rfm = detectar_colunas_rfm(df, medidas)
+    if colunas_rfm:
+        codigos, nomes, info, medidas_perfil = _segmentos_rfm(df, colunas_rfm)
+    elif medidas:
+        codigos, nomes, info, medidas_perfil = _segmentos_faixas(df, medidas)
+    elif estratos:
+        codigos, nomes = estratos[0][1].cat.codes.to_numpy(), list(estratos[0][1].cat.categories)
+        info, medidas_perfil = {"metodo": "categorias", "colunas": [estratos[0][0]]}, {}
+        estratos = estratos[1:]
+    else:
+        return None, None
+
+    # Cruza com a categoria principal só se o resultado ainda couber no limite de segmentos
+    segmentos_base = np.count_nonzero(np.bincount(codigos, minlength=len(nomes)))
+    if estratos and segmentos_base * len(estratos[0][1].cat.categories) <= max_segmentos:
+        info["coluna_categoria"] = estratos[0][0]
+        codigos, nomes = _cruzar(codigos, nomes, estratos[0][1])
+        estratos = estratos[1:]
+    codigos, nomes = _limitar_segmentos(codigos, nomes, max_segmentos)
+
+    # No perfil, as colunas usadas na segmentação vêm antes das demais medidas
+    usadas = list(info["colunas"].values()) if isinstance(info["colunas"], dict) else info["colunas"]
+    colunas_numericas = [c for c in dict.fromkeys(usadas + medidas) if c in medidas][:MAX_COLUNAS_PERFIL]
+    segmentos = _perfis(df, codigos, nomes, colunas_numericas, estratos[:2], medidas_perfil)
+    resumo = dict(info, total_leads=len(df), segmentos=segmentos,
+                  duracao_s=round(time.perf_counter() - inicio, 3))
+    segmentos_por_lead = pd.Series(pd.Categorical.from_codes(codigos, nomes), index=df.index, name=COLUNA_SEGMENTO)
+    return segmentos_por_lead, resumo
+
+
+def tabela_segmentos(resumo):
+    """Tabela compacta (uma linha por segmento) usada no prompt e na interface."""
+    import pandas as pd
+
+    return pd.DataFrame([
+        {
+            "segmento": s["segmento"],
+            "leads": s["leads"],
+            "%": s["percentual"],
+            "perfil": "; ".join(f"{chave}={valor}" for chave, valor in s["perfil"].items()),
+        }
+        for s in resumo.get("segmentos", [])
+    ])
+
+
+def exportar_segmentos_csv(df, segmentos_por_lead):
+    """CSV com a coluna do segmento na frente das colunas originais de cada lead."""
+    saida = df.drop(columns=[COLUNA_SEGMENTO], errors="ignore")
+    saida.insert(0, COLUNA_SEGMENTO, segmentos_por_lead.to_numpy())
+    return saida.to_csv(index=False).encode("utf-8")
@@ -0,0 +1,196 @@
+"""
+Seleção das colunas analisadas pela IA (antes eram as 9 primeiras, na ordem do arquivo).
+
+Cada coluna recebe um tipo semântico (categórico, numérico, data, email, telefone,
+identificador...) e uma pontuação calculada sobre a base inteira com operações vetorizadas:
+
+    pontuação = peso do tipo x informatividade (entropia normalizada) x (1 - taxa de nulos)
+
+Colunas constantes, quase vazias, identificadores (IDs, emails, telefones, códigos quase
+únicos) e nomes de pessoas são descartadas: dados pessoais não vão para o prompt. As melhores
+entram em ordem de pontuação enquanto couberem no orçamento de tokens da análise e no limite
+MAX_COLUNAS_ANALISE; o prompt as recebe na ordem original do arquivo.
+"""
+import math
+import os
+import re
+import unicodedata
+
+from prompt_builder import MAX_CARACTERES_CELULA, ORCAMENTO_TOKENS_ANALISE, estimar_tokens
+
+MAX_COLUNAS_ANALISE = int(os.getenv("MAX_COLUNAS_ANALISE", "12"))
+FRACAO_ORCAMENTO_COLUNAS = 0.5  # parte do orçamento de tokens que as colunas podem ocupar
+LINHAS_REFERENCIA = 20  # linhas de amostra que cada coluna precisa caber no orçamento
+AMOSTRA_TIPO = 1000  # valores não nulos usados para detectar o tipo semântico
+AMOSTRA_CARDINALIDADE = 5000
+FRACAO_MAX_NULOS = 0.95
+FRACAO_IDENTIFICADOR = 0.95  # distintos / não nulos acima disso: cada linha tem um valor próprio
+FRACAO_ALTA_CARDINALIDADE = 0.5
+FRACAO_MIN_PADRAO = 0.8  # fração da amostra que precisa casar com o padrão do tipo
+TAMANHO_TEXTO_LIVRE = 40
+
+# Utilidade de cada tipo para a análise de marketing (0 = descartar)
+PESO_TIPO = {
+    "categorico": 1.0,
+    "numerico": 1.0,
+    "data": 0.7,
+    "booleano": 0.6,
+    "texto_livre": 0.4,
+    "nome": 0.0,
+    "email": 0.0,
+    "telefone": 0.0,
+    "identificador": 0.0,
+    "constante": 0.0,
+    "vazia": 0.0,
+}
+# Dados pessoais: nunca entram no prompt, nem no fallback das primeiras colunas
+TIPOS_PESSOAIS = ("nome", "email", "telefone", "identificador")
+
+_PADRAO_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_PADRAO_TELEFONE = re.compile(r"^\+?[\d\s().-]{8,20}$")
+_PADRAO_UUID = re.compile(r"^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$", re.I)
+_PADRAO_DATA_TEXTO = re.compile(r"^\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}")
+_NOME_IDENTIFICADOR = re.compile(r"(^|_)(id|uuid|guid|codigo|cod|cpf|cnpj|rg|matricula|token|hash)($|_)")
+_NOME_TELEFONE = re.compile(r"telefone|celular|whatsapp|phone|fone|tel($|_)")
+_NOME_EMAIL = re.compile(r"e_?mail")
+# Só cabeçalhos que são inteiros um nome de pessoa: "nome_produto" e "campaign_name" são dados de negócio
+_NOME_PESSOA = re.compile(r"^(nome|nome_completo|primeiro_nome|sobrenome|nome_cliente|nome_lead|"
+                          r"name|full_name|first_name|last_name)$")
+
+
+def _nome_normalizado(coluna):
+    texto = unicodedata.normalize("NFKD", str(coluna)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"\W+", "_", texto.lower()).strip("_")
+
+
+def _fracao_casando(padrao, valores):
+    return sum(1 for v in valores if padrao.match(v)) / max(1, len(valores))
+
+
+def _tipo_semantico(serie, nome, amostra, fracao_distintos):
+    """Tipo semântico da coluna pelo nome, pelo dtype e por padrões em uma amostra dos valores."""
+    import pandas as pd
+
+    if pd.api.types.is_bool_dtype(serie):
+        return "booleano"
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return "data"
+    textos = [str(v).strip() for v in amostra]
+    if _NOME_EMAIL.search(nome) or _fracao_casando(_PADRAO_EMAIL, textos) >= FRACAO_MIN_PADRAO:
+        return "email"
+    if pd.api.types.is_numeric_dtype(serie):
+        # Números longos e quase únicos (telefones lidos como inteiro, códigos) não são medidas
+        if _NOME_TELEFONE.search(nome):
+            return "telefone"
+        if _NOME_IDENTIFICADOR.search(nome) or (
+                pd.api.types.is_integer_dtype(serie) and fracao_distintos > FRACAO_IDENTIFICADOR):
+            return "identificador"
+        return "numerico"
+    # Datas antes de telefones: "2024-01-31" também casa com o padrão de telefone
+    if _fracao_casando(_PADRAO_DATA_TEXTO, textos) >= FRACAO_MIN_PADRAO:
+        return "data"
+    if _NOME_TELEFONE.search(nome) or _fracao_casando(_PADRAO_TELEFONE, textos) >= FRACAO_MIN_PADRAO:
+        return "telefone"
+    if _NOME_IDENTIFICADOR.search(nome) or _fracao_casando(_PADRAO_UUID, textos) >= FRACAO_MIN_PADRAO:
+        return "identificador"
+    if _NOME_PESSOA.match(nome) and fracao_distintos > FRACAO_ALTA_CARDINALIDADE:
+        return "nome"
+    tamanho_medio = sum(map(len, textos)) / max(1, len(textos))
+    if tamanho_medio > TAMANHO_TEXTO_LIVRE:
+        return "texto_livre"
+    if fracao_distintos > FRACAO_IDENTIFICADOR:
+        return "identificador"
+    if fracao_distintos > FRACAO_ALTA_CARDINALIDADE:
+        return "texto_livre"
+    return "categorico"
+
+
+def _entropia_normalizada(contagens):
+    """Entropia dos valores dividida pelo máximo possível (1 = valores bem distribuídos)."""
+    import numpy as np
+
+    contagens = contagens[contagens > 0]
+    if len(contagens) < 2:
+        return 0.0
+    p = contagens / contagens.sum()
+    return float(-(p * np.log2(p)).sum() / math.log2(len(contagens)))
+
+
+def _custo_tokens(tipo, amostra):
+    """Tokens que a coluna ocupa no prompt: estatísticas + LINHAS_REFERENCIA células da amostra."""
+    celulas = [str(v)[:MAX_CARACTERES_CELULA] for v in amostra[:200]]
+    tokens_celula = estimar_tokens(",".join(celulas)) / max(1, len(celulas)) if celulas else 1
+    if tipo in ("numerico", "data"):
+        tokens_estatisticas = 30  # media, mediana, min e max
+    else:
+        tokens_estatisticas = 10 + 5 * tokens_celula  # 5 valores mais frequentes com contagem
+    return math.ceil(tokens_estatisticas + LINHAS_REFERENCIA * tokens_celula)
+
+
+def avaliar_coluna(serie):
+    """Perfil da coluna: tipo semântico, taxa de nulos, distintos, entropia, pontuação e custo em tokens."""
+    import numpy as np
+    import pandas as pd
+
+    total = len(serie)
+    nome = _nome_normalizado(serie.name)
+    nulos = int(serie.isna().sum())
+    preenchidas = total - nulos
+    taxa_nulos = nulos / max(1, total)
+    avaliacao = {"coluna": serie.name, "taxa_nulos": round(taxa_nulos, 4)}
+    if preenchidas == 0 or taxa_nulos >= FRACAO_MAX_NULOS:
+        return dict(avaliacao, tipo="vazia", distintos=0, entropia=0.0, pontuacao=0.0, custo_tokens=0)
+
+    nao_nulos = serie.dropna() if nulos else serie
+    amostra = nao_nulos.iloc[:AMOSTRA_TIPO].tolist()
+    # Cardinalidade: descarta cedo colunas quase únicas sem fatorar a coluna inteira
+    inicio = nao_nulos.iloc[:AMOSTRA_CARDINALIDADE]
+    if preenchidas > AMOSTRA_CARDINALIDADE and inicio.nunique() > FRACAO_ALTA_CARDINALIDADE * len(inicio):
+        distintos = None
+        fracao_distintos = inicio.nunique() / len(inicio)
+        entropia = 1.0
+    else:
+        codigos, valores = pd.factorize(nao_nulos)
+        distintos = len(valores)
+        fracao_distintos = distintos / preenchidas
+        entropia = _entropia_normalizada(np.bincount(codigos))
+
+    if distintos == 1:
+        tipo = "constante"
+    else:
+        tipo = _tipo_semantico(serie, nome, amostra, fracao_distintos)
+    # Medidas contínuas e datas informam pela dispersão, não pela distribuição dos valores exatos
+    informatividade = 1.0 if tipo in ("numerico", "data") and (distintos is None or distintos >= 10) else entropia
+    pontuacao = PESO_TIPO[tipo] * informatividade * (1 - taxa_nulos)
+    return dict(avaliacao, tipo=tipo, distintos=distintos, entropia=round(entropia, 4),
+                pontuacao=round(pontuacao, 4), custo_tokens=_custo_tokens(tipo, amostra))
+
+
+def selecionar_colunas(df, max_colunas=MAX_COLUNAS_ANALISE, orcamento_tokens=ORCAMENTO_TOKENS_ANALISE):
+    """
+    Escolhe as colunas mais informativas que cabem no orçamento de tokens.
+
+    Retorna (colunas, ranking): as colunas escolhidas na ordem original do DataFrame e o
+    ranking de todas (maior pontuação primeiro), com o motivo de cada uma ter ficado de fora.
+    """
+    ranking = sorted((avaliar_coluna(df[coluna]) for coluna in df.columns),
+                     key=lambda item: item["pontuacao"], reverse=True)
+    disponivel = orcamento_tokens * FRACAO_ORCAMENTO_COLUNAS
+    escolhidas = set()
+    for item in ranking:
+        if item["pontuacao"] <= 0:
+            item["motivo"] = f"descartada ({item['tipo']})"
+        elif len(escolhidas) >= max_colunas:
+            item["motivo"] = "limite de colunas"
+        elif item["custo_tokens"] > disponivel:
+            item["motivo"] = "orçamento de tokens"
+        else:
+            disponivel -= item["custo_tokens"]
+            escolhidas.add(item["coluna"])
+            item["motivo"] = "selecionada"
+    # Sem nenhuma coluna útil, mantém o comportamento antigo (primeiras colunas do arquivo),
+    # ainda sem dados pessoais
+    if not escolhidas:
+        pessoais = {item["coluna"] for item in ranking if item["tipo"] in TIPOS_PESSOAIS}
+        escolhidas = set([coluna for coluna in df.columns if coluna not in pessoais][:max_colunas])
+    return [coluna for coluna in df.columns if coluna in escolhidas], ranking
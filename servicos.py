@@ -0,0 +1,491 @@
+"""
+Camada de serviço: geração de copy, análise de leads e persistência sem dependência do Streamlit.
+
+As funções recebem os clientes da OpenAI e do Supabase e o ID do usuário explicitamente,
+então podem rodar em threads de segundo plano, na CLI ou em uma API.
+"""
+import json
+import time
+from datetime import datetime
+
+from cache import (CONSULTA_BUSCA, CONSULTA_CONSUMO_TOKENS, CONSULTA_HISTORICO_ANALISES, CONSULTA_METRICAS,
+                   cache_consultas)
+from limitador_taxa import limitador_openai
+from prompt_builder import construir_prompt_analise
+from prompts import mensagens_copy, tokens_em_cache
+from segmentacao import segmentar_leads
+from selecao_colunas import selecionar_colunas
+from similaridade import registrar_analises
+from snapshots import carregar_snapshot, salvar_snapshot
+from telemetria_llm import chamar_chat
+
+# Modelo usado nas chamadas à OpenAI
+MODELO_OPENAI = "gpt-4.1-mini"
+MAX_TOKENS_ANALISE = 800
+
+# Configuração de tokens por plataforma
+TOKENS_POR_PLATAFORMA = {
+    "Disparo de WhatsApp": 150,
+    "Email Marketing": 600,
+    "Conteúdo para Redes Sociais (Feed)": 300,
+    "Conteúdo para Redes Sociais (Stories)": 200,
+    "Copy para SMS": 100
+}
+
+CAMPOS_COPY = ("plataforma", "objetivo", "publico_alvo", "produto_servico", "tom_de_voz", "cta")
+COLUNAS_HISTORICO_COPIES = "id, " + ", ".join(CAMPOS_COPY) + ", copy_gerada, data_geracao"
+# Colunas explícitas em vez de '*': a coluna tsvector "busca" não deve trafegar nas leituras
+COLUNAS_COPIES = COLUNAS_HISTORICO_COPIES + ", usuario_id, created_at, updated_at"
+COLUNAS_ANALISES_LEADS = ("id, data, plataforma, objetivo, total_leads, colunas, analise, tempo_processamento, "
+                          "resumo_estatistico, usuario_id, created_at, updated_at")
+
+
+def gerar_copy(client, plataforma, objetivo, publico_alvo, produto_servico, tom_de_voz, cta,
+               informacoes_adicionais="", modelo=MODELO_OPENAI, limitador=limitador_openai, usuario_id=None):
+    """Gera uma copy e retorna um dict com o texto e o uso de tokens da chamada."""
+    max_tokens = TOKENS_POR_PLATAFORMA.get(plataforma, 300)
+    mensagens = mensagens_copy(
+        plataforma, objetivo, publico_alvo, produto_servico, tom_de_voz, cta,
+        informacoes_adicionais, max_tokens
+    )
+    response, telemetria = chamar_chat(
+        client, "copy", plataforma=plataforma, usuario_id=usuario_id, limitador=limitador,
+        model=modelo,
+        messages=mensagens,
+        temperature=0.7,
+        max_tokens=max_tokens
+    )
+    return {
+        "copy": response.choices[0].message.content.strip(),
+        "total_tokens": response.usage.total_tokens,
+        "prompt_tokens": response.usage.prompt_tokens,
+        "cached_tokens": tokens_em_cache(response.usage),
+        "latencia_api": telemetria["latencia_ms"] / 1000
+    }
+
+
+def salvar_copies(supabase, copies, usuario_id):
+    """Salva uma ou mais copies com um único insert e retorna as linhas salvas."""
+    if not copies:
+        return []
+    data_geracao = datetime.now().isoformat()
+    payload = []
+    for item in copies:
+        registro = {campo: item.get(campo) for campo in CAMPOS_COPY}
+        registro.update({
+            "copy_gerada": item.get("copy_gerada"),
+            "data_geracao": item.get("data_geracao_iso") or data_geracao,
+            "usuario_id": usuario_id
+        })
+        payload.append({k: v for k, v in registro.items() if v is not None})
+    response = supabase.table('copies').insert(payload).execute()
+    cache_consultas.invalidar(usuario_id, CONSULTA_METRICAS)
+    cache_consultas.invalidar(usuario_id, CONSULTA_BUSCA)
+    return response.data or []
+
+
+def listar_copies(supabase, usuario_id, limite=20, offset=0):
+    """Copies do usuário, mais recentes primeiro."""
+    response = supabase.table('copies')\
+        .select(COLUNAS_COPIES)\
+        .eq('usuario_id', usuario_id)\
+        .order('data_geracao', desc=True)\
+        .range(offset, offset + limite - 1)\
+        .execute()
+    return response.data or []
+
+
+def pagina_copies(supabase, usuario_id, limite=20, cursor=None):
+    """
+    Uma página de copies do usuário, mais recentes primeiro, paginada por chave (data_geracao, id).
+
+    `cursor` é o devolvido pela página anterior (None na primeira) e a consulta usa o índice
+    idx_copies_usuario_data_geracao, sem OFFSET. Copies salvas em lote compartilham o mesmo
+    data_geracao, então o cursor guarda também quantas linhas desse instante já foram mostradas:
+    a consulta busca com lte e descarta essas linhas. Retorna (linhas, proximo_cursor), com
+    proximo_cursor None na última página.
+    """
+    consulta = supabase.table('copies')\
+        .select(COLUNAS_HISTORICO_COPIES)\
+        .eq('usuario_id', usuario_id)
+    ja_mostradas = 0
+    if cursor:
+        data_cursor, id_cursor, ja_mostradas = cursor
+        consulta = consulta.lte('data_geracao', data_cursor)
+    # Uma linha a mais indica se existe próxima página
+    linhas = consulta.order('data_geracao', desc=True)\
+        .order('id', desc=True)\
+        .limit(limite + ja_mostradas + 1)\
+        .execute().data or []
+    if cursor:
+        linhas = [l for l in linhas if not (l['data_geracao'] == data_cursor and l['id'] >= id_cursor)]
+    if len(linhas) <= limite:
+        return linhas, None
+    linhas = linhas[:limite]
+    ultima = linhas[-1]
+    no_mesmo_instante = sum(1 for l in linhas if l['data_geracao'] == ultima['data_geracao'])
+    if cursor and ultima['data_geracao'] == data_cursor:
+        no_mesmo_instante += ja_mostradas
+    return linhas, (ultima['data_geracao'], ultima['id'], no_mesmo_instante)
+
+
+def buscar_texto(supabase, usuario_id, consulta, tipo=None, limite=10, offset=0):
+    """
+    Busca textual em copies e análises (função buscar_texto do banco), mais relevantes primeiro.
+
+    `tipo` restringe a "copy" ou "analise". Cada resultado traz tipo, id, plataforma, título,
+    data, relevância e um trecho com os termos em **negrito**. Retorna (resultados, tem_mais).
+    """
+    def _consultar():
+        response = supabase.rpc('buscar_texto', {
+            "p_usuario_id": usuario_id, "p_consulta": consulta, "p_tipo": tipo,
+            "p_limite": limite + 1, "p_offset": offset,
+        }).execute()
+        return response.data or []
+
+    resultados = cache_consultas.obter_ou_carregar(usuario_id, CONSULTA_BUSCA, _consultar, consulta, tipo, limite, offset)
+    return resultados[:limite], len(resultados) > limite
+
+
+def listar_analises(supabase, usuario_id, limite=20, offset=0):
+    """Análises de leads do usuário, mais recentes primeiro (sem o texto completo de colunas)."""
+    response = supabase.table('analises_leads')\
+        .select('id, data, plataforma, objetivo, total_leads, analise, tempo_processamento')\
+        .eq('usuario_id', usuario_id)\
+        .order('data', desc=True)\
+        .range(offset, offset + limite - 1)\
+        .execute()
+    return response.data or []
+
+
+def _json_ou_valor(valor, padrao):
+    """Campos JSONB podem vir como string (gravados com json.dumps) ou já decodificados."""
+    if isinstance(valor, str):
+        try:
+            return json.loads(valor)
+        except json.JSONDecodeError:
+            return padrao
+    return padrao if valor is None else valor
+
+
+def formatar_analise_historico(analise_db, tags):
+    """Linha de analises_leads no formato usado pelo histórico e pelo dashboard."""
+    return {
+        "id": analise_db['id'],
+        "data": analise_db.get('data_criacao') or analise_db.get('data', datetime.now().strftime("%d/%m/%Y %H:%M:%S")),
+        "plataforma": analise_db['plataforma'],
+        "objetivo": analise_db['objetivo'],
+        "total_leads": analise_db.get('total_leads'),
+        "colunas": _json_ou_valor(analise_db.get('colunas'), []),
+        "analise": analise_db['analise'],
+        "tempo_processamento": analise_db.get('tempo_processamento'),
+        "resumo_estatistico": _json_ou_valor(analise_db.get('resumo_estatistico'), {}),
+        "tags": list(tags),
+        "usuario_id": analise_db.get('usuario_id')
+    }
+
+
+def formatar_feedback(feedback_db):
+    """Linha de feedback no formato usado pelo histórico (historico_edicoes decodificado)."""
+    historico_edicoes = _json_ou_valor(feedback_db.get('historico_edicoes'), [])
+    if not isinstance(historico_edicoes, list):
+        historico_edicoes = []
+    return {
+        "id": feedback_db.get('id'),
+        "analise_id": feedback_db.get('analise_id'),
+        "pontos_positivos": feedback_db.get('pontos_positivos'),
+        "pontos_melhorar": feedback_db.get('pontos_melhorar'),
+        "nota": feedback_db.get('nota'),
+        "editado": feedback_db.get('editado', False),
+        "ultima_edicao": feedback_db.get('ultima_edicao') or feedback_db.get('updated_at'),  # updated_at como fallback
+        "historico_edicoes": historico_edicoes,
+        "usuario_id": feedback_db.get('usuario_id')
+    }
+
+
+def buscar_feedbacks_contexto(supabase, usuario_id, limite=3):
+    """Busca os feedbacks recentes do usuário que têm algum texto, para dar contexto à IA."""
+    response_feedbacks = supabase.table('feedback')\
+        .select('pontos_positivos, pontos_melhorar')\
+        .eq('usuario_id', usuario_id)\
+        .order('created_at', desc=True)\
+        .limit(10).execute()
+    feedbacks_contexto = []
+    if response_feedbacks and response_feedbacks.data:
+        for fb_item in response_feedbacks.data:
+            if fb_item.get('pontos_positivos') or fb_item.get('pontos_melhorar'):
+                feedbacks_contexto.append(fb_item)
+                if len(feedbacks_contexto) >= limite:
+                    break
+    return feedbacks_contexto
+
+
+def montar_contexto_aprendizado(feedbacks_contexto):
+    """Transforma os feedbacks anteriores em um bloco de texto para o prompt."""
+    if not feedbacks_contexto:
+        return ""
+    linhas = ["Baseado em feedbacks anteriores dos usuários, considere:"]
+    for feedback_item in feedbacks_contexto:
+        if feedback_item.get('pontos_positivos'):
+            linhas.append(f"- Pontos positivos anteriores: {feedback_item['pontos_positivos']}")
+        if feedback_item.get('pontos_melhorar'):
+            linhas.append(f"- Pontos a melhorar: {feedback_item['pontos_melhorar']}")
+    return "\n".join(linhas)
+
+
+def calcular_resumo_estatistico(df):
+    """
+    Calcula o resumo estatístico das colunas analisadas (sobre uma amostra de até 100 linhas).
+
+    As colunas são escolhidas por selecionar_colunas (informatividade e orçamento de tokens);
+    o ranking completo fica em resumo_estatistico["selecao_colunas"].
+    """
+    colunas_relevantes, ranking_colunas = selecionar_colunas(df)
+    df_otimizado_para_stats = df[colunas_relevantes].copy()
+    max_linhas_stats = 100
+    if len(df_otimizado_para_stats) > max_linhas_stats:
+        df_otimizado_para_stats = df_otimizado_para_stats.sample(n=max_linhas_stats, random_state=42)
+
+    resumo_estatistico = {
+        "total_leads": len(df),
+        "colunas_analisadas": list(colunas_relevantes),
+        "amostra_analisada": len(df_otimizado_para_stats),
+        "selecao_colunas": ranking_colunas,
+        "estatisticas": {}
+    }
+    for coluna in colunas_relevantes:
+        if df_otimizado_para_stats[coluna].dtype in ['int64', 'float64']:
+            resumo_estatistico["estatisticas"][coluna] = {
+                "media": df_otimizado_para_stats[coluna].mean(),
+                "mediana": df_otimizado_para_stats[coluna].median(),
+                "min": df_otimizado_para_stats[coluna].min(),
+                "max": df_otimizado_para_stats[coluna].max()
+            }
+        else:
+            resumo_estatistico["estatisticas"][coluna] = {
+                "valores_mais_frequentes": df_otimizado_para_stats[coluna].value_counts().head().to_dict()
+            }
+    return resumo_estatistico
+
+
+def analisar_leads_csv_openai(client, df, plataforma, objetivo, resumo_estatistico, contexto_aprendizado="",
+                              modelo=MODELO_OPENAI, limitador=limitador_openai, usuario_id=None):
+    """
+    Monta o prompt compacto e chama a OpenAI.
+
+    Atualiza resumo_estatistico["amostra_prompt"] e ["plano_amostragem"] e retorna um dict
+    com o texto da análise e o uso de tokens da chamada.
+    """
+    prompt_info = construir_prompt_analise(df, plataforma, objetivo, resumo_estatistico, contexto_aprendizado)
+    resumo_estatistico["amostra_prompt"] = {
+        "linhas": prompt_info["linhas_amostra"],
+        "formato": prompt_info["formato"],
+        "tokens_estimados": prompt_info["tokens_estimados"],
+        "orcamento_tokens": prompt_info["orcamento_tokens"]
+    }
+    # Plano da amostra (estratos, semente e posições das linhas) para refazer a mesma análise
+    resumo_estatistico["plano_amostragem"] = prompt_info["plano_amostragem"]
+    response_openai, telemetria = chamar_chat(
+        client, "analise", plataforma=plataforma, usuario_id=usuario_id, leads=len(df), limitador=limitador,
+        model=modelo,
+        messages=prompt_info["mensagens"],
+        temperature=0.7, max_tokens=MAX_TOKENS_ANALISE)
+
+    return {
+        "analise": response_openai.choices[0].message.content.strip(),
+        "total_tokens": response_openai.usage.total_tokens,
+        "prompt_tokens": response_openai.usage.prompt_tokens,
+        "prompt_tokens_estimados": prompt_info["tokens_estimados"],
+        "cached_tokens": tokens_em_cache(response_openai.usage),
+        "latencia_api": telemetria["latencia_ms"] / 1000
+    }
+
+
+def registrar_consumo_tokens(supabase, usuario_id, tipo_operacao, uso):
+    """Registra o consumo de tokens de uma chamada na tabela metricas."""
+    payload = {
+        "tipo": tipo_operacao,
+        "total_tokens": uso.get("total_tokens", 0),
+        "prompt_tokens": uso.get("prompt_tokens", 0),
+        "prompt_tokens_estimados": uso.get("prompt_tokens_estimados", 0),
+        "cached_tokens": uso.get("cached_tokens", 0),
+        "latencia_api": uso.get("latencia_api", 0.0),
+        "plataforma": "copy" if tipo_operacao == "copy" else "analise",
+        "tempo_processamento": 0,
+        "usuario_id": usuario_id,
+        "data": datetime.now().isoformat()
+    }
+    response = supabase.table('metricas').insert(payload).execute()
+    cache_consultas.invalidar(usuario_id, CONSULTA_CONSUMO_TOKENS)
+    return bool(response.data)
+
+
+def registrar_metrica_analise(supabase, usuario_id, plataforma, tempo_processamento):
+    """Registra o tempo de processamento de uma análise na tabela metricas."""
+    payload = {
+        "data": datetime.now().isoformat(),
+        "usuario_id": usuario_id,
+        "tipo": "analise",
+        "plataforma": plataforma,
+        "total_tokens": 0,  # Tokens de análise são salvos por registrar_consumo_tokens
+        "tempo_processamento": tempo_processamento
+    }
+    response = supabase.table('metricas').insert(payload).execute()
+    cache_consultas.invalidar(usuario_id, CONSULTA_METRICAS)
+    return bool(response.data)
+
+
+def categoria_da_tag(tag_nome, categorias_tags=None):
+    """Categoria de uma tag predefinida, ou "Personalizada"."""
+    for cat, tags_list in (categorias_tags or {}).items():
+        if tag_nome in tags_list:
+            return cat
+    return "Personalizada"
+
+
+def _registro_analise(analise_data, usuario_id):
+    """Linha da tabela analises_leads a partir dos dados da análise."""
+    return {
+        "plataforma": analise_data.get("plataforma"),
+        "objetivo": analise_data.get("objetivo"),
+        "total_leads": analise_data.get("total_leads"),
+        "colunas": json.dumps(analise_data.get("colunas", [])),
+        "analise": analise_data.get("analise"),
+        "tempo_processamento": analise_data.get("tempo_processamento"),
+        "resumo_estatistico": json.dumps(analise_data.get("resumo_estatistico", {}), default=str),
+        "usuario_id": usuario_id,
+        "data": datetime.now().isoformat()
+    }
+
+
+def salvar_analise_leads(supabase, analise_data, usuario_id, categorias_tags=None):
+    """Salva a análise de leads (e suas tags) no Supabase e retorna o ID da análise salva."""
+    payload = _registro_analise(analise_data, usuario_id)
+    response = supabase.table('analises_leads').insert(payload).execute()
+    cache_consultas.invalidar(usuario_id, CONSULTA_HISTORICO_ANALISES)
+    cache_consultas.invalidar(usuario_id, CONSULTA_METRICAS)
+    cache_consultas.invalidar(usuario_id, CONSULTA_BUSCA)
+    if not (response.data and len(response.data) > 0):
+        raise RuntimeError("Erro ao salvar análise no Supabase: resposta vazia")
+
+    saved_analise_id = response.data[0]['id']
+    registrar_analises(usuario_id, [{**analise_data, **response.data[0]}])
+    if analise_data.get('tags'):
+        tags_para_salvar = [
+            {
+                "analise_id": saved_analise_id,
+                "categoria": categoria_da_tag(tag_nome, categorias_tags),
+                "tag": tag_nome,
+                "usuario_id": usuario_id
+            }
+            for tag_nome in analise_data['tags']
+        ]
+        supabase.table('tags').insert(tags_para_salvar).execute()
+    return saved_analise_id
+
+
+def salvar_analises_em_lote(supabase, analises, usuario_id):
+    """Salva várias análises (sem tags) com um único insert e retorna os IDs na mesma ordem."""
+    if not analises:
+        return []
+    response = supabase.table('analises_leads').insert(
+        [_registro_analise(analise_data, usuario_id) for analise_data in analises]
+    ).execute()
+    cache_consultas.invalidar(usuario_id, CONSULTA_HISTORICO_ANALISES)
+    cache_consultas.invalidar(usuario_id, CONSULTA_METRICAS)
+    cache_consultas.invalidar(usuario_id, CONSULTA_BUSCA)
+    if not response.data or len(response.data) != len(analises):
+        raise RuntimeError("Erro ao salvar análises no Supabase: resposta incompleta")
+    ids = [linha['id'] for linha in response.data]
+    registrar_analises(usuario_id, [{**analise_data, **linha} for analise_data, linha in zip(analises, response.data)])
+    return ids
+
+
+def executar_analise(client, df, plataforma, objetivo, contexto_aprendizado="", modelo=MODELO_OPENAI,
+                     limitador=limitador_openai, usuario_id=None):
+    """
+    Estatísticas + segmentação de todos os leads + chamada à OpenAI, sem tocar no Supabase.
+
+    Retorna (analise_data, uso): analise_data no formato de salvar_analise_leads e o uso
+    de tokens da chamada.
+    """
+    tempo_inicio = time.time()
+    resumo_estatistico = calcular_resumo_estatistico(df)
+    # Segmentos calculados localmente sobre a base inteira; o modelo recebe só a tabela resumida
+    _, segmentacao = segmentar_leads(df)
+    if segmentacao:
+        resumo_estatistico["segmentacao"] = segmentacao
+    uso = analisar_leads_csv_openai(
+        client, df, plataforma, objetivo, resumo_estatistico, contexto_aprendizado, modelo, limitador, usuario_id
+    )
+    analise_data = {
+        "plataforma": plataforma,
+        "objetivo": objetivo,
+        "total_leads": len(df),
+        "colunas": list(df.columns),
+        "analise": uso["analise"],
+        "tempo_processamento": time.time() - tempo_inicio,
+        "resumo_estatistico": resumo_estatistico,
+        "tags": []
+    }
+    return analise_data, uso
+
+
+def analisar_leads_csv(client, supabase, df, plataforma, objetivo, usuario_id, modelo=MODELO_OPENAI,
+                       snapshot=None):
+    """
+    Pipeline completo de análise: estatísticas, prompt, OpenAI, persistência e métricas.
+
+    snapshot: referência de um snapshot já salvo com estes leads (reanálise); sem ela o
+    DataFrame é gravado como um novo snapshot.
+
+    Retorna um dict serializável em JSON com o texto, o ID da análise salva e os tempos.
+    """
+    tempo_inicio = time.time()
+    feedbacks_contexto = []
+    try:
+        feedbacks_contexto = buscar_feedbacks_contexto(supabase, usuario_id)
+    except Exception as e_fb:
+        print(f"Não foi possível carregar feedbacks para contexto OpenAI: {e_fb}")
+
+    analise_data, uso = executar_analise(
+        client, df, plataforma, objetivo, montar_contexto_aprendizado(feedbacks_contexto), modelo,
+        usuario_id=usuario_id
+    )
+    tempo_processamento = time.time() - tempo_inicio
+    analise_data["tempo_processamento"] = tempo_processamento
+    # Snapshot da base analisada, para reanalisar com outro objetivo sem reenviar os arquivos
+    if snapshot is None:
+        try:
+            snapshot = salvar_snapshot(df, usuario_id, supabase)
+        except Exception as e:
+            print(f"Erro ao salvar o snapshot dos leads: {e}")
+    if snapshot is not None:
+        analise_data["resumo_estatistico"]["snapshot"] = snapshot
+    analise_id = salvar_analise_leads(supabase, analise_data, usuario_id)
+
+    # Métricas não devem derrubar uma análise já salva
+    try:
+        registrar_consumo_tokens(supabase, usuario_id, "analise", uso)
+        registrar_metrica_analise(supabase, usuario_id, plataforma, tempo_processamento)
+    except Exception as e:
+        print(f"Erro ao salvar métricas da análise: {e}")
+
+    return {
+        "analise": uso["analise"],
+        "analise_id": analise_id,
+        "tempo_processamento": tempo_processamento,
+        "total_leads": len(df),
+        "total_tokens": uso["total_tokens"]
+    }
+
+
+def reanalisar_snapshot(client, supabase, snapshot, plataforma, objetivo, usuario_id, modelo=MODELO_OPENAI):
+    """
+    Reanálise a partir do snapshot de uma análise anterior: sem leitura de CSV nem deduplicação.
+
+    A nova análise aponta para o mesmo snapshot (referência do resumo_estatistico da anterior),
+    sem recalcular o fingerprint nem reenviar o arquivo ao bucket.
+    """
+    df = carregar_snapshot(snapshot["fingerprint"], usuario_id, supabase)
+    return analisar_leads_csv(client, supabase, df, plataforma, objetivo, usuario_id, modelo, snapshot=snapshot)
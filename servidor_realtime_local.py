@@ -0,0 +1,140 @@
+"""
+Servidor websocket local que imita o Supabase Realtime (protocolo Phoenix, postgres_changes).
+
+Permite testar realtime.py sem o Supabase: aceita phx_join e heartbeats e envia aos clientes
+inscritos as alterações lidas da entrada padrão, uma por linha em JSON:
+
+    {"table": "analises_leads", "type": "INSERT", "record": {...}, "old_record": {}}
+
+Uso:
+    python servidor_realtime_local.py --porta 4000
+    SUPABASE_REALTIME=1 SUPABASE_REALTIME_URL=ws://localhost:4000/socket streamlit run app.py
+
+Com --demo, publica periodicamente uma análise, uma tag e um feedback para --usuario-id.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from datetime import datetime, timezone
+
+import websockets
+
+
+class ServidorRealtimeLocal:
+    """Mantém os clientes conectados e as tabelas assinadas por cada um."""
+
+    def __init__(self):
+        self.clientes = {}  # websocket -> (tópico, tabelas assinadas)
+
+    async def atender(self, websocket):
+        try:
+            async for bruto in websocket:
+                mensagem = json.loads(bruto)
+                evento, topico, ref = mensagem.get("event"), mensagem.get("topic"), mensagem.get("ref")
+                if evento == "phx_join":
+                    alteracoes = mensagem["payload"].get("config", {}).get("postgres_changes", [])
+                    self.clientes[websocket] = (topico, {a.get("table") for a in alteracoes})
+                    resposta = {"status": "ok", "response": {
+                        "postgres_changes": [dict(a, id=i + 1) for i, a in enumerate(alteracoes)]
+                    }}
+                elif evento == "phx_leave":
+                    self.clientes.pop(websocket, None)
+                    resposta = {"status": "ok", "response": {}}
+                else:  # heartbeat e demais eventos
+                    resposta = {"status": "ok", "response": {}}
+                await websocket.send(json.dumps({
+                    "topic": topico, "event": "phx_reply", "payload": resposta,
+                    "ref": ref, "join_ref": mensagem.get("join_ref")
+                }))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.clientes.pop(websocket, None)
+
+    async def publicar(self, tabela, tipo, registro=None, registro_antigo=None):
+        """Envia um evento postgres_changes aos clientes que assinaram a tabela."""
+        enviados = 0
+        for websocket, (topico, tabelas) in list(self.clientes.items()):
+            if tabela not in tabelas and "*" not in tabelas:
+                continue
+            await websocket.send(json.dumps({
+                "topic": topico, "event": "postgres_changes", "ref": None,
+                "payload": {"ids": [1], "data": {
+                    "schema": "public", "table": tabela, "type": tipo,
+                    "commit_timestamp": datetime.now(timezone.utc).isoformat(),
+                    "record": registro or {}, "old_record": registro_antigo or {}, "errors": None
+                }}
+            }))
+            enviados += 1
+        return enviados
+
+
+async def _ler_entrada(servidor):
+    loop = asyncio.get_running_loop()
+    while True:
+        linha = await loop.run_in_executor(None, sys.stdin.readline)
+        if not linha:
+            return
+        if not linha.strip():
+            continue
+        try:
+            alteracao = json.loads(linha)
+            enviados = await servidor.publicar(
+                alteracao["table"], alteracao.get("type", "INSERT"),
+                alteracao.get("record"), alteracao.get("old_record")
+            )
+            print(f"{alteracao['table']} {alteracao.get('type', 'INSERT')} -> {enviados} cliente(s)")
+        except (ValueError, KeyError) as e:
+            print(f"Linha inválida ({e}): {linha.strip()}")
+
+
+async def _demo(servidor, usuario_id, intervalo):
+    while True:
+        await asyncio.sleep(intervalo)
+        agora = datetime.now(timezone.utc).isoformat()
+        analise_id = str(uuid.uuid4())
+        await servidor.publicar("analises_leads", "INSERT", {
+            "id": analise_id, "data": agora, "plataforma": "Disparo de WhatsApp", "objetivo": "Demonstração",
+            "total_leads": 42, "colunas": ["nome", "cidade"], "analise": f"Análise simulada em {agora}",
+            "tempo_processamento": 1.5, "resumo_estatistico": {}, "usuario_id": usuario_id
+        })
+        await servidor.publicar("tags", "INSERT", {
+            "id": str(uuid.uuid4()), "analise_id": analise_id, "categoria": "Objetivo", "tag": "Vendas",
+            "usuario_id": usuario_id
+        })
+        await servidor.publicar("feedback", "INSERT", {
+            "id": str(uuid.uuid4()), "analise_id": analise_id, "nota": 5, "pontos_positivos": "Simulado",
+            "pontos_melhorar": "", "editado": False, "historico_edicoes": [], "usuario_id": usuario_id
+        })
+        print(f"Demo: análise {analise_id} publicada para {usuario_id}")
+
+
+async def _principal(args):
+    servidor = ServidorRealtimeLocal()
+    async with websockets.serve(servidor.atender, args.host, args.porta):
+        print(f"Realtime local em ws://{args.host}:{args.porta}/socket")
+        tarefas = [_ler_entrada(servidor)]
+        if args.demo:
+            tarefas.append(_demo(servidor, args.usuario_id, args.intervalo))
+        await asyncio.gather(*tarefas)
+        await asyncio.Future()  # continua atendendo depois do fim da entrada padrão
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--porta", type=int, default=4000)
+    parser.add_argument("--demo", action="store_true", help="publica alterações simuladas periodicamente")
+    parser.add_argument("--usuario-id", default="usuario-teste")
+    parser.add_argument("--intervalo", type=float, default=10.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_principal(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Índice local de similaridade entre análises de leads (TF-IDF, sem serviço de embeddings).
+
+Cada análise vira um vetor de termos do texto da análise, do objetivo (com peso maior) e da
+plataforma. Os vetores guardam o tf sublinear normalizado; o idf é aplicado só na consulta,
+a partir das frequências atuais, então incluir uma análise não exige recalcular as outras.
+A consulta percorre o índice invertido apenas dos termos da análise de referência.
+
+O índice é por usuário e persistido em DIRETORIO_SIMILARIDADE como um log JSONL (uma linha
+por análise incluída ou removida). Outros processos (API, CLI) acrescentam linhas ao mesmo
+arquivo; antes de cada consulta o índice lê só o que foi acrescentado desde a última leitura.
+A compactação grava um arquivo novo, com uma linha de cabeçalho {"geracao": ...} única, e o
+troca de lugar: os outros processos a percebem pela geração diferente e releem do início.
+Acréscimos e compactação passam por um flock no arquivo ".lock" ao lado do log (compartilhado
+para acrescentar, exclusivo para compactar), então nenhuma linha acrescentada durante a
+compactação se perde.
+"""
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, a compactação fica restrita a um processo por vez
+    fcntl = None
+
+DIRETORIO_SIMILARIDADE = os.getenv("DIRETORIO_SIMILARIDADE", os.path.join(".mencare", "similaridade"))
+PESO_OBJETIVO = 3
+PESO_PLATAFORMA = 2
+MAX_TERMOS_POR_ANALISE = 300
+
+STOPWORDS = frozenset("""
+a ao aos as com como da das de dela dele deles do dos e ela elas ele eles em entre era essa esse esta este
+foi for ha isso isto ja la mais mas mesmo muito na nas nao no nos o os ou para pela pelas pelo pelos por
+pode que se sem ser seu seus sua suas sao tambem tem ter um uma umas uns voce voces ate cada todos todas
+""".split())
+
+
+def _tokens(texto):
+    sem_acentos = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    return [t for t in re.findall(r"[a-z0-9]{3,}", sem_acentos.lower()) if t not in STOPWORDS]
+
+
+def vetor_analise(analise, objetivo="", plataforma=""):
+    """Vetor esparso {termo: peso} com tf sublinear e norma 1 (idf entra só na consulta)."""
+    contagem = Counter(_tokens(analise))
+    for termo in _tokens(objetivo):
+        contagem[termo] += PESO_OBJETIVO
+    if plataforma:
+        contagem["plataforma:" + "_".join(_tokens(plataforma))] += PESO_PLATAFORMA
+    termos = contagem.most_common(MAX_TERMOS_POR_ANALISE)
+    pesos = {termo: 1 + math.log(n) for termo, n in termos}
+    norma = math.sqrt(sum(p * p for p in pesos.values())) or 1.0
+    return {termo: round(p / norma, 5) for termo, p in pesos.items()}
+
+
+TAMANHO_MAX_CABECALHO = 64
+
+
+def _geracao_do_cabecalho(primeira_linha):
+    """Geração do log ({"geracao": ...} na primeira linha), ou None se nunca foi compactado."""
+    if not primeira_linha.startswith(b'{"geracao"') or not primeira_linha.endswith(b"\n"):
+        return None
+    try:
+        return json.loads(primeira_linha)["geracao"]
+    except (ValueError, KeyError):
+        return None
+
+
+class IndiceAnalises:
+    """Índice invertido das análises de um usuário, com log JSONL em disco."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._limpar()
+
+    def _limpar(self):
+        self._vetores = {}
+        self._metadados = {}
+        self._postings = defaultdict(dict)
+        self._normas = {}
+        self._normas_para = 0  # tamanho do índice quando as normas foram calculadas
+        self._lido = 0
+        self._linhas = 0
+        self._geracao = None  # cabeçalho do log lido; muda quando algum processo compacta
+
+    def __len__(self):
+        self._sincronizar()
+        return len(self._vetores)
+
+    def __contains__(self, analise_id):
+        self._sincronizar()
+        return analise_id in self._vetores
+
+    # --- Log em disco ---
+
+    def _aplicar(self, registro):
+        analise_id = registro["id"]
+        for termo in self._vetores.pop(analise_id, {}):
+            self._postings[termo].pop(analise_id, None)
+            if not self._postings[termo]:
+                del self._postings[termo]
+        self._metadados.pop(analise_id, None)
+        self._normas.pop(analise_id, None)
+        self._linhas += 1
+        if registro.get("removido"):
+            return
+        self._vetores[analise_id] = registro["vetor"]
+        self._metadados[analise_id] = {"plataforma": registro.get("plataforma"), "objetivo": registro.get("objetivo"),
+                                       "data": registro.get("data")}
+        for termo, peso in registro["vetor"].items():
+            self._postings[termo][analise_id] = peso
+
+    @contextmanager
+    def _trava(self, exclusiva=False):
+        """flock no arquivo .lock do log: compartilhado para acrescentar, exclusivo para compactar."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        with open(self.caminho + ".lock", "a") as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def _sincronizar(self):
+        """Aplica as linhas acrescentadas ao log desde a última leitura (por este ou outro processo)."""
+        with self._lock:
+            try:
+                f = open(self.caminho, "rb")
+            except OSError:
+                return
+            with f:
+                tamanho = os.fstat(f.fileno()).st_size
+                geracao = _geracao_do_cabecalho(f.readline(TAMANHO_MAX_CABECALHO))
+                if geracao != self._geracao or tamanho < self._lido:
+                    # Log compactado por outro processo (o inode pode ser reaproveitado): reler do início
+                    self._limpar()
+                    self._geracao = geracao
+                if tamanho == self._lido:
+                    return
+                f.seek(self._lido)
+                novos = f.read()
+            completo = novos.rfind(b"\n") + 1  # ignora uma linha ainda sendo escrita
+            for linha in novos[:completo].splitlines():
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    print(f"Linha inválida ignorada no índice de similaridade {self.caminho}")
+                    continue
+                if "geracao" not in registro:
+                    self._aplicar(registro)
+            self._lido += completo
+
+    def _acrescentar(self, registros):
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        dados = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registros)
+        # Uma única escrita em modo append: linhas de processos diferentes não se misturam
+        with self._trava():
+            with open(self.caminho, "a", encoding="utf-8") as f:
+                f.write(dados)
+        self._sincronizar()
+        if self._linhas > 2 * len(self._vetores) + 100:
+            self.compactar()
+
+    # --- Atualização ---
+
+    def adicionar(self, analise_id, analise, objetivo="", plataforma="", data=None):
+        self.adicionar_varias([{"id": analise_id, "analise": analise, "objetivo": objetivo,
+                                "plataforma": plataforma, "data": data}])
+
+    def adicionar_varias(self, analises):
+        """Inclui (ou substitui) análises: dicts com id, analise, objetivo, plataforma e data."""
+        registros = [{
+            "id": str(a["id"]), "vetor": vetor_analise(a.get("analise"), a.get("objetivo"), a.get("plataforma")),
+            "plataforma": a.get("plataforma"), "objetivo": a.get("objetivo"),
+            "data": str(a["data"]) if a.get("data") else None,
+        } for a in analises]
+        if registros:
+            self._acrescentar(registros)
+
+    def remover(self, analise_id):
+        self._acrescentar([{"id": str(analise_id), "removido": True}])
+
+    def completar(self, analises):
+        """Inclui as análises que ainda não estão no índice (ex: histórico já carregado)."""
+        self._sincronizar()
+        faltantes = [a for a in analises if str(a["id"]) not in self._vetores]
+        self.adicionar_varias(faltantes)
+        return len(faltantes)
+
+    def compactar(self):
+        """Reescreve o log só com as análises atuais (sem versões antigas nem remoções)."""
+        # Com a trava exclusiva nenhum processo acrescenta linhas entre a leitura e a troca
+        with self._trava(exclusiva=True):
+            self._sincronizar()
+            with self._lock:
+                temporario = f"{self.caminho}.{os.getpid()}.tmp"
+                geracao = os.urandom(8).hex()
+                with open(temporario, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"geracao": geracao}) + "\n")
+                    for analise_id, vetor in self._vetores.items():
+                        f.write(json.dumps(dict(self._metadados[analise_id], id=analise_id, vetor=vetor),
+                                           ensure_ascii=False) + "\n")
+                os.replace(temporario, self.caminho)
+                self._geracao = geracao
+                self._lido = os.path.getsize(self.caminho)
+                self._linhas = len(self._vetores)
+
+    # --- Consulta ---
+
+    def _idf(self, termo):
+        return math.log((1 + len(self._vetores)) / (1 + len(self._postings.get(termo, ())))) + 1
+
+    def _norma(self, analise_id):
+        """Norma do vetor com idf; recalculada quando o índice cresce ou encolhe mais de 10%."""
+        if abs(len(self._vetores) - self._normas_para) > self._normas_para // 10:
+            self._normas = {}
+            self._normas_para = len(self._vetores)
+        if analise_id not in self._normas:
+            self._normas[analise_id] = math.sqrt(sum(
+                (peso * self._idf(termo)) ** 2 for termo, peso in self._vetores[analise_id].items())) or 1.0
+        return self._normas[analise_id]
+
+    def similares(self, analise_id, k=5, excluir=()):
+        """[(id, similaridade, metadados)] das k análises mais parecidas com a indicada."""
+        self._sincronizar()
+        vetor = self._vetores.get(str(analise_id))
+        if vetor is None:
+            return []
+        return self._consultar(vetor, k, {str(analise_id), *map(str, excluir)})
+
+    def similares_texto(self, analise, objetivo="", plataforma="", k=5):
+        """Mesma consulta para uma análise que não está no índice."""
+        self._sincronizar()
+        return self._consultar(vetor_analise(analise, objetivo, plataforma), k, set())
+
+    def _consultar(self, vetor, k, excluir):
+        """Similaridade de cosseno TF-IDF, percorrendo só as listas dos termos da consulta."""
+        with self._lock:
+            pontuacao = defaultdict(float)
+            norma_consulta = 0.0
+            for termo, peso in vetor.items():
+                idf = self._idf(termo)
+                norma_consulta += (peso * idf) ** 2
+                for outro_id, peso_outro in self._postings.get(termo, {}).items():
+                    pontuacao[outro_id] += peso * peso_outro * idf * idf
+            for analise_id in excluir:
+                pontuacao.pop(analise_id, None)
+            norma_consulta = math.sqrt(norma_consulta) or 1.0
+            similaridades = ((analise_id, valor / (norma_consulta * self._norma(analise_id)))
+                             for analise_id, valor in pontuacao.items())
+            melhores = heapq.nlargest(k, similaridades, key=lambda item: item[1])
+            return [(analise_id, round(min(1.0, valor), 4), dict(self._metadados[analise_id]))
+                    for analise_id, valor in melhores]
+
+
+_indices = {}
+_lock_indices = threading.Lock()
+
+
+def indice_similaridade(usuario_id, diretorio=DIRETORIO_SIMILARIDADE):
+    """Índice do usuário (um por processo), carregado do disco no primeiro uso."""
+    # Nome do arquivo derivado do ID: não expõe o ID nem depende dos caracteres dele
+    nome = hashlib.sha256(str(usuario_id).encode("utf-8")).hexdigest()[:32] + ".jsonl"
+    caminho = os.path.join(diretorio, nome)
+    with _lock_indices:
+        if caminho not in _indices:
+            _indices[caminho] = IndiceAnalises(caminho)
+        return _indices[caminho]
+
+
+def registrar_analises(usuario_id, analises):
+    """Inclui análises recém-salvas no índice do usuário; falhas não interrompem o salvamento."""
+    if not usuario_id:
+        return
+    try:
+        indice_similaridade(usuario_id).adicionar_varias(analises)
+    except (OSError, ValueError) as e:
+        print(f"Erro ao atualizar o índice de similaridade: {e}")
@@ -0,0 +1,140 @@
+"""
+Snapshots colunares (Parquet) dos leads de cada análise, para reanalisar sem reenviar arquivos.
+
+Depois de uma análise só ficavam o texto, as colunas e o resumo_estatistico: mudar o objetivo
+ou a plataforma exigia achar os CSVs originais, enviá-los de novo e refazer leitura e
+deduplicação. Agora o DataFrame analisado (já lido e sem repetições) é gravado em Parquet com
+compressão zstd, com o nome pelo fingerprint do conteúdo, então a mesma base analisada várias
+vezes ocupa um único arquivo. A referência vai em resumo_estatistico["snapshot"], ligando a
+linha de analises_leads ao snapshot sem mudar o schema.
+
+Os arquivos ficam em DIRETORIO_SNAPSHOTS/<hash do usuário>/<fingerprint>.parquet. Com SNAPSHOTS_BUCKET,
+também são enviados ao Supabase Storage e um snapshot ausente no disco é baixado de lá antes de
+ser lido. A leitura usa memory-map, sem passar pelo parser de CSV nem pela deduplicação.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+from jobs import fingerprint_dataframe
+
+DIRETORIO_SNAPSHOTS = os.getenv("DIRETORIO_SNAPSHOTS", os.path.join(".mencare", "snapshots"))
+# Bucket do Supabase Storage para os snapshots (vazio = só disco local)
+SNAPSHOTS_BUCKET = os.getenv("SNAPSHOTS_BUCKET", "")
+COMPRESSAO_SNAPSHOT = "zstd"
+USUARIO_SEM_LOGIN = "sem_usuario"
+
+_PADRAO_FINGERPRINT = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _pasta_usuario(usuario_id):
+    # Nome da pasta derivado do ID: não expõe o ID nem depende dos caracteres dele ("../", "/")
+    return hashlib.sha256(str(usuario_id or USUARIO_SEM_LOGIN).encode("utf-8")).hexdigest()[:32]
+
+
+def _nome_arquivo(fingerprint):
+    # O fingerprint chega do resumo_estatistico salvo no banco: só aceita o sha256 que salvar_snapshot gera
+    if not isinstance(fingerprint, str) or not _PADRAO_FINGERPRINT.match(fingerprint):
+        raise ValueError("Fingerprint de snapshot inválido")
+    return f"{fingerprint}.parquet"
+
+
+def caminho_snapshot(usuario_id, fingerprint, diretorio=DIRETORIO_SNAPSHOTS):
+    """Caminho local do snapshot; o mesmo caminho relativo é usado no bucket."""
+    return os.path.join(diretorio, _pasta_usuario(usuario_id), _nome_arquivo(fingerprint))
+
+
+def _chave_bucket(usuario_id, fingerprint):
+    # Pasta por usuário: as políticas do Storage podem restringir cada um à sua pasta
+    return f"{_pasta_usuario(usuario_id)}/{_nome_arquivo(fingerprint)}"
+
+
+def _tabela_arrow(df):
+    """Tabela Arrow do DataFrame; colunas de texto misturado com números (ex: telefone) viram texto."""
+    import pandas as pd
+    import pyarrow as pa
+
+    mistas = [coluna for coluna in df.columns
+              if df[coluna].dtype == object and pd.api.types.infer_dtype(df[coluna], skipna=True).startswith("mixed")]
+    if mistas:
+        df = df.assign(**{coluna: df[coluna].astype("string") for coluna in mistas})
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _bucket(supabase):
+    """Bucket do Supabase Storage, ou None (sem SNAPSHOTS_BUCKET ou no armazenamento local)."""
+    if not SNAPSHOTS_BUCKET or supabase is None or not hasattr(supabase, "storage"):
+        return None
+    return supabase.storage.from_(SNAPSHOTS_BUCKET)
+
+
+def salvar_snapshot(df, usuario_id, supabase=None, diretorio=DIRETORIO_SNAPSHOTS):
+    """
+    Grava o snapshot do DataFrame, se ainda não existe um com o mesmo conteúdo.
+
+    Retorna a referência guardada no resumo_estatistico: fingerprint, linhas, colunas,
+    tamanho em MB e onde o snapshot está ("local" ou "local+bucket").
+    """
+    import pyarrow.parquet as pq
+
+    inicio = time.perf_counter()
+    fingerprint = fingerprint_dataframe(df)
+    caminho = caminho_snapshot(usuario_id, fingerprint, diretorio)
+    if not os.path.exists(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # Escreve num temporário e renomeia: um snapshot pela metade nunca é lido
+        temporario = f"{caminho}.{os.getpid()}.parcial"
+        pq.write_table(_tabela_arrow(df), temporario, compression=COMPRESSAO_SNAPSHOT)
+        os.replace(temporario, caminho)
+    armazenamento = "local"
+    bucket = _bucket(supabase)
+    if bucket is not None:
+        try:
+            with open(caminho, "rb") as arquivo:
+                bucket.upload(_chave_bucket(usuario_id, fingerprint), arquivo.read(),
+                              {"content-type": "application/octet-stream", "upsert": "true"})
+            armazenamento = "local+bucket"
+        except Exception as e:
+            print(f"Erro ao enviar snapshot ao Supabase Storage: {e}")
+    return {
+        "fingerprint": fingerprint,
+        "linhas": len(df),
+        "colunas": len(df.columns),
+        "tamanho_mb": round(os.path.getsize(caminho) / 1024 / 1024, 2),
+        "armazenamento": armazenamento,
+        "duracao_s": round(time.perf_counter() - inicio, 3),
+    }
+
+
+def snapshot_disponivel(snapshot, usuario_id, diretorio=DIRETORIO_SNAPSHOTS):
+    """Se o snapshot pode ser carregado: está no disco ou foi enviado a um bucket."""
+    if not snapshot or not _PADRAO_FINGERPRINT.match(str(snapshot.get("fingerprint", ""))):
+        return False
+    return os.path.exists(caminho_snapshot(usuario_id, snapshot["fingerprint"], diretorio)) or \
+        snapshot.get("armazenamento") == "local+bucket"
+
+
+def carregar_snapshot(fingerprint, usuario_id, supabase=None, diretorio=DIRETORIO_SNAPSHOTS):
+    """DataFrame do snapshot, lido com memory-map (baixado do bucket antes, se só existir lá)."""
+    import pyarrow.parquet as pq
+
+    caminho = caminho_snapshot(usuario_id, fingerprint, diretorio)
+    if not os.path.exists(caminho):
+        bucket = _bucket(supabase)
+        if bucket is None:
+            raise FileNotFoundError(f"Snapshot {fingerprint[:12]} não encontrado em {diretorio}")
+        conteudo = bucket.download(_chave_bucket(usuario_id, fingerprint))
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.parcial"
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, caminho)
+    return pq.read_table(caminho, memory_map=True).to_pandas()
+
+
+def fingerprint_reanalise(fingerprint, plataforma, objetivo):
+    """Fingerprint do job de reanálise: o mesmo snapshot com os mesmos parâmetros não roda duas vezes."""
+    conteudo = json.dumps(["snapshot", fingerprint, plataforma, objetivo], ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
@@ -1,5 +1,5 @@
-from supabase import create_client
 import os
+import threading
 from dotenv import load_dotenv
 
 
@@ -10,17 +10,53 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Cliente criado no primeiro uso: importar o pacote supabase é caro e a tela de login não precisa dele.
+# O backend (Supabase ou SQLite local) é escolhido por MENCARE_ARMAZENAMENTO, ver armazenamento.py
+_supabase = None
+_lock_supabase = threading.Lock()
 
 def get_supabase_client():
-
-    return supabase
+    global _supabase
+    with _lock_supabase:
+        if _supabase is None:
+            from armazenamento import criar_cliente
+            from instrumentacao import INSTRUMENTACAO_HABILITADA, ClienteInstrumentado
+            _supabase = criar_cliente()
+            if INSTRUMENTACAO_HABILITADA:
+                _supabase = ClienteInstrumentado(_supabase)
+    return _supabase
+
+_supabase_servico = None
+
+def get_supabase_servico():
+    """
+    Cliente com SUPABASE_SERVICE_ROLE_KEY, para gravações do servidor que não pertencem à sessão
+    de um usuário (ex: telemetria das chamadas à IA de todos os usuários). None sem a chave ou
+    no armazenamento local, que não tem RLS.
+    """
+    global _supabase_servico
+    from armazenamento import ARMAZENAMENTO
+
+    chave = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not chave or ARMAZENAMENTO != "supabase":
+        return None
+    with _lock_supabase:
+        if _supabase_servico is None:
+            from supabase import create_client
+            _supabase_servico = create_client(SUPABASE_URL, chave)
+    return _supabase_servico
+
+def definir_supabase_client(cliente):
+    """Substitui o cliente do processo (ex: Supabase em memória nos benchmarks)."""
+    global _supabase
+    with _lock_supabase:
+        _supabase = cliente
 
 # Funções auxiliares para interagir com o Supabase
 
 def salvar_copy(data):
     try:
-        response = supabase.table('copies').insert(data).execute()
+        response = get_supabase_client().table('copies').insert(data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Erro ao salvar copy: {e}")
@@ -28,7 +64,7 @@ def salvar_copy(data):
 
 def salvar_analise(data):
     try:
-        response = supabase.table('analises_leads').insert(data).execute()
+        response = get_supabase_client().table('analises_leads').insert(data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Erro ao salvar análise: {e}")
@@ -36,7 +72,7 @@ def salvar_analise(data):
 
 def salvar_feedback(data):
     try:
-        response = supabase.table('feedback').insert(data).execute()
+        response = get_supabase_client().table('feedback').insert(data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Erro ao salvar feedback: {e}")
@@ -44,7 +80,7 @@ def salvar_feedback(data):
 
 def salvar_metricas(data):
     try:
-        response = supabase.table('metricas').insert(data).execute()
+        response = get_supabase_client().table('metricas').insert(data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Erro ao salvar métricas: {e}")
@@ -52,7 +88,7 @@ def salvar_metricas(data):
 
 def salvar_metricas_plataforma(data):
     try:
-        response = supabase.table('metricas_plataforma').insert(data).execute()
+        response = get_supabase_client().table('metricas_plataforma').insert(data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Erro ao salvar métricas de plataforma: {e}")
@@ -60,23 +96,26 @@ def salvar_metricas_plataforma(data):
 
 def salvar_tags(data):
     try:
-        response = supabase.table('tags').insert(data).execute()
+        response = get_supabase_client().table('tags').insert(data).execute()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"Erro ao salvar tags: {e}")
         return None
 
-def buscar_copies(usuario_id):
+def buscar_copies(usuario_id, limite=50, cursor=None):
+    """Uma página de copies (mais recentes primeiro); o cursor da próxima vem de servicos.pagina_copies."""
+    from servicos import pagina_copies
     try:
-        response = supabase.table('copies').select('*').eq('usuario_id', usuario_id).execute()
-        return response.data
+        linhas, _ = pagina_copies(get_supabase_client(), usuario_id, limite, cursor)
+        return linhas
     except Exception as e:
         print(f"Erro ao buscar copies: {e}")
         return []
 
 def buscar_analises(usuario_id):
     try:
-        response = supabase.table('analises_leads').select('*').eq('usuario_id', usuario_id).execute()
+        from servicos import COLUNAS_ANALISES_LEADS
+        response = get_supabase_client().table('analises_leads').select(COLUNAS_ANALISES_LEADS).eq('usuario_id', usuario_id).execute()
         return response.data
     except Exception as e:
         print(f"Erro ao buscar análises: {e}")
@@ -84,7 +123,7 @@ def buscar_analises(usuario_id):
 
 def buscar_feedback(analise_id):
     try:
-        response = supabase.table('feedback').select('*').eq('analise_id', analise_id).execute()
+        response = get_supabase_client().table('feedback').select('*').eq('analise_id', analise_id).execute()
         return response.data
     except Exception as e:
         print(f"Erro ao buscar feedback: {e}")
@@ -92,7 +131,7 @@ def buscar_feedback(analise_id):
 
 def buscar_metricas(usuario_id):
     try:
-        response = supabase.table('metricas').select('*').eq('usuario_id', usuario_id).execute()
+        response = get_supabase_client().table('metricas').select('*').eq('usuario_id', usuario_id).execute()
         return response.data
     except Exception as e:
         print(f"Erro ao buscar métricas: {e}")
@@ -100,7 +139,7 @@ def buscar_metricas(usuario_id):
 
 def buscar_metricas_plataforma(usuario_id):
     try:
-        response = supabase.table('metricas_plataforma').select('*').eq('usuario_id', usuario_id).execute()
+        response = get_supabase_client().table('metricas_plataforma').select('*').eq('usuario_id', usuario_id).execute()
         return response.data
     except Exception as e:
         print(f"Erro ao buscar métricas de plataforma: {e}")
@@ -108,7 +147,7 @@ def buscar_metricas_plataforma(usuario_id):
 
 def buscar_tags(analise_id):
     try:
-        response = supabase.table('tags').select('*').eq('analise_id', analise_id).execute()
+        response = get_supabase_client().table('tags').select('*').eq('analise_id', analise_id).execute()
         return response.data
     except Exception as e:
         print(f"Erro ao buscar tags: {e}")
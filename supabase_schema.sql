@@ -56,6 +56,10 @@ CREATE TABLE metricas (
     data TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     tipo TEXT NOT NULL,
     total_tokens INTEGER DEFAULT 0,
+    prompt_tokens INTEGER DEFAULT 0,
+    prompt_tokens_estimados INTEGER DEFAULT 0,
+    cached_tokens INTEGER DEFAULT 0,
+    latencia_api FLOAT DEFAULT 0,
     plataforma TEXT NOT NULL,
     tempo_processamento FLOAT DEFAULT 0,
     usuario_id TEXT,
@@ -63,6 +67,12 @@ CREATE TABLE metricas (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Migração de bancos criados antes das colunas de tokens, cache e latência (servicos.registrar_consumo_tokens)
+ALTER TABLE metricas ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER DEFAULT 0;
+ALTER TABLE metricas ADD COLUMN IF NOT EXISTS prompt_tokens_estimados INTEGER DEFAULT 0;
+ALTER TABLE metricas ADD COLUMN IF NOT EXISTS cached_tokens INTEGER DEFAULT 0;
+ALTER TABLE metricas ADD COLUMN IF NOT EXISTS latencia_api FLOAT DEFAULT 0;
+
 -- Tabela de Métricas por Plataforma
 CREATE TABLE metricas_plataforma (
     id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
@@ -161,8 +171,157 @@ CREATE POLICY "Usuários podem atualizar suas próprias análises"
 
 -- Índices para melhorar performance
 CREATE INDEX idx_copies_usuario_id ON copies(usuario_id);
+-- Histórico paginado por chave (servicos.pagina_copies): usuário + mais recentes primeiro
+CREATE INDEX idx_copies_usuario_data_geracao ON copies(usuario_id, data_geracao DESC, id DESC);
 CREATE INDEX idx_analises_leads_usuario_id ON analises_leads(usuario_id);
 CREATE INDEX idx_feedback_usuario_id ON feedback(usuario_id);
 CREATE INDEX idx_metricas_usuario_id ON metricas(usuario_id);
 CREATE INDEX idx_metricas_plataforma_usuario_id ON metricas_plataforma(usuario_id);
-CREATE INDEX idx_tags_usuario_id ON tags(usuario_id); 
\ No newline at end of file
+CREATE INDEX idx_tags_usuario_id ON tags(usuario_id); 
+-- Realtime (opcional, SUPABASE_REALTIME=1): publicar as alterações das tabelas cacheadas pelo app.
+-- REPLICA IDENTITY FULL faz os eventos de DELETE trazerem a linha antiga (dono e análise),
+-- permitindo atualizar o cache só do usuário afetado.
+ALTER PUBLICATION supabase_realtime ADD TABLE analises_leads, tags, feedback, metricas;
+ALTER TABLE analises_leads REPLICA IDENTITY FULL;
+ALTER TABLE tags REPLICA IDENTITY FULL;
+ALTER TABLE feedback REPLICA IDENTITY FULL;
+
+-- Telemetria das chamadas à OpenAI (telemetria_llm.py): uma linha por chamada, só INSERT.
+-- Sem UUID nem updated_at para manter a linha pequena; o índice BRIN em criado_em é barato
+-- em tabelas append-only.
+CREATE TABLE chamadas_llm (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    criado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    usuario_id TEXT,
+    operacao TEXT NOT NULL,
+    modelo TEXT,
+    plataforma TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    ttft_ms INTEGER,
+    latencia_ms INTEGER NOT NULL,
+    tentativas SMALLINT NOT NULL DEFAULT 1,
+    resultado TEXT NOT NULL,
+    leads INTEGER NOT NULL DEFAULT 0,
+    custo_usd REAL NOT NULL DEFAULT 0
+);
+
+ALTER TABLE chamadas_llm ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Usuários podem ver suas próprias chamadas"
+    ON chamadas_llm FOR SELECT
+    USING (usuario_id = auth.uid()::text);
+
+CREATE POLICY "Usuários podem inserir suas próprias chamadas"
+    ON chamadas_llm FOR INSERT
+    WITH CHECK (usuario_id = auth.uid()::text);
+
+CREATE INDEX idx_chamadas_llm_usuario_criado_em ON chamadas_llm(usuario_id, criado_em);
+CREATE INDEX idx_chamadas_llm_criado_em ON chamadas_llm USING BRIN (criado_em);
+
+-- Percentis de latência por dia, operação e plataforma, mais uma linha por operação e
+-- plataforma com o período inteiro (dia nulo). Chamada pelo dashboard via rpc().
+CREATE OR REPLACE FUNCTION percentis_chamadas_llm(p_usuario_id TEXT, p_desde TIMESTAMP WITH TIME ZONE)
+RETURNS TABLE (
+    dia DATE,
+    operacao TEXT,
+    plataforma TEXT,
+    chamadas BIGINT,
+    erros BIGINT,
+    retentativas BIGINT,
+    p50_ms DOUBLE PRECISION,
+    p95_ms DOUBLE PRECISION,
+    p99_ms DOUBLE PRECISION,
+    ttft_p50_ms DOUBLE PRECISION,
+    ttft_p95_ms DOUBLE PRECISION,
+    prompt_tokens BIGINT,
+    completion_tokens BIGINT,
+    cached_tokens BIGINT,
+    custo_usd DOUBLE PRECISION,
+    leads BIGINT
+)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        (c.criado_em AT TIME ZONE 'UTC')::date,
+        c.operacao,
+        c.plataforma,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE c.resultado NOT IN ('ok', 'truncado')),
+        SUM(c.tentativas - 1),
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY c.latencia_ms),
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY c.latencia_ms),
+        percentile_cont(0.99) WITHIN GROUP (ORDER BY c.latencia_ms),
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY c.ttft_ms),
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY c.ttft_ms),
+        SUM(c.prompt_tokens),
+        SUM(c.completion_tokens),
+        SUM(c.cached_tokens),
+        SUM(c.custo_usd)::DOUBLE PRECISION,
+        SUM(c.leads)
+    FROM chamadas_llm c
+    WHERE c.usuario_id = p_usuario_id AND c.criado_em >= p_desde
+    GROUP BY GROUPING SETS (
+        ((c.criado_em AT TIME ZONE 'UTC')::date, c.operacao, c.plataforma),
+        (c.operacao, c.plataforma)
+    )
+    ORDER BY 1 NULLS LAST, 2, 3;
+$$;
+
+-- Busca textual em copies e análises (servicos.buscar_texto), com a configuração 'portuguese'
+-- (stemming e stopwords). As colunas tsvector são geradas e guardadas, então o ranking não
+-- reprocessa o texto; o produto/serviço e o objetivo pesam mais (A) que o texto gerado (B).
+ALTER TABLE copies ADD COLUMN busca tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('portuguese', coalesce(produto_servico, '')), 'A') ||
+    setweight(to_tsvector('portuguese', coalesce(copy_gerada, '')), 'B')
+) STORED;
+ALTER TABLE analises_leads ADD COLUMN busca tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('portuguese', coalesce(objetivo, '')), 'A') ||
+    setweight(to_tsvector('portuguese', coalesce(analise, '')), 'B')
+) STORED;
+CREATE INDEX idx_copies_busca ON copies USING GIN (busca);
+CREATE INDEX idx_analises_leads_busca ON analises_leads USING GIN (busca);
+
+-- Resultados ordenados por relevância (e data), com trechos destacados em **negrito**.
+-- O ts_headline, que relê o texto, só roda para as linhas da página.
+CREATE OR REPLACE FUNCTION buscar_texto(p_usuario_id TEXT, p_consulta TEXT, p_tipo TEXT DEFAULT NULL,
+                                        p_limite INTEGER DEFAULT 10, p_offset INTEGER DEFAULT 0)
+RETURNS TABLE (
+    tipo TEXT,
+    id UUID,
+    plataforma TEXT,
+    titulo TEXT,
+    data TIMESTAMP WITH TIME ZONE,
+    relevancia REAL,
+    trecho TEXT
+)
+LANGUAGE sql STABLE AS $$
+    WITH consulta AS (
+        SELECT websearch_to_tsquery('portuguese', p_consulta) AS q
+    ),
+    pagina AS (
+        SELECT 'copy' AS tipo, c.id, c.data_geracao AS data, ts_rank_cd(c.busca, consulta.q) AS relevancia
+        FROM copies c, consulta
+        WHERE (p_tipo IS NULL OR p_tipo = 'copy') AND c.usuario_id = p_usuario_id AND c.busca @@ consulta.q
+        UNION ALL
+        SELECT 'analise', a.id, a.data, ts_rank_cd(a.busca, consulta.q)
+        FROM analises_leads a, consulta
+        WHERE (p_tipo IS NULL OR p_tipo = 'analise') AND a.usuario_id = p_usuario_id AND a.busca @@ consulta.q
+        ORDER BY relevancia DESC, data DESC
+        LIMIT p_limite OFFSET p_offset
+    )
+    SELECT
+        p.tipo,
+        p.id,
+        coalesce(c.plataforma, a.plataforma),
+        coalesce(c.produto_servico, a.objetivo),
+        p.data,
+        p.relevancia,
+        ts_headline('portuguese', coalesce(c.copy_gerada, a.analise), consulta.q,
+                    'StartSel=**, StopSel=**, MaxWords=30, MinWords=10, MaxFragments=2, FragmentDelimiter=" … "')
+    FROM pagina p
+    CROSS JOIN consulta
+    LEFT JOIN copies c ON p.tipo = 'copy' AND c.id = p.id
+    LEFT JOIN analises_leads a ON p.tipo = 'analise' AND a.id = p.id
+    ORDER BY p.relevancia DESC, p.data DESC;
+$$;
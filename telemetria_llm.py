@@ -0,0 +1,341 @@
+"""
+Telemetria por chamada à OpenAI: modelo, plataforma, tokens, tempo até o primeiro token (TTFT),
+latência total, tentativas e resultado.
+
+chamar_chat() substitui client.chat.completions.create: faz a chamada em streaming (só assim
+dá para medir o TTFT), repete erros transitórios com backoff e registra uma linha por chamada
+lógica. Cada tentativa reserva o limitador de taxa separadamente, então a espera do backoff
+não ocupa uma vaga de concorrência. As linhas ficam em memória e são gravadas em lote, por uma
+thread em segundo plano, na tabela append-only chamadas_llm, depois que um destino é
+configurado (configurar_destino). Os lotes são separados por usuário, como a política de
+INSERT da tabela exige, e um lote recusado volta para a fila só até MAX_TENTATIVAS_GRAVACAO.
+
+As agregações (p50/p95/p99 por operação e plataforma, por dia) são feitas no Postgres pela
+função percentis_chamadas_llm; agregar_percentis() produz o mesmo formato em Python, para
+quando a função não existe no banco ou para as linhas ainda em memória.
+"""
+import atexit
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from cache import CONSULTA_TELEMETRIA_LLM, cache_consultas
+from prompts import tokens_em_cache
+
+TABELA_TELEMETRIA = "chamadas_llm"
+LLM_MAX_TENTATIVAS = int(os.getenv("LLM_MAX_TENTATIVAS", "3"))
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1").lower() in ("1", "true", "sim")
+INTERVALO_GRAVACAO = 5.0
+TAMANHO_LOTE_GRAVACAO = 200
+MAX_PENDENTES = 5000
+# Tentativas de gravação de cada registro antes de ele ser descartado
+MAX_TENTATIVAS_GRAVACAO = 3
+
+# Preço (USD) por milhão de tokens, usado no custo por chamada e na economia do cache de prompt
+PRECOS_POR_MILHAO_TOKENS = {
+    "gpt-4.1-mini": {"entrada": 0.40, "entrada_cache": 0.10, "saida": 1.60}
+}
+
+# Exceções do SDK da OpenAI que valem nova tentativa, e o resultado registrado para cada uma
+_ERROS_TRANSITORIOS = {
+    "RateLimitError": "rate_limit",
+    "APITimeoutError": "timeout",
+    "APIConnectionError": "erro_conexao",
+    "InternalServerError": "erro_servidor",
+}
+
+
+def calcular_custo(modelo, prompt_tokens, completion_tokens, cached_tokens):
+    """Custo estimado (USD) de uma chamada; 0 para modelos sem preço cadastrado."""
+    precos = PRECOS_POR_MILHAO_TOKENS.get(modelo)
+    if not precos:
+        return 0.0
+    nao_cacheados = max(prompt_tokens - cached_tokens, 0)
+    return (nao_cacheados * precos["entrada"] + cached_tokens * precos["entrada_cache"]
+            + completion_tokens * precos["saida"]) / 1_000_000
+
+
+def _sem_retentativas_do_sdk(client):
+    """As tentativas são contadas aqui, então as do SDK são desligadas quando possível."""
+    with_options = getattr(client, "with_options", None)
+    return with_options(max_retries=0) if callable(with_options) else client
+
+
+def _consumir_stream(stream, inicio):
+    """Junta os chunks do streaming em um objeto com a forma da resposta normal."""
+    textos = defaultdict(list)
+    motivos = {}
+    usage = None
+    ttft = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+        for choice in chunk.choices or []:
+            conteudo = getattr(choice.delta, "content", None)
+            if conteudo:
+                if ttft is None:
+                    ttft = time.perf_counter() - inicio
+                textos[choice.index].append(conteudo)
+            if choice.finish_reason:
+                motivos[choice.index] = choice.finish_reason
+    indices = sorted(set(textos) | set(motivos)) or [0]
+    choices = [
+        SimpleNamespace(index=i, message=SimpleNamespace(role="assistant", content="".join(textos[i])),
+                        finish_reason=motivos.get(i))
+        for i in indices
+    ]
+    if usage is None:
+        usage = SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0, prompt_tokens_details=None)
+    return SimpleNamespace(choices=choices, usage=usage), ttft
+
+
+def chamar_chat(client, operacao, plataforma=None, usuario_id=None, leads=0, streaming=LLM_STREAMING,
+                max_tentativas=LLM_MAX_TENTATIVAS, coletor=None, limitador=None, **parametros):
+    """
+    Chama client.chat.completions.create(**parametros) e registra a telemetria da chamada.
+
+    Retorna (resposta, registro). A resposta tem choices[i].message.content e usage, como a
+    da chamada sem streaming; o registro é a linha gravada em chamadas_llm. Erros não
+    transitórios (ou transitórios depois de max_tentativas) são registrados e relançados.
+    Com limitador (LimitadorTaxa), cada tentativa é feita dentro de limitador.reservar() e o
+    backoff entre tentativas acontece fora dele.
+    """
+    coletor = coletor or coletor_telemetria
+    modelo = parametros.get("model")
+    cliente_chamada = _sem_retentativas_do_sdk(client)
+    if streaming:
+        parametros = dict(parametros, stream=True, stream_options={"include_usage": True})
+
+    inicio = time.perf_counter()
+    tentativas = 0
+    resposta = None
+    ttft = None
+    resultado = "ok"
+    try:
+        while True:
+            tentativas += 1
+            try:
+                with limitador.reservar() if limitador is not None else nullcontext():
+                    inicio_tentativa = time.perf_counter()
+                    if streaming:
+                        resposta, ttft = _consumir_stream(
+                            cliente_chamada.chat.completions.create(**parametros), inicio_tentativa
+                        )
+                    else:
+                        resposta = cliente_chamada.chat.completions.create(**parametros)
+                        ttft = time.perf_counter() - inicio_tentativa
+                break
+            except Exception as e:
+                resultado = _ERROS_TRANSITORIOS.get(type(e).__name__, "erro")
+                if resultado == "erro" or tentativas >= max_tentativas:
+                    raise
+                time.sleep(0.5 * 2 ** (tentativas - 1) + random.uniform(0, 0.25))
+        resultado = "truncado" if any(c.finish_reason == "length" for c in resposta.choices) else "ok"
+        return resposta, _registrar(coletor, operacao, modelo, plataforma, usuario_id, leads, resposta,
+                                    ttft, inicio, tentativas, resultado)
+    except Exception:
+        _registrar(coletor, operacao, modelo, plataforma, usuario_id, leads, None, None, inicio, tentativas,
+                   resultado)
+        raise
+
+
+def _registrar(coletor, operacao, modelo, plataforma, usuario_id, leads, resposta, ttft, inicio, tentativas,
+               resultado):
+    usage = getattr(resposta, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cached_tokens = tokens_em_cache(usage) if usage is not None else 0
+    registro = {
+        "criado_em": datetime.now(timezone.utc).isoformat(),
+        "usuario_id": usuario_id,
+        "operacao": operacao,
+        "modelo": modelo,
+        "plataforma": plataforma,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "ttft_ms": round(ttft * 1000) if ttft is not None else None,
+        "latencia_ms": round((time.perf_counter() - inicio) * 1000),
+        "tentativas": tentativas,
+        "resultado": resultado,
+        "leads": leads or 0,
+        "custo_usd": round(calcular_custo(modelo, prompt_tokens, completion_tokens, cached_tokens), 6),
+    }
+    coletor.registrar(registro)
+    return registro
+
+
+class ColetorTelemetria:
+    """Acumula os registros e os grava em lote no Supabase, em segundo plano."""
+
+    def __init__(self, intervalo=INTERVALO_GRAVACAO, tamanho_lote=TAMANHO_LOTE_GRAVACAO,
+                 max_pendentes=MAX_PENDENTES, max_tentativas=MAX_TENTATIVAS_GRAVACAO):
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        self.max_tentativas = max_tentativas
+        # (registro, tentativas de gravação); descarta os mais antigos se o banco ficar fora
+        self._pendentes = deque(maxlen=max_pendentes)
+        self._recentes = deque(maxlen=1000)
+        self._destino = None
+        self._destino_servico = None
+        self._lock = threading.Lock()
+        self._lock_gravacao = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        self.registrados = 0
+        self.gravados = 0
+        self.descartados = 0
+        self.ultimo_erro = None
+
+    def configurar_destino(self, supabase, servico=None):
+        """
+        Define os clientes usados na gravação e inicia a thread de gravação.
+
+        servico: cliente com a chave de serviço (sem RLS), que grava os registros de qualquer
+        usuário. Sem ele, os lotes vão pelo cliente do processo e só passam os do usuário
+        autenticado nele; os demais são descartados depois de max_tentativas.
+        """
+        with self._lock:
+            self._destino = supabase
+            self._destino_servico = servico
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._laco, name="telemetria-llm", daemon=True)
+                self._thread.start()
+
+    def registrar(self, registro):
+        with self._lock:
+            self.registrados += 1
+            self._recentes.append(registro)
+            if self._destino is None:
+                return
+            self._pendentes.append((registro, 0))
+            if len(self._pendentes) >= self.tamanho_lote:
+                self._acordar.set()
+
+    def recentes(self):
+        """Registros deste processo (os últimos 1000), gravados ou não."""
+        with self._lock:
+            return list(self._recentes)
+
+    def descarregar(self):
+        """
+        Grava os registros pendentes, em lotes de um usuário só.
+
+        Um lote recusado volta para a fila com mais uma tentativa; os que já tiveram
+        max_tentativas são descartados. Lotes gravados nunca voltam, então não há duplicatas.
+        """
+        with self._lock_gravacao:
+            with self._lock:
+                destino = self._destino_servico or self._destino
+                itens = list(self._pendentes)
+                self._pendentes.clear()
+            if not itens or destino is None:
+                return 0
+            por_usuario = defaultdict(list)
+            for item in itens:
+                por_usuario[item[0]["usuario_id"]].append(item)
+            gravados, devolver, falhou = 0, [], False
+            for usuario_id, itens_usuario in por_usuario.items():
+                for i in range(0, len(itens_usuario), self.tamanho_lote):
+                    lote = itens_usuario[i:i + self.tamanho_lote]
+                    try:
+                        destino.table(TABELA_TELEMETRIA).insert([registro for registro, _ in lote]).execute()
+                    except Exception as e:
+                        falhou = True
+                        self.ultimo_erro = str(e)
+                        print(f"Erro ao gravar telemetria das chamadas à IA: {e}")
+                        devolver.extend((registro, tentativas + 1) for registro, tentativas in lote
+                                        if tentativas + 1 < self.max_tentativas)
+                        self.descartados += sum(1 for _, tentativas in lote if tentativas + 1 >= self.max_tentativas)
+                        continue
+                    gravados += len(lote)
+                if gravados:
+                    cache_consultas.invalidar(usuario_id, CONSULTA_TELEMETRIA_LLM)
+            if devolver:
+                with self._lock:
+                    self._pendentes.extendleft(reversed(devolver))
+            if not falhou:
+                self.ultimo_erro = None
+            self.gravados += gravados
+            return gravados
+
+    def _laco(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            self.descarregar()
+
+
+coletor_telemetria = ColetorTelemetria()
+atexit.register(coletor_telemetria.descarregar)
+
+
+def configurar_destino(supabase, servico=None):
+    coletor_telemetria.configurar_destino(supabase, servico)
+
+
+# --- Agregações ---
+
+def percentil(valores_ordenados, fracao):
+    """Percentil com interpolação linear (mesma definição do percentile_cont do Postgres)."""
+    if not valores_ordenados:
+        return None
+    posicao = (len(valores_ordenados) - 1) * fracao
+    abaixo = int(posicao)
+    acima = min(abaixo + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[abaixo] + (valores_ordenados[acima] - valores_ordenados[abaixo]) * (posicao - abaixo)
+
+
+def _resumir_grupo(dia, operacao, plataforma, registros):
+    latencias = sorted(r["latencia_ms"] for r in registros if r.get("latencia_ms") is not None)
+    ttfts = sorted(r["ttft_ms"] for r in registros if r.get("ttft_ms") is not None)
+    return {
+        "dia": dia,
+        "operacao": operacao,
+        "plataforma": plataforma,
+        "chamadas": len(registros),
+        "erros": sum(1 for r in registros if r.get("resultado") not in ("ok", "truncado")),
+        "retentativas": sum(max((r.get("tentativas") or 1) - 1, 0) for r in registros),
+        "p50_ms": percentil(latencias, 0.5),
+        "p95_ms": percentil(latencias, 0.95),
+        "p99_ms": percentil(latencias, 0.99),
+        "ttft_p50_ms": percentil(ttfts, 0.5),
+        "ttft_p95_ms": percentil(ttfts, 0.95),
+        "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in registros),
+        "completion_tokens": sum(r.get("completion_tokens") or 0 for r in registros),
+        "cached_tokens": sum(r.get("cached_tokens") or 0 for r in registros),
+        "custo_usd": sum(float(r.get("custo_usd") or 0) for r in registros),
+        "leads": sum(r.get("leads") or 0 for r in registros),
+    }
+
+
+def agregar_percentis(registros):
+    """
+    Agrega registros de chamadas_llm no formato de percentis_chamadas_llm.
+
+    Uma linha por (dia, operação, plataforma) e uma por (operação, plataforma) no período
+    inteiro, esta com dia = None.
+    """
+    por_dia = defaultdict(list)
+    por_periodo = defaultdict(list)
+    for registro in registros:
+        chave = (registro.get("operacao"), registro.get("plataforma"))
+        por_dia[(str(registro.get("criado_em", ""))[:10],) + chave].append(registro)
+        por_periodo[chave].append(registro)
+    linhas = [_resumir_grupo(dia, operacao, plataforma, grupo)
+              for (dia, operacao, plataforma), grupo in sorted(por_dia.items(), key=lambda i: tuple(map(str, i[0])))]
+    linhas += [_resumir_grupo(None, operacao, plataforma, grupo)
+               for (operacao, plataforma), grupo in sorted(por_periodo.items(), key=lambda i: tuple(map(str, i[0])))]
+    return linhas
+
+
+def custo_por_mil_leads(linhas, operacao="analise"):
+    """Custo (USD) por 1.000 leads da operação, a partir das linhas do período inteiro."""
+    periodo = [l for l in linhas if l["dia"] is None and l["operacao"] == operacao]
+    leads = sum(l["leads"] or 0 for l in periodo)
+    return sum(l["custo_usd"] or 0 for l in periodo) / leads * 1000 if leads else None
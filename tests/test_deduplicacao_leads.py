@@ -0,0 +1,34 @@
+"""Regressões da deduplicação por identidade com cabeçalhos reais de exportação."""
+import pandas as pd
+
+from deduplicacao_leads import deduplicar_leads
+
+
+def test_email_em_maiusculas_com_cabecalho_e_mail():
+    df = pd.DataFrame({"E-mail": ["ana@x.com", "ANA@X.COM "], "Cidade": ["SP", None]})
+
+    resultado, estatisticas = deduplicar_leads(df)
+
+    assert len(resultado) == 1
+    assert estatisticas["removidas_por_chave"] == {"email": 1}
+
+
+def test_sinonimos_de_cabecalho_entre_arquivos():
+    primeiro = pd.DataFrame({"E-mail": ["bia@x.com", "caio@x.com"], "Celular": ["(11) 99999-0000", None]})
+    segundo = pd.DataFrame({"email": ["BIA@x.com", None], "Telefone": [None, "+55 11 98888-7777"]})
+    terceiro = pd.DataFrame({"EMAIL": [None], "WhatsApp": [5511988887777]})
+
+    resultado, estatisticas = deduplicar_leads([primeiro, segundo, terceiro])
+
+    assert estatisticas["duplicatas_removidas"] == 2
+    assert list(resultado.columns) == ["E-mail", "Celular"]
+    assert resultado["E-mail"].tolist() == ["bia@x.com", "caio@x.com", None]
+
+
+def test_chave_composta_com_cabecalhos_diferentes():
+    primeiro = pd.DataFrame({"Nome": ["Ana Lima"], "Cidade": ["SP"]})
+    segundo = pd.DataFrame({"NAME": ["ana  lima"], "cidade": ["sp"]})
+
+    resultado, _ = deduplicar_leads([primeiro, segundo], chave="nome+cidade")
+
+    assert len(resultado) == 1
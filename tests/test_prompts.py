@@ -0,0 +1,21 @@
+"""Os prefixos estáticos de copy e de análise precisam alcançar o mínimo do cache de prefixo."""
+import pytest
+
+from prompts import MIN_TOKENS_CACHE_PREFIXO, TEMPLATES_PROMPT, mensagens_copy
+
+# Limite conservador: em português o o200k_base fica abaixo de 4,5 caracteres por token
+CARACTERES_POR_TOKEN = 4.5
+
+
+@pytest.mark.parametrize("nome", ["copy", "analise"])
+def test_prefixo_alcanca_minimo_do_cache(nome):
+    prefixo = TEMPLATES_PROMPT[nome]["prefixo"]
+
+    assert len(prefixo) / CARACTERES_POR_TOKEN >= MIN_TOKENS_CACHE_PREFIXO
+
+
+def test_prefixo_da_copy_nao_depende_do_pedido():
+    whatsapp = mensagens_copy("Disparo de WhatsApp", "Vender", "Adultos", "Curso", "Amigável", "Compre")
+    email = mensagens_copy("Email Marketing", "Reter", "Clientes", "Plano", "Profissional", "Renove", "Desconto")
+
+    assert whatsapp[0] == email[0]
@@ -0,0 +1,32 @@
+"""Seleção de colunas: nomes de pessoas ficam de fora, colunas de negócio com "nome" no cabeçalho não."""
+import pandas as pd
+
+from selecao_colunas import selecionar_colunas
+
+LINHAS = 300
+
+
+def test_colunas_de_negocio_com_nome_no_cabecalho_sao_analisadas():
+    df = pd.DataFrame({
+        "Nome": [f"Pessoa {i}" for i in range(LINHAS)],
+        "nome_produto": [["Básico", "Pro", "Premium"][i % 3] for i in range(LINHAS)],
+        "campaign_name": [["black_friday", "natal"][i % 2] for i in range(LINHAS)],
+        "E-mail": [f"p{i}@x.com" for i in range(LINHAS)],
+    })
+
+    colunas, ranking = selecionar_colunas(df)
+
+    assert colunas == ["nome_produto", "campaign_name"]
+    assert {item["coluna"]: item["tipo"] for item in ranking}["Nome"] == "nome"
+
+
+def test_arquivo_sem_outras_colunas_nao_fica_sem_dados():
+    df = pd.DataFrame({
+        "campaign_name": [["black_friday", "natal", "verao"][i % 3] for i in range(LINHAS)],
+        "canal_contato": [["whatsapp", "email"][i % 2] for i in range(LINHAS)],
+        "Telefone": [f"+55 11 9{i:04d}-0000" for i in range(LINHAS)],
+    })
+
+    colunas, _ = selecionar_colunas(df)
+
+    assert colunas == ["campaign_name", "canal_contato"]